@@ -46,19 +46,59 @@ def create_app() -> Flask:
             logger.error(f"❌ Error en migraciones: {e}")
             logger.warning("⚠️ La app continuará, pero puede haber problemas con DB")
 
+        # Reporta consultas calientes que caen en Seq Scan por falta de índice
+        try:
+            from gateway_app.services.query_plans import check_hot_query_plans
+            check_hot_query_plans()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo revisar planes de consultas: {e}")
+
+    # ✅ Start ticket events writer (ticket_events en lotes)
+    try:
+        from gateway_app.services.ticket_events import start_ticket_events_writer
+        start_ticket_events_writer()
+    except Exception as e:
+        logger.error(f"❌ Error starting ticket events writer: {e}")
+
+    # ✅ Start LISTEN/NOTIFY (invalidación del directorio de workers)
+    try:
+        from gateway_app.services.staff_directory import start_staff_directory_listener
+        from gateway_app.services.pg_listener import start_pg_listener
+        start_staff_directory_listener()
+        start_pg_listener()
+    except Exception as e:
+        logger.error(f"❌ Error starting pg listener: {e}")
+
+    # ✅ Jobs de fondo: solo en el líder (uno entre workers de gunicorn / instancias).
+    # Nuevos jobs de fondo: registrarlos con run_on_leader y arrancar la elección al final.
     # ✅ Start ticket watcher (guest → supervisor notifications)
     try:
+        from gateway_app.services.leader_election import run_on_leader
         from gateway_app.services.ticket_watch import start_ticket_watch
-        start_ticket_watch()
+        run_on_leader("ticket_watch", start_ticket_watch)
     except Exception as e:
         logger.error(f"❌ Error starting ticket watcher: {e}")
 
     # ✅ NEW: Start daily scheduler (recordatorios matutinos)
     try:
+        from gateway_app.services.leader_election import run_on_leader
         from gateway_app.services.daily_scheduler import start_daily_scheduler
-        start_daily_scheduler()
+        run_on_leader("daily_scheduler", start_daily_scheduler)
     except Exception as e:
         logger.error(f"❌ Error starting daily scheduler: {e}")
+
+    try:
+        from gateway_app.services.leader_election import start_leader_election
+        start_leader_election()
+    except Exception as e:
+        logger.error(f"❌ Error starting leader election: {e}")
+
+    # ✅ Start media workers (descarga/subida de fotos y videos en background)
+    try:
+        from gateway_app.services.media_jobs import start_media_workers
+        start_media_workers()
+    except Exception as e:
+        logger.error(f"❌ Error starting media workers: {e}")
     
     return app
 
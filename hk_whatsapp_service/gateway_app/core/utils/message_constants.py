@@ -18,8 +18,9 @@ from typing import Dict, Any, List, Optional
 # CONSTANTES DE EMOJI
 # ═══════════════════════════════════════════════════════════════
 
-PRIORIDAD_EMOJI = {"ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}
-PRIORIDAD_ORDER = {"ALTA": 0, "MEDIA": 1, "BAJA": 2}
+PRIORIDAD_EMOJI = {"URGENTE": "🚨", "ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}
+# Igual que tickets.priority_rank (ver migrations.ensure_ticket_priority_rank)
+PRIORIDAD_ORDER = {"URGENTE": 0, "ALTA": 1, "MEDIA": 2, "BAJA": 3}
 
 ESTADO_EMOJI = {
     "PENDIENTE": "⏳",
@@ -117,10 +118,11 @@ def nombre_worker_de_ticket(t: dict) -> str:
     """
     Extrae nombre del worker asignado. Soporta:
     - t["worker_name"] (de JOINs)
+    - t["assigned_name"] (columna de asignación)
     - t["huesped_whatsapp"] formato "phone|nombre"
     - t["asignado_a_nombre"] (campo enriquecido)
     """
-    wn = t.get("worker_name")
+    wn = t.get("worker_name") or t.get("assigned_name")
     if wn:
         return wn
 
@@ -250,10 +252,23 @@ def formatear_linea_ticket(
         if worker and worker != "Sin asignar":
             partes.append(f"👤 {worker[:15]}")
 
+    # media_count: lo agrega adjuntar_conteo_media (una query para toda la lista)
+    if t.get("media_count"):
+        partes.append(f"📎 {t['media_count']}")
+
     linea1 = " · ".join(partes)
     return f"{linea1}\n   {det}"
 
 
+def _adjuntar_conteo_media(tickets: List[dict]) -> None:
+    """Conteo de media de toda la lista en una query (nunca rompe el formateo)."""
+    try:
+        from gateway_app.services.tickets_db import adjuntar_conteo_media
+        adjuntar_conteo_media(tickets)
+    except Exception:
+        pass
+
+
 def formatear_lista_tickets(
     tickets: List[dict],
     titulo: str,
@@ -263,9 +278,11 @@ def formatear_lista_tickets(
     mostrar_worker: bool = False,
     campo_fecha: str = "created_at",
     max_items: int = 10,
+    total: Optional[int] = None,
 ) -> str:
     """
     Lista formateada de tickets con título, líneas y hint.
+    total: cantidad real cuando `tickets` es solo una página (listados paginados).
 
     Resultado:
         📋 Tareas Pendientes (5)
@@ -280,7 +297,9 @@ def formatear_lista_tickets(
     if not tickets:
         return msg_vacio or "✅ No hay tareas en esta categoría"
 
-    lineas = [f"{titulo} ({len(tickets)})\n"]
+    lineas = [f"{titulo} ({total if total is not None else len(tickets)})\n"]
+
+    _adjuntar_conteo_media(tickets[:max_items])
 
     for t in tickets[:max_items]:
         lineas.append(formatear_linea_ticket(
@@ -489,6 +508,119 @@ def msg_worker_tarea_finalizada_sup(
     )
 
 
+# ═══════════════════════════════════════════════════════════════
+# TEMPLATES: OPERACIONES EN LOTE (un mensaje por worker)
+# ═══════════════════════════════════════════════════════════════
+
+def msg_worker_nuevas_tareas(tickets: List[dict]) -> str:
+    """
+    Notificación consolidada al worker: varias tareas asignadas de una vez.
+
+    Resultado:
+        🔔 Nuevas tareas asignadas (3)
+
+        🟡 #12 · Hab. 305
+           Fuga de agua
+        ...
+
+        💡 Di 'tomar' para comenzar
+    """
+    return formatear_lista_tickets(
+        tickets,
+        "🔔 Nuevas tareas asignadas",
+        hint="💡 Di 'tomar' para comenzar",
+        mostrar_tiempo=False,
+        max_items=15,
+    )
+
+
+def msg_worker_tareas_reasignadas_saliente(tickets: List[dict], nuevo_worker: str) -> str:
+    """Notificación consolidada al worker original: sus tareas pasaron a otro."""
+    ids = ", ".join(f"#{t.get('id')}" for t in tickets)
+    return (
+        f"🔄 {len(tickets)} tarea(s) reasignada(s)\n\n"
+        f"{ids}\n"
+        f"ℹ️ Fueron reasignadas a {nuevo_worker}"
+    )
+
+
+def msg_worker_tareas_finalizadas_sup(tickets: List[dict]) -> str:
+    """Notificación consolidada al worker: supervisión cerró varias de sus tareas."""
+    return formatear_lista_tickets(
+        tickets,
+        "ℹ️ Tareas finalizadas por supervisión",
+        hint="✅ Ya no necesitas completarlas",
+        mostrar_tiempo=False,
+        max_items=15,
+    )
+
+
+def msg_sup_resultado_lote(
+    verbo: str,
+    aplicados: List[dict],
+    omitidos: List[int],
+    worker_nombre: str = None,
+    motivo_omitidos: str = "no estaban disponibles",
+) -> str:
+    """
+    Resumen al supervisor de una operación en lote.
+
+    verbo: "asignadas" | "reasignadas" | "finalizadas"
+
+    Resultado:
+        ✅ 3 tarea(s) asignadas a María
+        #12, #15, #18
+
+        ⚠️ Sin cambios: #20 (no estaban disponibles)
+    """
+    if not aplicados:
+        lineas = [f"⚠️ Ninguna tarea {verbo.rstrip('s')}"]
+    else:
+        destino = f" a {worker_nombre}" if worker_nombre else ""
+        lineas = [
+            f"✅ {len(aplicados)} tarea(s) {verbo}{destino}",
+            ", ".join(f"#{t.get('id')}" for t in aplicados),
+        ]
+
+    if omitidos:
+        ids = ", ".join(f"#{i}" for i in omitidos)
+        lineas.append(f"\n⚠️ Sin cambios: {ids} ({motivo_omitidos})")
+
+    return "\n".join(lineas)
+
+
+def msg_sup_plan_auto_asignacion(por_worker: List[dict], sin_asignar: List[int]) -> str:
+    """
+    Propuesta de asignación automática (antes de confirmar).
+
+    por_worker: [{"nombre": str, "area": str, "ticket_ids": [int, ...]}, ...]
+
+    Resultado:
+        🧮 Propuesta de asignación (5 tareas)
+
+        👤 María (🏠 HK): #12, #15, #18
+        👤 Pedro (🔧 MT): #20, #21
+
+        ⚠️ Sin asignar: #30 (todos con la cola llena)
+
+        ¿Aplico la asignación? (sí/no)
+    """
+    total = sum(len(g["ticket_ids"]) for g in por_worker)
+    lineas = [f"🧮 Propuesta de asignación ({total} tarea{'s' if total != 1 else ''})\n"]
+    for g in por_worker:
+        ids = ", ".join(f"#{tid}" for tid in g["ticket_ids"])
+        area = f" ({emoji_area(g['area'])} {tag_area(g['area'])})" if g.get("area") else ""
+        lineas.append(f"👤 {g['nombre']}{area}: {ids}")
+
+    if sin_asignar:
+        ids = ", ".join(f"#{tid}" for tid in sin_asignar[:15])
+        resto = f" y {len(sin_asignar) - 15} más" if len(sin_asignar) > 15 else ""
+        lineas.append(f"\n⚠️ Sin asignar: {ids}{resto} (todos con la cola llena)")
+
+    lineas.append("\n¿Aplico la asignación? (sí/no)")
+    return "\n".join(lineas)
+
+
 # ═══════════════════════════════════════════════════════════════
 # TEMPLATES: ESTADOS DE TAREA — WORKER / HK (FASE 4)
 # ═══════════════════════════════════════════════════════════════
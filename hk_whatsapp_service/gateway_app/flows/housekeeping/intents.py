@@ -114,6 +114,8 @@ def extraer_habitacion(text: str) -> Optional[str]:
     """
     Extrae número de habitación del texto.
     VALIDACIÓN: Solo acepta 3-4 dígitos para evitar confusión con opciones de menú (1, 2, 3)
+    y, si el hotel tiene topología cargada, solo habitaciones que existen
+    (lookup O(1) en hotel_topology; "la 999" en un hotel de 8 pisos no es habitación).
     
     Args:
         text: Texto
@@ -121,6 +123,8 @@ def extraer_habitacion(text: str) -> Optional[str]:
     Returns:
         Número de habitación o None
     """
+    from gateway_app.services.hotel_topology import es_habitacion_valida
+
     text_lower = text.lower()
     text_stripped = text.strip()
     
@@ -135,17 +139,17 @@ def extraer_habitacion(text: str) -> Optional[str]:
     
     for pattern in patterns_con_contexto:
         match = re.search(pattern, text_lower)
-        if match:
+        if match and es_habitacion_valida(match.group(1)):
             return match.group(1)
     
     # Solo número: DEBE ser 3-4 dígitos (no 1-2 para evitar confusión con menú)
     if text_stripped.isdigit() and 3 <= len(text_stripped) <= 4:
-        return text_stripped
+        return text_stripped if es_habitacion_valida(text_stripped) else None
     
     # Buscar número de 3-4 dígitos en el texto (sin contexto pero más seguro)
-    match = re.search(r'\b(\d{3,4})\b', text_lower)
-    if match:
-        return match.group(1)
+    for match in re.finditer(r'\b(\d{3,4})\b', text_lower):
+        if es_habitacion_valida(match.group(1)):
+            return match.group(1)
     
     return None
 
@@ -217,6 +217,10 @@ def handle_media_context_response(from_phone: str, text: str) -> bool:
     ubicacion_guardada = media_info.get("ubicacion") if media_info else None
     if ubicacion_guardada:
     # Ya tenemos ubicación, el texto que llegó ES el detalle
+        # (limpiar antes de crear: _crear_ticket_con_media puede guardar
+        # media_duplicado y no hay que pisarlo)
+        state.pop("media_pendiente", None)
+        persist_state(from_phone, state)
         _crear_ticket_con_media(
             from_phone=from_phone,
             media_id=media_info["media_id"],
@@ -224,8 +228,6 @@ def handle_media_context_response(from_phone: str, text: str) -> bool:
             ubicacion=ubicacion_guardada,
             detalle=text.strip()
         )
-        state.pop("media_pendiente", None)
-        persist_state(from_phone, state)
         return True
     
     text_lower = text.strip().lower()
@@ -347,6 +349,69 @@ def handle_media_detail_response(from_phone: str, text: str) -> bool:
     return True
 
 
+def handle_media_duplicate_response(from_phone: str, text: str) -> bool:
+    """
+    Maneja la respuesta cuando la foto/video parecía de un ticket ya abierto
+    (ver _crear_ticket_con_media): 'sí' la agrega a ese ticket, 'no' crea
+    uno nuevo.
+
+    Returns:
+        True si se manejó, False si no había media_duplicado
+    """
+    get_state, persist_state, is_supervisor = _get_state_functions(from_phone)
+    send_whatsapp = _get_send_function(from_phone)
+
+    state = get_state(from_phone)
+    info = state.get("media_duplicado")
+
+    if not info:
+        return False
+
+    text_lower = text.strip().lower()
+
+    if text_lower in ["si", "sí", "yes", "ok", "misma", "es la misma", "agregar"]:
+        state.pop("media_duplicado", None)
+        persist_state(from_phone, state)
+
+        from gateway_app.services.tickets_db import registrar_reporte_duplicado
+        registrar_reporte_duplicado(
+            info["ticket_id"], from_phone, detalle=info.get("detalle"), media_id=info["media_id"]
+        )
+        _agregar_media_a_ticket(from_phone, info["media_id"], info["media_type"], info["ticket_id"])
+        return True
+
+    if text_lower in ["no", "nueva", "nuevo", "otra", "crear"]:
+        state.pop("media_duplicado", None)
+        persist_state(from_phone, state)
+
+        _crear_ticket_con_media(
+            from_phone=from_phone,
+            media_id=info["media_id"],
+            media_type=info["media_type"],
+            ubicacion=info["ubicacion"],
+            detalle=info["detalle"],
+            verificar_duplicado=False,
+        )
+        return True
+
+    if text_lower in ["cancelar", "cancel", "descartar"]:
+        state.pop("media_duplicado", None)
+        persist_state(from_phone, state)
+        send_whatsapp(from_phone, "❌ Foto descartada")
+        return True
+
+    from gateway_app.flows.housekeeping.ui_simple import texto_posible_duplicado
+    send_whatsapp(
+        from_phone,
+        "❌ No entendí\n\n"
+        + texto_posible_duplicado(
+            {"id": info["ticket_id"], "ubicacion": info["ubicacion"], "detalle": info.get("detalle_ticket")},
+            media=True,
+        ),
+    )
+    return True
+
+
 # ============================================================
 # FUNCIONES AUXILIARES
 # ============================================================
@@ -402,13 +467,39 @@ def _crear_ticket_con_media(
     media_id: str,
     media_type: str,
     ubicacion: str,
-    detalle: str
+    detalle: str,
+    verificar_duplicado: bool = True
 ) -> None:
-    """Crea un ticket nuevo con media adjunto y notifica al supervisor."""
+    """
+    Crea un ticket nuevo con media adjunto y notifica al supervisor.
+    Si ya hay un ticket abierto parecido (misma ubicación, reciente), primero
+    pregunta si la foto es de ese ticket (ver handle_media_duplicate_response).
+    """
     from gateway_app.flows.housekeeping.outgoing import send_whatsapp
-    from gateway_app.services.tickets_db import crear_ticket
-    from gateway_app.services.media_storage import process_and_store_media
-    
+    from gateway_app.services.tickets_db import crear_ticket, buscar_ticket_duplicado
+    from gateway_app.services.media_jobs import enqueue_media_job
+
+    if verificar_duplicado:
+        duplicado = buscar_ticket_duplicado(str(ubicacion), detalle)
+        if duplicado:
+            from gateway_app.flows.housekeeping.ui_simple import texto_posible_duplicado
+
+            get_state, persist_state, _ = _get_state_functions(from_phone)
+            state = get_state(from_phone)
+            state["media_duplicado"] = {
+                "ticket_id": duplicado["id"],
+                "detalle_ticket": duplicado.get("detalle"),
+                "media_id": media_id,
+                "media_type": media_type,
+                "ubicacion": ubicacion,
+                "detalle": detalle,
+            }
+            persist_state(from_phone, state)
+
+            logger.info(f"🔁 {media_type} de {from_phone} parece del ticket #{duplicado['id']}")
+            send_whatsapp(from_phone, texto_posible_duplicado(duplicado, media=True))
+            return
+
     from gateway_app.services.ticket_classifier import clasificar_ticket
     clasificacion = clasificar_ticket(
         detalle=detalle,
@@ -437,11 +528,11 @@ def _crear_ticket_con_media(
         
         ticket_id = ticket["id"]
         
-        # Procesar y guardar media
-        media_result = process_and_store_media(
+        # Registrar media pendiente; la descarga/subida corre en background
+        enqueue_media_job(
+            ticket_id=ticket_id,
             media_id=media_id,
             media_type=media_type,
-            ticket_id=ticket_id,
             uploaded_by=from_phone
         )
         
@@ -466,8 +557,7 @@ def _crear_ticket_con_media(
                 prioridad=prioridad,
                 media_id=media_id,
                 media_type=media_type,
-                reportado_por=from_phone,
-                storage_url=media_result.get("storage_url")
+                reportado_por=from_phone
             )
         
         logger.info(f"✅ Ticket #{ticket_id} creado con {media_type} por {from_phone}")
@@ -486,7 +576,7 @@ def _agregar_media_a_ticket(
     """Agrega un media a un ticket existente."""
     from gateway_app.flows.housekeeping.outgoing import send_whatsapp
     from gateway_app.services.tickets_db import obtener_ticket_por_id
-    from gateway_app.services.media_storage import process_and_store_media
+    from gateway_app.services.media_jobs import enqueue_media_job
     
     ticket = obtener_ticket_por_id(ticket_id)
     
@@ -494,14 +584,14 @@ def _agregar_media_a_ticket(
         send_whatsapp(from_phone, f"❌ No encontré el ticket #{ticket_id}")
         return
     
-    media_result = process_and_store_media(
+    media_db_id = enqueue_media_job(
+        ticket_id=ticket_id,
         media_id=media_id,
         media_type=media_type,
-        ticket_id=ticket_id,
         uploaded_by=from_phone
     )
     
-    if not media_result["success"]:
+    if not media_db_id:
         send_whatsapp(from_phone, f"❌ Error guardando {'foto' if media_type == 'image' else 'video'}")
         return
     
@@ -519,8 +609,7 @@ def _agregar_media_a_ticket(
         ticket_id=ticket_id,
         media_id=media_id,
         media_type=media_type,
-        agregado_por=from_phone,
-        storage_url=media_result.get("storage_url")
+        agregado_por=from_phone
     )
     
     logger.info(f"✅ {media_type} agregado a ticket #{ticket_id} por {from_phone}")
@@ -38,7 +38,8 @@ from .ui_simple import (
     texto_pedir_habitacion,
     texto_pedir_detalle,
     texto_ticket_creado,
-    texto_confirmar_reporte
+    texto_confirmar_reporte,
+    texto_posible_duplicado
 )
 from .intents import (
     detectar_reporte_directo,
@@ -108,6 +109,18 @@ def _extract_ticket_id_any(s: str):
     m = re.search(r"\b(\d+)\b", s or "")
     return int(m.group(1)) if m else None
 
+def _as_utc(value):
+    """Timestamp de BD (datetime o str en SQLite) → datetime aware en UTC."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        from dateutil import parser
+        value = parser.parse(value)
+    # FIX: if DB returned a naive datetime, treat it as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
 def maybe_handle_tomar_anywhere(from_phone: str, text: str, state: dict) -> bool:
     """
     Maneja 'tomar' desde cualquier estado.
@@ -130,48 +143,34 @@ def maybe_handle_tomar_anywhere(from_phone: str, text: str, state: dict) -> bool
 
     from gateway_app.services.tickets_db import (
         obtener_ticket_por_id,
-        obtener_tickets_por_worker,
-        actualizar_ticket_estado,
+        contar_tickets_en_curso,
     )
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
     from .outgoing import send_whatsapp
 
     # 1) Caso: "tomar <id>" o "aceptar <id>" o número directo en VIENDO_TICKETS
     if m:
         ticket_id = int(m.group(1))
 
-        # ✅ VALIDAR ASIGNACIÓN contra "mis tickets" (fuente consistente)
-        tickets_mios = obtener_tickets_por_worker(from_phone) or []
-        ticket = next(
-            (t for t in tickets_mios if str(t.get("id")) == str(ticket_id)),
-            None
-        )
+        # ✅ Transición atómica: solo pasa si está ASIGNADO y asignado a mí
+        ticket = ticket_state_machine.take(ticket_id, from_phone)
 
-        # Si no está en mis tickets, ahí sí reviso si existe para dar mejor mensaje
         if not ticket:
+            # Rechazado: leer el ticket solo para explicar por qué
             ticket_existe = obtener_ticket_por_id(ticket_id)
+            estado = str((ticket_existe or {}).get("estado") or "").upper()
             if not ticket_existe:
                 send_whatsapp(from_phone, f"❌ No encontré la tarea #{ticket_id}.")
-            else:
+            elif ticket_existe.get("assigned_phone") != from_phone:
                 send_whatsapp(from_phone, f"❌ La tarea #{ticket_id} no está asignada a ti.")
-            return True
-
-        estado = str(ticket.get("estado") or "").upper()
-        if estado == "RESUELTO":
-            send_whatsapp(from_phone, f"✅ La tarea #{ticket_id} ya está resuelta.")
-            return True
-
-        if estado == "EN_CURSO":
-            send_whatsapp(from_phone, f"⚙️ La tarea #{ticket_id} ya está en curso.")
-            return True
-
-        # Solo tiene sentido tomar si está ASIGNADO (o si tú permites PENDIENTE)
-        if estado != "ASIGNADO":
-            send_whatsapp(from_phone, f"⚠️ La tarea #{ticket_id} está en estado {estado} y no se puede 'tomar'.")
-            return True
-
-        ok = actualizar_ticket_estado(ticket_id, "EN_CURSO")
-        if not ok:
-            send_whatsapp(from_phone, "❌ No pude tomar la tarea. Intenta de nuevo.")
+            elif estado == "RESUELTO":
+                send_whatsapp(from_phone, f"✅ La tarea #{ticket_id} ya está resuelta.")
+            elif estado == "EN_CURSO":
+                send_whatsapp(from_phone, f"⚙️ La tarea #{ticket_id} ya está en curso.")
+            elif estado and estado != "ASIGNADO":
+                send_whatsapp(from_phone, f"⚠️ La tarea #{ticket_id} está en estado {estado} y no se puede 'tomar'.")
+            else:
+                send_whatsapp(from_phone, "❌ No pude tomar la tarea. Intenta de nuevo.")
             return True
 
         # ✅ Marca estado runtime (importante: guarda el id activo)
@@ -184,15 +183,14 @@ def maybe_handle_tomar_anywhere(from_phone: str, text: str, state: dict) -> bool
         p_emoji = {"ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}.get(prioridad, "🟡")
 
         # Conteo activos
-        tickets = obtener_tickets_por_worker(from_phone) or []
-        activos = [t for t in tickets if str(t.get("estado", "")).upper() == "EN_CURSO"]
+        activos = contar_tickets_en_curso(from_phone)
 
         send_whatsapp(
             from_phone,
             "✅ Tarea tomada\n\n"
             f"{p_emoji} #{ticket_id} · Hab. {ubic}\n"
             f"{detalle}\n\n"
-            f"📊 Tienes {len(activos)} tarea(s) activa(s)\n\n"
+            f"📊 Tienes {activos} tarea(s) activa(s)\n\n"
             f"💡 'fin {ticket_id}' cuando termines\n"
             "💡 'activos' para ver todas"
         )
@@ -243,6 +241,11 @@ def handle_hk_message_simple(from_phone: str, text: str) -> None:
          if handle_media_detail_response(from_phone, text):
              return
 
+    if state.get("media_duplicado"):
+         from .media_handler import handle_media_duplicate_response
+         if handle_media_duplicate_response(from_phone, text):
+             return
+
     try:
         raw = (text or "").strip().lower()
         logger.info(f"🏨 HK | {from_phone} | Comando: '{raw[:30]}...'")
@@ -409,6 +412,9 @@ def handle_hk_message_simple(from_phone: str, text: str) -> None:
         
         if current_state == CONFIRMANDO_REPORTE:
             handle_confirmando_reporte(from_phone, raw)
+            # Los handlers del reporte leen y persisten su propia copia del
+            # estado: re-sincronizar para que el persist final no la pise
+            state.update(get_user_state(from_phone))
             return
         
         if state["state"] == TRABAJANDO:
@@ -570,8 +576,8 @@ def tomar_ticket(from_phone: str) -> None:
     state = get_user_state(from_phone)
     
     # ✅ Buscar tickets ASIGNADOS desde BD
-    from gateway_app.services.tickets_db import obtener_tickets_asignados_a, actualizar_estado_ticket
-    from gateway_app.services.db import execute
+    from gateway_app.services.tickets_db import obtener_tickets_asignados_a
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
     
     tickets = obtener_tickets_asignados_a(from_phone)
     tickets_asignados = [t for t in tickets if t.get('estado') == 'ASIGNADO']
@@ -590,20 +596,11 @@ def tomar_ticket(from_phone: str) -> None:
         return
     
     # Tomar el primer ticket asignado
-    ticket = tickets_asignados[0]
-    ticket_id = ticket["id"]
-    
-    # ✅ Actualizar estado en BD: ASIGNADO → EN_CURSO
-    if actualizar_estado_ticket(ticket_id, "EN_CURSO"):
-        # ✅ FIX M9: Usar timezone-aware para compatibilidad con PostgreSQL TIMESTAMPTZ
-        from datetime import datetime, timezone
-        now_utc = datetime.now(timezone.utc)
-        execute(
-            "UPDATE public.tickets SET started_at = ?, accepted_at = ? WHERE id = ?",
-            [now_utc, now_utc, ticket_id],
-            commit=True
-        )
-        
+    ticket_id = tickets_asignados[0]["id"]
+    
+    # ✅ ASIGNADO → EN_CURSO + started_at/accepted_at en un solo UPDATE con guarda
+    ticket = ticket_state_machine.take(ticket_id, from_phone)
+    if ticket:
         # Actualizar estado local (agregar a lista en lugar de reemplazar)
         state["state"] = TRABAJANDO
         persist_user_state(from_phone, state)
@@ -661,131 +658,112 @@ def finalizar_ticket_especifico(from_phone: str, ticket_id: int) -> None:
     """
     ✅ NUEVO: Finaliza un ticket específico por su ID.
     """
-    from gateway_app.services.tickets_db import actualizar_estado_ticket, obtener_ticket_por_id
-    from gateway_app.services.db import execute
-    from datetime import datetime
+    from gateway_app.services.tickets_db import obtener_ticket_por_id, contar_tickets_en_curso
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
+    from datetime import datetime, timezone
     
-    # Verificar que el ticket existe y está EN_CURSO
-    ticket_data = obtener_ticket_por_id(ticket_id)
+    # ✅ EN_CURSO → RESUELTO + finished_at, solo si es del worker (un solo UPDATE)
+    ticket_data = ticket_state_machine.finish(ticket_id, from_phone)
     
     if not ticket_data:
-        send_whatsapp(from_phone, f"❌ No encontré la tarea #{ticket_id}\n\n💡 Di 'M' para volver al menú")
-        return
-    
-    # Verificar que pertenece al worker
-    huesped_whatsapp = ticket_data.get("huesped_whatsapp", "")
-    if from_phone not in huesped_whatsapp:
-        send_whatsapp(from_phone, f"❌ La tarea #{ticket_id} no está asignada a ti\n\n💡 Di 'M' para volver al menú")
+        # Rechazado: leer el ticket solo para explicar por qué
+        actual = obtener_ticket_por_id(ticket_id)
+        if not actual:
+            send_whatsapp(from_phone, f"❌ No encontré la tarea #{ticket_id}\n\n💡 Di 'M' para volver al menú")
+        elif actual.get("assigned_phone") != from_phone:
+            send_whatsapp(from_phone, f"❌ La tarea #{ticket_id} no está asignada a ti\n\n💡 Di 'M' para volver al menú")
+        elif actual.get("estado") != "EN_CURSO":
+            send_whatsapp(from_phone, f"⚠️ La tarea #{ticket_id} no está en progreso\n\n💡 Di 'M' para volver al menú")
+        else:
+            send_whatsapp(from_phone, "❌ Error finalizando tarea. Intenta de nuevo.\n\n💡 Di 'M' para volver al menú")
         return
     
-    # Verificar que está EN_CURSO
-    if ticket_data.get("estado") != "EN_CURSO":
-        send_whatsapp(from_phone, f"⚠️ La tarea #{ticket_id} no está en progreso\n\n💡 Di 'M' para volver al menú")
-        return
+    now = _as_utc(ticket_data.get("finished_at")) or datetime.now(timezone.utc)
     
-# ✅ Actualizar estado en BD: EN_CURSO → RESUELTO
-    if actualizar_estado_ticket(ticket_id, "RESUELTO"):
-        # ✅ FIX A7: Usar timezone-aware para compatibilidad con PostgreSQL TIMESTAMPTZ
-        from datetime import timezone
-        now = datetime.now(timezone.utc)
-        execute(
-            "UPDATE public.tickets SET finished_at = ? WHERE id = ?",
-            [now, ticket_id],
-            commit=True
-        )
+    # ✅ CALCULAR TIEMPO DE RESOLUCIÓN
+    started_at = _as_utc(ticket_data.get("started_at"))
+    if started_at:
+        duracion = now - started_at
+        minutos_totales = int(duracion.total_seconds() / 60)
         
-        # ✅ CALCULAR TIEMPO DE RESOLUCIÓN
-        started_at = ticket_data.get("started_at")
-        if started_at:
-            if isinstance(started_at, str):
-                from dateutil import parser
-                started_at = parser.parse(started_at)
-            # FIX: if DB returned a naive datetime, treat it as UTC
-            if started_at.tzinfo is None:
-                started_at = started_at.replace(tzinfo=timezone.utc)
-
-            duracion = now - started_at
-            minutos_totales = int(duracion.total_seconds() / 60)
-            
-            if minutos_totales < 60:
-                tiempo_texto = f"{minutos_totales} min"
-            else:
-                horas = minutos_totales // 60
-                minutos = minutos_totales % 60
-                tiempo_texto = f"{horas}h {minutos}min" if minutos > 0 else f"{horas}h"
+        if minutos_totales < 60:
+            tiempo_texto = f"{minutos_totales} min"
         else:
-            tiempo_texto = "No disponible"
-            minutos_totales = 0
-        
-        # ✅ NOTIFICAR AL SUPERVISOR
-        import os
-        supervisor_phones = os.getenv("SUPERVISOR_PHONES", "").split(",")
-        supervisor_phones = [p.strip() for p in supervisor_phones if p.strip()]
+            horas = minutos_totales // 60
+            minutos = minutos_totales % 60
+            tiempo_texto = f"{horas}h {minutos}min" if minutos > 0 else f"{horas}h"
+    else:
+        tiempo_texto = "No disponible"
+        minutos_totales = 0
+    
+    # ✅ NOTIFICAR AL SUPERVISOR
+    import os
+    supervisor_phones = os.getenv("SUPERVISOR_PHONES", "").split(",")
+    supervisor_phones = [p.strip() for p in supervisor_phones if p.strip()]
+    
+    if supervisor_phones:
+        from gateway_app.services.whatsapp_client import send_whatsapp_text
+        from gateway_app.services.workers_db import buscar_worker_por_telefono
         
-        if supervisor_phones:
-            from gateway_app.services.whatsapp_client import send_whatsapp_text
-            from gateway_app.services.workers_db import buscar_worker_por_telefono
-            
+        worker_nombre = ticket_data.get("assigned_name")
+        if not worker_nombre:
             worker = buscar_worker_por_telefono(from_phone)
             worker_nombre = worker.get("nombre_completo") if worker else "Trabajador"
-            
-            prioridad_emoji = {"ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}.get(
-                ticket_data.get("prioridad", "MEDIA"), "🟡"
-            )
-            
-            if minutos_totales <= 15:
-                tiempo_emoji = "⚡"
-            elif minutos_totales <= 30:
-                tiempo_emoji = "✅"
-            else:
-                tiempo_emoji = "🕐"
-            
-            ubicacion = ticket_data.get("ubicacion") or ticket_data.get("habitacion", "?")
-            
-            for supervisor_phone in supervisor_phones:
-                send_whatsapp_text(
-                    to=supervisor_phone,
-                    body=f"✅ Tarea completada por {worker_nombre}\n\n"
-                         f"#{ticket_id} · Hab. {ubicacion}\n"
-                         f"{ticket_data.get('detalle', 'Sin detalle')}\n"
-                         f"{prioridad_emoji} Prioridad: {ticket_data.get('prioridad', 'MEDIA')}\n"
-                         f"{tiempo_emoji} Tiempo: {tiempo_texto}"
-                )
-                logger.info(f"✅ Notificación de finalización enviada a supervisor {supervisor_phone}")
-        
-        # Verificar si aún tiene tickets activos
-        tickets = obtener_tickets_asignados_a(from_phone)
-        tickets_activos = [t for t in tickets if t.get('estado') == 'EN_CURSO']
         
-        # Actualizar estado
-        state = get_user_state(from_phone)
-        if len(tickets_activos) == 0:
-            state["state"] = MENU
-        persist_user_state(from_phone, state)
+        prioridad_emoji = {"ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}.get(
+            ticket_data.get("prioridad", "MEDIA"), "🟡"
+        )
         
-        # Notificar al worker
-        if len(tickets_activos) > 0:
-            send_whatsapp(
-                from_phone,
-                f"✅ Tarea #{ticket_id} completada\n\n"
-                f"⏱️ Tiempo: {tiempo_texto}\n"
-                f"🎉 ¡Buen trabajo!\n\n"
-                f"📊 Tienes {len(tickets_activos)} tarea(s) activa(s)\n"
-                f"💡 'activos' para verlas"
-            )
+        if minutos_totales <= 15:
+            tiempo_emoji = "⚡"
+        elif minutos_totales <= 30:
+            tiempo_emoji = "✅"
         else:
-            send_whatsapp(
-                from_phone,
-                f"✅ Tarea #{ticket_id} completada\n\n"
-                f"⏱️ Tiempo: {tiempo_texto}\n"
-                f"🎉 ¡Buen trabajo!\n\n"
-                f"✨ No tienes más tareas activas\n"
-                f"💡 Di 'M' para el menú"
-            )
+            tiempo_emoji = "🕐"
         
-        logger.info(f"✅ Ticket #{ticket_id} finalizado por {from_phone} en {tiempo_texto}")
+        ubicacion = ticket_data.get("ubicacion") or ticket_data.get("habitacion", "?")
+        
+        for supervisor_phone in supervisor_phones:
+            send_whatsapp_text(
+                to=supervisor_phone,
+                body=f"✅ Tarea completada por {worker_nombre}\n\n"
+                     f"#{ticket_id} · Hab. {ubicacion}\n"
+                     f"{ticket_data.get('detalle', 'Sin detalle')}\n"
+                     f"{prioridad_emoji} Prioridad: {ticket_data.get('prioridad', 'MEDIA')}\n"
+                     f"{tiempo_emoji} Tiempo: {tiempo_texto}"
+            )
+            logger.info(f"✅ Notificación de finalización enviada a supervisor {supervisor_phone}")
+    
+    # Verificar si aún tiene tickets activos
+    tickets_activos = contar_tickets_en_curso(from_phone)
+    
+    # Actualizar estado
+    state = get_user_state(from_phone)
+    if tickets_activos == 0:
+        state["state"] = MENU
+    persist_user_state(from_phone, state)
+    
+    # Notificar al worker
+    if tickets_activos > 0:
+        send_whatsapp(
+            from_phone,
+            f"✅ Tarea #{ticket_id} completada\n\n"
+            f"⏱️ Tiempo: {tiempo_texto}\n"
+            f"🎉 ¡Buen trabajo!\n\n"
+            f"📊 Tienes {tickets_activos} tarea(s) activa(s)\n"
+            f"💡 'activos' para verlas"
+        )
     else:
-        send_whatsapp(from_phone, "❌ Error finalizando tarea. Intenta de nuevo.\n\n💡 Di 'M' para volver al menú")
+        send_whatsapp(
+            from_phone,
+            f"✅ Tarea #{ticket_id} completada\n\n"
+            f"⏱️ Tiempo: {tiempo_texto}\n"
+            f"🎉 ¡Buen trabajo!\n\n"
+            f"✨ No tienes más tareas activas\n"
+            f"💡 Di 'M' para el menú"
+        )
+    
+    logger.info(f"✅ Ticket #{ticket_id} finalizado por {from_phone} en {tiempo_texto}")
 
 
 def pausar_ticket_interactivo(from_phone: str) -> None:
@@ -816,60 +794,60 @@ def pausar_ticket_especifico(from_phone: str, ticket_id: int) -> None:
     """
     ✅ NUEVO: Pausa un ticket específico.
     """
-    from gateway_app.services.tickets_db import actualizar_estado_ticket, obtener_ticket_por_id
+    from gateway_app.services.tickets_db import obtener_ticket_por_id
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
     
-    ticket_data = obtener_ticket_por_id(ticket_id)
+    # EN_CURSO → PAUSADO (+ paused_at) en un solo UPDATE con guarda
+    ticket_data = ticket_state_machine.pause(ticket_id, from_phone)
     
     if not ticket_data:
-        send_whatsapp(from_phone, f"❌ No encontré la tarea #{ticket_id}\n\n💡 Di 'M' para volver al menú")
+        actual = obtener_ticket_por_id(ticket_id)
+        if not actual:
+            send_whatsapp(from_phone, f"❌ No encontré la tarea #{ticket_id}\n\n💡 Di 'M' para volver al menú")
+        elif actual.get("estado") != "EN_CURSO":
+            send_whatsapp(from_phone, f"⚠️ La tarea #{ticket_id} no está en progreso\n\n💡 Di 'M' para volver al menú")
+        else:
+            send_whatsapp(from_phone, "❌ Error pausando tarea\n\n💡 Di 'M' para volver al menú")
         return
     
-    if ticket_data.get("estado") != "EN_CURSO":
-        send_whatsapp(from_phone, f"⚠️ La tarea #{ticket_id} no está en progreso\n\n💡 Di 'M' para volver al menú")
-        return
+    ubicacion = ticket_data.get("ubicacion") or ticket_data.get("habitacion", "?")
     
-    # Actualizar a PAUSADO
-    if actualizar_estado_ticket(ticket_id, "PAUSADO"):
-        ubicacion = ticket_data.get("ubicacion") or ticket_data.get("habitacion", "?")
-        
-        send_whatsapp(
-            from_phone,
-            f"⏸️ Tarea #{ticket_id} pausada\n\n"
-            f"📍 Hab. {ubicacion}\n\n"
-            f"💡 'reanudar {ticket_id}' para continuar"
-        )
-    else:
-        send_whatsapp(from_phone, "❌ Error pausando tarea\n\n💡 Di 'M' para volver al menú")
+    send_whatsapp(
+        from_phone,
+        f"⏸️ Tarea #{ticket_id} pausada\n\n"
+        f"📍 Hab. {ubicacion}\n\n"
+        f"💡 'reanudar {ticket_id}' para continuar"
+    )
 
 
 def reanudar_ticket_especifico(from_phone: str, ticket_id: int) -> None:
     """
     ✅ NUEVO: Reanuda un ticket pausado.
     """
-    from gateway_app.services.tickets_db import actualizar_estado_ticket, obtener_ticket_por_id
+    from gateway_app.services.tickets_db import obtener_ticket_por_id
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
     
-    ticket_data = obtener_ticket_por_id(ticket_id)
+    # PAUSADO → EN_CURSO (acumula total_paused_seconds) en un solo UPDATE con guarda
+    ticket_data = ticket_state_machine.resume(ticket_id, from_phone)
     
     if not ticket_data:
-        send_whatsapp(from_phone, f"❌ No encontré la tarea #{ticket_id}\n\n💡 Di 'M' para volver al menú")
+        actual = obtener_ticket_por_id(ticket_id)
+        if not actual:
+            send_whatsapp(from_phone, f"❌ No encontré la tarea #{ticket_id}\n\n💡 Di 'M' para volver al menú")
+        elif actual.get("estado") != "PAUSADO":
+            send_whatsapp(from_phone, f"⚠️ La tarea #{ticket_id} no está pausada\n\n💡 Di 'M' para volver al menú")
+        else:
+            send_whatsapp(from_phone, "❌ Error reanudando tarea\n\n💡 Di 'M' para volver al menú")
         return
     
-    if ticket_data.get("estado") != "PAUSADO":
-        send_whatsapp(from_phone, f"⚠️ La tarea #{ticket_id} no está pausada\n\n💡 Di 'M' para volver al menú")
-        return
+    ubicacion = ticket_data.get("ubicacion") or ticket_data.get("habitacion", "?")
     
-    # Actualizar a EN_CURSO
-    if actualizar_estado_ticket(ticket_id, "EN_CURSO"):
-        ubicacion = ticket_data.get("ubicacion") or ticket_data.get("habitacion", "?")
-        
-        send_whatsapp(
-            from_phone,
-            f"▶️ Tarea #{ticket_id} reanudada\n\n"
-            f"📍 Hab. {ubicacion}\n\n"
-            f"💡 'fin {ticket_id}' cuando termines"
-        )
-    else:
-        send_whatsapp(from_phone, "❌ Error reanudando tarea\n\n💡 Di 'M' para volver al menú")
+    send_whatsapp(
+        from_phone,
+        f"▶️ Tarea #{ticket_id} reanudada\n\n"
+        f"📍 Hab. {ubicacion}\n\n"
+        f"💡 'fin {ticket_id}' cuando termines"
+    )
 
 
 def iniciar_reporte(from_phone: str) -> None:
@@ -991,7 +969,10 @@ def handle_confirmando_reporte(from_phone: str, raw: str) -> None:
         draft["habitacion"] = ubic
         draft["ubicacion"] = ubic
 
-    
+    if draft.get("duplicado_de"):
+        handle_confirmando_duplicado(from_phone, raw)
+        return
+
     if raw in ['si', 'sí', 'yes', 'ok', 'confirmar', 'confirmo', 'dale', 'correcto']:
         # ✅ Si por alguna razón aún no hay ubicación, no creamos el ticket
         if not draft.get("habitacion") and not draft.get("ubicacion"):
@@ -1094,6 +1075,60 @@ def crear_ticket_directo_DESPUES(from_phone: str, reporte: dict, area_worker: st
         send_whatsapp(from_phone, "❌ Error creando el ticket. Intenta de nuevo.\n\n💡 Di 'M' para volver al menú")
 
 
+def _cerrar_reporte(from_phone: str) -> None:
+    """Limpia el borrador y vuelve al menú (persistido)."""
+    reset_ticket_draft(from_phone)
+    state = get_user_state(from_phone)
+    state["state"] = MENU
+    persist_user_state(from_phone, state)
+
+
+def handle_confirmando_duplicado(from_phone: str, raw: str) -> None:
+    """
+    El reporte se parece a un ticket abierto (ver crear_ticket_desde_draft):
+    'si' → se agrega al ticket existente, 'no' → se crea uno nuevo,
+    'cancelar' → se descarta el reporte.
+    """
+    state = get_user_state(from_phone)
+    draft = state.get("ticket_draft") or {}
+    ticket_id = draft.get("duplicado_de")
+
+    if raw in ['si', 'sí', 'yes', 'ok', 'misma', 'es la misma', 'agregar']:
+        ticket = tickets_db.obtener_ticket_por_id(ticket_id)
+        if not ticket or ticket.get("estado") == "RESUELTO":
+            # Se cerró mientras tanto: mejor crear el ticket nuevo
+            draft.pop("duplicado_de", None)
+            draft["duplicado_descartado"] = True
+            persist_user_state(from_phone, state)
+            crear_ticket_desde_draft(from_phone)
+            return
+
+        tickets_db.registrar_reporte_duplicado(ticket_id, from_phone, detalle=draft.get("detalle"))
+        send_whatsapp(
+            from_phone,
+            f"🔁 Tu reporte quedó agregado a la tarea #{ticket_id}\n"
+            f"(no se creó un ticket nuevo)\n\n"
+            f"💡 Di 'foto {ticket_id}' con una foto para adjuntarla"
+        )
+        _cerrar_reporte(from_phone)
+        return
+
+    if raw in ['no', 'nueva', 'nuevo', 'otra', 'crear']:
+        draft.pop("duplicado_de", None)
+        draft["duplicado_descartado"] = True
+        persist_user_state(from_phone, state)
+        crear_ticket_desde_draft(from_phone)
+        return
+
+    if raw in ['cancelar', 'cancel', 'descartar']:
+        _cerrar_reporte(from_phone)
+        send_whatsapp(from_phone, "❌ Reporte cancelado\n\n💡 Di 'M' para volver al menú")
+        return
+
+    duplicado = tickets_db.obtener_ticket_por_id(ticket_id) or {"id": ticket_id}
+    send_whatsapp(from_phone, "❌ No entendí\n\n" + texto_posible_duplicado(duplicado))
+
+
 def crear_ticket_desde_draft(from_phone: str) -> None:
     """
     Crea ticket desde el borrador y notifica al supervisor.
@@ -1127,7 +1162,21 @@ def crear_ticket_desde_draft(from_phone: str) -> None:
     try:
         # ✅ NUEVO: Obtener área del worker
         area_worker = state.get("area_worker", "HOUSEKEEPING")
-        
+
+        # ¿Ya hay un ticket abierto para lo mismo? Preguntar antes de clasificar/crear
+        if not draft.get("duplicado_descartado"):
+            duplicado = tickets_db.buscar_ticket_duplicado(ubicacion, draft["detalle"])
+            if duplicado:
+                logger.info(
+                    "HK_CREATE_FROM_DRAFT posible duplicado de #%s (sim=%.2f) from=%s",
+                    duplicado["id"], duplicado.get("similitud") or 0, from_phone,
+                )
+                draft["duplicado_de"] = duplicado["id"]
+                state["ticket_draft"] = draft
+                persist_user_state(from_phone, state)
+                send_whatsapp(from_phone, texto_posible_duplicado(duplicado))
+                return
+
         # ── NUEVO: Clasificar con IA ───────────────────────────────
         from gateway_app.services.ticket_classifier import clasificar_ticket
         clasificacion = clasificar_ticket(
@@ -1228,8 +1277,7 @@ def crear_ticket_desde_draft(from_phone: str) -> None:
                 )
         # ====================================================================
 
-        reset_ticket_draft(from_phone)
-        state["state"] = MENU
+        _cerrar_reporte(from_phone)
 
     except Exception as e:
         logger.exception("HK_CREATE_FROM_DRAFT exception from=%s err=%s", from_phone, e)
@@ -1290,10 +1338,10 @@ def terminar_turno(from_phone: str) -> None:
     tickets_activos = [t for t in tickets if t.get('estado') == 'EN_CURSO']
     
     if len(tickets_activos) > 0:
-        from gateway_app.services.tickets_db import actualizar_estado_ticket
+        from gateway_app.services.ticket_state_machine import ticket_state_machine
         
         for ticket in tickets_activos:
-            actualizar_estado_ticket(ticket['id'], "PAUSADO")
+            ticket_state_machine.pause(ticket['id'], from_phone)
         
         send_whatsapp(
             from_phone,
@@ -227,4 +227,25 @@ def texto_confirmar_reporte_adaptado(ubicacion: str, detalle: str, prioridad: st
         f"• 'sí' para confirmar\n"
         f"• 'editar' para cambiar\n"
         f"• 'cancelar' para abortar"
-    )
\ No newline at end of file
+    )
+
+def texto_posible_duplicado(ticket: dict, media: bool = False) -> str:
+    """
+    Pregunta si el reporte es la misma tarea que un ticket abierto
+    (ver tickets_db.buscar_ticket_duplicado).
+    """
+    ticket_id = ticket.get("id")
+    ubicacion = ticket.get("ubicacion") or ticket.get("habitacion") or "?"
+    detalle = (ticket.get("detalle") or "")[:80]
+    agregar = "tu foto" if media else "tu reporte"
+
+    return (
+        f"🔁 Ya hay una tarea abierta parecida:\n\n"
+        f"#{ticket_id} · {ubicacion}\n"
+        f"📝 {detalle}\n"
+        f"📊 Estado: {ticket.get('estado') or '?'}\n\n"
+        f"¿Es la misma?\n"
+        f"• 'sí' - agregar {agregar} a #{ticket_id}\n"
+        f"• 'no' - crear una tarea nueva\n"
+        f"• 'cancelar' - descartar {agregar}"
+    )
@@ -2,6 +2,7 @@
 Orquestador SIMPLE para supervisión - Sin menú, solo comandos.
 """
 import logging
+import re
 
 from .ticket_assignment import calcular_score_worker
 from gateway_app.services.workers_db import buscar_worker_por_nombre, obtener_todos_workers
@@ -9,7 +10,6 @@ from gateway_app.services.tickets_db import obtener_tickets_asignados_a, obtener
 from .ticket_assignment import formatear_ubicacion_con_emoji
 from .state import get_supervisor_state, persist_supervisor_state
 from gateway_app.services.whatsapp_client import send_whatsapp_text
-from gateway_app.services.tickets_db import obtener_pendientes
 
 from gateway_app.core.utils.message_constants import (
         msg_sup_confirmacion, msg_sup_dialogo,
@@ -22,7 +22,7 @@ from gateway_app.core.utils.message_constants import (
 
 from gateway_app.flows.supervision.tiempo_utils import (
     formatear_lista_tickets_con_tiempo,
-    formatear_workers_para_asignacion,
+    preparar_opciones_asignacion,
     construir_mensaje_equipo,
     calcular_tiempo_transcurrido
 )
@@ -32,6 +32,13 @@ from .ubicacion_helpers import (
     get_area_emoji,
     get_area_short
 )
+from .seleccion import (
+    guardar_opciones_asignacion,
+    opciones_asignacion,
+    limpiar_opciones_asignacion,
+    recordar_listado,
+    ticket_de_listado,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -80,6 +87,22 @@ def calcular_tiempo_desde(fecha_str: str) -> str:
         logger.warning(f"Error calculando tiempo desde {fecha_str}")
         return "?"
 
+def reasignar_ticket_guardado(ticket_id: int, worker_phone: str, worker_nombre: str,
+                              worker_original_phone: str = None) -> bool:
+    """
+    Reasigna con guarda sobre el worker original: si entre que el supervisor
+    vio el ticket y confirmó el worker original ya lo cambió (otro supervisor
+    lo reasignó), la reasignación no se aplica. Sin worker original → asignación normal.
+    """
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
+
+    if worker_original_phone:
+        ticket = ticket_state_machine.reassign(
+            ticket_id, worker_phone, worker_nombre, from_phone=worker_original_phone
+        )
+        return ticket is not None
+    return asignar_ticket(ticket_id, worker_phone, worker_nombre)
+
 def notificar_worker_nueva_tarea(worker_phone: str, ticket_id: int, 
                                   ubicacion: str, detalle: str, prioridad: str) -> None:
     """
@@ -89,6 +112,7 @@ def notificar_worker_nueva_tarea(worker_phone: str, ticket_id: int,
         send_whatsapp_text, send_whatsapp_image, send_whatsapp_video
     )
     from gateway_app.services.tickets_db import obtener_media_de_ticket
+    from gateway_app.services.storage_backends import is_http_url
 
     # 1) Mensaje de texto con la tarea
     send_whatsapp_text(
@@ -100,10 +124,13 @@ def notificar_worker_nueva_tarea(worker_phone: str, ticket_id: int,
     try:
         medias = obtener_media_de_ticket(ticket_id)
         for media in medias:
-            storage_url = media.get("storage_url")
+            # Solo links http(s): WhatsApp no puede descargar otra cosa
+            storage_url = media.get("storage_url") if is_http_url(media.get("storage_url")) else None
+            wa_media_id = media.get("whatsapp_media_id")
             media_type = media.get("media_type", "image")
             
-            if not storage_url:
+            # Media aún en proceso (media_jobs): reenviar por media_id de WhatsApp
+            if not storage_url and not wa_media_id:
                 continue
             
             caption = f"📎 Foto de tarea #{ticket_id}"
@@ -111,13 +138,15 @@ def notificar_worker_nueva_tarea(worker_phone: str, ticket_id: int,
             if media_type == "video":
                 send_whatsapp_video(
                     to=worker_phone,
-                    video_url=storage_url,
+                    media_id=None if storage_url else wa_media_id,
+                    video_url=storage_url or None,
                     caption=caption,
                 )
             else:
                 send_whatsapp_image(
                     to=worker_phone,
-                    image_url=storage_url,
+                    media_id=None if storage_url else wa_media_id,
+                    image_url=storage_url or None,
                     caption=caption,
                 )
             logger.info(f"📤 Media reenviada a worker {worker_phone} | Ticket #{ticket_id} | {media_type}")
@@ -140,11 +169,17 @@ def handle_supervisor_message_simple(from_phone: str, text: str) -> None:
     # ═══════════════════════════════════════════════════════════════
     # ✅ NUEVO: Verificar si hay media pendiente ANTES de todo
     # ═══════════════════════════════════════════════════════════════
-    if state.get("media_pendiente") or state.get("media_para_ticket"):
+    if state.get("media_pendiente") or state.get("media_para_ticket") or state.get("media_duplicado"):
         from gateway_app.flows.housekeeping.media_handler import (
             handle_media_context_response,
-            handle_media_detail_response
+            handle_media_detail_response,
+            handle_media_duplicate_response
         )
+
+        # ¿La foto era de un ticket ya abierto? (esperando sí/no)
+        if state.get("media_duplicado"):
+            if handle_media_duplicate_response(from_phone, text):
+                return
         
         # Primero verificar media_para_ticket (esperando descripción)
         if state.get("media_para_ticket"):
@@ -157,6 +192,10 @@ def handle_supervisor_message_simple(from_phone: str, text: str) -> None:
                 return
     # ═══════════════════════════════════════════════════════════════
 
+    # ¿La tarea dictada era una ya abierta? (esperando sí/no/cancelar)
+    if state.get("duplicado_pendiente") and _handle_duplicado_sup(from_phone, text):
+        return
+
     try:
         raw = (text or "").strip().lower()
         logger.info(f"👔 SUP | {from_phone} | Comando: '{raw[:30]}...'")
@@ -209,6 +248,16 @@ def handle_supervisor_message_simple(from_phone: str, text: str) -> None:
                     send_whatsapp(from_phone, "❌ Aviso cancelado.")
                 return
 
+            # Caso especial: plan de asignación automática
+            if conf.get("tipo") == "auto_asignar":
+                state.pop("confirmacion_pendiente", None)
+                persist_supervisor_state(from_phone, state)
+                if raw_conf_norm in {w.replace("í", "i") for w in YES} or raw_conf in YES:
+                    aplicar_auto_asignacion(from_phone, conf.get("plan") or [])
+                else:
+                    send_whatsapp(from_phone, "❌ Asignación automática cancelada.")
+                return
+
             # Caso 1: el usuario respondió afirmativo
             if raw_conf_norm in {w.replace("í", "i") for w in YES} or raw_conf in YES:
                 ticket_id = conf.get("ticket_id")
@@ -308,6 +357,26 @@ def handle_supervisor_message_simple(from_phone: str, text: str) -> None:
             mostrar_tickets_asignados_y_en_curso(from_phone)
             return
         
+        # 4.2a) Búsqueda por texto: "buscar ducha que gotea piso 4"
+        if raw_cmd.startswith("buscar ") or raw_cmd.startswith("busca "):
+            mostrar_busqueda(from_phone, raw_cmd.split(" ", 1)[1])
+            return
+        
+        # 4.2b) Siguiente página del último listado
+        if raw_cmd in ["más", "mas", "mas tareas", "más tareas", "siguiente pagina", "siguiente página"]:
+            mostrar_mas(from_phone)
+            return
+        
+        # 4.2c) Operaciones en lote: "asignar 12 15 18 a María", "cerrar 20-25",
+        # "reasignar todo de Pedro a Ana"
+        if maybe_handle_comando_lote(from_phone, raw_cmd):
+            return
+        
+        # 4.2d) Asignación automática de todos los pendientes (con confirmación)
+        if raw_cmd in ["auto asignar", "autoasignar", "asignar auto", "asignar todo", "asignar todas", "repartir", "repartir tareas"]:
+            proponer_auto_asignacion(from_phone)
+            return
+        
         # 4.3) Más urgente / siguiente
         if raw_cmd in ["siguiente", "next", "proximo", "urgente", "asignar urgente", "mas urgente", "más urgente"]:
             asignar_siguiente(from_phone)
@@ -357,6 +426,8 @@ def handle_supervisor_message_simple(from_phone: str, text: str) -> None:
                 "💡 Para asignar, di:\n"
                 "• 'más urgente' - asigna la más importante\n"
                 "• 'asignar [#] a [nombre]' - asigna específica\n"
+                "• 'asignar 12 15 18 a [nombre]' - varias a la vez\n"
+                "• 'auto asignar' - reparte todas las pendientes\n"
                 "• 'pendientes' - ve todas primero"
             )
             return
@@ -384,6 +455,7 @@ def handle_supervisor_message_simple(from_phone: str, text: str) -> None:
             state.pop("confirmacion_pendiente", None)
             state.pop("seleccion_worker_pendiente", None)
             state.pop("seleccion_mucamas", None)
+            limpiar_opciones_asignacion(state)
             persist_supervisor_state(from_phone, state)
             
             if tiene_pendiente:
@@ -456,17 +528,23 @@ def handle_supervisor_message_simple(from_phone: str, text: str) -> None:
         logger.exception(f"❌ Error en supervisor handler: {e}")
         send_whatsapp(from_phone, "❌ Error interno. Intenta de nuevo.")
 
-def mostrar_opciones_workers(from_phone: str, workers: list, ticket_id: int) -> None:
+def mostrar_opciones_workers(from_phone: str, workers: list, ticket_id: int, ticket: dict = None) -> None:
     """
     ✅ MODIFICADO: Muestra workers con estado de turno.
     Prioriza los que tienen turno activo.
+
+    Guarda en la sesión la lista tal como se numeró (y el ticket): la
+    respuesta "2" se resuelve contra eso (ver seleccion.py).
     """
-    ticket = obtener_ticket_por_id(ticket_id)
-    mensaje = formatear_workers_para_asignacion(workers, ticket)
+    if ticket is None:
+        ticket = obtener_ticket_por_id(ticket_id)
+    mensaje, mostrados = preparar_opciones_asignacion(workers, ticket)
     
     state = get_supervisor_state(from_phone)
     state["ticket_seleccionado"] = ticket_id
     state["esperando_asignacion"] = True
+    guardar_opciones_asignacion(state, ticket_id, ticket, mostrados)
+    persist_supervisor_state(from_phone, state)
     
     send_whatsapp(from_phone, mensaje)
 
@@ -482,7 +560,7 @@ def handle_respuesta_asignacion(from_phone: str, text: str) -> bool:
         True si se manejó la asignación
     """
 
-    from .ticket_assignment import calcular_score_worker, confirmar_asignacion
+    from .ticket_assignment import confirmar_asignacion
     
     state = get_supervisor_state(from_phone)
     ticket_id = state.get("ticket_seleccionado")
@@ -511,6 +589,8 @@ def handle_respuesta_asignacion(from_phone: str, text: str) -> bool:
     if raw in ["cancelar", "cancel", "salir", "atras", "atrás", "volver"]:
         state["esperando_asignacion"] = False
         state["ticket_seleccionado"] = None
+        limpiar_opciones_asignacion(state)
+        persist_supervisor_state(from_phone, state)
         send_whatsapp(from_phone, "❌ Asignación cancelada")
         return True
     
@@ -550,48 +630,32 @@ def handle_respuesta_asignacion(from_phone: str, text: str) -> bool:
         state["esperando_asignacion"] = False
         state["ticket_seleccionado"] = None
         state["seleccion_mucamas"] = None
+        limpiar_opciones_asignacion(state)
         persist_supervisor_state(from_phone, state)
         return False  # ✅ Dejar que se procese como comando normal
     
     worker = None
     
-    # Opción 1: Respuesta por número (1, 2, 3, 4, 5)
+    # Opción 1: Respuesta por número → contra la lista que se mostró
+    ticket_snapshot = None
     if raw.isdigit():
         index = int(raw) - 1
         
-        from gateway_app.services.workers_db import obtener_todos_workers
-
-        # ✅ OBTENER TICKET para scoring
-        ticket = obtener_ticket_por_id(ticket_id)
-        
-        workers = obtener_todos_workers()
-        
-        # ✅ MODIFICADO: Incluir TODOS los workers, no solo con turno activo
-        # Separar por turno activo para ordenar (activos primero)
-        workers_activos = [w for w in workers if w.get("turno_activo", False)]
-        workers_sin_turno = [w for w in workers if not w.get("turno_activo", False)]
-
-        # Calcular scores para ambos grupos
-        workers_con_score = []
-        for w in workers_activos:
-            score = calcular_score_worker(w, ticket)
-            workers_con_score.append({**w, "score": score})
-        
-        for w in workers_sin_turno:
-            score = calcular_score_worker(w, ticket) - 1000  # Penalizar sin turno
-            workers_con_score.append({**w, "score": score})
-        
-        workers_con_score.sort(key=lambda w: w["score"], reverse=True)
-        
-        # ✅ Tomar top 6 (para que coincida con lo mostrado)
-        top_workers = workers_con_score[:6]
+        opciones = opciones_asignacion(state, ticket_id)
+        if opciones:
+            mostrados = opciones.get("workers") or []
+            ticket_snapshot = opciones.get("ticket") or None
+        else:
+            # Sesión sin snapshot (lista mostrada antes del deploy): rearmarla igual que al mostrarla
+            ticket_snapshot = obtener_ticket_por_id(ticket_id)
+            _, mostrados = preparar_opciones_asignacion(obtener_todos_workers(), ticket_snapshot)
         
-        if 0 <= index < len(top_workers):
-            worker = top_workers[index]
+        if 0 <= index < len(mostrados):
+            worker = mostrados[index]
         else:
             send_whatsapp(
                 from_phone,
-                f"❌ Número inválido (1-{len(top_workers)})\n\n"
+                f"❌ Número inválido (1-{len(mostrados)})\n\n"
                 "💡 Di el nombre o número\n"
                 "O escribe 'cancelar'"
             )
@@ -654,12 +718,13 @@ def handle_respuesta_asignacion(from_phone: str, text: str) -> bool:
         
         if asignar_ticket(ticket_id, worker_phone, worker_nombre):
             # Notificar al supervisor
-            confirmar_asignacion(from_phone, ticket_id, worker)
+            confirmar_asignacion(from_phone, ticket_id, worker, ticket=ticket_snapshot)
             
             # ✅ NOTIFICAR AL TRABAJADOR
             from gateway_app.services.whatsapp_client import send_whatsapp_text
 
-            ticket_data = obtener_ticket_por_id(ticket_id) or {}
+            # detalle/ubicación/prioridad no cambian al asignar: sirve el snapshot
+            ticket_data = ticket_snapshot or obtener_ticket_por_id(ticket_id) or {}
 
             detalle = (
                 ticket_data.get("detalle")
@@ -680,6 +745,8 @@ def handle_respuesta_asignacion(from_phone: str, text: str) -> bool:
             
             state["esperando_asignacion"] = False
             state["ticket_seleccionado"] = None
+            limpiar_opciones_asignacion(state)
+            persist_supervisor_state(from_phone, state)
             return True
         else:
             send_whatsapp(from_phone, "❌ Error asignando. Intenta de nuevo.")
@@ -694,29 +761,120 @@ def handle_respuesta_asignacion(from_phone: str, text: str) -> bool:
         return True
 
 
-def mostrar_pendientes_simple(from_phone: str) -> None:
-    """Muestra tareas pendientes ordenadas por prioridad con tiempo."""
-    from gateway_app.services.tickets_db import obtener_pendientes
-    from gateway_app.core.utils.message_constants import (
-        formatear_lista_tickets, PRIORIDAD_ORDER,
+TICKETS_POR_PAGINA = 5
+
+_ESTADOS_PENDIENTES = ("PENDIENTE", "PENDIENTE_APROBACION", "PENDIENTE_APROBACIÓN")
+_ESTADOS_ACTIVOS = ("EN_CURSO", "ASIGNADO")
+
+
+def _pagina_de_listado(from_phone: str, lista: str, estados, cursor=None, totales=None):
+    """
+    Trae UNA página (keyset) del listado y deja el cursor en la sesión
+    del supervisor para que 'más' continúe desde ahí (y los tickets
+    mostrados, ver seleccion.py).
+
+    Returns:
+        (tickets, totales por estado, hay_mas)
+    """
+    tickets, siguiente = tickets_db.obtener_pagina_tickets(
+        estados, despues_de=cursor, limite=TICKETS_POR_PAGINA
+    )
+    if totales is None:
+        totales = tickets_db.contar_tickets_por_estados(estados)
+
+    state = get_supervisor_state(from_phone)
+    if siguiente:
+        state["paginacion"] = {"lista": lista, "cursor": siguiente, "totales": totales}
+    else:
+        state.pop("paginacion", None)
+    recordar_listado(state, lista, tickets)
+    persist_supervisor_state(from_phone, state)
+
+    return tickets, totales, siguiente is not None
+
+
+def _recordar_listado(from_phone: str, lista: str, tickets: list) -> None:
+    """Listados sin paginar: guarda igual los tickets mostrados en la sesión."""
+    state = get_supervisor_state(from_phone)
+    recordar_listado(state, lista, tickets)
+    persist_supervisor_state(from_phone, state)
+
+
+def mostrar_mas(from_phone: str) -> None:
+    """Siguiente página del último listado (comando 'más')."""
+    state = get_supervisor_state(from_phone)
+    pag = state.get("paginacion")
+
+    if not pag:
+        send_whatsapp(from_phone, "✅ No hay más tareas para mostrar\n\n💡 Di 'pendientes' o 'activos'")
+        return
+
+    lista = pag.get("lista") or ""
+    cursor = pag.get("cursor")
+    totales = pag.get("totales")
+
+    if lista == "pendientes":
+        mostrar_pendientes_simple(from_phone, cursor=cursor, totales=totales)
+    elif lista == "activos":
+        mostrar_tickets_asignados_y_en_curso(from_phone, cursor=cursor, totales=totales)
+    elif lista.startswith("estado:"):
+        mostrar_tickets_db(from_phone, lista.split(":", 1)[1], cursor=cursor, totales=totales)
+    else:
+        state.pop("paginacion", None)
+        persist_supervisor_state(from_phone, state)
+        send_whatsapp(from_phone, "✅ No hay más tareas para mostrar")
+
+
+def mostrar_busqueda(from_phone: str, query: str) -> None:
+    """Tickets que coinciden con un texto libre (detalle/ubicación), más relevantes primero."""
+    from gateway_app.core.utils.message_constants import formatear_lista_tickets
+
+    query = (query or "").strip()
+    if not query:
+        send_whatsapp(from_phone, "💡 Di 'buscar [texto]'\nEj: 'buscar ducha gotea piso 4'")
+        return
+
+    tickets = tickets_db.buscar_tickets(query, limit=TICKETS_POR_PAGINA)
+
+    if not tickets:
+        send_whatsapp(from_phone, f"🔎 No encontré tareas para '{query}'")
+        return
+
+    _recordar_listado(from_phone, "busqueda", tickets)
+    msg = formatear_lista_tickets(
+        tickets,
+        titulo=f"🔎 Resultados para '{query}'",
+        hint="💡 Di 'ticket [#]' para ver el detalle",
+        mostrar_tiempo=False,
+        mostrar_worker=True,
     )
+    send_whatsapp(from_phone, msg)
+    logger.info(f"🔎 SUP | Búsqueda '{query}' → {len(tickets)} resultado(s)")
 
-    tickets = obtener_pendientes()
+
+def mostrar_pendientes_simple(from_phone: str, cursor=None, totales=None) -> None:
+    """Muestra tareas pendientes ordenadas por prioridad con tiempo (paginado)."""
+    from gateway_app.core.utils.message_constants import formatear_lista_tickets
+
+    tickets, totales, hay_mas = _pagina_de_listado(
+        from_phone, "pendientes", _ESTADOS_PENDIENTES, cursor, totales
+    )
 
     if not tickets:
         send_whatsapp(from_phone, "✅ No hay tareas pendientes")
         return
 
-    tickets.sort(key=lambda t: PRIORIDAD_ORDER.get(
-        (t.get("prioridad") or "MEDIA").upper(), 1
-    ))
+    hint = "💡 Di 'asignar [#] a [nombre]' o 'siguiente'"
+    if hay_mas:
+        hint += "\n💡 Di 'más' para ver más"
 
     msg = formatear_lista_tickets(
         tickets,
         titulo="📋 Tareas Pendientes",
-        hint="💡 Di 'asignar [#] a [nombre]' o 'siguiente'",
+        hint=hint,
         mostrar_tiempo=True,
         mostrar_worker=False,
+        total=sum(totales.values()),
     )
     send_whatsapp(from_phone, msg)
 
@@ -728,23 +886,13 @@ def asignar_siguiente(from_phone: str) -> None:
     from .ticket_assignment import calcular_score_worker
     from .ui_simple import texto_recomendaciones_simple
     
-    tickets = obtener_pendientes()
+    # Más prioritario y más antiguo (priority_rank, created_at) directo desde BD
+    ticket = tickets_db.obtener_siguiente_pendiente()
     
-    if not tickets:
+    if not ticket:
         send_whatsapp(from_phone, "✅ No hay tickets pendientes")
         return
     
-    # Ordenar por prioridad
-    prioridad_order = {"ALTA": 0, "MEDIA": 1, "BAJA": 2}
-    tickets_sorted = sorted(
-        tickets,
-        key=lambda t: (
-            prioridad_order.get(t.get("prioridad", "MEDIA"), 1),
-            -t.get("tiempo_sin_resolver_mins", 0)
-        )
-    )
-    
-    ticket = tickets_sorted[0]
     ticket_id = ticket["id"]
     
     # Guardar ticket seleccionado
@@ -752,7 +900,7 @@ def asignar_siguiente(from_phone: str) -> None:
     state["ticket_seleccionado"] = ticket_id
     
     # Mostrar ticket + recomendaciones
-    prioridad_emoji = {"ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}.get(
+    prioridad_emoji = {"URGENTE": "🚨", "ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}.get(
         ticket.get("prioridad", "MEDIA"), "🟡"
     )
     
@@ -782,8 +930,7 @@ def asignar_siguiente(from_phone: str) -> None:
     
     # Mostrar recomendaciones compactas (inline, no función externa)
     workers = obtener_todos_workers()
-    mostrar_opciones_workers(from_phone, workers, ticket_id)
-    state["esperando_asignacion"] = True
+    mostrar_opciones_workers(from_phone, workers, ticket_id, ticket=ticket)
 
 def mostrar_urgentes(from_phone: str) -> None:
     """Muestra tareas urgentes: pendientes >5 min y en curso >10 min."""
@@ -803,6 +950,8 @@ def mostrar_urgentes(from_phone: str) -> None:
     ]
 
     mensaje = texto_urgentes(pendientes_urgentes, retrasados)
+    if pendientes_urgentes or retrasados:
+        _recordar_listado(from_phone, "urgentes", pendientes_urgentes[:5] + retrasados[:5])
     send_whatsapp(from_phone, mensaje)
 
 
@@ -817,6 +966,8 @@ def mostrar_en_proceso(from_phone: str) -> None:
         send_whatsapp(from_phone, "✅ No hay tareas en proceso")
         return
 
+    _recordar_listado(from_phone, "en_curso", tickets[:10])
+
     msg = formatear_lista_tickets(
         tickets,
         titulo="🔄 Tareas en Proceso",
@@ -845,6 +996,8 @@ def mostrar_retrasados(from_phone: str) -> None:
         send_whatsapp(from_phone, "✅ No hay tareas retrasadas")
         return
 
+    _recordar_listado(from_phone, "retrasados", retrasados[:10])
+
     msg = formatear_lista_tickets(
         retrasados,
         titulo="⏰ Tareas Retrasadas",
@@ -903,14 +1056,15 @@ def mostrar_info_ticket(from_phone: str, ticket_id: int) -> None:
 
     send_whatsapp(from_phone, "\n".join(lineas))
 
-def mostrar_tickets_db(from_phone: str, estado: str = "PENDIENTE") -> None:
-    """Muestra tareas desde BD por estado (comando bd/db)."""
-    from gateway_app.services.tickets_db import obtener_tickets_por_estado
+def mostrar_tickets_db(from_phone: str, estado: str = "PENDIENTE", cursor=None, totales=None) -> None:
+    """Muestra tareas desde BD por estado (comando bd/db, paginado)."""
     from gateway_app.core.utils.message_constants import (
         emoji_estado, formatear_lista_tickets,
     )
 
-    tickets = obtener_tickets_por_estado(estado)
+    tickets, totales, hay_mas = _pagina_de_listado(
+        from_phone, f"estado:{estado}", (estado,), cursor, totales
+    )
 
     if not tickets:
         send_whatsapp(from_phone, f"✅ No hay tareas en estado '{estado}'")
@@ -920,51 +1074,54 @@ def mostrar_tickets_db(from_phone: str, estado: str = "PENDIENTE") -> None:
     msg = formatear_lista_tickets(
         tickets,
         titulo=f"{emoji_estado(estado)} Tareas {estado_label}",
+        hint="💡 Di 'más' para ver más" if hay_mas else "",
         mostrar_tiempo=True,
         mostrar_worker=(estado != "PENDIENTE"),
+        total=sum(totales.values()),
     )
     send_whatsapp(from_phone, msg)
 
-def mostrar_tickets_asignados_y_en_curso(from_phone: str) -> None:
-    """Muestra tareas activas: en curso + asignadas, formato unificado."""
-    from gateway_app.services.tickets_db import obtener_tickets_asignados_y_en_curso
+def mostrar_tickets_asignados_y_en_curso(from_phone: str, cursor=None, totales=None) -> None:
+    """Muestra tareas activas: en curso + asignadas, formato unificado (paginado)."""
     from gateway_app.core.utils.message_constants import formatear_linea_ticket
 
-    tickets = obtener_tickets_asignados_y_en_curso()
+    tickets, totales, hay_mas = _pagina_de_listado(
+        from_phone, "activos", _ESTADOS_ACTIVOS, cursor, totales
+    )
 
     if not tickets:
         send_whatsapp(from_phone, "✅ No hay tareas asignadas ni en proceso")
         return
 
+    tickets_db.adjuntar_conteo_media(tickets)
+
     en_curso = [t for t in tickets if t.get("estado") == "EN_CURSO"]
     asignados = [t for t in tickets if t.get("estado") == "ASIGNADO"]
 
-    lineas = [f"📋 Tareas Activas ({len(tickets)})\n"]
+    lineas = [f"📋 Tareas Activas ({sum(totales.values())})\n"]
 
     if en_curso:
-        lineas.append(f"🔄 EN CURSO ({len(en_curso)}):")
-        for t in en_curso[:5]:
+        lineas.append(f"🔄 EN CURSO ({totales.get('EN_CURSO', len(en_curso))}):")
+        for t in en_curso:
             lineas.append(formatear_linea_ticket(
                 t, mostrar_tiempo=True, mostrar_worker=True,
                 campo_fecha="started_at",
             ))
-        if len(en_curso) > 5:
-            lineas.append(f"   ... y {len(en_curso) - 5} más")
         lineas.append("")
 
     if asignados:
-        lineas.append(f"📋 ASIGNADAS ({len(asignados)}):")
-        for t in asignados[:5]:
+        lineas.append(f"📋 ASIGNADAS ({totales.get('ASIGNADO', len(asignados))}):")
+        for t in asignados:
             lineas.append(formatear_linea_ticket(
                 t, mostrar_tiempo=False, mostrar_worker=True,
             ))
-        if len(asignados) > 5:
-            lineas.append(f"   ... y {len(asignados) - 5} más")
 
     lineas.append("\n💡 Di 'finalizar [#]' o 'reasignar [#] a [nombre]'")
+    if hay_mas:
+        lineas.append("💡 Di 'más' para ver más")
 
     send_whatsapp(from_phone, "\n".join(lineas))
-    logger.info(f"📋 Mostrados {len(tickets)} tareas activas a supervisor")
+    logger.info(f"📋 Mostradas {len(tickets)} tareas activas a supervisor")
 
 def finalizar_ticket_supervisor(from_phone: str, ticket_id: int) -> None:
     """
@@ -1076,6 +1233,20 @@ def finalizar_ticket_supervisor(from_phone: str, ticket_id: int) -> None:
             logger.error(f"Error notificando worker: {e}")
     
     # ── NUEVO: 8. Notificar al huésped si el ticket vino del canal guest ──
+    _notificar_huesped_ticket_resuelto(ticket)
+
+def _notificar_huesped_ticket_resuelto(ticket: dict) -> None:
+    """
+    Si el ticket vino del canal huésped: avisa al huésped que se resolvió y
+    marca csat_survey_triggered (la encuesta la envía ticket_watch después).
+    """
+    from gateway_app.services.whatsapp_client import send_whatsapp_text
+    from gateway_app.services.db import using_pg
+
+    ticket_id = ticket.get("id")
+    ubicacion = ticket.get("ubicacion") or ticket.get("habitacion", "?")
+    detalle = ticket.get("detalle", "Sin detalle")
+
     canal = ticket.get("canal_origen", "")
     huesped_phone = None
 
@@ -1111,7 +1282,583 @@ def finalizar_ticket_supervisor(from_phone: str, ticket_id: int) -> None:
 
         except Exception as e:
             logger.error(f"Error notificando huésped o marcando CSAT: {e}")
-    # ─────────────────────────────────────────────────────────────────────
+
+
+# ==================================================
+# OPERACIONES EN LOTE
+# "asignar 12 15 18 a María" · "cerrar 20-25" · "reasignar todo de Pedro a Ana"
+# Un UPDATE por operación (tickets_db.*_tickets) y un mensaje por worker.
+# ==================================================
+
+MAX_TICKETS_LOTE = 50
+
+_IDS_LOTE = r"#?\d+(?:\s*-\s*#?\d+)?(?:(?:\s*,\s*|\s+y\s+|\s+)#?\d+(?:\s*-\s*#?\d+)?)*"
+_RE_ASIGNAR_LOTE = re.compile(
+    rf"^(?:asignar|asigna|derivar)\s+(?:las\s+)?(?:tareas\s+)?({_IDS_LOTE})\s+a\s+(.+)$"
+)
+_RE_CERRAR_LOTE = re.compile(
+    rf"^(?:cerrar|cierra|finalizar|finaliza|completar)\s+(?:las\s+)?(?:tareas\s+)?({_IDS_LOTE})$"
+)
+_RE_REASIGNAR_TODO = re.compile(
+    r"^(?:reasignar|reasigna|pasar|pasa)\s+tod[oa]s?\s+(?:las\s+tareas\s+)?de\s+(.+?)\s+a\s+(.+)$"
+)
+
+
+def _parsear_ids_lote(texto: str) -> list:
+    """'12 15, 18 y 20-22' → [12, 15, 18, 20, 21, 22] (sin repetidos, en orden)."""
+    ids = []
+    for desde, hasta in re.findall(r"#?(\d+)(?:\s*-\s*#?(\d+))?", texto):
+        a = int(desde)
+        b = int(hasta) if hasta else a
+        if b < a:
+            a, b = b, a
+        for tid in range(a, min(b, a + MAX_TICKETS_LOTE) + 1):
+            if tid not in ids:
+                ids.append(tid)
+    return ids[:MAX_TICKETS_LOTE]
+
+
+def maybe_handle_comando_lote(from_phone: str, raw: str) -> bool:
+    """
+    Detecta comandos en lote. Con un solo ticket no aplica (lo manejan los
+    flujos normales de asignar / finalizar).
+
+    Returns:
+        True si se manejó
+    """
+    m = _RE_REASIGNAR_TODO.match(raw)
+    if m:
+        reasignar_todo_lote(from_phone, m.group(1).strip(), m.group(2).strip())
+        return True
+
+    m = _RE_ASIGNAR_LOTE.match(raw)
+    if m:
+        ids = _parsear_ids_lote(m.group(1))
+        if len(ids) > 1:
+            asignar_lote(from_phone, ids, m.group(2).strip())
+            return True
+
+    m = _RE_CERRAR_LOTE.match(raw)
+    if m:
+        ids = _parsear_ids_lote(m.group(1))
+        if len(ids) > 1:
+            cerrar_lote(from_phone, ids)
+            return True
+
+    return False
+
+
+_MATCH_SEGURO = ("exact", "exact_token")
+
+
+def _resolver_worker_lote(from_phone: str, nombre: str):
+    """
+    Worker por nombre para operaciones en lote. Con varios candidatos se
+    queda con el mejor si es el único de su tramo y el tramo es exacto
+    ("ana" → "Ana Díaz" aunque también aparezca "Adriana"); si hay empate,
+    pide el nombre completo (sin flujo de selección).
+    """
+    from gateway_app.services.workers_db import buscar_workers_por_nombre
+
+    candidatos = buscar_workers_por_nombre(nombre) or []
+    if not candidatos:
+        send_whatsapp(from_phone, f"❌ No encontré a '{nombre}'\n\n💡 Di 'equipo' para ver los nombres")
+        return None
+
+    if len(candidatos) > 1:
+        mejor = candidatos[0].get("match_type")
+        empatados = [w for w in candidatos if w.get("match_type") == mejor]
+        if mejor not in _MATCH_SEGURO or len(empatados) != 1:
+            nombres = "\n".join(f"• {w.get('nombre_completo')}" for w in candidatos[:8])
+            send_whatsapp(
+                from_phone,
+                f"🤔 Hay varios '{nombre}':\n{nombres}\n\n💡 Repite el comando con el nombre completo"
+            )
+            return None
+
+    return candidatos[0]
+
+
+def _nombre_worker(worker: dict) -> str:
+    return worker.get("nombre_completo") or worker.get("username") or "Trabajador"
+
+
+def asignar_lote(from_phone: str, ticket_ids: list, nombre: str) -> None:
+    """Asigna varias tareas pendientes a un worker y le envía un solo mensaje."""
+    from gateway_app.core.utils.message_constants import msg_sup_resultado_lote, msg_worker_nuevas_tareas
+
+    worker = _resolver_worker_lote(from_phone, nombre)
+    if not worker:
+        return
+
+    worker_phone = worker.get("telefono")
+    worker_nombre = _nombre_worker(worker)
+
+    asignados = tickets_db.asignar_tickets(ticket_ids, worker_phone, worker_nombre, actor=from_phone)
+    ids_ok = {t.get("id") for t in asignados}
+    omitidos = [tid for tid in ticket_ids if tid not in ids_ok]
+
+    send_whatsapp(
+        from_phone,
+        msg_sup_resultado_lote(
+            "asignadas", asignados, omitidos, worker_nombre,
+            motivo_omitidos="no existen o no están pendientes; usa 'reasignar'",
+        ),
+    )
+
+    if asignados and worker_phone:
+        send_whatsapp_text(to=worker_phone, body=msg_worker_nuevas_tareas(asignados))
+
+    logger.info(f"👔 SUP | Lote asignar → {worker_nombre}: ok={sorted(ids_ok)} omitidos={omitidos}")
+
+
+def cerrar_lote(from_phone: str, ticket_ids: list) -> None:
+    """Finaliza varias tareas; cada worker afectado recibe un solo mensaje."""
+    from gateway_app.core.utils.message_constants import msg_sup_resultado_lote, msg_worker_tareas_finalizadas_sup
+
+    cerrados = tickets_db.completar_tickets(ticket_ids, actor=from_phone)
+    ids_ok = {t.get("id") for t in cerrados}
+    omitidos = [tid for tid in ticket_ids if tid not in ids_ok]
+
+    send_whatsapp(
+        from_phone,
+        msg_sup_resultado_lote(
+            "finalizadas", cerrados, omitidos,
+            motivo_omitidos="no existen o ya estaban cerradas",
+        ),
+    )
+
+    por_worker = {}
+    for t in cerrados:
+        if t.get("assigned_phone"):
+            por_worker.setdefault(t["assigned_phone"], []).append(t)
+
+    for worker_phone, tickets in por_worker.items():
+        try:
+            send_whatsapp_text(to=worker_phone, body=msg_worker_tareas_finalizadas_sup(tickets))
+        except Exception as e:
+            logger.error(f"Error notificando worker {worker_phone}: {e}")
+
+    for t in cerrados:
+        _notificar_huesped_ticket_resuelto(t)
+
+    logger.info(f"👔 SUP | Lote cerrar: ok={sorted(ids_ok)} omitidos={omitidos}")
+
+
+def reasignar_todo_lote(from_phone: str, nombre_origen: str, nombre_destino: str) -> None:
+    """Pasa todas las tareas activas de un worker a otro (un mensaje a cada uno)."""
+    from gateway_app.core.utils.message_constants import (
+        msg_sup_resultado_lote, msg_worker_nuevas_tareas, msg_worker_tareas_reasignadas_saliente,
+    )
+
+    origen = _resolver_worker_lote(from_phone, nombre_origen)
+    if not origen:
+        return
+    destino = _resolver_worker_lote(from_phone, nombre_destino)
+    if not destino:
+        return
+
+    origen_phone = origen.get("telefono")
+    destino_phone = destino.get("telefono")
+    destino_nombre = _nombre_worker(destino)
+
+    if origen_phone == destino_phone:
+        send_whatsapp(from_phone, "⚠️ Origen y destino son la misma persona")
+        return
+
+    reasignados = tickets_db.reasignar_tickets_de_worker(
+        origen_phone, destino_phone, destino_nombre, actor=from_phone
+    )
+
+    if not reasignados:
+        send_whatsapp(from_phone, f"✅ {_nombre_worker(origen)} no tiene tareas activas")
+        return
+
+    send_whatsapp(from_phone, msg_sup_resultado_lote("reasignadas", reasignados, [], destino_nombre))
+
+    try:
+        send_whatsapp_text(
+            to=origen_phone,
+            body=msg_worker_tareas_reasignadas_saliente(reasignados, destino_nombre),
+        )
+        send_whatsapp_text(to=destino_phone, body=msg_worker_nuevas_tareas(reasignados))
+    except Exception as e:
+        logger.error(f"Error notificando reasignación en lote: {e}")
+
+    logger.info(
+        f"👔 SUP | Lote reasignar {origen_phone} → {destino_nombre}: "
+        f"{[t.get('id') for t in reasignados]}"
+    )
+
+
+# ==================================================
+# ASIGNACIÓN AUTOMÁTICA EN LOTE
+# "auto asignar" → propuesta óptima (assignment_engine) → "sí" la aplica.
+# ==================================================
+
+def proponer_auto_asignacion(from_phone: str) -> None:
+    """Calcula el reparto de todos los pendientes y lo deja esperando confirmación."""
+    from gateway_app.core.utils.message_constants import msg_sup_plan_auto_asignacion
+    from gateway_app.services.assignment_engine import AUTO_ASIGNAR_MAX_TICKETS, planificar_asignacion
+
+    tickets = tickets_db.obtener_pendientes_priorizados(AUTO_ASIGNAR_MAX_TICKETS)
+    if not tickets:
+        send_whatsapp(from_phone, "✅ No hay tickets pendientes")
+        return
+
+    workers = [w for w in obtener_todos_workers() if w.get("turno_activo") and not w.get("pausada")]
+    if not workers:
+        send_whatsapp(from_phone, "⚠️ No hay trabajadores con turno activo ahora.")
+        return
+
+    plan = planificar_asignacion(tickets, workers, score_fn=calcular_score_worker)
+    por_worker = [
+        {
+            "telefono": g["worker"].get("telefono"),
+            "nombre": _nombre_worker(g["worker"]),
+            "area": g["worker"].get("area"),
+            "ticket_ids": [t["id"] for t in g["tickets"]],
+        }
+        for g in plan["por_worker"]
+    ]
+    if not por_worker:
+        send_whatsapp(from_phone, "⚠️ Todos los trabajadores en turno tienen la cola llena")
+        return
+
+    state = get_supervisor_state(from_phone)
+    state["confirmacion_pendiente"] = {"tipo": "auto_asignar", "plan": por_worker}
+    persist_supervisor_state(from_phone, state)
+
+    send_whatsapp(
+        from_phone,
+        msg_sup_plan_auto_asignacion(por_worker, [t["id"] for t in plan["sin_asignar"]]),
+    )
+
+
+def aplicar_auto_asignacion(from_phone: str, plan: list) -> None:
+    """Aplica un plan confirmado: un UPDATE y un mensaje por worker."""
+    from gateway_app.core.utils.message_constants import msg_sup_resultado_lote, msg_worker_nuevas_tareas
+
+    asignados_total = []
+    omitidos = []
+    for grupo in plan:
+        asignados = tickets_db.asignar_tickets(
+            grupo["ticket_ids"], grupo["telefono"], grupo["nombre"], actor=from_phone
+        )
+        ids_ok = {t.get("id") for t in asignados}
+        omitidos.extend(tid for tid in grupo["ticket_ids"] if tid not in ids_ok)
+        asignados_total.extend(asignados)
+
+        if asignados and grupo.get("telefono"):
+            try:
+                send_whatsapp_text(to=grupo["telefono"], body=msg_worker_nuevas_tareas(asignados))
+            except Exception as e:
+                logger.error(f"Error notificando worker {grupo['telefono']}: {e}")
+
+    send_whatsapp(
+        from_phone,
+        msg_sup_resultado_lote(
+            "asignadas", asignados_total, omitidos,
+            motivo_omitidos="ya no estaban pendientes",
+        ),
+    )
+    logger.info(
+        f"👔 SUP | Auto asignar: ok={[t.get('id') for t in asignados_total]} omitidos={omitidos}"
+    )
+
+
+_SUP_SI = ['si', 'sí', 'yes', 'ok', 'misma', 'es la misma', 'agregar']
+_SUP_NO = ['no', 'nueva', 'nuevo', 'otra', 'crear']
+_SUP_CANCELAR = ['cancelar', 'cancel', 'descartar']
+
+
+def _preguntar_si_duplicado_sup(
+    from_phone: str, state: dict, intent: str, intent_data: dict, ubicacion, detalle: str
+) -> bool:
+    """
+    Antes de clasificar/crear: si ya hay una tarea abierta parecida (ver
+    tickets_db.buscar_ticket_duplicado) pregunta si es la misma, igual que
+    el flujo de housekeeping. Guarda el intent completo (incluido el worker
+    de crear_y_asignar) para que 'no' cree la tarea como se pidió.
+
+    Returns:
+        True si se preguntó (el caller no debe crear nada todavía)
+    """
+    if intent_data.get("duplicado_descartado") or not ubicacion or not detalle:
+        return False
+
+    duplicado = tickets_db.buscar_ticket_duplicado(str(ubicacion), detalle)
+    if not duplicado:
+        return False
+
+    from gateway_app.flows.housekeeping.ui_simple import texto_posible_duplicado
+
+    state["duplicado_pendiente"] = {
+        "ticket_id": duplicado["id"],
+        "intent": intent,
+        "intent_data": intent_data,
+    }
+    persist_supervisor_state(from_phone, state)
+    send_whatsapp(from_phone, texto_posible_duplicado(duplicado))
+    return True
+
+
+def _handle_duplicado_sup(from_phone: str, text: str) -> bool:
+    """
+    Respuesta a la pregunta de _preguntar_si_duplicado_sup:
+    'sí' → el reporte queda en el timeline del ticket existente,
+    'no' → se crea (y asigna) la tarea nueva, 'cancelar' → se descarta.
+
+    Returns:
+        True si se manejó, False si no había duplicado_pendiente
+    """
+    state = get_supervisor_state(from_phone)
+    info = state.get("duplicado_pendiente")
+    if not info:
+        return False
+
+    raw = (text or "").strip().lower()
+    ticket_id = info.get("ticket_id")
+    intent = info.get("intent")
+    intent_data = info.get("intent_data") or {}
+
+    if raw in _SUP_SI:
+        ticket = tickets_db.obtener_ticket_por_id(ticket_id)
+        if ticket and ticket.get("estado") != "RESUELTO":
+            state.pop("duplicado_pendiente", None)
+            persist_supervisor_state(from_phone, state)
+            tickets_db.registrar_reporte_duplicado(ticket_id, from_phone, detalle=intent_data.get("detalle"))
+            mensaje = f"🔁 Tu reporte quedó agregado a la tarea #{ticket_id}\n(no se creó una nueva)"
+            if intent == "crear_y_asignar" and not ticket.get("assigned_phone"):
+                mensaje += f"\n\n💡 Di 'asignar {ticket_id} a {intent_data.get('worker')}'"
+            send_whatsapp(from_phone, mensaje)
+            return True
+        # Se cerró mientras tanto: mejor crear la tarea nueva
+        raw = "no"
+
+    if raw in _SUP_NO:
+        state.pop("duplicado_pendiente", None)
+        persist_supervisor_state(from_phone, state)
+        intent_data = {**intent_data, "duplicado_descartado": True}
+        if intent == "crear_y_asignar":
+            _sup_crear_y_asignar(from_phone, state, intent_data)
+        else:
+            _sup_crear_ticket(from_phone, state, intent_data)
+        # La creación deja confirmacion_pendiente / ticket_seleccionado
+        persist_supervisor_state(from_phone, state)
+        return True
+
+    if raw in _SUP_CANCELAR:
+        state.pop("duplicado_pendiente", None)
+        persist_supervisor_state(from_phone, state)
+        send_whatsapp(from_phone, "❌ Reporte cancelado")
+        return True
+
+    from gateway_app.flows.housekeeping.ui_simple import texto_posible_duplicado
+
+    duplicado = tickets_db.obtener_ticket_por_id(ticket_id) or {"id": ticket_id}
+    send_whatsapp(from_phone, "❌ No entendí\n\n" + texto_posible_duplicado(duplicado))
+    return True
+
+
+def _sup_crear_y_asignar(from_phone: str, state: dict, intent_data: dict) -> bool:
+    """Crea la tarea dictada por el supervisor y la asigna al worker nombrado."""
+    ubicacion = intent_data.get("ubicacion", intent_data.get("habitacion"))  # ✅ MODIFICADO
+    detalle = intent_data["detalle"]
+    prioridad = intent_data["prioridad"]
+    nombre_trabajador = intent_data["worker"]
+
+    if _preguntar_si_duplicado_sup(from_phone, state, "crear_y_asignar", intent_data, ubicacion, detalle):
+        return True
+
+    # 1. Crear el ticket en BD
+    from gateway_app.services.tickets_db import crear_ticket, asignar_ticket
+
+    try:
+        area = infer_area_from_ubicacion(ubicacion)
+        ticket = crear_ticket(
+            habitacion=ubicacion,  # ✅ MODIFICADO: Genérico
+            detalle=detalle,
+            prioridad=prioridad,
+            area=area,
+            creado_por=from_phone,
+            origen="supervisor"
+        )
+
+        if not ticket:
+            send_whatsapp(from_phone, "❌ Error creando tarea. Intenta de nuevo.")
+            return True
+
+        ticket_id = ticket["id"]
+        prioridad_emoji = {"ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}.get(prioridad, "🟡")
+
+        # 2. Buscar trabajador
+        from gateway_app.services.workers_db import buscar_workers_por_nombre
+        coincidencias = buscar_workers_por_nombre(nombre_trabajador)
+
+        if len(coincidencias) == 1:
+            # ✅ PEDIR CONFIRMACIÓN
+            worker = coincidencias[0]
+            worker_phone = worker.get("telefono")
+            worker_nombre = worker.get("nombre_completo") or worker.get("username")
+
+            estado_emoji = {
+                "disponible": "✅",
+                "ocupada": "🔴",
+                "en_pausa": "⏸️"
+            }.get(worker.get("estado"), "✅")
+
+            # Guardar en estado para confirmar después
+            state["confirmacion_pendiente"] = {
+                "tipo": "crear_y_asignar",
+                "ticket_id": ticket_id,
+                "worker": worker,
+                "ubicacion": ubicacion,  # ✅ MODIFICADO
+                "detalle": detalle,
+                "prioridad": prioridad
+            }
+
+            send_whatsapp(
+                from_phone,
+                msg_sup_dialogo(
+                    ticket_id, ubicacion, detalle, prioridad,
+                    worker_nombre, es_creacion=True,
+                    ticket_area=area,
+                )
+            )
+            return True
+
+        elif len(coincidencias) > 1:
+            # Múltiples: mostrar opciones
+            state["ticket_seleccionado"] = ticket_id
+            state["esperando_asignacion"] = True
+
+            send_whatsapp(
+                from_phone,
+                msg_sup_confirmacion(
+                    ticket_id, "creada", ubicacion, detalle, prioridad,
+                    hint=f"📋 Encontré {len(coincidencias)} personas con '{nombre_trabajador}':",
+                    ticket_area=area,
+                )
+            )
+
+            from gateway_app.services.workers_db import obtener_todos_workers
+
+            # mostrar_opciones_workers ordena por score y guarda la lista en la sesión
+            workers = obtener_todos_workers()
+            mostrar_opciones_workers(from_phone, workers, ticket_id, ticket=ticket)
+            return True
+
+        else:
+            # No encontrado: mostrar todos
+            state["ticket_seleccionado"] = ticket_id
+            state["esperando_asignacion"] = True
+
+            send_whatsapp(
+                from_phone,
+                msg_sup_confirmacion(
+                    ticket_id, "creada", ubicacion, detalle, prioridad,
+                    hint=f"⚠️ No encontré a '{nombre_trabajador}'\nMostrando todas las opciones:",
+                    ticket_area=area,
+                )
+            )
+
+            from gateway_app.services.workers_db import obtener_todos_workers
+
+            # mostrar_opciones_workers ordena por score y guarda la lista en la sesión
+            workers = obtener_todos_workers()
+            mostrar_opciones_workers(from_phone, workers, ticket_id, ticket=ticket)
+            return True
+
+    except Exception as e:
+        logger.exception(f"❌ Error en crear_y_asignar: {e}")
+        send_whatsapp(from_phone, "❌ Error creando tarea. Intenta de nuevo.")
+        return True
+
+
+def _sup_crear_ticket(from_phone: str, state: dict, intent_data: dict) -> bool:
+    """Crea la tarea dictada por el supervisor (clasificada) y sugiere workers."""
+    ubicacion = intent_data.get("ubicacion", intent_data.get("habitacion"))
+    detalle = intent_data["detalle"]
+
+    if _preguntar_si_duplicado_sup(from_phone, state, "crear_ticket", intent_data, ubicacion, detalle):
+        return True
+
+    from gateway_app.services.tickets_db import crear_ticket
+    from gateway_app.services.ticket_classifier import clasificar_ticket  # ← NUEVO
+    try:
+        # ── Clasificación inteligente ────────────────────────────────
+        clasificacion = clasificar_ticket(
+            detalle=detalle,
+            ubicacion=str(ubicacion) if ubicacion else "",
+        )
+        prioridad = clasificacion["prioridad"] 
+        area = clasificacion["area"]
+        # ────────────────────────────────────────────────────────────
+
+        ticket = crear_ticket(
+            habitacion=ubicacion,
+            detalle=detalle,
+            prioridad=clasificacion["prioridad"],          # ← antes era intent_data["prioridad"]
+            area=clasificacion["area"],                    # ← antes era infer_area_from_ubicacion()
+            creado_por=from_phone,
+            origen="supervisor",
+            routing_source=clasificacion["routing_source"],    # ← NUEVO
+            routing_reason=clasificacion["routing_reason"],    # ← NUEVO
+            routing_confidence=clasificacion["routing_confidence"],  # ← NUEVO
+            routing_version=clasificacion["routing_source"],   # ← NUEVO
+        )
+
+        if ticket:
+            ticket_id = ticket["id"]
+
+            try:
+                notificar_supervisor_de_area(
+                    area=clasificacion["area"],
+                    ticket_id=ticket_id,
+                    ubicacion=ubicacion,
+                    detalle=detalle,
+                    prioridad=clasificacion["prioridad"],
+                    creado_por_phone=from_phone,
+                )
+            except Exception as e:
+                logger.error(f"❌ Error notificando supervisor de área: {e}")
+                # No relanzar — el ticket ya existe, la notificación es secundaria
+
+            send_whatsapp(
+                from_phone,
+                msg_sup_confirmacion(
+                    ticket_id, "creada", ubicacion, detalle, prioridad,
+                    hint=f"💡 Di 'asignar {ticket_id} a [nombre]'",
+                    ticket_area=clasificacion["area"],
+                )
+            )
+
+            # Guardar para asignación rápida
+            state["ticket_seleccionado"] = ticket_id
+            state["esperando_asignacion"] = True
+
+            # ✅ Recomendaciones (no deben romper el flujo si falla algo)
+            try:
+                from gateway_app.services.workers_db import obtener_todos_workers
+                workers = obtener_todos_workers()
+                mostrar_opciones_workers(from_phone, workers, ticket_id, ticket=ticket)
+
+                return True
+            except Exception as e:
+                logger.exception(f"⚠️ No pude mostrar recomendaciones de workers: {e}")
+                # No abortar: el ticket ya se creó. Opcional: no enviar nada extra.
+        else:
+            send_whatsapp(from_phone, "❌ Error creando tarea. Intenta de nuevo.")
+            return True
+
+    # ✅ AQUÍ ESTÁ EL EXCEPT QUE FALTABA
+    except Exception as e:
+        logger.exception(f"❌ Error creando ticket en DB: {e}")
+        send_whatsapp(from_phone, "❌ Error creando tarea. Intenta de nuevo.")
+        return True
+    return True
+
 
 def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
     """
@@ -1169,8 +1916,11 @@ def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
             worker_phone = mucama_seleccionada.get("telefono")
             worker_nombre = mucama_seleccionada.get("nombre_completo") or mucama_seleccionada.get("username")
             
-            from gateway_app.services.tickets_db import asignar_ticket
-            if asignar_ticket(ticket_id, worker_phone, worker_nombre):
+            worker_original_phone = None
+            if seleccion_info.get("tipo") == "reasignar":
+                worker_original_phone = (seleccion_info.get("worker_original") or {}).get("phone")
+
+            if reasignar_ticket_guardado(ticket_id, worker_phone, worker_nombre, worker_original_phone):
                 ubicacion = seleccion_info.get("ubicacion") or seleccion_info.get("habitacion") or "?"
                 ticket = obtener_ticket_por_id(ticket_id)
                 detalle = (ticket.get("detalle") or "—").strip()
@@ -1241,7 +1991,7 @@ def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
                 worker_phone = worker.get("telefono")
                 worker_nombre_completo = worker.get("nombre_completo", worker.get("nombre"))
                 
-                if asignar_ticket(ticket_id, worker_phone, worker_nombre_completo):
+                if reasignar_ticket_guardado(ticket_id, worker_phone, worker_nombre_completo, worker_original_phone):
                     ubicacion = ticket.get("ubicacion") or ticket.get("habitacion", "?")
                     detalle = ticket.get("detalle", "Sin detalle")
                     prioridad = ticket.get("prioridad", "MEDIA")
@@ -1413,7 +2163,7 @@ def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
     # ✅ NUEVO: Asignar ticket sin especificar worker → mostrar lista
     if intent == "asignar_ticket_sin_worker":
         ticket_id = intent_data["ticket_id"]
-        ticket = obtener_ticket_por_id(ticket_id)
+        ticket = ticket_de_listado(state, ticket_id) or obtener_ticket_por_id(ticket_id)
         if not ticket:
             send_whatsapp(from_phone, f"❌ No encontré la tarea #{ticket_id}")
             return True
@@ -1427,7 +2177,7 @@ def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
         persist_supervisor_state(from_phone, state)
         
         # Mostrar lista de workers
-        mostrar_opciones_workers(from_phone, workers, ticket_id)
+        mostrar_opciones_workers(from_phone, workers, ticket_id, ticket=ticket)
         return True
 
 # Caso 1: Asignar ticket existente
@@ -1453,8 +2203,8 @@ def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
             )
             return True
 
-        # Traer ticket para armar confirmaciones con datos reales
-        ticket = obtener_ticket_por_id(ticket_id) or {}
+        # Ticket para armar confirmaciones: el del último listado si se vio ahí
+        ticket = ticket_de_listado(state, ticket_id) or obtener_ticket_por_id(ticket_id) or {}
         detalle = ticket.get("detalle") or ticket.get("descripcion") or "Tarea asignada"
         prioridad = str(ticket.get("prioridad") or "MEDIA").upper()
         ubicacion = ticket.get("ubicacion") or ticket.get("habitacion") or "?"
@@ -1552,7 +2302,7 @@ def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
             worker_phone = worker.get("telefono")
             worker_nombre_completo = worker.get("nombre_completo", worker.get("nombre"))
             
-            if asignar_ticket(ticket_id, worker_phone, worker_nombre_completo):
+            if reasignar_ticket_guardado(ticket_id, worker_phone, worker_nombre_completo, worker_original_phone):
                 ubicacion = ticket.get("ubicacion") or ticket.get("habitacion", "?")
                 detalle = ticket.get("detalle", "Sin detalle")
                 prioridad = ticket.get("prioridad", "MEDIA")
@@ -1608,216 +2358,12 @@ def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
     
     # Caso 2: Crear y asignar
     if intent == "crear_y_asignar":
-        ubicacion = intent_data.get("ubicacion", intent_data.get("habitacion"))  # ✅ MODIFICADO
-        detalle = intent_data["detalle"]
-        prioridad = intent_data["prioridad"]
-        nombre_trabajador = intent_data["worker"]
-        
-        # 1. Crear el ticket en BD
-        from gateway_app.services.tickets_db import crear_ticket, asignar_ticket
-        
-        try:
-            area = infer_area_from_ubicacion(ubicacion)
-            ticket = crear_ticket(
-                habitacion=ubicacion,  # ✅ MODIFICADO: Genérico
-                detalle=detalle,
-                prioridad=prioridad,
-                area=area,
-                creado_por=from_phone,
-                origen="supervisor"
-            )
-            
-            if not ticket:
-                send_whatsapp(from_phone, "❌ Error creando tarea. Intenta de nuevo.")
-                return True
-            
-            ticket_id = ticket["id"]
-            prioridad_emoji = {"ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}.get(prioridad, "🟡")
-            
-            # 2. Buscar trabajador
-            from gateway_app.services.workers_db import buscar_workers_por_nombre
-            coincidencias = buscar_workers_por_nombre(nombre_trabajador)
-            
-            if len(coincidencias) == 1:
-                # ✅ PEDIR CONFIRMACIÓN
-                worker = coincidencias[0]
-                worker_phone = worker.get("telefono")
-                worker_nombre = worker.get("nombre_completo") or worker.get("username")
-                
-                estado_emoji = {
-                    "disponible": "✅",
-                    "ocupada": "🔴",
-                    "en_pausa": "⏸️"
-                }.get(worker.get("estado"), "✅")
-                
-                # Guardar en estado para confirmar después
-                state["confirmacion_pendiente"] = {
-                    "tipo": "crear_y_asignar",
-                    "ticket_id": ticket_id,
-                    "worker": worker,
-                    "ubicacion": ubicacion,  # ✅ MODIFICADO
-                    "detalle": detalle,
-                    "prioridad": prioridad
-                }
-                
-                send_whatsapp(
-                    from_phone,
-                    msg_sup_dialogo(
-                        ticket_id, ubicacion, detalle, prioridad,
-                        worker_nombre, es_creacion=True,
-                        ticket_area=area,
-                    )
-                )
-                return True
-            
-            elif len(coincidencias) > 1:
-                # Múltiples: mostrar opciones
-                state["ticket_seleccionado"] = ticket_id
-                state["esperando_asignacion"] = True
-                
-                send_whatsapp(
-                    from_phone,
-                    msg_sup_confirmacion(
-                        ticket_id, "creada", ubicacion, detalle, prioridad,
-                        hint=f"📋 Encontré {len(coincidencias)} personas con '{nombre_trabajador}':",
-                        ticket_area=area,
-                    )
-                )
-                
-                from .ticket_assignment import calcular_score_worker
-                from .ui_simple import texto_recomendaciones_simple
-                from gateway_app.services.workers_db import obtener_todos_workers
-                
-                workers = obtener_todos_workers()
-                workers_con_score = []
-                for worker in workers:
-                    score = calcular_score_worker(worker)
-                    workers_con_score.append({**worker, "score": score})
-                
-                workers_con_score.sort(key=lambda w: w["score"], reverse=True)
-                workers = obtener_todos_workers()
-                mostrar_opciones_workers(from_phone, workers, ticket_id)
-
-                state["ticket_seleccionado"] = ticket_id
-                state["esperando_asignacion"] = True
-                return True
-            
-            else:
-                # No encontrado: mostrar todos
-                state["ticket_seleccionado"] = ticket_id
-                state["esperando_asignacion"] = True
-                
-                send_whatsapp(
-                    from_phone,
-                    msg_sup_confirmacion(
-                        ticket_id, "creada", ubicacion, detalle, prioridad,
-                        hint=f"⚠️ No encontré a '{nombre_trabajador}'\nMostrando todas las opciones:",
-                        ticket_area=area,
-                    )
-                )
-                
-                from .ticket_assignment import calcular_score_worker
-                from .ui_simple import texto_recomendaciones_simple
-                from gateway_app.services.workers_db import obtener_todos_workers
-                
-                workers = obtener_todos_workers()
-                workers_con_score = []
-                for worker in workers:
-                    score = calcular_score_worker(worker)
-                    workers_con_score.append({**worker, "score": score})
-                
-                workers_con_score.sort(key=lambda w: w["score"], reverse=True)
-                workers = obtener_todos_workers()
-                mostrar_opciones_workers(from_phone, workers, ticket_id)
-
-                state["ticket_seleccionado"] = ticket_id
-                state["esperando_asignacion"] = True
-                return True
-        
-        except Exception as e:
-            logger.exception(f"❌ Error en crear_y_asignar: {e}")
-            send_whatsapp(from_phone, "❌ Error creando tarea. Intenta de nuevo.")
-            return True
+        return _sup_crear_y_asignar(from_phone, state, intent_data)
 
     # Caso 3: Solo crear
     if intent == "crear_ticket":
-        ubicacion = intent_data.get("ubicacion", intent_data.get("habitacion"))
-        detalle = intent_data["detalle"]
-        
-        from gateway_app.services.tickets_db import crear_ticket
-        from gateway_app.services.ticket_classifier import clasificar_ticket  # ← NUEVO
-        try:
-            # ── Clasificación inteligente ────────────────────────────────
-            clasificacion = clasificar_ticket(
-                detalle=detalle,
-                ubicacion=str(ubicacion) if ubicacion else "",
-            )
-            prioridad = clasificacion["prioridad"] 
-            area = clasificacion["area"]
-            # ────────────────────────────────────────────────────────────
-            
-            ticket = crear_ticket(
-                habitacion=ubicacion,
-                detalle=detalle,
-                prioridad=clasificacion["prioridad"],          # ← antes era intent_data["prioridad"]
-                area=clasificacion["area"],                    # ← antes era infer_area_from_ubicacion()
-                creado_por=from_phone,
-                origen="supervisor",
-                routing_source=clasificacion["routing_source"],    # ← NUEVO
-                routing_reason=clasificacion["routing_reason"],    # ← NUEVO
-                routing_confidence=clasificacion["routing_confidence"],  # ← NUEVO
-                routing_version=clasificacion["routing_source"],   # ← NUEVO
-            )
-            
-            if ticket:
-                ticket_id = ticket["id"]
+        return _sup_crear_ticket(from_phone, state, intent_data)
 
-                try:
-                    notificar_supervisor_de_area(
-                        area=clasificacion["area"],
-                        ticket_id=ticket_id,
-                        ubicacion=ubicacion,
-                        detalle=detalle,
-                        prioridad=clasificacion["prioridad"],
-                        creado_por_phone=from_phone,
-                    )
-                except Exception as e:
-                    logger.error(f"❌ Error notificando supervisor de área: {e}")
-                    # No relanzar — el ticket ya existe, la notificación es secundaria
-
-                send_whatsapp(
-                    from_phone,
-                    msg_sup_confirmacion(
-                        ticket_id, "creada", ubicacion, detalle, prioridad,
-                        hint=f"💡 Di 'asignar {ticket_id} a [nombre]'",
-                        ticket_area=clasificacion["area"],
-                    )
-                )
-                
-                # Guardar para asignación rápida
-                state["ticket_seleccionado"] = ticket_id
-                state["esperando_asignacion"] = True
-                
-                # ✅ Recomendaciones (no deben romper el flujo si falla algo)
-                try:
-                    from gateway_app.services.workers_db import obtener_todos_workers
-                    workers = obtener_todos_workers()
-                    mostrar_opciones_workers(from_phone, workers, ticket_id)
-                    
-                    return True
-                except Exception as e:
-                    logger.exception(f"⚠️ No pude mostrar recomendaciones de workers: {e}")
-                    # No abortar: el ticket ya se creó. Opcional: no enviar nada extra.
-            else:
-                send_whatsapp(from_phone, "❌ Error creando tarea. Intenta de nuevo.")
-                return True
-        
-        # ✅ AQUÍ ESTÁ EL EXCEPT QUE FALTABA
-        except Exception as e:
-            logger.exception(f"❌ Error creando ticket en DB: {e}")
-            send_whatsapp(from_phone, "❌ Error creando tarea. Intenta de nuevo.")
-            return True
-        
     # Caso 4: Asignar sin ticket (usar el de mayor prioridad)
     if intent == "asignar_sin_ticket":
         worker_nombre = intent_data.get("worker")
@@ -1832,21 +2378,16 @@ def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
         worker = buscar_worker_por_nombre(worker_nombre)
         
         if worker:
-            tickets = obtener_pendientes()
-            if tickets:
-                prioridad_order = {"ALTA": 0, "MEDIA": 1, "BAJA": 2}
-                tickets_sorted = sorted(
-                    tickets,
-                    key=lambda t: prioridad_order.get(t.get("prioridad", "MEDIA"), 1)
-                )
-                ticket = tickets_sorted[0]
+            ticket = tickets_db.obtener_siguiente_pendiente()
+            if ticket:
                 ticket_id = ticket["id"]
                 
                 worker_phone = worker.get("telefono")
                 worker_nombre_completo = worker.get("nombre_completo") or worker.get("username")
                 
-                # ✅ Asignar en BD
-                if asignar_ticket(ticket_id, worker_phone, worker_nombre_completo):
+                # ✅ Asignar en BD (solo si sigue pendiente: otro supervisor pudo tomarlo)
+                from gateway_app.services.ticket_state_machine import ticket_state_machine
+                if ticket_state_machine.assign(ticket_id, worker_phone, worker_nombre_completo, actor=from_phone):
                     # Obtener datos completos del ticket
                     ticket_data = obtener_ticket_por_id(ticket_id)
                     habitacion = ticket_data.get("ubicacion") or ticket_data.get("habitacion", "?")
@@ -1946,6 +2487,34 @@ def maybe_handle_audio_command_simple(from_phone: str, text: str) -> bool:
                 hint=f"💡 Di 'asignar {ticket_id} a [nombre]' | 'área {ticket_id} [area]'",
             )
         )
+        # Preview liviano (rendition); si aún no existe queda encolada y se manda el original
+        from gateway_app.services.media_renditions import get_ticket_preview_url
+        from gateway_app.services.tickets_db import obtener_primer_media_de_ticket
+        from gateway_app.services.whatsapp_client import send_whatsapp_image, send_whatsapp_video
+        caption = f"📎 Ticket #{ticket_id}"
+        preview_url = get_ticket_preview_url(ticket_id, "preview")
+        if preview_url:
+            send_whatsapp_image(to=from_phone, image_url=preview_url, caption=caption)
+        else:
+            from gateway_app.services.storage_backends import is_http_url
+            media = obtener_primer_media_de_ticket(ticket_id) or {}
+            storage_url = media.get("storage_url") if is_http_url(media.get("storage_url")) else None
+            wa_media_id = media.get("whatsapp_media_id")
+            if storage_url or wa_media_id:
+                if media.get("media_type") == "video":
+                    send_whatsapp_video(
+                        to=from_phone,
+                        media_id=None if storage_url else wa_media_id,
+                        video_url=storage_url or None,
+                        caption=caption,
+                    )
+                else:
+                    send_whatsapp_image(
+                        to=from_phone,
+                        media_id=None if storage_url else wa_media_id,
+                        image_url=storage_url or None,
+                        caption=caption,
+                    )
         return True
 
     if intent == "aviso_general":
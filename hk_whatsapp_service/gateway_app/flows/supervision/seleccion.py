@@ -0,0 +1,96 @@
+"""
+Snapshots de lo que se le mostró al supervisor (listas numeradas y listados
+de tickets), guardados en su sesión (runtime_sessions).
+
+Una respuesta "2" se resuelve contra la lista que el supervisor VIO, sin
+volver a consultar tickets/workers ni re-ordenar por score: si entre medio
+alguien activó turno o cambió la carga, el "2" sigue siendo la misma persona.
+
+Sesión del supervisor:
+    opciones_asignacion = {"ticket_id", "ticket": {...}, "workers": [{...}], "ts"}
+    listado_tickets     = {"lista", "tickets": [{...}], "ts"}
+
+Los dicts se guardan "planos" (solo escalares, fechas como ISO): la sesión
+se serializa a JSON.
+"""
+from __future__ import annotations
+
+import os
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+# Un listado viejo ya no describe la realidad: pasado esto se vuelve a la BD
+LISTADO_TTL_SECONDS = int(os.getenv("SUP_LISTADO_TTL_SECONDS", "1800"))
+
+
+def _plano(d: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Copia JSON-serializable: escalares tal cual, fechas en ISO, el resto fuera."""
+    out: Dict[str, Any] = {}
+    for k, v in (d or {}).items():
+        if isinstance(v, (str, int, float, bool)) or v is None:
+            out[k] = v
+        elif isinstance(v, (datetime, date)):
+            out[k] = v.isoformat()
+    return out
+
+
+# ============================================================
+# Lista numerada de workers para asignar un ticket
+# ============================================================
+
+def guardar_opciones_asignacion(
+    state: Dict[str, Any],
+    ticket_id: int,
+    ticket: Optional[Dict[str, Any]],
+    workers: List[Dict[str, Any]],
+) -> None:
+    """`workers` en el MISMO orden en que se numeraron en el mensaje."""
+    state["opciones_asignacion"] = {
+        "ticket_id": ticket_id,
+        "ticket": _plano(ticket),
+        "workers": [_plano(w) for w in workers],
+        "ts": time.time(),
+    }
+
+
+def opciones_asignacion(state: Dict[str, Any], ticket_id: int) -> Optional[Dict[str, Any]]:
+    """Snapshot de la lista mostrada para `ticket_id` (None si no hay / es de otro ticket)."""
+    opciones = state.get("opciones_asignacion")
+    if not isinstance(opciones, dict) or opciones.get("ticket_id") != ticket_id:
+        return None
+    return opciones
+
+
+def limpiar_opciones_asignacion(state: Dict[str, Any]) -> None:
+    state.pop("opciones_asignacion", None)
+
+
+# ============================================================
+# Listados de tickets (pendientes, activos, búsqueda...)
+# ============================================================
+
+def recordar_listado(state: Dict[str, Any], lista: str, tickets: List[Dict[str, Any]]) -> None:
+    """Guarda los tickets mostrados: 'asignar [#] a ...' los toma de aquí."""
+    state["listado_tickets"] = {
+        "lista": lista,
+        "tickets": [_plano(t) for t in tickets],
+        "ts": time.time(),
+    }
+
+
+def ticket_de_listado(state: Dict[str, Any], ticket_id: Any) -> Optional[Dict[str, Any]]:
+    """El ticket #ticket_id tal como se mostró en el último listado (si es reciente)."""
+    listado = state.get("listado_tickets")
+    if not isinstance(listado, dict):
+        return None
+    if time.time() - float(listado.get("ts") or 0) > LISTADO_TTL_SECONDS:
+        return None
+    try:
+        ticket_id = int(ticket_id)
+    except (TypeError, ValueError):
+        return None
+    for t in listado.get("tickets") or []:
+        if t.get("id") == ticket_id:
+            return t
+    return None
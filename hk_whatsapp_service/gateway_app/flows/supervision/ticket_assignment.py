@@ -3,6 +3,7 @@ Sistema de asignación de tickets a workers con scoring inteligente.
 VERSIÓN MEJORADA: Prioriza workers según área del ticket.
 """
 from .ubicacion_helpers import normalize_area
+from gateway_app.services.hotel_topology import bonus_proximidad
 
 def calcular_score_worker(worker: dict, ticket: dict = None) -> int:
     """
@@ -23,6 +24,8 @@ def calcular_score_worker(worker: dict, ticket: dict = None) -> int:
     - En pausa: -100
     - Carga de trabajo: -10 por cada ticket asignado
     - Turno activo: +30
+    - Proximidad: hasta +40 si su última ubicación está cerca del ticket
+      (mismo piso/zona según hotel_topology; baja 8 por piso)
     """
     score = 100  # Base
     
@@ -53,6 +56,14 @@ def calcular_score_worker(worker: dict, ticket: dict = None) -> int:
                 score += 200  # BONUS GRANDE
             elif worker_area in ["HOUSEKEEPING", "HK"]:
                 score -= 100  # Penalización mayor (no es su especialidad)
+
+        # Proximidad: quien terminó la 812 es mejor para la 810 que para la 105
+        score += bonus_proximidad(
+            worker.get("ultima_ubicacion"),
+            ticket_ubicacion,
+            ticket.get("org_id"),
+            ticket.get("hotel_id"),
+        )
     
     # Estado: Disponible (no ocupada, no pausada)
     if not worker.get("ocupada", False) and not worker.get("pausada", False):
@@ -137,8 +148,11 @@ def formatear_ubicacion_con_emoji(ubicacion: str) -> str:
     return ubicacion_con_emoji(ubicacion)
 
 
-def confirmar_asignacion(from_phone: str, ticket_id: int, worker: dict) -> None:
-    """Confirma la asignación de una tarea a un worker."""
+def confirmar_asignacion(from_phone: str, ticket_id: int, worker: dict, ticket: dict = None) -> None:
+    """
+    Confirma la asignación de una tarea a un worker.
+    ticket: snapshot ya mostrado al supervisor (evita releerlo de la BD).
+    """
     from gateway_app.flows.supervision.outgoing import send_whatsapp
     from gateway_app.services.tickets_db import obtener_ticket_por_id
     from gateway_app.core.utils.message_constants import (
@@ -146,7 +160,8 @@ def confirmar_asignacion(from_phone: str, ticket_id: int, worker: dict) -> None:
     )
     from .ubicacion_helpers import normalize_area
 
-    ticket = obtener_ticket_por_id(ticket_id)
+    if not ticket:
+        ticket = obtener_ticket_por_id(ticket_id)
     if not ticket:
         send_whatsapp(from_phone, f"❌ No encontré la tarea #{ticket_id}")
         return
@@ -11,7 +11,7 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from zoneinfo import ZoneInfo
 from typing import Any
 
@@ -162,10 +162,22 @@ def obtener_workers_con_estado() -> List[Dict[str, Any]]:
     return workers
 
 
+MAX_OPCIONES_EN_TURNO = 5
+MAX_OPCIONES_SIN_TURNO = 3
+
+
 def formatear_workers_para_asignacion(workers: List[Dict[str, Any]], 
                                         ticket: Optional[Dict] = None) -> str:
+    """Solo el mensaje de preparar_opciones_asignacion."""
+    return preparar_opciones_asignacion(workers, ticket)[0]
+
+
+def preparar_opciones_asignacion(workers: List[Dict[str, Any]],
+                                 ticket: Optional[Dict] = None) -> Tuple[str, List[Dict[str, Any]]]:
     """
     Formatea lista de workers para asignación, mostrando estado de turno.
+    Devuelve (mensaje, workers mostrados en el orden de su número): la
+    respuesta "2" es mostrados[1] (ver seleccion.guardar_opciones_asignacion).
     
     Ordena: primero los que tienen turno activo.
     
@@ -180,7 +192,7 @@ def formatear_workers_para_asignacion(workers: List[Dict[str, Any]],
     3. 🔴 Ana Pérez (🏠 HK)
     """
     if not workers:
-        return "📭 No hay trabajadores registrados"
+        return "📭 No hay trabajadores registrados", []
     
     # Calcular score si hay ticket
     if ticket:
@@ -200,11 +212,12 @@ def formatear_workers_para_asignacion(workers: List[Dict[str, Any]],
     lineas = ["👥 Trabajadores\n"]
     
     idx = 1
+    mostrados: List[Dict[str, Any]] = []
     
     # Primero los que están en turno
     if en_turno:
         lineas.append(f"✅ EN TURNO ({len(en_turno)}):")
-        for w in en_turno[:5]:  # Máximo 5
+        for w in en_turno[:MAX_OPCIONES_EN_TURNO]:
             nombre = w.get("nombre_completo", w.get("username", "?"))
             area = (w.get("area") or "HK").upper()
             
@@ -222,17 +235,18 @@ def formatear_workers_para_asignacion(workers: List[Dict[str, Any]],
             }.get(area, area[:3])
             
             lineas.append(f"{idx}. 🟢 {nombre} ({area_emoji} {area_corta})")
+            mostrados.append(w)
             idx += 1
         
-        if len(en_turno) > 5:
-            lineas.append(f"   ... +{len(en_turno) - 5} más en turno")
+        if len(en_turno) > MAX_OPCIONES_EN_TURNO:
+            lineas.append(f"   ... +{len(en_turno) - MAX_OPCIONES_EN_TURNO} más en turno")
         
         lineas.append("")
     
     # Luego los que no están en turno (con advertencia)
     if sin_turno:
         lineas.append(f"⚠️ SIN TURNO ({len(sin_turno)}):")
-        for w in sin_turno[:3]:  # Máximo 3
+        for w in sin_turno[:MAX_OPCIONES_SIN_TURNO]:
             nombre = w.get("nombre_completo", w.get("username", "?"))
             area = (w.get("area") or "HK").upper()
             
@@ -250,16 +264,17 @@ def formatear_workers_para_asignacion(workers: List[Dict[str, Any]],
             }.get(area, area[:3])
             
             lineas.append(f"{idx}. 🔴 {nombre} ({area_emoji} {area_corta})")
+            mostrados.append(w)
             idx += 1
         
-        if len(sin_turno) > 3:
-            lineas.append(f"   ... +{len(sin_turno) - 3} más sin turno")
+        if len(sin_turno) > MAX_OPCIONES_SIN_TURNO:
+            lineas.append(f"   ... +{len(sin_turno) - MAX_OPCIONES_SIN_TURNO} más sin turno")
     
     lineas.append("")
     lineas.append("💡 Recomendado: asignar a quien tenga turno activo (🟢)")
     lineas.append("💡 Di el nombre o número")
     
-    return "\n".join(lineas)
+    return "\n".join(lineas), mostrados
 
 
 def construir_mensaje_equipo() -> str:
@@ -24,9 +24,13 @@ def texto_saludo_supervisor() -> str:
 • `asignar 15 a María`
 • `reasignar 12 a Pedro`
 • `más urgente` → asigna el próximo
+• `asignar 12 15 18 a María` → varias a la vez
+• `reasignar todo de Pedro a Ana`
+• `auto asignar` → reparte todas las pendientes
 
 ✅ *FINALIZAR*
 • `finalizar 15`
+• `cerrar 20-25` → varias a la vez
 
 📝 *CREAR TICKET*
 • `hab 420 limpieza urgente`
@@ -121,10 +125,14 @@ def texto_ticket_creado_simple(ticket_id: int, habitacion: str, prioridad: str)
 def texto_urgentes(pendientes_urgentes: list, retrasados: list) -> str:
     """Muestra tareas urgentes con formato unificado."""
     from gateway_app.core.utils.message_constants import formatear_linea_ticket
+    from gateway_app.services.tickets_db import adjuntar_conteo_media
 
     if not pendientes_urgentes and not retrasados:
         return "✅ Todo bien, nada urgente"
 
+    # 📎 de todas las líneas en una sola query
+    adjuntar_conteo_media(pendientes_urgentes[:5] + retrasados[:5])
+
     lineas = ["⚠️ Tareas Urgentes\n"]
 
     if pendientes_urgentes:
@@ -9,6 +9,7 @@ from typing import List, Dict, Any, Optional
 from difflib import SequenceMatcher
 
 from gateway_app.flows.supervision.ubicacion_helpers import get_area_emoji, get_area_tag
+from gateway_app.services.name_index import search_items
 from gateway_app.services.workers_db import normalizar_area
 
 
@@ -45,58 +46,26 @@ def buscar_workers(nombre_query: str, workers: List[Dict[str, Any]], rol: str =
         >>> buscar_workers("Pedro", workers, rol="mantenimiento")
         [Pedro Ramírez (Mantención)]
     """
-    nombre_query = nombre_query.lower().strip()
-    
     # Filtrar por rol si se especifica
     workers_filtrados = workers
     if rol:
         workers_filtrados = [w for w in workers if w.get("rol") == rol]
     
-    candidatos = []
-    
+    # Exacto > token > prefijo > substring > fonética/trigramas (ver name_index)
+    hits = search_items(nombre_query, workers_filtrados)
+    candidatos = [
+        {**worker, "match_score": score, "match_type": match_type}
+        for score, match_type, worker in hits
+    ]
+
+    # Apodos (si el worker los trae)
+    encontrados = {id(worker) for _, _, worker in hits}
+    query_lower = nombre_query.lower().strip()
     for worker in workers_filtrados:
-        score = 0.0
-        match_type = None
-        
-        # 1. Búsqueda exacta en nombre
-        if worker.get("nombre", "").lower() == nombre_query:
-            score = 1.0
-            match_type = "exact_name"
-        
-        # 2. Búsqueda exacta en apellido
-        elif worker.get("apellido", "").lower() == nombre_query:
-            score = 1.0
-            match_type = "exact_surname"
-        
-        # 3. Búsqueda en nombre completo
-        elif nombre_query in worker.get("nombre_completo", "").lower():
-            score = 0.95
-            match_type = "contains"
-        
-        # 4. Búsqueda en apodos
-        elif any(nombre_query == apodo.lower() for apodo in worker.get("apodos", [])):
-            score = 0.95
-            match_type = "nickname"
-        
-        # 5. Fuzzy matching en nombre (tolerancia a typos)
-        else:
-            nombre_sim = similarity(nombre_query, worker.get("nombre", ""))
-            apellido_sim = similarity(nombre_query, worker.get("apellido", ""))
-            completo_sim = similarity(nombre_query, worker.get("nombre_completo", ""))
-            
-            # Tomar la mejor similitud
-            score = max(nombre_sim, apellido_sim, completo_sim)
-            
-            # Solo considerar si similitud >= 0.6 (60%)
-            if score >= 0.6:
-                match_type = "fuzzy"
-        
-        if score > 0:
-            candidatos.append({
-                **worker,
-                "match_score": score,
-                "match_type": match_type
-            })
+        if id(worker) in encontrados:
+            continue
+        if any(query_lower == apodo.lower() for apodo in worker.get("apodos", [])):
+            candidatos.append({**worker, "match_score": 0.95, "match_type": "nickname"})
     
     # Ordenar por score (mayor primero)
     candidatos.sort(key=lambda x: x["match_score"], reverse=True)
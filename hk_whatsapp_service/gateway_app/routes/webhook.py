@@ -23,6 +23,7 @@ from gateway_app.flows.housekeeping.message_handler import handle_hk_message_wit
 from gateway_app.flows.supervision import handle_supervisor_message
 
 from gateway_app.services.db import fetchone, execute, using_pg
+from gateway_app.services.tickets_db import media_request_scope
 
 # Configuración: Detectar rol por número de teléfono
 # Lee desde variable de entorno SUPERVISOR_PHONES
@@ -121,6 +122,12 @@ def inbound_updated():
     Webhook principal con routing por rol.
     VERSIÓN ACTUALIZADA con soporte para imágenes y videos.
     """
+    # Memo de media por request: listados + notificaciones no repiten queries
+    with media_request_scope():
+        return _inbound_updated()
+
+
+def _inbound_updated():
     payload = request.get_json(silent=True) or {}
 
     try:
@@ -385,6 +392,14 @@ def db_status():
         # Verificar tabla 'runtime_sessions'
         runtime_sessions_exists = 'runtime_sessions' in status["tables"]
         
+        # Planes de las consultas calientes (Seq Scan sin índice = problema)
+        if tickets_exists:
+            try:
+                from gateway_app.services.query_plans import check_hot_query_plans
+                status["query_plans"] = check_hot_query_plans()
+            except Exception as e:
+                status["errors"].append(f"Error revisando planes: {e}")
+        
         status["summary"] = {
             "total_tables": len(status["tables"]),
             "tickets_table_exists": tickets_exists,
@@ -409,6 +424,13 @@ def health_check():
     whatsapp_token_configured = bool(os.getenv("WHATSAPP_TOKEN"))
     openai_key_configured = bool(os.getenv("OPENAI_API_KEY"))
     database_configured = bool(os.getenv("DATABASE_URL"))
+
+    # Qué proceso corre los jobs de fondo (ticket_watch, daily_scheduler)
+    try:
+        from gateway_app.services.leader_election import leader_status
+        leader = leader_status()
+    except Exception as e:
+        leader = {"error": str(e)}
     
     return jsonify({
         "status": "healthy",
@@ -416,5 +438,6 @@ def health_check():
         "audio_support": openai_key_configured,
         "database_configured": database_configured,
         "bots": ["housekeeping", "supervision"],
+        "leader": leader,
         "message": "WhatsApp Multi-Bot is running"
     }), 200
\ No newline at end of file
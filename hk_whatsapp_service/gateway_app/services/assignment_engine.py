@@ -0,0 +1,352 @@
+# gateway_app/services/assignment_engine.py
+"""
+Asignación automática en lote: reparte TODOS los pendientes entre TODOS los
+workers en turno resolviendo una asignación de costo mínimo (húngaro).
+
+Asignar de a uno (asignar_siguiente / elegir_mejor_worker) es greedy: con
+30 pendientes a las 07:30 el primero con mejor score se lleva todo. Aquí:
+
+- Cada worker aporta `capacidad` columnas ("slots"):
+      capacidad = AUTO_ASIGNAR_MAX_POR_WORKER - tickets_asignados (carga actual)
+  El slot k (0, 1, 2...) es su k-ésima tarea nueva: cuesta más mientras más
+  larga su cola, así el solver reparte en vez de apilar.
+- costo(ticket, worker, k) =
+      (SCORE_MAX - calcular_score_worker(worker, ticket))   área, estado, carga, cercanía
+    + k * COSTO_COLA * (1 + peso_prioridad)                 urgentes → colas cortas
+- Si hay más tickets que slots, se agregan columnas "sin asignar" con costo
+  COSTO_SIN_ASIGNAR * (1 + peso_prioridad): quedan fuera los menos urgentes.
+- resolver_asignacion(): húngaro O(n²·m) (caminos aumentantes más cortos con
+  potenciales). Con NumPy (en requirements.txt) el barrido por columnas es
+  vectorizado. Si NumPy no está instalado cae a la misma versión en Python
+  puro, con un warning: da el mismo resultado pero ~4× más lenta
+  (200×200: ~75 ms con NumPy vs ~300-400 ms sin).
+
+Benchmark (200 tickets × 50 workers):
+    python -m gateway_app.services.assignment_engine
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+AUTO_ASIGNAR_MAX_POR_WORKER = int(os.getenv("AUTO_ASIGNAR_MAX_POR_WORKER", "5"))
+AUTO_ASIGNAR_MAX_TICKETS = int(os.getenv("AUTO_ASIGNAR_MAX_TICKETS", "200"))
+
+# calcular_score_worker da 0..~400 (clamp a 0): costo = SCORE_MAX - score ≥ 0
+SCORE_MAX = 500.0
+# Por cada tarea nueva ya en cola del worker (mismo -10 por ticket que
+# calcular_score_worker aplica a la carga actual)
+COSTO_COLA = 10.0
+# Siempre mayor que cualquier costo de asignar → solo queda sin asignar si no hay slot
+COSTO_SIN_ASIGNAR = 1000.0
+
+PESO_PRIORIDAD = {"URGENTE": 3, "ALTA": 2, "MEDIA": 1, "BAJA": 0}
+
+ScoreFn = Callable[[dict, dict], float]
+
+
+def _peso(ticket: dict) -> int:
+    return PESO_PRIORIDAD.get(str(ticket.get("prioridad") or "MEDIA").upper(), 1)
+
+
+# ============================================================
+# SOLVER
+# ============================================================
+
+def _hungarian_python(cost: Sequence[Sequence[float]]) -> List[int]:
+    n, m = len(cost), len(cost[0])
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)       # p[j]: fila (1-based) asignada a la columna j
+    way = [0] * (m + 1)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0 - 1]
+            ui0 = u[i0]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - ui0 - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    result = [-1] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            result[p[j] - 1] = j - 1
+    return result
+
+
+def _hungarian_numpy(cost) -> List[int]:
+    """
+    Misma asignación, variante de caminos aumentantes más cortos (estilo
+    LAPJV): cada paso es un barrido vectorizado sobre las m columnas y los
+    potenciales se actualizan una vez por fila, no en cada paso.
+    """
+    import numpy as np
+
+    c = np.asarray(cost, dtype=float)
+    n, m = c.shape
+    v = np.zeros(m)
+    row4col = np.full(m, -1, dtype=np.int64)
+    col4row = np.full(n, -1, dtype=np.int64)
+
+    # Arranque: reducción por filas (u = mínimo de la fila, v = 0 mantiene la
+    # factibilidad dual también en el caso rectangular) y cada fila toma una
+    # columna libre de costo reducido 0. Solo las que queden sin columna
+    # pasan por el camino aumentante.
+    u = c.min(axis=1)
+    free_cols = np.ones(m, dtype=bool)
+    for i in range(n):
+        zeros = np.flatnonzero((c[i] == u[i]) & free_cols)
+        if zeros.size:
+            j = int(zeros[0])
+            col4row[i] = j
+            row4col[j] = i
+            free_cols[j] = False
+
+    for cur_row in np.flatnonzero(col4row < 0):
+        cur_row = int(cur_row)
+        shortest = np.full(m, np.inf)
+        path = np.full(m, -1, dtype=np.int64)
+        in_tree_rows = [cur_row]
+        scanned = np.zeros(m, dtype=bool)
+        min_val = 0.0
+        i = cur_row
+        sink = -1
+
+        while sink < 0:
+            r = c[i] - (u[i] - min_val) - v
+            upd = (r < shortest) & ~scanned
+            path[upd] = i
+            shortest[upd] = r[upd]
+
+            candidates = np.where(scanned, np.inf, shortest)
+            j = int(candidates.argmin())
+            min_val = candidates[j]
+            if row4col[j] >= 0:
+                # Empate con una columna libre → terminar ya (muy común: slots equivalentes)
+                libres = np.flatnonzero((candidates == min_val) & (row4col < 0))
+                if libres.size:
+                    j = int(libres[0])
+            scanned[j] = True
+            if row4col[j] < 0:
+                sink = j
+            else:
+                i = int(row4col[j])
+                in_tree_rows.append(i)
+
+        # Potenciales
+        u[cur_row] += min_val
+        otros = np.asarray(in_tree_rows[1:], dtype=np.int64)
+        if otros.size:
+            u[otros] += min_val - shortest[col4row[otros]]
+        cols = np.flatnonzero(scanned)
+        v[cols] -= min_val - shortest[cols]
+
+        # Aumentar a lo largo del camino
+        j = sink
+        while True:
+            i = int(path[j])
+            row4col[j] = i
+            col4row[i], j = j, int(col4row[i])
+            if i == cur_row:
+                break
+
+    return [int(j) for j in col4row]
+
+
+def resolver_asignacion(cost, *, use_numpy: Optional[bool] = None) -> Tuple[List[int], str]:
+    """
+    Asignación de costo mínimo fila → columna (n filas ≤ m columnas).
+
+    Returns:
+        (columna asignada a cada fila, "numpy" | "python")
+    """
+    if not len(cost):
+        return [], "python"
+    if len(cost) > len(cost[0]):
+        raise ValueError("resolver_asignacion requiere filas ≤ columnas")
+
+    if use_numpy is not False:
+        try:
+            return _hungarian_numpy(cost), "numpy"
+        except ImportError:
+            if use_numpy:
+                raise
+            logger.warning("⚠️ AUTO_ASIGNAR: numpy no instalado (está en requirements.txt), usando el solver en Python puro")
+    return _hungarian_python(cost), "python"
+
+
+# ============================================================
+# MATRIZ DE COSTOS + PLAN
+# ============================================================
+
+def _default_score_fn() -> ScoreFn:
+    from gateway_app.flows.supervision.ticket_assignment import calcular_score_worker
+    return calcular_score_worker
+
+
+def construir_costos(
+    tickets: Sequence[dict],
+    workers: Sequence[dict],
+    *,
+    score_fn: ScoreFn,
+    max_por_worker: int = AUTO_ASIGNAR_MAX_POR_WORKER,
+) -> Tuple[List[List[float]], List[Optional[int]]]:
+    """
+    Returns:
+        (matriz tickets × columnas, columna → índice de worker o None si es "sin asignar")
+    """
+    slots: List[Tuple[int, int]] = []
+    for wi, w in enumerate(workers):
+        capacidad = max(max_por_worker - int(w.get("tickets_asignados") or 0), 0)
+        slots.extend((wi, k) for k in range(min(capacidad, len(tickets))))
+    n_sin_asignar = max(len(tickets) - len(slots), 0)
+
+    cost: List[List[float]] = []
+    for t in tickets:
+        factor = 1 + _peso(t)
+        # score una vez por (ticket, worker); el slot solo suma costo de cola
+        base = [SCORE_MAX - score_fn(w, t) for w in workers]
+        row = [base[wi] + k * COSTO_COLA * factor for wi, k in slots]
+        row.extend([COSTO_SIN_ASIGNAR * factor] * n_sin_asignar)
+        cost.append(row)
+
+    owners: List[Optional[int]] = [wi for wi, _ in slots] + [None] * n_sin_asignar
+    return cost, owners
+
+
+def planificar_asignacion(
+    tickets: Sequence[dict],
+    workers: Sequence[dict],
+    *,
+    score_fn: Optional[ScoreFn] = None,
+    max_por_worker: int = AUTO_ASIGNAR_MAX_POR_WORKER,
+) -> Dict[str, Any]:
+    """
+    Plan óptimo para repartir `tickets` entre `workers` (ya filtrados: en
+    turno y no pausados). No escribe nada en BD.
+
+    Returns:
+        {
+          "por_worker": [{"worker": dict, "tickets": [dict, ...]}, ...],
+          "sin_asignar": [dict, ...],
+          "costo": float, "solver": "numpy" | "python", "ms": float,
+        }
+    """
+    plan: Dict[str, Any] = {"por_worker": [], "sin_asignar": list(tickets), "costo": 0.0, "solver": None, "ms": 0.0}
+    if not tickets or not workers:
+        return plan
+
+    t0 = time.perf_counter()
+    cost, owners = construir_costos(
+        tickets, workers, score_fn=score_fn or _default_score_fn(), max_por_worker=max_por_worker
+    )
+    if not cost[0]:
+        return plan
+
+    columnas, solver = resolver_asignacion(cost)
+
+    asignados: Dict[int, List[dict]] = {}
+    sin_asignar: List[dict] = []
+    total = 0.0
+    for ti, col in enumerate(columnas):
+        total += cost[ti][col]
+        wi = owners[col]
+        if wi is None:
+            sin_asignar.append(tickets[ti])
+        else:
+            asignados.setdefault(wi, []).append(tickets[ti])
+
+    plan.update(
+        por_worker=[{"worker": workers[wi], "tickets": ts} for wi, ts in sorted(asignados.items())],
+        sin_asignar=sin_asignar,
+        costo=total,
+        solver=solver,
+        ms=(time.perf_counter() - t0) * 1000,
+    )
+    logger.info(
+        f"🧮 AUTO_ASIGNAR {len(tickets)}×{len(workers)}: "
+        f"{len(tickets) - len(sin_asignar)} asignados, {len(sin_asignar)} sin asignar, "
+        f"solver={solver} {plan['ms']:.1f}ms"
+    )
+    return plan
+
+
+def _benchmark(n_tickets: int = 200, n_workers: int = 50) -> None:
+    import random
+
+    random.seed(7)
+    areas = ["HOUSEKEEPING", "MANTENIMIENTO", "AREAS_COMUNES"]
+    tickets = [
+        {
+            "id": i,
+            "ubicacion": str(random.randint(101, 950)) if random.random() < 0.7 else "Lobby",
+            "prioridad": random.choice(list(PESO_PRIORIDAD)),
+        }
+        for i in range(n_tickets)
+    ]
+    workers = [
+        {
+            "telefono": str(56900000000 + i),
+            "area": random.choice(areas),
+            "turno_activo": True,
+            "tickets_asignados": random.randint(0, 2),
+        }
+        for i in range(n_workers)
+    ]
+    try:
+        score_fn = _default_score_fn()
+    except ImportError:
+        # Sin dependencias de la app: score sintético con la misma escala
+        def score_fn(w, t):
+            hab = str(t.get("ubicacion", "")).isdigit()
+            match = (w["area"] == "HOUSEKEEPING") == hab
+            return 100 + (200 if match else -50) + 80 - 10 * w["tickets_asignados"]
+
+    cost, _ = construir_costos(tickets, workers, score_fn=score_fn)
+    print(f"matriz {len(cost)}×{len(cost[0])} ({n_tickets} tickets × {n_workers} workers)")
+    for use_numpy in (True, False):
+        try:
+            resolver_asignacion(cost[:2], use_numpy=use_numpy)  # excluir el import de numpy
+        except ImportError:
+            print("numpy: no instalado")
+            continue
+        t0 = time.perf_counter()
+        _, solver = resolver_asignacion(cost, use_numpy=use_numpy)
+        print(f"{solver}: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -304,7 +304,13 @@ def enviar_recordatorios_matutinos():
 
 
 def _scheduler_loop():
-    """Loop principal del scheduler."""
+    """
+    Loop principal del scheduler. ultimo_envio evita re-consultar la BD en
+    el mismo proceso; claim_run garantiza un solo envío por día entre
+    procesos (ej. failover del líder dentro del mismo minuto).
+    """
+    from gateway_app.services.leader_election import claim_run, is_leader
+
     ultimo_envio: Optional[str] = None
     
     logger.info("🕐 DAILY_SCHEDULER: Loop iniciado")
@@ -316,11 +322,13 @@ def _scheduler_loop():
             
             if (ahora.hour == HORA_RECORDATORIO and 
                 ahora.minute == MINUTO_RECORDATORIO and 
-                ultimo_envio != hoy_str):
+                ultimo_envio != hoy_str and
+                is_leader()):
                 
-                logger.info("⏰ DAILY_SCHEDULER: Es hora del recordatorio matutino!")
-                enviar_recordatorios_matutinos()
                 ultimo_envio = hoy_str
+                if claim_run("daily_reminder", hoy_str):
+                    logger.info("⏰ DAILY_SCHEDULER: Es hora del recordatorio matutino!")
+                    enviar_recordatorios_matutinos()
             
             time.sleep(30)
             
@@ -330,7 +338,7 @@ def _scheduler_loop():
 
 
 def start_daily_scheduler() -> None:
-    """Inicia el scheduler de recordatorios diarios."""
+    """Inicia el scheduler de recordatorios diarios (solo en el líder, ver leader_election)."""
     enabled = (os.getenv("DAILY_SCHEDULER_ENABLED", "true") or "").lower() == "true"
     
     if not enabled:
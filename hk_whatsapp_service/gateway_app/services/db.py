@@ -142,16 +142,21 @@ def execute(query, params=(), commit=True):
         query: Query SQL con placeholders ?
         params: Parámetros para la query
         commit: Si hacer commit automáticamente (default: True)
+
+    Returns:
+        Cantidad de filas afectadas (rowcount)
     """
     conn = db()
     try:
         cur = _execute(conn, query, params)
+        rowcount = cur.rowcount
         
         if USE_PG:
             cur.close()
         
         if commit:
             conn.commit()
+        return rowcount
     finally:
         with suppress(Exception):
             conn.close()
@@ -0,0 +1,255 @@
+# gateway_app/services/hotel_topology.py
+"""
+Topología del hotel en memoria: dónde queda cada habitación / área común.
+
+Tabla public.hotel_topology (ver migrations.create_hotel_topology_table):
+
+    ubicacion   tipo         piso  ala     zona
+    '812'       HABITACION   8     NORTE   TORRE_A
+    'Lobby'     AREA         1     NULL    RECEPCION
+
+Se carga una vez por (org_id, hotel_id) y por TTL (HOTEL_TOPOLOGY_TTL_SECONDS,
+default 600) en dos dicts:
+
+    habitaciones: '812'            → Lugar   (validación O(1) en extraer_habitacion)
+    areas:        'pasillo piso 2' → Lugar   (nombre normalizado)
+
+Sin filas para el hotel (o si la tabla no existe) se infiere lo mínimo:
+- habitación de 3-4 dígitos → piso = número // 100 ("812" → 8, "1503" → 15)
+- área con "piso N" en el texto ("Ascensor Piso 3") → piso N
+y cualquier número de 3-4 dígitos sigue siendo habitación válida.
+
+distancia() compara dos Lugar en "pisos": misma ubicación 0, misma zona 0.5,
+si no |Δpiso| (+1 si cambia de ala). calcular_score_worker la convierte en
+un bonus de proximidad respecto de la última ubicación del worker.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from gateway_app.services.db import fetchall, using_pg
+from gateway_app.services.name_index import normalize_name
+
+logger = logging.getLogger(__name__)
+
+HOTEL_TOPOLOGY_TTL_SECONDS = float(os.getenv("HOTEL_TOPOLOGY_TTL_SECONDS", "600"))
+
+# Bonus de proximidad en calcular_score_worker: máximo si está en la misma
+# ubicación/zona, baja PROXIMIDAD_POR_PISO por piso de distancia.
+PROXIMIDAD_MAX_BONUS = int(os.getenv("PROXIMIDAD_MAX_BONUS", "40"))
+PROXIMIDAD_POR_PISO = int(os.getenv("PROXIMIDAD_POR_PISO", "8"))
+
+_COSTO_CAMBIO_ALA = 1
+_COSTO_MISMA_ZONA = 0.5
+
+_RE_HABITACION = re.compile(r"^\d{3,4}$")
+_RE_PISO = re.compile(r"\bpiso\s*(\d{1,2})\b")
+
+
+class Lugar(NamedTuple):
+    clave: str
+    tipo: str  # HABITACION | AREA
+    piso: Optional[int] = None
+    ala: Optional[str] = None
+    zona: Optional[str] = None
+
+
+def _clave_habitacion(ubicacion: str) -> Optional[str]:
+    """'0812' / ' 812 ' → '812'; None si no es un número de 3-4 dígitos."""
+    s = str(ubicacion or "").strip()
+    if not _RE_HABITACION.match(s):
+        return None
+    return str(int(s))
+
+
+def _inferir(ubicacion: str) -> Optional[Lugar]:
+    """Lugar aproximado cuando la ubicación no está en la tabla."""
+    hab = _clave_habitacion(ubicacion)
+    if hab:
+        return Lugar(hab, "HABITACION", int(hab) // 100)
+
+    nombre = normalize_name(ubicacion)
+    if not nombre:
+        return None
+    m = _RE_PISO.search(nombre)
+    return Lugar(nombre, "AREA", int(m.group(1)) if m else None)
+
+
+class _Topologia:
+    """Topología de un (org_id, hotel_id)."""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.loaded_at = time.monotonic()
+        self.habitaciones: Dict[str, Lugar] = {}
+        self.areas: Dict[str, Lugar] = {}
+        # ubicación cruda → Lugar (el scoring resuelve las mismas una y otra vez)
+        self._resueltas: Dict[str, Optional[Lugar]] = {}
+
+        for r in rows:
+            piso = r.get("piso")
+            ala = (r.get("ala") or "").strip().upper() or None
+            zona = (r.get("zona") or "").strip().upper() or None
+            hab = _clave_habitacion(r.get("ubicacion"))
+            if hab and (r.get("tipo") or "HABITACION").upper() == "HABITACION":
+                self.habitaciones[hab] = Lugar(hab, "HABITACION", piso, ala, zona)
+                continue
+            nombre = normalize_name(r.get("ubicacion") or "")
+            if nombre:
+                self.areas[nombre] = Lugar(nombre, "AREA", piso, ala, zona)
+
+    def ubicar(self, ubicacion: Any) -> Optional[Lugar]:
+        raw = str(ubicacion or "").strip()
+        if raw in self._resueltas:
+            return self._resueltas[raw]
+
+        hab = _clave_habitacion(raw)
+        if hab:
+            lugar = self.habitaciones.get(hab) or _inferir(hab)
+        else:
+            lugar = self.areas.get(normalize_name(raw)) or _inferir(raw)
+
+        if len(self._resueltas) < 10_000:
+            self._resueltas[raw] = lugar
+        return lugar
+
+
+class HotelTopology:
+    """Cache de topología por scope con TTL (ver docstring del módulo)."""
+
+    def __init__(self, loader: Callable[[int, int], List[Dict[str, Any]]]):
+        self._loader = loader
+        self._snapshots: Dict[Tuple[int, int], _Topologia] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def _snapshot(self, org_id: int, hotel_id: int) -> _Topologia:
+        key = (org_id, hotel_id)
+        snap = self._snapshots.get(key)
+        if snap is not None and time.monotonic() - snap.loaded_at < HOTEL_TOPOLOGY_TTL_SECONDS:
+            return snap
+
+        with self._lock:
+            snap = self._snapshots.get(key)
+            if snap is not None and time.monotonic() - snap.loaded_at < HOTEL_TOPOLOGY_TTL_SECONDS:
+                return snap
+
+            generation = self._generation
+            try:
+                rows = self._loader(org_id, hotel_id)
+            except Exception as e:
+                # Se cachea vacía igual: sin topología se infiere por número (ver _inferir)
+                logger.warning(f"⚠️ HOTEL_TOPOLOGY no se pudo cargar, se infiere por número: {e}")
+                rows = []
+            snap = _Topologia(rows)
+            if generation == self._generation:
+                self._snapshots[key] = snap
+            logger.info(
+                f"🗺️ HOTEL_TOPOLOGY cargada org={org_id} hotel={hotel_id}: "
+                f"{len(snap.habitaciones)} habitaciones, {len(snap.areas)} áreas"
+            )
+            return snap
+
+    def invalidate(self, reason: str = "") -> None:
+        self._generation += 1
+        self._snapshots = {}
+        logger.info(f"🗺️ HOTEL_TOPOLOGY invalidada ({reason or 'manual'})")
+
+    def es_habitacion(self, numero: str, org_id: int, hotel_id: int) -> bool:
+        hab = _clave_habitacion(numero)
+        if not hab:
+            return False
+        habitaciones = self._snapshot(org_id, hotel_id).habitaciones
+        # Sin habitaciones cargadas: cualquier 3-4 dígitos (comportamiento previo)
+        return not habitaciones or hab in habitaciones
+
+    def ubicar(self, ubicacion: Any, org_id: int, hotel_id: int) -> Optional[Lugar]:
+        return self._snapshot(org_id, hotel_id).ubicar(ubicacion)
+
+
+def distancia(a: Optional[Lugar], b: Optional[Lugar]) -> Optional[float]:
+    """Distancia aproximada en pisos; None si no hay datos para compararlos."""
+    if a is None or b is None:
+        return None
+    if a.clave == b.clave:
+        return 0.0
+    if a.zona and a.zona == b.zona and (a.piso is None or b.piso is None or a.piso == b.piso):
+        return _COSTO_MISMA_ZONA
+    if a.piso is None or b.piso is None:
+        return None
+
+    d = float(abs(a.piso - b.piso))
+    if a.ala and b.ala and a.ala != b.ala:
+        d += _COSTO_CAMBIO_ALA
+    return d
+
+
+# ============================================================
+# Instancia del proceso + API de módulo
+# ============================================================
+
+def cargar_topologia(org_id: int, hotel_id: int) -> List[Dict[str, Any]]:
+    """Filas de hotel_topology del hotel. Es el loader del cache: si falla, lanza."""
+    table = "public.hotel_topology" if using_pg() else "hotel_topology"
+    return fetchall(
+        f"""
+        SELECT ubicacion, tipo, piso, ala, zona
+        FROM {table}
+        WHERE org_id = ? AND hotel_id = ?
+        """,
+        [org_id, hotel_id],
+    )
+
+
+_topologia = HotelTopology(cargar_topologia)
+
+
+def _scope(org_id: Optional[int], hotel_id: Optional[int]) -> Optional[Tuple[int, int]]:
+    if org_id is not None and hotel_id is not None:
+        return int(org_id), int(hotel_id)
+    try:
+        return int(os.getenv("ORG_ID_DEFAULT", "")), int(os.getenv("HOTEL_ID_DEFAULT", ""))
+    except ValueError:
+        return None
+
+
+def invalidar_topologia(motivo: str = "") -> None:
+    _topologia.invalidate(motivo)
+
+
+def es_habitacion_valida(numero: str, org_id: Optional[int] = None, hotel_id: Optional[int] = None) -> bool:
+    """¿Existe la habitación en este hotel? (O(1); sin topología: 3-4 dígitos)."""
+    scope = _scope(org_id, hotel_id)
+    if scope is None:
+        return _clave_habitacion(numero) is not None
+    return _topologia.es_habitacion(numero, *scope)
+
+
+def ubicar(ubicacion: Any, org_id: Optional[int] = None, hotel_id: Optional[int] = None) -> Optional[Lugar]:
+    scope = _scope(org_id, hotel_id)
+    if scope is None:
+        return _inferir(str(ubicacion or ""))
+    return _topologia.ubicar(ubicacion, *scope)
+
+
+def bonus_proximidad(
+    desde: Any,
+    hacia: Any,
+    org_id: Optional[int] = None,
+    hotel_id: Optional[int] = None,
+) -> int:
+    """
+    Puntos extra por cercanía entre la última ubicación del worker (desde) y
+    la del ticket (hacia): PROXIMIDAD_MAX_BONUS en el mismo lugar, 0 lejos o
+    sin datos.
+    """
+    if not desde or not hacia:
+        return 0
+    d = distancia(ubicar(desde, org_id, hotel_id), ubicar(hacia, org_id, hotel_id))
+    if d is None:
+        return 0
+    return max(0, round(PROXIMIDAD_MAX_BONUS - d * PROXIMIDAD_POR_PISO))
@@ -0,0 +1,384 @@
+# gateway_app/services/leader_election.py
+"""
+Elección de líder para los jobs de fondo (ticket_watch, daily_scheduler...).
+
+create_app() corre en cada worker de gunicorn y en cada instancia: sin esto
+cada proceso levantaba su propio watcher y su propio scheduler, repitiendo
+el polling y mandando dos veces los recordatorios matutinos.
+
+Postgres: advisory lock de SESIÓN sobre una conexión dedicada (autocommit).
+- Cada LEADER_HEARTBEAT_SECONDS (default 10) los seguidores intentan
+  pg_try_advisory_lock; el líder verifica en pg_locks que su backend sigue
+  teniendo el lock y renueva su fila en public.background_leader.
+- Si el líder muere o pierde la conexión, Postgres suelta el lock y otro
+  proceso lo toma en el siguiente heartbeat (failover). Keepalives TCP +
+  idle_session_timeout (PG 14+) acotan el caso de un líder colgado.
+- Si el heartbeat falla o pasa LEADER_LEASE_SECONDS (default 30) sin uno
+  exitoso, el proceso deja de considerarse líder aunque no lo sepa aún.
+- El lock es por (ORG_ID_DEFAULT, HOTEL_ID_DEFAULT): dos despliegues de
+  hoteles distintos sobre la misma BD tienen cada uno su líder.
+- Con pooler en modo transacción los locks de sesión no sirven: usar
+  LEADER_DATABASE_URL con la conexión directa.
+
+SQLite: flock sobre DATABASE_PATH + '.leader' (mismo host → entre workers
+de gunicorn alcanza); el archivo guarda la identidad del líder.
+
+LEADER_ELECTION_ENABLED=false: todos los procesos son líderes (como antes).
+
+Uso:
+    run_on_leader("ticket_watch", start_ticket_watch)  # arranca al ganar el liderazgo
+    is_leader()  # los loops lo consultan: un thread no se puede detener,
+                 # así que si se pierde el liderazgo deben pausar su trabajo
+    claim_run("daily_reminder", "2026-10-19")  # True una sola vez por clave,
+                 # entre todos los procesos (tabla background_job_runs)
+
+is_leader() no alcanza para jobs "una vez al día": si el líder muere justo
+después de enviar, el nuevo líder no sabe que ya se hizo. claim_run() lo
+registra en la BD antes de correr el job.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from gateway_app.services.db import DATABASE_URL, execute, fetchone, using_pg
+
+logger = logging.getLogger(__name__)
+
+LEADER_HEARTBEAT_SECONDS = float(os.getenv("LEADER_HEARTBEAT_SECONDS", "10"))
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "30"))
+LEADER_MAX_BACKOFF_SECONDS = float(os.getenv("LEADER_MAX_BACKOFF_SECONDS", "60"))
+
+IDENTITY = f"{socket.gethostname()}:{os.getpid()}"
+
+_state_lock = threading.Lock()
+_leader = False
+_last_ok = 0.0  # monotonic del último heartbeat exitoso siendo líder
+_since: Optional[float] = None  # epoch desde que este proceso es líder
+_mode = "off"  # off | local | postgres | sqlite
+_jobs: List[Tuple[str, Callable[[], None]]] = []
+_started_jobs: set = set()
+_thread: Optional[threading.Thread] = None
+_start_lock = threading.Lock()
+
+
+def _enabled() -> bool:
+    return (os.getenv("LEADER_ELECTION_ENABLED", "true") or "").lower() == "true"
+
+
+def _scope_name() -> str:
+    return f"hk_background:{os.getenv('ORG_ID_DEFAULT', '')}:{os.getenv('HOTEL_ID_DEFAULT', '')}"
+
+
+def _lock_key() -> int:
+    """Clave del advisory lock (estable entre procesos; crc32 cabe en bigint)."""
+    return zlib.crc32(_scope_name().encode("utf-8"))
+
+
+# ============================================================
+# Estado local
+# ============================================================
+
+def is_leader() -> bool:
+    """¿Este proceso debe correr los jobs de fondo ahora?"""
+    if _mode == "local":
+        return True
+    return _leader and time.monotonic() - _last_ok < LEADER_LEASE_SECONDS
+
+
+def _become_leader() -> None:
+    global _leader, _last_ok, _since
+    with _state_lock:
+        was = _leader
+        _leader, _last_ok = True, time.monotonic()
+        if not was:
+            _since = time.time()
+    if not was:
+        logger.info(f"👑 LEADER: {IDENTITY} es el líder ({_mode})")
+        _start_pending_jobs()
+
+
+def _heartbeat_ok() -> None:
+    global _last_ok
+    _last_ok = time.monotonic()
+
+
+def _lose_leadership(reason: str) -> None:
+    global _leader, _since
+    with _state_lock:
+        was = _leader
+        _leader, _since = False, None
+    if was:
+        logger.warning(f"⚠️ LEADER: {IDENTITY} dejó de ser líder ({reason})")
+
+
+def run_on_leader(name: str, start: Callable[[], None]) -> None:
+    """Registra un job de fondo: `start()` se llama una vez, al ser (o si ya es) líder."""
+    with _state_lock:
+        _jobs.append((name, start))
+    if is_leader():
+        _start_pending_jobs()
+
+
+def _start_pending_jobs() -> None:
+    with _state_lock:
+        pending = [(n, s) for n, s in _jobs if n not in _started_jobs]
+        _started_jobs.update(n for n, _ in pending)
+    for name, start in pending:
+        try:
+            start()
+        except Exception as e:
+            logger.error(f"❌ LEADER: error iniciando job '{name}': {e}")
+
+
+def _job_runs_table() -> str:
+    return "public.background_job_runs" if using_pg() else "background_job_runs"
+
+
+def claim_run(job: str, run_key: str) -> bool:
+    """
+    Reserva la ejecución `run_key` (ej. la fecha) del job para este proceso.
+    True solo para el primero que la reserva, en cualquier instancia; el job
+    queda registrado aunque después falle (no se reintenta solo).
+    """
+    name = f"{job}:{_scope_name()}"
+    try:
+        inserted = execute(
+            f"""
+            INSERT INTO {_job_runs_table()} (name, run_key, holder)
+            VALUES (?, ?, ?)
+            ON CONFLICT (name, run_key) DO NOTHING
+            """,
+            [name, run_key, IDENTITY],
+            commit=True,
+        )
+    except Exception as e:
+        # Sin BD no hay forma de coordinar: correr (como antes) antes que saltarse el job
+        logger.warning(f"⚠️ LEADER: no se pudo reservar {name}/{run_key} ({e}), se corre igual")
+        return True
+    if not inserted:
+        logger.info(f"👑 LEADER: {name}/{run_key} ya lo corrió otro proceso")
+    return bool(inserted)
+
+
+# ============================================================
+# Postgres: advisory lock de sesión
+# ============================================================
+
+def _leader_table() -> str:
+    return "public.background_leader" if using_pg() else "background_leader"
+
+
+def _pg_connect():
+    import psycopg
+
+    conn = psycopg.connect(
+        os.getenv("LEADER_DATABASE_URL") or DATABASE_URL,
+        autocommit=True,
+        application_name=f"hk-leader:{IDENTITY}"[:63],
+        keepalives=1,
+        keepalives_idle=int(LEADER_HEARTBEAT_SECONDS),
+        keepalives_interval=int(LEADER_HEARTBEAT_SECONDS),
+        keepalives_count=3,
+    )
+    # Si el proceso se cuelga, el servidor cierra la sesión y suelta el lock (PG 14+)
+    try:
+        conn.execute(f"SET idle_session_timeout = {int(LEADER_LEASE_SECONDS * 1000)}")
+    except Exception as e:
+        logger.debug(f"LEADER sin idle_session_timeout: {e}")
+    return conn
+
+
+def _pg_holds_lock(conn, key: int) -> bool:
+    row = conn.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_locks
+            WHERE locktype = 'advisory'
+              AND pid = pg_backend_pid()
+              AND granted
+              AND objsubid = 1
+              AND ((classid::bigint << 32) | objid::bigint) = %s
+        )
+        """,
+        (key,),
+    ).fetchone()
+    return bool(row and row[0])
+
+
+def _pg_write_heartbeat(conn) -> None:
+    conn.execute(
+        f"""
+        INSERT INTO {_leader_table()} (name, holder, acquired_at, heartbeat_at)
+        VALUES (%s, %s, NOW(), NOW())
+        ON CONFLICT (name) DO UPDATE SET
+            holder = EXCLUDED.holder,
+            acquired_at = CASE
+                WHEN {_leader_table()}.holder = EXCLUDED.holder THEN {_leader_table()}.acquired_at
+                ELSE EXCLUDED.acquired_at
+            END,
+            heartbeat_at = NOW()
+        """,
+        (_scope_name(), IDENTITY),
+    )
+
+
+def _pg_loop() -> None:
+    key = _lock_key()
+    backoff = 1.0
+    heartbeat_warned = False
+    while True:
+        conn = None
+        try:
+            conn = _pg_connect()
+            backoff = 1.0
+            while True:
+                if _leader:
+                    if not _pg_holds_lock(conn, key):
+                        raise RuntimeError("el backend ya no tiene el advisory lock")
+                else:
+                    row = conn.execute("SELECT pg_try_advisory_lock(%s)", (key,)).fetchone()
+                    if row and row[0]:
+                        _become_leader()
+
+                if _leader:
+                    _heartbeat_ok()
+                    try:
+                        _pg_write_heartbeat(conn)
+                        heartbeat_warned = False
+                    except Exception as e:
+                        # Sin la tabla igual hay líder; solo /health no lo ve desde otros procesos
+                        if not heartbeat_warned:
+                            logger.warning(f"⚠️ LEADER: no se pudo registrar el heartbeat: {e}")
+                            heartbeat_warned = True
+
+                time.sleep(LEADER_HEARTBEAT_SECONDS)
+
+        except Exception as e:
+            _lose_leadership(str(e))
+            logger.warning(f"⚠️ LEADER desconectado ({e}); reintento en {backoff:.0f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, LEADER_MAX_BACKOFF_SECONDS)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()  # cerrar la sesión suelta el lock
+                except Exception:
+                    pass
+
+
+# ============================================================
+# SQLite: flock sobre un archivo junto a la BD
+# ============================================================
+
+def _lock_path() -> str:
+    return os.getenv("DATABASE_PATH", "./gateway.db") + ".leader"
+
+
+def _file_loop() -> None:
+    import fcntl
+
+    path = _lock_path()
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    while True:
+        try:
+            if not _leader:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    time.sleep(LEADER_HEARTBEAT_SECONDS)
+                    continue
+                os.ftruncate(fd, 0)
+                os.pwrite(fd, f"{IDENTITY}\n{time.time():.0f}\n".encode("utf-8"), 0)
+                _become_leader()
+            # El flock se mantiene mientras el fd siga abierto (se suelta al morir el proceso)
+            _heartbeat_ok()
+        except Exception as e:
+            _lose_leadership(str(e))
+            logger.warning(f"⚠️ LEADER error con {path}: {e}")
+        time.sleep(LEADER_HEARTBEAT_SECONDS)
+
+
+# ============================================================
+# Arranque + estado para /health
+# ============================================================
+
+def start_leader_election() -> None:
+    """Inicia el thread de elección (o marca líder local si está desactivada)."""
+    global _thread, _mode
+
+    with _start_lock:
+        if _thread is not None and _thread.is_alive():
+            return
+
+        if not _enabled():
+            _mode = "local"
+            logger.info("👑 LEADER: elección desactivada (LEADER_ELECTION_ENABLED=false), todos los procesos son líderes")
+            _start_pending_jobs()
+            return
+
+        if using_pg():
+            _mode, target = "postgres", _pg_loop
+        else:
+            try:
+                import fcntl  # noqa: F401
+            except ImportError:
+                _mode = "local"
+                logger.info("👑 LEADER: sin fcntl (no POSIX), este proceso corre los jobs")
+                _start_pending_jobs()
+                return
+            _mode, target = "sqlite", _file_loop
+
+        _thread = threading.Thread(target=target, daemon=True, name="leader_election")
+        _thread.start()
+    logger.info(f"👑 LEADER: elección iniciada mode={_mode} identity={IDENTITY} scope={_scope_name()}")
+
+
+def _current_leader() -> Dict[str, Any]:
+    """Quién es el líder según la BD / archivo (visto desde cualquier proceso)."""
+    if _mode == "postgres":
+        row = fetchone(
+            f"""
+            SELECT holder, acquired_at, heartbeat_at,
+                   EXTRACT(EPOCH FROM (NOW() - heartbeat_at)) AS age
+            FROM {_leader_table()}
+            WHERE name = ?
+            """,
+            [_scope_name()],
+        )
+        if not row:
+            return {}
+        age = float(row.get("age") or 0)
+        return {
+            "identity": row.get("holder"),
+            "acquired_at": str(row.get("acquired_at")),
+            "heartbeat_age_seconds": round(age, 1),
+            "stale": age > LEADER_LEASE_SECONDS,
+        }
+    if _mode == "sqlite":
+        with open(_lock_path(), encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        return {"identity": lines[0] or None} if lines else {}
+    return {"identity": IDENTITY}
+
+
+def leader_status() -> Dict[str, Any]:
+    """Para /health: rol de este proceso y líder actual."""
+    status: Dict[str, Any] = {
+        "mode": _mode,
+        "identity": IDENTITY,
+        "is_leader": is_leader(),
+        "leader_since": _since,
+        "jobs": sorted(_started_jobs),
+    }
+    try:
+        status["leader"] = _current_leader()
+    except Exception as e:
+        status["leader"] = {}
+        status["error"] = str(e)
+    return status
@@ -0,0 +1,243 @@
+# gateway_app/services/media_jobs.py
+"""
+Cola de procesamiento de medios en segundo plano.
+
+Flujo:
+1. El webhook crea el ticket y registra un ticket_media PENDIENTE (sin storage_url)
+   → responde al usuario de inmediato.
+2. Un worker de esta cola descarga de WhatsApp, optimiza, sube a Storage
+   y completa storage_url (estado LISTO).
+
+Idempotencia por whatsapp_media_id:
+- El registro es único por (ticket_id, whatsapp_media_id).
+- Cada job se "reclama" con un UPDATE condicional → un solo worker lo procesa.
+- El objeto en Storage tiene nombre determinístico ({media_id}.{ext}) + x-upsert,
+  así un reintento sobreescribe en vez de duplicar.
+- Si el mismo whatsapp_media_id (o el mismo contenido, por SHA-256) ya está
+  almacenado en otra fila, se reutiliza su URL.
+- Videos grandes suben en streaming resumible; el token de la subida queda en ticket_media.upload_url
+  y el reintento continúa desde el último chunk confirmado.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+from typing import Any, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+MEDIA_JOB_MAX_ATTEMPTS = int(os.getenv("MEDIA_JOB_MAX_ATTEMPTS", "5"))
+MEDIA_JOB_BACKOFF_SECONDS = float(os.getenv("MEDIA_JOB_BACKOFF_SECONDS", "5"))
+MEDIA_JOB_STALE_MINUTES = int(os.getenv("MEDIA_JOB_STALE_MINUTES", "10"))
+
+# Items: ("media", media_db_id) | ("rendition", (media_db_id, kind))
+_queue: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+_started = False
+_start_lock = threading.Lock()
+
+# Renditions ya encoladas (evita encolar la misma N veces si varios listados la piden)
+_renditions_en_cola: Set[Tuple[int, str]] = set()
+_renditions_lock = threading.Lock()
+
+
+def _storage_filename(media_id: str) -> str:
+    """Nombre determinístico en Storage (sin extensión) para que los reintentos sean upserts."""
+    return "".join(c for c in (media_id or "") if c.isalnum() or c in "-_") or "media"
+
+
+def enqueue_media_job(
+    ticket_id: int,
+    media_id: str,
+    media_type: str,
+    uploaded_by: str = ""
+) -> Optional[int]:
+    """
+    Registra el media como PENDIENTE y lo encola para procesamiento.
+
+    Returns:
+        ID del registro en ticket_media, o None si no se pudo registrar
+    """
+    from gateway_app.services.tickets_db import registrar_media_pendiente
+
+    media_db_id = registrar_media_pendiente(
+        ticket_id=ticket_id,
+        media_type=media_type,
+        whatsapp_media_id=media_id,
+        uploaded_by=uploaded_by
+    )
+
+    if not media_db_id:
+        logger.error(f"❌ MEDIA_JOBS no se pudo registrar media {media_id} en ticket #{ticket_id}")
+        return None
+
+    _ensure_workers()
+    _queue.put(("media", media_db_id))
+    logger.info(f"📥 MEDIA_JOBS encolado media #{media_db_id} (ticket #{ticket_id}, {media_type})")
+    return media_db_id
+
+
+def enqueue_rendition_job(media_db_id: int, kind: str) -> bool:
+    """
+    Encola la generación de una rendition (thumb/preview/full).
+    
+    Returns:
+        True si se encoló, False si ya estaba en cola
+    """
+    key = (int(media_db_id), kind)
+    with _renditions_lock:
+        if key in _renditions_en_cola:
+            return False
+        _renditions_en_cola.add(key)
+
+    _ensure_workers()
+    _queue.put(("rendition", key))
+    logger.info(f"📥 MEDIA_JOBS encolada rendition {kind} de media #{media_db_id}")
+    return True
+
+
+def _process_rendition_job(media_db_id: int, kind: str) -> None:
+    from gateway_app.services.media_renditions import generate_rendition
+
+    try:
+        generate_rendition(media_db_id, kind)
+    finally:
+        with _renditions_lock:
+            _renditions_en_cola.discard((media_db_id, kind))
+
+
+def _process_job(media_db_id: int) -> None:
+    """Procesa un media pendiente. Reencola con backoff si falla."""
+    from gateway_app.services.tickets_db import (
+        reclamar_media_pendiente,
+        completar_media_pendiente,
+        marcar_media_error,
+        obtener_media_listo_por_whatsapp_id,
+        guardar_upload_url_media,
+    )
+    from gateway_app.services.media_storage import download_optimize_upload
+
+    row = reclamar_media_pendiente(media_db_id, stale_minutes=MEDIA_JOB_STALE_MINUTES)
+    if not row:
+        # Otro worker lo tiene o ya está LISTO
+        return
+
+    ticket_id = row.get("ticket_id")
+    media_id = row.get("whatsapp_media_id") or ""
+    media_type = row.get("media_type") or "image"
+
+    try:
+        # ¿Ya se subió este mismo media antes? Reutilizar
+        existente = obtener_media_listo_por_whatsapp_id(media_id)
+        if existente:
+            completar_media_pendiente(
+                media_db_id,
+                storage_url=existente["storage_url"],
+                mime_type=existente.get("mime_type") or "",
+                file_size_bytes=existente.get("file_size_bytes") or 0,
+                original_hash=existente.get("original_hash"),
+                content_hash=existente.get("content_hash")
+            )
+            logger.info(f"♻️ MEDIA_JOBS media #{media_db_id} reutiliza upload existente")
+            return
+
+        result = download_optimize_upload(
+            media_id,
+            media_type,
+            folder=f"tickets/{ticket_id}",
+            filename=_storage_filename(media_id),
+            resume_url=row.get("upload_url"),
+            on_resume_url=lambda url: guardar_upload_url_media(media_db_id, url)
+        )
+
+        if not result["success"]:
+            raise RuntimeError(result.get("error") or "error descargando media")
+        if not result.get("storage_url"):
+            raise RuntimeError(result.get("upload_error") or "error subiendo al storage")
+
+        completar_media_pendiente(
+            media_db_id,
+            storage_url=result["storage_url"],
+            mime_type=result["mime_type"],
+            file_size_bytes=result["size"],
+            original_hash=result.get("original_hash"),
+            content_hash=result.get("content_hash")
+        )
+        logger.info(f"✅ MEDIA_JOBS media #{media_db_id} listo (ticket #{ticket_id})")
+
+    except Exception as e:
+        intentos = marcar_media_error(media_db_id, str(e))
+        if intentos and intentos < MEDIA_JOB_MAX_ATTEMPTS:
+            delay = MEDIA_JOB_BACKOFF_SECONDS * (2 ** (intentos - 1))
+            logger.warning(
+                f"⚠️ MEDIA_JOBS media #{media_db_id} falló (intento {intentos}/{MEDIA_JOB_MAX_ATTEMPTS}), "
+                f"reintento en {delay:.0f}s: {e}"
+            )
+            _requeue_later(media_db_id, delay)
+        else:
+            logger.error(f"❌ MEDIA_JOBS media #{media_db_id} descartado tras {intentos} intentos: {e}")
+
+
+def _requeue_later(media_db_id: int, delay: float) -> None:
+    timer = threading.Timer(delay, _queue.put, args=(("media", media_db_id),))
+    timer.daemon = True
+    timer.start()
+
+
+def _worker_loop() -> None:
+    while True:
+        job_type, payload = _queue.get()
+        try:
+            if job_type == "rendition":
+                _process_rendition_job(*payload)
+            else:
+                _process_job(payload)
+        except Exception:
+            logger.exception(f"MEDIA_JOBS worker error procesando {job_type} {payload}")
+        finally:
+            _queue.task_done()
+
+
+def _recover_pending() -> None:
+    """Reencola medios que quedaron pendientes (reinicio / deploy)."""
+    from gateway_app.services.tickets_db import obtener_media_pendientes
+
+    pendientes = obtener_media_pendientes(MEDIA_JOB_MAX_ATTEMPTS, limit=200)
+    for row in pendientes:
+        _queue.put(("media", row["id"]))
+
+    if pendientes:
+        logger.info(f"🔁 MEDIA_JOBS recuperados {len(pendientes)} medios pendientes")
+
+
+def _ensure_workers() -> bool:
+    global _started
+    with _start_lock:
+        if _started:
+            return False
+        for i in range(max(1, MEDIA_WORKERS)):
+            th = threading.Thread(target=_worker_loop, daemon=True, name=f"media_jobs_{i}")
+            th.start()
+        _started = True
+        return True
+
+
+def start_media_workers() -> None:
+    """
+    Inicia los workers de medios y recupera pendientes de ejecuciones anteriores.
+    """
+    enabled = (os.getenv("MEDIA_JOBS_ENABLED", "true") or "").lower() == "true"
+    if not enabled:
+        logger.info("MEDIA_JOBS not started (MEDIA_JOBS_ENABLED=false)")
+        return
+
+    if _ensure_workers():
+        logger.info(f"MEDIA_JOBS {MEDIA_WORKERS} worker thread(s) started")
+
+    try:
+        _recover_pending()
+    except Exception as e:
+        logger.warning(f"⚠️ MEDIA_JOBS no se pudo recuperar pendientes: {e}")
+
@@ -0,0 +1,116 @@
+# gateway_app/services/media_renditions.py
+"""
+Renditions de imágenes de tickets: thumb / preview / full.
+
+- full: el JPEG optimizado (1280px) que ya está en ticket_media.storage_url.
+- preview / thumb: versiones reducidas para listados y previews de supervisor.
+
+Se generan la primera vez que alguien las pide, en el pool de media_jobs,
+y quedan cacheadas en Storage con key determinística
+renditions/{content_hash}/{kind}.jpg + registradas en ticket_media_renditions.
+Mientras no existan, get_rendition_url retorna None y el caller usa su fallback
+(p.ej. el media_id de WhatsApp) — un listado nunca descarga la imagen completa.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+RENDITION_SIZES = {
+    "thumb": 160,
+    "preview": 480,
+}
+RENDITION_KINDS = ("thumb", "preview", "full")
+
+
+def get_rendition_url(media_db_id: int, kind: str = "thumb") -> Optional[str]:
+    """
+    URL de la rendition pedida. Si aún no existe, encola su generación y retorna None.
+    """
+    from gateway_app.services.tickets_db import obtener_rendition
+    from gateway_app.services.media_jobs import enqueue_rendition_job
+
+    if kind not in RENDITION_KINDS:
+        raise ValueError(f"Rendition desconocida: {kind}")
+
+    rendition = obtener_rendition(media_db_id, kind)
+    if rendition:
+        return rendition["storage_url"]
+
+    enqueue_rendition_job(media_db_id, kind)
+    return None
+
+
+def get_ticket_preview_url(ticket_id: int, kind: str = "thumb") -> Optional[str]:
+    """
+    Preview liviano del primer media de un ticket (para listados de supervisor).
+    Retorna None si el ticket no tiene imagen o la rendition aún se está generando.
+    """
+    from gateway_app.services.tickets_db import obtener_primer_media_de_ticket
+
+    media = obtener_primer_media_de_ticket(ticket_id)
+    if not media or media.get("media_type") != "image":
+        return None
+
+    url = media.get(f"{kind}_url")
+    if url:
+        return url
+
+    if not media.get("storage_url"):
+        return None
+
+    return get_rendition_url(media["id"], kind)
+
+
+def _rendition_folder(media: dict) -> str:
+    key = media.get("content_hash") or f"m{media['id']}"
+    return f"renditions/{key}"
+
+
+def generate_rendition(media_db_id: int, kind: str) -> Optional[str]:
+    """
+    Genera, sube y registra una rendition. Idempotente: si ya existe no hace nada.
+    Se ejecuta dentro de un worker de media_jobs.
+
+    Returns:
+        URL de la rendition o None si no se pudo generar
+    """
+    from gateway_app.services.tickets_db import obtener_media_por_id, obtener_rendition, guardar_rendition
+    from gateway_app.services.media_storage import download_stored_media, resize_image, upload_to_storage
+
+    existente = obtener_rendition(media_db_id, kind)
+    if existente:
+        return existente["storage_url"]
+
+    media = obtener_media_por_id(media_db_id)
+    if not media or media.get("media_type") != "image" or not media.get("storage_url"):
+        logger.info(f"MEDIA_RENDITIONS media #{media_db_id} sin imagen almacenada, se omite {kind}")
+        return None
+
+    if kind == "full":
+        # El almacenado ya es la versión full optimizada
+        guardar_rendition(
+            media_db_id, "full", media["storage_url"],
+            None, None, media.get("file_size_bytes")
+        )
+        return media["storage_url"]
+
+    source = download_stored_media(media["storage_url"])
+    if not source:
+        return None
+
+    resized = resize_image(source, RENDITION_SIZES[kind])
+    if not resized:
+        return None
+
+    data, width, height = resized
+    upload = upload_to_storage(data, "image/jpeg", folder=_rendition_folder(media), filename=f"{kind}.jpg")
+    if not upload["success"]:
+        logger.warning(f"⚠️ MEDIA_RENDITIONS no se pudo subir {kind} de media #{media_db_id}")
+        return None
+
+    guardar_rendition(media_db_id, kind, upload["url"], width, height, len(data))
+    logger.info(f"✅ MEDIA_RENDITIONS {kind} {width}x{height} de media #{media_db_id}")
+    return upload["url"]
@@ -1,16 +1,19 @@
 # gateway_app/services/media_storage.py
 """
 Servicio de almacenamiento de medios.
-Descarga archivos de WhatsApp Cloud API, los OPTIMIZA, y los sube a Supabase Storage.
+Descarga archivos de WhatsApp Cloud API, los OPTIMIZA, y los sube al storage
+configurado (Supabase / local / S3, ver storage_backends.py).
 """
 
+import hashlib
 import logging
 import requests
 import uuid
 import io
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 from gateway_app.config import Config
+from gateway_app.services.storage_backends import StorageError, get_storage_backend
 
 logger = logging.getLogger(__name__)
 
@@ -22,22 +25,11 @@ IMAGE_MAX_HEIGHT = 1280         # Alto máximo en píxeles
 JPEG_QUALITY = 85               # Calidad JPEG (1-100, 85 es buen balance)
 CONVERT_TO_JPEG = True          # Convertir PNG/WebP a JPEG para ahorrar espacio
 
-# Configuración de Supabase Storage
-STORAGE_BUCKET = "ticket-media"
-
-
-def _get_supabase_config():
-    """Obtiene configuración de Supabase desde environment."""
-    import os
-    
-    url = os.getenv("SUPABASE_URL", "")
-    key = os.getenv("SUPABASE_SERVICE_KEY", "")
-    
-    if not url or not key:
-        logger.warning("⚠️ SUPABASE_URL o SUPABASE_SERVICE_KEY no configurados")
-        return None, None
-    
-    return url, key
+# ============================================================
+# CONFIGURACIÓN DE STREAMING (videos / archivos grandes)
+# ============================================================
+STREAM_THRESHOLD_BYTES = 5 * 1024 * 1024  # Sobre esto, nunca cargar el archivo completo en memoria
+STREAM_MAX_RESUMES = 3              # Reanudaciones por llamada ante cortes de red
 
 
 def optimize_image(image_data: bytes, mime_type: str) -> Tuple[bytes, str, int]:
@@ -113,12 +105,61 @@ def optimize_image(image_data: bytes, mime_type: str) -> Tuple[bytes, str, int]:
         return image_data, mime_type, len(image_data)
 
 
-def download_whatsapp_media(media_id: str) -> dict:
+def resize_image(image_data: bytes, max_side: int, quality: int = JPEG_QUALITY) -> Optional[Tuple[bytes, int, int]]:
+    """
+    Genera una versión reducida (JPEG) que cabe en max_side x max_side.
+    
+    Returns:
+        (bytes_jpeg, ancho, alto) o None si Pillow no está disponible / falla
+    """
+    try:
+        from PIL import Image
+        
+        img = Image.open(io.BytesIO(image_data))
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+        return output.getvalue(), img.size[0], img.size[1]
+        
+    except ImportError:
+        logger.warning("⚠️ Pillow no instalado, no se pueden generar renditions")
+        return None
+    except Exception as e:
+        logger.exception(f"⚠️ Error redimensionando imagen: {e}")
+        return None
+
+
+def download_stored_media(storage_url: str) -> Optional[bytes]:
+    """Descarga un archivo ya almacenado (por su URL pública)."""
+    try:
+        backend = get_storage_backend()
+        path = backend.path_from_url(storage_url)
+        if path:
+            return backend.get(path)
+        
+        # URL de otro backend (p.ej. históricos en Supabase): HTTP directo
+        resp = requests.get(storage_url, timeout=30)
+        if resp.status_code != 200:
+            logger.error(f"❌ Error descargando de Storage: {resp.status_code}")
+            return None
+        return resp.content
+    except Exception as e:
+        logger.exception(f"❌ Error descargando de Storage: {e}")
+        return None
+
+
+def download_whatsapp_media(media_id: str, media_info: Optional[dict] = None) -> dict:
     """
-    Descarga un archivo de WhatsApp Cloud API.
+    Descarga un archivo de WhatsApp Cloud API (completo en memoria).
+    Para videos/archivos grandes usar stream_whatsapp_media_to_storage.
     
     Args:
         media_id: ID del media recibido en el webhook
+        media_info: Metadata ya obtenida con get_whatsapp_media_info (evita otra llamada)
     
     Returns:
         {"success": True, "data": bytes, "mime_type": str, "size": int}
@@ -131,23 +172,16 @@ def download_whatsapp_media(media_id: str) -> dict:
     
     try:
         # Paso 1: Obtener URL del media
-        url_info = f"https://graph.facebook.com/v18.0/{media_id}"
-        headers = {"Authorization": f"Bearer {token}"}
-        
         logger.info(f"📥 Obteniendo URL para media_id: {media_id}")
-        resp = requests.get(url_info, headers=headers, timeout=30)
-        
-        if resp.status_code != 200:
-            logger.error(f"❌ Error obteniendo URL: {resp.status_code} - {resp.text}")
-            return {"success": False, "error": f"Error obteniendo URL: {resp.status_code}"}
+        info = media_info or get_whatsapp_media_info(media_id)
         
-        media_data = resp.json()
-        media_url = media_data.get("url")
-        mime_type = media_data.get("mime_type", "application/octet-stream")
-        file_size = media_data.get("file_size", 0)
+        if not info["success"]:
+            return info
         
-        if not media_url:
-            return {"success": False, "error": "No se obtuvo URL del media"}
+        headers = {"Authorization": f"Bearer {token}"}
+        media_url = info["url"]
+        mime_type = info["mime_type"]
+        file_size = info["file_size"]
         
         # Paso 2: Descargar el archivo
         logger.info(f"📥 Descargando archivo ({mime_type}, {file_size} bytes)...")
@@ -174,14 +208,14 @@ def download_whatsapp_media(media_id: str) -> dict:
         return {"success": False, "error": str(e)}
 
 
-def upload_to_supabase(
+def upload_to_storage(
     file_data: bytes,
     mime_type: str,
     folder: str = "tickets",
     filename: Optional[str] = None
 ) -> dict:
     """
-    Sube un archivo a Supabase Storage.
+    Sube un archivo al storage configurado.
     
     Args:
         file_data: Bytes del archivo
@@ -193,12 +227,6 @@ def upload_to_supabase(
         {"success": True, "url": str, "path": str}
         {"success": False, "error": str}
     """
-    supabase_url, supabase_key = _get_supabase_config()
-    
-    if not supabase_url or not supabase_key:
-        logger.warning("⚠️ Supabase no configurado, no se puede subir archivo")
-        return {"success": False, "error": "Supabase Storage no configurado"}
-    
     try:
         # Generar nombre único
         if not filename:
@@ -207,25 +235,10 @@ def upload_to_supabase(
             filename = f"{timestamp}_{uuid.uuid4().hex[:8]}{ext}"
         
         file_path = f"{folder}/{filename}"
+        backend = get_storage_backend()
         
-        # URL de upload
-        upload_url = f"{supabase_url}/storage/v1/object/{STORAGE_BUCKET}/{file_path}"
-        
-        headers = {
-            "Authorization": f"Bearer {supabase_key}",
-            "Content-Type": mime_type,
-            "x-upsert": "true"
-        }
-        
-        logger.info(f"📤 Subiendo a Supabase: {file_path} ({len(file_data)/1024:.1f}KB)")
-        resp = requests.post(upload_url, headers=headers, data=file_data, timeout=60)
-        
-        if resp.status_code not in (200, 201):
-            logger.error(f"❌ Error subiendo a Supabase: {resp.status_code} - {resp.text}")
-            return {"success": False, "error": f"Error subiendo: {resp.status_code}"}
-        
-        # URL pública del archivo
-        public_url = f"{supabase_url}/storage/v1/object/public/{STORAGE_BUCKET}/{file_path}"
+        logger.info(f"📤 Subiendo a {backend.name}: {file_path} ({len(file_data)/1024:.1f}KB)")
+        public_url = backend.put(file_path, file_data, mime_type)
         
         logger.info(f"✅ Archivo subido: {public_url}")
         
@@ -235,9 +248,305 @@ def upload_to_supabase(
             "path": file_path
         }
         
+    except StorageError as e:
+        logger.error(f"❌ Error subiendo archivo: {e}")
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        logger.exception(f"❌ Error subiendo archivo: {e}")
+        return {"success": False, "error": str(e)}
+
+
+# Compatibilidad: nombre histórico
+upload_to_supabase = upload_to_storage
+
+
+def get_whatsapp_media_info(media_id: str) -> dict:
+    """
+    Obtiene la metadata de un media de WhatsApp (sin descargar el archivo).
+    
+    Returns:
+        {"success": True, "url": str, "mime_type": str, "file_size": int, "sha256": str|None}
+        {"success": False, "error": str}
+    """
+    token = Config.WHATSAPP_TOKEN
+    
+    if not token:
+        return {"success": False, "error": "WHATSAPP_TOKEN no configurado"}
+    
+    try:
+        headers = {"Authorization": f"Bearer {token}"}
+        resp = requests.get(f"https://graph.facebook.com/v18.0/{media_id}", headers=headers, timeout=30)
+        
+        if resp.status_code != 200:
+            logger.error(f"❌ Error obteniendo URL: {resp.status_code} - {resp.text}")
+            return {"success": False, "error": f"Error obteniendo URL: {resp.status_code}"}
+        
+        data = resp.json()
+        if not data.get("url"):
+            return {"success": False, "error": "No se obtuvo URL del media"}
+        
+        return {
+            "success": True,
+            "url": data["url"],
+            "mime_type": data.get("mime_type", "application/octet-stream"),
+            "file_size": int(data.get("file_size") or 0),
+            "sha256": data.get("sha256"),
+        }
+    except Exception as e:
+        logger.exception(f"❌ Error obteniendo metadata de media: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def _open_whatsapp_download(media_url: str, offset: int = 0) -> Tuple[requests.Response, bytes]:
+    """
+    Abre la descarga de WhatsApp en modo streaming desde `offset`.
+    Si el servidor ignora el Range (200 en vez de 206), descarta los bytes ya subidos.
+    
+    Returns:
+        (respuesta abierta, bytes sobrantes del descarte que aún deben subirse)
+    """
+    headers = {"Authorization": f"Bearer {Config.WHATSAPP_TOKEN}"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    
+    resp = requests.get(media_url, headers=headers, stream=True, timeout=(10, 60))
+    
+    if resp.status_code not in (200, 206):
+        resp.close()
+        raise RuntimeError(f"Error descargando: {resp.status_code}")
+    
+    leftover = b""
+    if offset and resp.status_code == 200:
+        logger.info(f"↪️ Range no soportado, descartando {offset} bytes")
+        skipped = 0
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            skipped += len(chunk)
+            if skipped >= offset:
+                leftover = chunk[len(chunk) - (skipped - offset):]
+                break
+    
+    return resp, leftover
+
+
+def stream_whatsapp_media_to_storage(
+    media_id: str,
+    folder: str = "tickets",
+    filename: Optional[str] = None,
+    resume_url: Optional[str] = None,
+    on_resume_url: Optional[Callable[[Optional[str]], None]] = None,
+    media_info: Optional[dict] = None
+) -> dict:
+    """
+    Descarga de WhatsApp en streaming directo a una subida resumible del storage
+    (TUS en Supabase, multipart en S3, archivo .part en local).
+    
+    Memoria máxima ≈ un chunk del backend sin importar el tamaño del archivo.
+    Si la subida se corta, se reanuda desde el último byte confirmado:
+    - dentro de esta llamada (hasta STREAM_MAX_RESUMES veces)
+    - en un reintento posterior, si el caller persistió `resume_url` (on_resume_url)
+    
+    Returns:
+        {"success": True, "url": str, "path": str, "mime_type": str, "size": int, "sha256": str|None}
+        {"success": False, "error": str}
+    """
+    info = media_info or get_whatsapp_media_info(media_id)
+    if not info["success"]:
+        return info
+    
+    mime_type = info["mime_type"]
+    total = info["file_size"]
+    if not total:
+        return {"success": False, "error": "file_size desconocido, no se puede subir en streaming"}
+    
+    if not filename:
+        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    if "." not in filename:
+        filename = f"{filename}{_get_extension(mime_type)}"
+    file_path = f"{folder}/{filename}"
+    
+    # El hash solo es válido si una pasada vio el archivo desde el byte 0
+    hash_state = {"hasher": None}
+    
+    def open_source(offset: int):
+        resp, leftover = _open_whatsapp_download(info["url"], offset)
+        hasher = hashlib.sha256() if offset == 0 else None
+        hash_state["hasher"] = hasher
+        try:
+            if leftover:
+                yield leftover
+            for piece in resp.iter_content(chunk_size=256 * 1024):
+                if hasher:
+                    hasher.update(piece)
+                yield piece
+        finally:
+            resp.close()
+    
+    try:
+        backend = get_storage_backend()
+        public_url = backend.put_stream(
+            file_path,
+            open_source,
+            mime_type,
+            total,
+            resume_token=resume_url,
+            on_resume_token=on_resume_url,
+            max_resumes=STREAM_MAX_RESUMES
+        )
     except Exception as e:
-        logger.exception(f"❌ Error subiendo a Supabase: {e}")
+        logger.error(f"❌ Streaming falló para {file_path}: {e}")
         return {"success": False, "error": str(e)}
+    
+    logger.info(f"✅ Archivo subido (streaming): {public_url}")
+    hasher = hash_state["hasher"]
+    
+    return {
+        "success": True,
+        "url": public_url,
+        "path": file_path,
+        "mime_type": mime_type,
+        "size": total,
+        "sha256": hasher.hexdigest() if hasher else None
+    }
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _find_stored_by_hash(content_hash: Optional[str]) -> Optional[dict]:
+    """Busca en ticket_media un objeto ya subido con el mismo hash (original u optimizado)."""
+    if not content_hash:
+        return None
+    try:
+        from gateway_app.services.tickets_db import obtener_media_por_hash
+        return obtener_media_por_hash(content_hash)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo buscar media por hash: {e}")
+        return None
+
+
+def _reused_result(existing: dict, original_hash: Optional[str], original_size: int) -> dict:
+    logger.info(f"♻️ Media duplicado, reutilizando {existing['storage_url']}")
+    return {
+        "success": True,
+        "storage_url": existing["storage_url"],
+        "upload_error": None,
+        "mime_type": existing.get("mime_type") or "",
+        "size": existing.get("file_size_bytes") or 0,
+        "original_size": original_size,
+        "original_hash": original_hash,
+        "content_hash": existing.get("content_hash"),
+        "reused": True
+    }
+
+
+def download_optimize_upload(
+    media_id: str,
+    media_type: str,
+    folder: str = "tickets",
+    filename: Optional[str] = None,
+    resume_url: Optional[str] = None,
+    on_resume_url: Optional[Callable[[Optional[str]], None]] = None
+) -> dict:
+    """
+    Descarga de WhatsApp + OPTIMIZACIÓN + upload al storage (sin tocar la BD).
+    
+    Videos y archivos grandes (> STREAM_THRESHOLD_BYTES) que no se optimizan
+    van por streaming resumible (stream_whatsapp_media_to_storage) y nunca
+    se cargan completos en memoria.
+    
+    Dedupe por contenido (SHA-256):
+    - original_hash: el sha256 que entrega WhatsApp (o calculado al descargar).
+      Si ya existe en ticket_media, ni siquiera se descarga.
+    - content_hash: hash del archivo final (optimizado). Si ya existe, no se sube.
+    - Los objetos nuevos quedan en media/{content_hash}.{ext}: la misma foto
+      siempre cae en la misma key.
+    
+    Sin hash disponible se usa `filename` (determinístico → reintentos idempotentes).
+    Si `filename` no trae extensión, se agrega según el MIME final.
+    
+    Returns:
+        {"success": True, "storage_url": str|None, "mime_type": str, "size": int, "original_size": int,
+         "original_hash": str|None, "content_hash": str|None, "reused": bool}
+        {"success": False, "error": str}
+    """
+    info = get_whatsapp_media_info(media_id)
+    if not info["success"]:
+        return info
+    
+    original_hash = (info.get("sha256") or "").lower() or None
+    
+    # Paso 0: ¿Ya tenemos este archivo? → solo lookup en BD
+    existing = _find_stored_by_hash(original_hash)
+    if existing:
+        return _reused_result(existing, original_hash, info["file_size"])
+    
+    optimizable = media_type == "image" and info["mime_type"].startswith("image/")
+    if not optimizable and (media_type == "video" or info["file_size"] > STREAM_THRESHOLD_BYTES):
+        # Sin optimización el contenido final es el original → key por hash si lo hay
+        stream_result = stream_whatsapp_media_to_storage(
+            media_id,
+            folder="media" if original_hash else folder,
+            filename=original_hash or filename,
+            resume_url=resume_url,
+            on_resume_url=on_resume_url,
+            media_info=info
+        )
+        if stream_result["success"] or info["file_size"] > STREAM_THRESHOLD_BYTES:
+            content_hash = original_hash or stream_result.get("sha256")
+            return {
+                "success": True,
+                "storage_url": stream_result.get("url"),
+                "upload_error": stream_result.get("error"),
+                "mime_type": info["mime_type"],
+                "size": info["file_size"],
+                "original_size": info["file_size"],
+                "original_hash": content_hash,
+                "content_hash": content_hash,
+                "reused": False
+            }
+        # Video chico sin file_size: camino en memoria
+    
+    # Paso 1: Descargar de WhatsApp
+    download_result = download_whatsapp_media(media_id, media_info=info)
+    
+    if not download_result["success"]:
+        return download_result
+    
+    file_data = download_result["data"]
+    mime_type = download_result["mime_type"]
+    original_size = download_result["size"]
+    
+    if not original_hash:
+        original_hash = _sha256(file_data)
+        existing = _find_stored_by_hash(original_hash)
+        if existing:
+            return _reused_result(existing, original_hash, original_size)
+    
+    # Paso 2: OPTIMIZAR si es imagen
+    if media_type == "image" and mime_type.startswith("image/"):
+        file_data, mime_type, _ = optimize_image(file_data, mime_type)
+    
+    content_hash = _sha256(file_data)
+    existing = _find_stored_by_hash(content_hash)
+    if existing:
+        return _reused_result(existing, original_hash, original_size)
+    
+    # Paso 3: Subir al storage (key direccionada por contenido)
+    filename = f"{content_hash}{_get_extension(mime_type)}"
+    upload_result = upload_to_storage(file_data, mime_type, folder="media", filename=filename)
+    
+    return {
+        "success": True,
+        "storage_url": upload_result["url"] if upload_result["success"] else None,
+        "upload_error": upload_result.get("error"),
+        "mime_type": mime_type,
+        "size": len(file_data),
+        "original_size": original_size,
+        "original_hash": original_hash,
+        "content_hash": content_hash,
+        "reused": False
+    }
 
 
 def process_and_store_media(
@@ -247,7 +556,8 @@ def process_and_store_media(
     uploaded_by: str = ""
 ) -> dict:
     """
-    Proceso completo: descarga de WhatsApp + OPTIMIZACIÓN + upload a Supabase + registro en BD.
+    Proceso completo: descarga de WhatsApp + OPTIMIZACIÓN + upload al storage + registro en BD.
+    Si el contenido ya existe (mismo hash), se reutiliza el objeto y solo se registra en BD.
     
     Args:
         media_id: ID del media de WhatsApp
@@ -255,6 +565,9 @@ def process_and_store_media(
         ticket_id: ID del ticket asociado (puede ser None si aún no existe)
         uploaded_by: Teléfono del usuario que envió el media
     
+    Nota: es síncrono. Los flujos de WhatsApp usan media_jobs.enqueue_media_job
+    para responder al usuario sin esperar la subida.
+    
     Returns:
         {
             "success": True,
@@ -263,35 +576,24 @@ def process_and_store_media(
             "mime_type": str,
             "size": int,
             "original_size": int,
+            "content_hash": str,
             "db_id": int
         }
         {"success": False, "error": str}
     """
-    # Paso 1: Descargar de WhatsApp
-    download_result = download_whatsapp_media(media_id)
-    
-    if not download_result["success"]:
-        return download_result
-    
-    file_data = download_result["data"]
-    mime_type = download_result["mime_type"]
-    original_size = download_result["size"]
-    
-    # Paso 2: OPTIMIZAR si es imagen
-    if media_type == "image" and mime_type.startswith("image/"):
-        file_data, mime_type, _ = optimize_image(file_data, mime_type)
+    folder = f"tickets/{ticket_id}" if ticket_id else "pending"
+    result = download_optimize_upload(media_id, media_type, folder=folder)
     
-    file_size = len(file_data)
+    if not result["success"]:
+        return result
     
-    # Paso 3: Subir a Supabase
-    folder = f"tickets/{ticket_id}" if ticket_id else "pending"
-    upload_result = upload_to_supabase(file_data, mime_type, folder=folder)
+    storage_url = result["storage_url"]
+    mime_type = result["mime_type"]
+    file_size = result["size"]
+    original_size = result["original_size"]
     
-    storage_url = None
-    if upload_result["success"]:
-        storage_url = upload_result["url"]
-    else:
-        logger.warning(f"⚠️ No se pudo subir a Supabase, guardando solo media_id")
+    if not storage_url:
+        logger.warning(f"⚠️ No se pudo subir al storage, guardando solo media_id")
     
     # Paso 4: Guardar en BD (si hay ticket_id)
     db_id = None
@@ -305,7 +607,9 @@ def process_and_store_media(
                 whatsapp_media_id=media_id,
                 mime_type=mime_type,
                 file_size_bytes=file_size,
-                uploaded_by=uploaded_by
+                uploaded_by=uploaded_by,
+                original_hash=result.get("original_hash"),
+                content_hash=result.get("content_hash")
             )
         except Exception as e:
             logger.exception(f"⚠️ Error guardando media en BD: {e}")
@@ -317,6 +621,7 @@ def process_and_store_media(
         "mime_type": mime_type,
         "size": file_size,
         "original_size": original_size,
+        "content_hash": result.get("content_hash"),
         "db_id": db_id
     }
 
@@ -29,6 +29,37 @@ def table_exists(table_name: str) -> bool:
         return result is not None
 
 
+def column_exists(table_name: str, column_name: str) -> bool:
+    """Verifica si una columna existe en una tabla."""
+    if using_pg():
+        sql = """
+            SELECT EXISTS (
+                SELECT FROM information_schema.columns
+                WHERE table_schema = 'public'
+                AND table_name = ?
+                AND column_name = ?
+            )
+        """
+        result = fetchone(sql, [table_name, column_name])
+        return bool(result and list(result.values())[0])
+    else:
+        from gateway_app.services.db import fetchall
+        rows = fetchall(f"PRAGMA table_info({table_name})")
+        return any(r.get("name") == column_name for r in rows)
+
+
+def add_column_if_missing(table_name: str, column_name: str, pg_type: str, sqlite_type: str = None) -> None:
+    """Agrega una columna si no existe (idempotente)."""
+    if column_exists(table_name, column_name):
+        return
+
+    table = f"public.{table_name}" if using_pg() else table_name
+    col_type = pg_type if using_pg() else (sqlite_type or pg_type)
+
+    logger.info(f"➕ Agregando columna '{table_name}.{column_name}'...")
+    execute(f"ALTER TABLE {table} ADD COLUMN {column_name} {col_type}", commit=True)
+
+
 def create_tickets_table():
     """Crea la tabla de tickets."""
     logger.info("📦 Creando tabla 'tickets'...")
@@ -132,13 +163,330 @@ def create_ticket_media_table():
     
     logger.info("✅ Tabla 'ticket_media' creada")
 
+
+def ensure_ticket_media_job_columns():
+    """
+    Columnas para el pipeline asíncrono de medios (ver media_jobs.py).
+
+    - estado: PENDIENTE → PROCESANDO → LISTO | ERROR
+    - intentos / ultimo_error: reintentos del worker
+    - procesando_desde: para reclamar jobs abandonados (worker caído)
+    - procesado_at: cuándo quedó disponible storage_url
+    - upload_url: subida resumible (TUS) en curso, para reanudar videos grandes
+
+    Las filas históricas quedan en 'LISTO' (ya tenían storage_url o ya fallaron).
+    """
+    logger.info("🔧 Verificando columnas de jobs en 'ticket_media'...")
+
+    try:
+        add_column_if_missing("ticket_media", "estado", "TEXT NOT NULL DEFAULT 'LISTO'")
+        add_column_if_missing("ticket_media", "intentos", "INTEGER NOT NULL DEFAULT 0")
+        add_column_if_missing("ticket_media", "ultimo_error", "TEXT")
+        add_column_if_missing("ticket_media", "procesando_desde", "TIMESTAMPTZ", "TIMESTAMP")
+        add_column_if_missing("ticket_media", "procesado_at", "TIMESTAMPTZ", "TIMESTAMP")
+        add_column_if_missing("ticket_media", "upload_url", "TEXT")
+    except Exception as e:
+        logger.warning(f"⚠️ Error agregando columnas de jobs a ticket_media: {e}")
+        return
+
+    indices = [
+        # Un mismo media de WhatsApp se registra una sola vez por ticket (reintentos idempotentes)
+        """CREATE UNIQUE INDEX IF NOT EXISTS uq_ticket_media_ticket_wamedia
+           ON public.ticket_media(ticket_id, whatsapp_media_id)
+           WHERE whatsapp_media_id IS NOT NULL""",
+        "CREATE INDEX IF NOT EXISTS idx_ticket_media_whatsapp_media_id ON public.ticket_media(whatsapp_media_id)",
+        # Barrido de jobs pendientes al arrancar
+        """CREATE INDEX IF NOT EXISTS idx_ticket_media_jobs_abiertos
+           ON public.ticket_media(created_at)
+           WHERE estado IN ('PENDIENTE', 'PROCESANDO', 'ERROR')""",
+    ]
+
+    if not using_pg():
+        indices = [idx.replace("public.ticket_media", "ticket_media") for idx in indices]
+
+    for idx_sql in indices:
+        try:
+            execute(idx_sql, commit=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Índice ya existe o error: {e}")
+
+    logger.info("✅ Columnas de jobs en 'ticket_media' listas")
+
+
+def ensure_ticket_media_hash_columns():
+    """
+    Hashes de contenido para dedupe de medios (ver media_storage.download_optimize_upload).
+
+    - original_hash: SHA-256 del archivo tal como llegó de WhatsApp
+    - content_hash: SHA-256 del archivo almacenado (optimizado)
+    """
+    logger.info("🔧 Verificando columnas de hash en 'ticket_media'...")
+
+    try:
+        add_column_if_missing("ticket_media", "original_hash", "TEXT")
+        add_column_if_missing("ticket_media", "content_hash", "TEXT")
+    except Exception as e:
+        logger.warning(f"⚠️ Error agregando columnas de hash a ticket_media: {e}")
+        return
+
+    indices = [
+        """CREATE INDEX IF NOT EXISTS idx_ticket_media_original_hash
+           ON public.ticket_media(original_hash)
+           WHERE original_hash IS NOT NULL""",
+        """CREATE INDEX IF NOT EXISTS idx_ticket_media_content_hash
+           ON public.ticket_media(content_hash)
+           WHERE content_hash IS NOT NULL""",
+    ]
+
+    if not using_pg():
+        indices = [idx.replace("public.ticket_media", "ticket_media") for idx in indices]
+
+    for idx_sql in indices:
+        try:
+            execute(idx_sql, commit=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Índice ya existe o error: {e}")
+
+    logger.info("✅ Columnas de hash en 'ticket_media' listas")
+
+
+def create_ticket_media_renditions_table():
+    """
+    Crea la tabla de renditions (thumb/preview/full) de cada media.
+    Se generan bajo demanda (ver media_renditions.py).
+    """
+    logger.info("📦 Creando tabla 'ticket_media_renditions'...")
+
+    sql = """
+        CREATE TABLE IF NOT EXISTS public.ticket_media_renditions (
+            id SERIAL PRIMARY KEY,
+            media_id INTEGER NOT NULL REFERENCES public.ticket_media(id) ON DELETE CASCADE,
+            kind TEXT NOT NULL CHECK (kind IN ('thumb', 'preview', 'full')),
+            storage_url TEXT NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            file_size_bytes INTEGER,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            UNIQUE (media_id, kind)
+        )
+    """
+
+    if not using_pg():
+        sql = """
+            CREATE TABLE IF NOT EXISTS ticket_media_renditions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                media_id INTEGER NOT NULL,
+                kind TEXT NOT NULL CHECK (kind IN ('thumb', 'preview', 'full')),
+                storage_url TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                file_size_bytes INTEGER,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (media_id, kind)
+            )
+        """
+
+    execute(sql, commit=True)
+    logger.info("✅ Tabla 'ticket_media_renditions' creada")
+
+
+def create_ticket_events_table():
+    """
+    Log append-only de eventos de tickets (ver ticket_events.py).
+
+    - (ticket_id, ts): timeline por ticket.
+    - ts: scans por rango de tiempo para analítica. En Postgres es BRIN: la
+      tabla solo recibe inserts en orden de ts, así el índice queda mínimo.
+    """
+    logger.info("📦 Creando tabla 'ticket_events'...")
+
+    sql = """
+        CREATE TABLE IF NOT EXISTS public.ticket_events (
+            id BIGSERIAL PRIMARY KEY,
+            ticket_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            actor TEXT,
+            payload JSONB,
+            ts TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """
+    indices = [
+        "CREATE INDEX IF NOT EXISTS idx_ticket_events_ticket_ts ON public.ticket_events(ticket_id, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_ticket_events_ts ON public.ticket_events USING BRIN (ts)",
+    ]
+
+    if not using_pg():
+        sql = """
+            CREATE TABLE IF NOT EXISTS ticket_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ticket_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                actor TEXT,
+                payload TEXT,
+                ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+        indices = [
+            "CREATE INDEX IF NOT EXISTS idx_ticket_events_ticket_ts ON ticket_events(ticket_id, ts)",
+            "CREATE INDEX IF NOT EXISTS idx_ticket_events_ts ON ticket_events(ts)",
+        ]
+
+    execute(sql, commit=True)
+
+    for idx_sql in indices:
+        try:
+            execute(idx_sql, commit=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Índice ya existe o error: {e}")
+
+    logger.info("✅ Tabla 'ticket_events' creada")
+
+
+def create_hotel_topology_table():
+    """
+    Topología del hotel (ver hotel_topology.py): habitación / área común →
+    piso, ala, zona. Se carga completa por (org_id, hotel_id), así que basta
+    el índice del UNIQUE.
+    """
+    logger.info("📦 Creando tabla 'hotel_topology'...")
+
+    sql = """
+        CREATE TABLE IF NOT EXISTS public.hotel_topology (
+            id BIGSERIAL PRIMARY KEY,
+            org_id INTEGER NOT NULL,
+            hotel_id INTEGER NOT NULL,
+            ubicacion TEXT NOT NULL,
+            tipo TEXT NOT NULL DEFAULT 'HABITACION' CHECK (tipo IN ('HABITACION', 'AREA')),
+            piso INTEGER,
+            ala TEXT,
+            zona TEXT,
+            UNIQUE (org_id, hotel_id, ubicacion)
+        )
+    """
+
+    if not using_pg():
+        sql = """
+            CREATE TABLE IF NOT EXISTS hotel_topology (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                org_id INTEGER NOT NULL,
+                hotel_id INTEGER NOT NULL,
+                ubicacion TEXT NOT NULL,
+                tipo TEXT NOT NULL DEFAULT 'HABITACION' CHECK (tipo IN ('HABITACION', 'AREA')),
+                piso INTEGER,
+                ala TEXT,
+                zona TEXT,
+                UNIQUE (org_id, hotel_id, ubicacion)
+            )
+        """
+
+    execute(sql, commit=True)
+    logger.info("✅ Tabla 'hotel_topology' creada")
+
+
+def create_ticket_watch_state_table():
+    """
+    High-watermark de ticket_watch por (org_id, hotel_id): último id de
+    ticket ya revisado. Cada poll lee solo id > last_id (rango sobre la PK).
+    """
+    logger.info("📦 Creando tabla 'ticket_watch_state'...")
+
+    sql = """
+        CREATE TABLE IF NOT EXISTS public.ticket_watch_state (
+            org_id INTEGER NOT NULL,
+            hotel_id INTEGER NOT NULL,
+            last_id BIGINT NOT NULL DEFAULT 0,
+            last_created_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (org_id, hotel_id)
+        )
+    """
+
+    if not using_pg():
+        sql = """
+            CREATE TABLE IF NOT EXISTS ticket_watch_state (
+                org_id INTEGER NOT NULL,
+                hotel_id INTEGER NOT NULL,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                last_created_at TIMESTAMP,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (org_id, hotel_id)
+            )
+        """
+
+    execute(sql, commit=True)
+    logger.info("✅ Tabla 'ticket_watch_state' creada")
+
+
+def create_background_leader_table():
+    """
+    Líder actual de los jobs de fondo (ver leader_election.py): el dueño
+    del advisory lock renueva heartbeat_at; /health lo lee desde cualquier
+    proceso.
+    """
+    logger.info("📦 Creando tabla 'background_leader'...")
+
+    sql = """
+        CREATE TABLE IF NOT EXISTS public.background_leader (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            acquired_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """
+
+    if not using_pg():
+        sql = """
+            CREATE TABLE IF NOT EXISTS background_leader (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                acquired_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                heartbeat_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+
+    execute(sql, commit=True)
+    logger.info("✅ Tabla 'background_leader' creada")
+
+
+def create_background_job_runs_table():
+    """
+    Ejecuciones de jobs programados (ver leader_election.claim_run): una fila
+    por (job, fecha). El INSERT que gana el conflicto es el único que corre
+    el job, aunque haya failover de líder en el mismo minuto.
+    """
+    logger.info("📦 Creando tabla 'background_job_runs'...")
+
+    sql = """
+        CREATE TABLE IF NOT EXISTS public.background_job_runs (
+            name TEXT NOT NULL,
+            run_key TEXT NOT NULL,
+            holder TEXT NOT NULL,
+            ran_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (name, run_key)
+        )
+    """
+
+    if not using_pg():
+        sql = """
+            CREATE TABLE IF NOT EXISTS background_job_runs (
+                name TEXT NOT NULL,
+                run_key TEXT NOT NULL,
+                holder TEXT NOT NULL,
+                ran_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (name, run_key)
+            )
+        """
+
+    execute(sql, commit=True)
+    logger.info("✅ Tabla 'background_job_runs' creada")
+
+
 def create_indices():
     """Crea índices para optimizar búsquedas."""
     logger.info("📑 Creando índices...")
     
     indices = [
         "CREATE INDEX IF NOT EXISTS idx_tickets_estado ON public.tickets(estado)",
-        "CREATE INDEX IF NOT EXISTS idx_tickets_asignado_a ON public.tickets(asignado_a)",
         "CREATE INDEX IF NOT EXISTS idx_tickets_prioridad ON public.tickets(prioridad)",
         "CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON public.tickets(created_at DESC)",
     ]
@@ -156,6 +504,302 @@ def create_indices():
     logger.info("✅ Índices creados")
 
 
+def ensure_ticket_assignment_columns():
+    """
+    Columnas dedicadas para el worker asignado (assigned_phone / assigned_name).
+
+    Antes solo existía huesped_whatsapp = "phone|nombre", que obligaba a
+    LIKE 'phone|%' / SPLIT_PART en cada consulta. Se mantiene huesped_whatsapp
+    por compatibilidad; aquí se agregan las columnas, se hace backfill desde
+    el formato con pipe y se indexa (assigned_phone, estado).
+    """
+    logger.info("🔧 Verificando columnas de asignación en 'tickets'...")
+
+    table = "public.tickets" if using_pg() else "tickets"
+
+    try:
+        add_column_if_missing("tickets", "assigned_phone", "TEXT")
+        add_column_if_missing("tickets", "assigned_name", "TEXT")
+    except Exception as e:
+        logger.warning(f"⚠️ Error agregando columnas de asignación: {e}")
+        return
+
+    # Backfill (idempotente: solo filas aún sin assigned_phone)
+    if using_pg():
+        backfill_sql = f"""
+            UPDATE {table}
+            SET assigned_phone = SPLIT_PART(huesped_whatsapp, '|', 1),
+                assigned_name = NULLIF(SPLIT_PART(huesped_whatsapp, '|', 2), '')
+            WHERE assigned_phone IS NULL
+              AND POSITION('|' IN COALESCE(huesped_whatsapp, '')) > 0
+        """
+    else:
+        backfill_sql = f"""
+            UPDATE {table}
+            SET assigned_phone = substr(huesped_whatsapp, 1, instr(huesped_whatsapp, '|') - 1),
+                assigned_name = NULLIF(substr(huesped_whatsapp, instr(huesped_whatsapp, '|') + 1), '')
+            WHERE assigned_phone IS NULL
+              AND instr(COALESCE(huesped_whatsapp, ''), '|') > 0
+        """
+
+    try:
+        execute(backfill_sql, commit=True)
+        logger.info("✅ Backfill de assigned_phone/assigned_name completado")
+    except Exception as e:
+        logger.warning(f"⚠️ Error en backfill de asignación: {e}")
+
+    idx_sql = """CREATE INDEX IF NOT EXISTS idx_tickets_assigned_phone_estado
+           ON public.tickets(assigned_phone, estado)
+           WHERE deleted_at IS NULL"""
+    if not using_pg():
+        idx_sql = idx_sql.replace("public.tickets", "tickets")
+
+    try:
+        execute(idx_sql, commit=True)
+    except Exception as e:
+        logger.warning(f"⚠️ Índice ya existe o error: {e}")
+
+    logger.info("✅ Columnas de asignación listas")
+
+
+def ensure_ticket_timing_columns():
+    """
+    Columnas de tiempos usadas por TicketStateMachine.
+
+    paused_at marca el inicio de la pausa en curso; al reanudar/finalizar
+    se suma a total_paused_seconds en el mismo UPDATE. Las demás existen en
+    el schema de Supabase; se agregan por si la BD es una instalación vieja/SQLite.
+    """
+    logger.info("🔧 Verificando columnas de tiempos en 'tickets'...")
+
+    columnas = [
+        ("assigned_at", "TIMESTAMPTZ", "TIMESTAMP"),
+        ("accepted_at", "TIMESTAMPTZ", "TIMESTAMP"),
+        ("started_at", "TIMESTAMPTZ", "TIMESTAMP"),
+        ("paused_at", "TIMESTAMPTZ", "TIMESTAMP"),
+        ("finished_at", "TIMESTAMPTZ", "TIMESTAMP"),
+        ("total_paused_seconds", "INTEGER DEFAULT 0", "INTEGER DEFAULT 0"),
+    ]
+
+    for col, pg_type, sqlite_type in columnas:
+        try:
+            add_column_if_missing("tickets", col, pg_type, sqlite_type)
+        except Exception as e:
+            logger.warning(f"⚠️ Error agregando columna {col}: {e}")
+
+    logger.info("✅ Columnas de tiempos listas")
+
+
+def create_hot_query_indices():
+    """
+    Índices para las consultas calientes (se ejecuta siempre, idempotente).
+
+    - obtener_pendientes / obtener_tickets_por_estado / asignados_y_en_curso:
+      WHERE org_id, hotel_id, estado, deleted_at IS NULL ORDER BY created_at
+    - ticket_watch (barrido de respaldo / polling sin LISTEN): tickets de huésped aún no notificados.
+      Índice parcial → solo contiene los pendientes de notificar, queda chico.
+    - buscar_ticket_duplicado (antes de cada crear_ticket): misma ubicación,
+      estado abierto, created_at reciente. Parcial sobre estados abiertos.
+
+    Ver query_plans.py para el chequeo con EXPLAIN.
+    """
+    logger.info("📑 Verificando índices de consultas calientes...")
+
+    notif_pendiente = "(assignment_notif_sent IS NULL OR assignment_notif_sent = false)"
+    if not using_pg():
+        notif_pendiente = "(assignment_notif_sent IS NULL OR assignment_notif_sent = 0)"
+
+    indices = [
+        """CREATE INDEX IF NOT EXISTS idx_tickets_scope_estado_created
+           ON public.tickets(org_id, hotel_id, estado, created_at DESC)
+           WHERE deleted_at IS NULL""",
+        f"""CREATE INDEX IF NOT EXISTS idx_tickets_guest_watch
+           ON public.tickets(org_id, hotel_id, created_at)
+           WHERE canal_origen = 'huesped_whatsapp' AND {notif_pendiente}""",
+        """CREATE INDEX IF NOT EXISTS idx_tickets_dup_check
+           ON public.tickets(org_id, hotel_id, ubicacion, created_at)
+           WHERE deleted_at IS NULL
+             AND estado IN ('PENDIENTE', 'PENDIENTE_APROBACION', 'PENDIENTE_APROBACIÓN',
+                            'ASIGNADO', 'EN_CURSO', 'PAUSADO')""",
+        # asignado_a ya no se usa (ver assigned_phone): evitar mantener un índice muerto
+        "DROP INDEX IF EXISTS public.idx_tickets_asignado_a",
+    ]
+
+    if not using_pg():
+        indices = [
+            idx.replace("public.tickets", "tickets").replace("public.idx_", "idx_")
+            for idx in indices
+        ]
+
+    for idx_sql in indices:
+        try:
+            execute(idx_sql, commit=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Índice ya existe o error: {e}")
+
+    logger.info("✅ Índices de consultas calientes listos")
+
+
+PRIORITY_RANK_EXPR = (
+    "CASE UPPER(prioridad) "
+    "WHEN 'URGENTE' THEN 0 WHEN 'ALTA' THEN 1 WHEN 'MEDIA' THEN 2 WHEN 'BAJA' THEN 3 "
+    "ELSE 4 END"
+)
+
+
+def ensure_ticket_priority_rank():
+    """
+    Columna generada priority_rank (URGENTE=0, ALTA=1, MEDIA=2, BAJA=3, otro=4)
+    + índices compuestos con created_at, para que los listados ordenados por
+    prioridad y los "siguiente" (top-N) sean range scans en vez de ORDER BY CASE.
+
+    Postgres: GENERATED ... STORED. SQLite: ALTER TABLE solo admite VIRTUAL
+    (también indexable).
+    """
+    logger.info("🔧 Verificando columna 'priority_rank' en 'tickets'...")
+
+    try:
+        add_column_if_missing(
+            "tickets",
+            "priority_rank",
+            f"SMALLINT GENERATED ALWAYS AS ({PRIORITY_RANK_EXPR}) STORED",
+            f"INTEGER GENERATED ALWAYS AS ({PRIORITY_RANK_EXPR}) VIRTUAL",
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Error agregando priority_rank: {e}")
+        return
+
+    indices = [
+        # Mis tickets (HK): obtener_tickets_asignados_a
+        """CREATE INDEX IF NOT EXISTS idx_tickets_assigned_rank
+           ON public.tickets(assigned_phone, priority_rank, created_at)
+           WHERE deleted_at IS NULL AND estado IN ('ASIGNADO', 'EN_CURSO', 'PAUSADO')""",
+        # Supervisor: obtener_tickets_asignados_y_en_curso
+        """CREATE INDEX IF NOT EXISTS idx_tickets_activos_rank
+           ON public.tickets(org_id, hotel_id, priority_rank, created_at)
+           WHERE deleted_at IS NULL AND estado IN ('ASIGNADO', 'EN_CURSO')""",
+        # Supervisor: listados paginados por estado (obtener_pagina_tickets, keyset)
+        """CREATE INDEX IF NOT EXISTS idx_tickets_estado_rank_keyset
+           ON public.tickets(org_id, hotel_id, estado, priority_rank, created_at, id)
+           WHERE deleted_at IS NULL""",
+        # Supervisor: obtener_siguiente_pendiente
+        """CREATE INDEX IF NOT EXISTS idx_tickets_pendientes_rank
+           ON public.tickets(org_id, hotel_id, priority_rank, created_at)
+           WHERE deleted_at IS NULL
+             AND estado IN ('PENDIENTE', 'PENDIENTE_APROBACION', 'PENDIENTE_APROBACIÓN')""",
+    ]
+
+    if not using_pg():
+        indices = [idx.replace("public.tickets", "tickets") for idx in indices]
+
+    for idx_sql in indices:
+        try:
+            execute(idx_sql, commit=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Índice ya existe o error: {e}")
+
+    logger.info("✅ priority_rank listo")
+
+
+SEARCH_TEXT_EXPR = "coalesce(detalle, '') || ' ' || coalesce(ubicacion, '')"
+
+
+def ensure_ticket_search():
+    """
+    Búsqueda de tickets por texto (detalle + ubicacion), ver tickets_db.buscar_tickets.
+
+    Postgres:
+      - unaccent + pg_trgm.
+      - public.f_unaccent(text): wrapper IMMUTABLE de unaccent (requerido para
+        usarlo en columnas generadas e índices).
+      - search_tsv: tsvector generado (config 'spanish', sin acentos) + índice GIN.
+      - índice GIN trigram sobre el texto normalizado, para matches difusos
+        ("duch" / "gotea" / typos).
+    SQLite:
+      - tabla FTS5 externa (tickets_fts) sincronizada con triggers.
+    """
+    logger.info("🔎 Verificando búsqueda de tickets...")
+
+    if using_pg():
+        for ext in ("unaccent", "pg_trgm"):
+            try:
+                execute(f"CREATE EXTENSION IF NOT EXISTS {ext}", commit=True)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo crear extensión {ext}: {e}")
+
+        try:
+            execute(
+                """CREATE OR REPLACE FUNCTION public.f_unaccent(text)
+                   RETURNS text
+                   LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+                   SET search_path = public, extensions
+                   AS $$ SELECT unaccent('unaccent'::regdictionary, $1) $$""",
+                commit=True,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Error creando f_unaccent: {e}")
+            return
+
+        try:
+            add_column_if_missing(
+                "tickets",
+                "search_tsv",
+                "tsvector GENERATED ALWAYS AS "
+                f"(to_tsvector('spanish'::regconfig, public.f_unaccent({SEARCH_TEXT_EXPR}))) STORED",
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Error agregando search_tsv: {e}")
+            return
+
+        indices = [
+            "CREATE INDEX IF NOT EXISTS idx_tickets_search_tsv ON public.tickets USING GIN (search_tsv)",
+            f"""CREATE INDEX IF NOT EXISTS idx_tickets_search_trgm ON public.tickets
+                USING GIN (public.f_unaccent(lower({SEARCH_TEXT_EXPR})) gin_trgm_ops)""",
+        ]
+        for idx_sql in indices:
+            try:
+                execute(idx_sql, commit=True)
+            except Exception as e:
+                logger.warning(f"⚠️ Índice ya existe o error: {e}")
+
+        logger.info("✅ Búsqueda de tickets lista (tsvector + trigram)")
+        return
+
+    # SQLite: FTS5 con contenido externo (no duplica el texto)
+    creada = not table_exists("tickets_fts")
+    statements = [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+               detalle, ubicacion,
+               content='tickets', content_rowid='id',
+               tokenize='unicode61 remove_diacritics 2'
+           )""",
+        """CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+               INSERT INTO tickets_fts(rowid, detalle, ubicacion)
+               VALUES (new.id, new.detalle, new.ubicacion);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+               INSERT INTO tickets_fts(tickets_fts, rowid, detalle, ubicacion)
+               VALUES ('delete', old.id, old.detalle, old.ubicacion);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE OF detalle, ubicacion ON tickets BEGIN
+               INSERT INTO tickets_fts(tickets_fts, rowid, detalle, ubicacion)
+               VALUES ('delete', old.id, old.detalle, old.ubicacion);
+               INSERT INTO tickets_fts(rowid, detalle, ubicacion)
+               VALUES (new.id, new.detalle, new.ubicacion);
+           END""",
+    ]
+    try:
+        for sql in statements:
+            execute(sql, commit=True)
+        if creada:
+            execute("INSERT INTO tickets_fts(tickets_fts) VALUES ('rebuild')", commit=True)
+    except Exception as e:
+        logger.warning(f"⚠️ FTS5 no disponible, buscar_tickets usará LIKE: {e}")
+        return
+
+    logger.info("✅ Búsqueda de tickets lista (FTS5)")
+
+
 def create_trigger_updated_at():
     """Crea trigger para actualizar updated_at automáticamente."""
     if not using_pg():
@@ -191,6 +835,84 @@ def create_trigger_updated_at():
     except Exception as e:
         logger.warning(f"⚠️ Error creando trigger: {e}")
 
+def create_staff_notify_triggers():
+    """
+    NOTIFY 'staff_changed' cuando cambian public.users / public.orgusers
+    (altas, bajas, área, turno_activo...). Lo escucha pg_listener para
+    invalidar el directorio de workers (staff_directory) en todos los procesos.
+    FOR EACH STATEMENT: un UPDATE masivo genera un solo NOTIFY.
+    """
+    if not using_pg():
+        logger.info("⏭️ Triggers solo para PostgreSQL, saltando...")
+        return
+
+    logger.info("⚡ Verificando triggers NOTIFY de staff...")
+
+    statements = [
+        """CREATE OR REPLACE FUNCTION public.notify_staff_changed()
+           RETURNS TRIGGER AS $$
+           BEGIN
+               PERFORM pg_notify('staff_changed', TG_TABLE_NAME);
+               RETURN NULL;
+           END;
+           $$ LANGUAGE plpgsql""",
+    ]
+    for table in ("users", "orgusers"):
+        statements += [
+            f"DROP TRIGGER IF EXISTS {table}_staff_changed ON public.{table}",
+            f"""CREATE TRIGGER {table}_staff_changed
+                AFTER INSERT OR UPDATE OR DELETE ON public.{table}
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION public.notify_staff_changed()""",
+        ]
+
+    try:
+        for sql in statements:
+            execute(sql, commit=True)
+        logger.info("✅ Triggers NOTIFY de staff listos")
+    except Exception as e:
+        logger.warning(f"⚠️ Error creando triggers NOTIFY de staff: {e}")
+
+
+def create_guest_ticket_notify_trigger():
+    """
+    NOTIFY 'guest_ticket' con el id de cada ticket de huésped que queda
+    pendiente de avisar a supervisores (INSERT, o UPDATE que lo deja así).
+    Lo escucha ticket_watch vía pg_listener: no necesita hacer polling.
+    El propio claim (assignment_notif_sent = true) no dispara el NOTIFY.
+    """
+    if not using_pg():
+        logger.info("⏭️ Triggers solo para PostgreSQL, saltando...")
+        return
+
+    logger.info("⚡ Verificando trigger NOTIFY de tickets de huésped...")
+
+    statements = [
+        """CREATE OR REPLACE FUNCTION public.notify_guest_ticket()
+           RETURNS TRIGGER AS $$
+           BEGIN
+               PERFORM pg_notify('guest_ticket', NEW.id::text);
+               RETURN NULL;
+           END;
+           $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS tickets_guest_notify ON public.tickets",
+        """CREATE TRIGGER tickets_guest_notify
+           AFTER INSERT OR UPDATE OF estado, canal_origen, assignment_notif_sent ON public.tickets
+           FOR EACH ROW
+           WHEN (NEW.canal_origen = 'huesped_whatsapp'
+                 AND NEW.assignment_notif_sent IS NOT TRUE
+                 AND NEW.estado IN ('PENDIENTE', 'PENDIENTE_APROBACION', 'PENDIENTE_APROBACIÓN'))
+           EXECUTE FUNCTION public.notify_guest_ticket()""",
+    ]
+
+    try:
+        for sql in statements:
+            execute(sql, commit=True)
+        logger.info("✅ Trigger NOTIFY de tickets de huésped listo")
+    except Exception as e:
+        logger.warning(f"⚠️ Error creando trigger NOTIFY de tickets de huésped: {e}")
+
+
 def seed_base_data():
     """
     Crea datos base mínimos necesarios (org y hotel).
@@ -333,12 +1055,54 @@ def run_migrations_updated():
             create_indices()
             create_trigger_updated_at()
         
+        ensure_ticket_assignment_columns()
+        ensure_ticket_timing_columns()
+        create_hot_query_indices()
+        ensure_ticket_priority_rank()
+        ensure_ticket_search()
+
         # ✅ NUEVO: Verificar/crear tabla ticket_media
         if not ticket_media_exists:
             create_ticket_media_table()
         else:
             logger.info("✅ Tabla 'ticket_media' ya existe")
-        
+
+        ensure_ticket_media_job_columns()
+        ensure_ticket_media_hash_columns()
+
+        if not table_exists("ticket_media_renditions"):
+            create_ticket_media_renditions_table()
+        else:
+            logger.info("✅ Tabla 'ticket_media_renditions' ya existe")
+
+        if not table_exists("ticket_events"):
+            create_ticket_events_table()
+        else:
+            logger.info("✅ Tabla 'ticket_events' ya existe")
+
+        if not table_exists("ticket_watch_state"):
+            create_ticket_watch_state_table()
+        else:
+            logger.info("✅ Tabla 'ticket_watch_state' ya existe")
+
+        if not table_exists("background_leader"):
+            create_background_leader_table()
+        else:
+            logger.info("✅ Tabla 'background_leader' ya existe")
+
+        if not table_exists("background_job_runs"):
+            create_background_job_runs_table()
+        else:
+            logger.info("✅ Tabla 'background_job_runs' ya existe")
+
+        if not table_exists("hotel_topology"):
+            create_hotel_topology_table()
+        else:
+            logger.info("✅ Tabla 'hotel_topology' ya existe")
+
+        create_staff_notify_triggers()
+        create_guest_ticket_notify_trigger()
+
         # Siempre verificar y crear datos base
         seed_base_data()
         seed_workers()
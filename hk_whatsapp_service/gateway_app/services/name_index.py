@@ -0,0 +1,195 @@
+# gateway_app/services/name_index.py
+"""
+Índice de nombres de workers para búsqueda tolerante a errores.
+
+Se construye una vez (al cargar el directorio de workers) y precalcula por
+cada token del nombre:
+- forma normalizada (minúsculas, sin tildes)
+- trigramas estilo pg_trgm ('  x ' con padding) → postings trigrama → workers
+- clave fonética en español (v/b, c/s/z, ll/y/j, h muda, qu/k, ge/je...)
+
+La búsqueda junta candidatos desde los postings (no recorre todo el roster)
+y los rankea por tramos:
+
+    1.00 exact        nombre completo igual
+    0.97 exact_token  todos los tokens de la consulta están en el nombre
+    0.93 prefix       todos los tokens son token o prefijo ("mar" → "maria")
+    0.90 contains     la consulta es substring del nombre
+    <0.85 fuzzy       promedio por token de: fonética, trigramas
+
+Si hay matches directos (exact..contains) se devuelven solo esos: así
+"maria" no trae a "Mario". Los fuzzy solo aparecen cuando no hubo ninguno
+("Soláng" → "Solange", "Adriana DA" → "Adriana Díaz").
+"""
+from __future__ import annotations
+
+import os
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+NAME_FUZZY_MIN_SCORE = float(os.getenv("NAME_FUZZY_MIN_SCORE", "0.45"))
+
+_SCORE_EXACT = 1.0
+_SCORE_EXACT_TOKEN = 0.97
+_SCORE_PREFIX = 0.93
+_SCORE_CONTAINS = 0.90
+_FUZZY_CAP = 0.85
+
+# Token a token (fuzzy)
+_TOKEN_PREFIX = 0.9
+_TOKEN_PHONETIC = 0.85
+
+
+def normalize_name(s: str) -> str:
+    """Minúsculas, sin tildes, solo letras/dígitos separados por un espacio."""
+    s = unicodedata.normalize("NFD", (s or "").strip().lower())
+    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    return " ".join(re.findall(r"[^\W_]+", s))
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+_PHONETIC_RULES = (
+    (re.compile(r"ch"), "X"),
+    (re.compile(r"qu"), "k"),
+    (re.compile(r"ll"), "y"),
+    (re.compile(r"gu(?=[ei])"), "g"),
+    (re.compile(r"g(?=[ei])"), "j"),
+    (re.compile(r"c(?=[ei])"), "s"),
+    (re.compile(r"c"), "k"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"v"), "b"),
+    (re.compile(r"w"), "u"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"h"), ""),
+    (re.compile(r"y(?=[aeiou])"), "j"),
+    (re.compile(r"y"), "i"),
+)
+
+
+def phonetic_key(token: str) -> str:
+    """
+    Clave fonética española (aprox.) de un token ya normalizado.
+
+        >>> phonetic_key("silvia") == phonetic_key("cilbia")
+        True
+        >>> phonetic_key("hector") == phonetic_key("ektor")
+        True
+    """
+    key = token
+    for pattern, repl in _PHONETIC_RULES:
+        key = pattern.sub(repl, key)
+    # Letras dobles ("ss", "nn") suenan igual que simples
+    return re.sub(r"(.)\1+", r"\1", key)
+
+
+def _trigram_similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Token:
+    __slots__ = ("text", "trigrams", "phonetic")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.trigrams = trigrams(text)
+        self.phonetic = phonetic_key(text)
+
+
+class NameIndex:
+    """
+    Índice inmutable sobre una lista de nombres (posición i ↔ items[i]).
+
+    search() devuelve [(score, match_type, posición)] ordenado por score.
+    """
+
+    def __init__(self, names: Sequence[str]):
+        self._full: List[str] = [normalize_name(n) for n in names]
+        self._tokens: List[List[_Token]] = [[_Token(t) for t in full.split()] for full in self._full]
+        self._by_trigram: Dict[str, Set[int]] = {}
+        self._by_phonetic: Dict[str, Set[int]] = {}
+
+        for i, tokens in enumerate(self._tokens):
+            for tok in tokens:
+                for tg in tok.trigrams:
+                    self._by_trigram.setdefault(tg, set()).add(i)
+                self._by_phonetic.setdefault(tok.phonetic, set()).add(i)
+
+    def __len__(self) -> int:
+        return len(self._full)
+
+    def _candidates(self, query_tokens: List[_Token]) -> Set[int]:
+        found: Set[int] = set()
+        for qt in query_tokens:
+            found |= self._by_phonetic.get(qt.phonetic, set())
+            for tg in qt.trigrams:
+                found |= self._by_trigram.get(tg, set())
+        return found
+
+    @staticmethod
+    def _token_score(qt: _Token, tokens: List[_Token]) -> float:
+        best = 0.0
+        for tok in tokens:
+            if qt.text == tok.text:
+                return 1.0
+            if tok.text.startswith(qt.text):
+                score = _TOKEN_PREFIX
+            elif qt.phonetic == tok.phonetic:
+                score = _TOKEN_PHONETIC
+            else:
+                score = _trigram_similarity(qt.trigrams, tok.trigrams)
+            best = max(best, score)
+        return best
+
+    def _score(self, query: str, query_tokens: List[_Token], i: int) -> Tuple[float, Optional[str]]:
+        full = self._full[i]
+        tokens = self._tokens[i]
+        texts = [t.text for t in tokens]
+
+        if full == query:
+            return _SCORE_EXACT, "exact"
+        if all(qt.text in texts for qt in query_tokens):
+            return _SCORE_EXACT_TOKEN, "exact_token"
+        if all(any(t.startswith(qt.text) for t in texts) for qt in query_tokens):
+            return _SCORE_PREFIX, "prefix"
+        if query in full:
+            return _SCORE_CONTAINS, "contains"
+
+        score = sum(self._token_score(qt, tokens) for qt in query_tokens) / len(query_tokens)
+        score *= _FUZZY_CAP
+        if score >= NAME_FUZZY_MIN_SCORE:
+            return score, "fuzzy"
+        return 0.0, None
+
+    def search(self, query: str) -> List[Tuple[float, str, int]]:
+        query = normalize_name(query)
+        if not query:
+            return []
+        query_tokens = [_Token(t) for t in query.split()]
+
+        hits = []
+        for i in self._candidates(query_tokens):
+            score, match_type = self._score(query, query_tokens, i)
+            if match_type:
+                hits.append((score, match_type, i))
+
+        direct = [h for h in hits if h[1] != "fuzzy"]
+        hits = direct or hits
+        hits.sort(key=lambda h: (-h[0], self._full[h[2]]))
+        return hits
+
+
+def search_items(
+    query: str,
+    items: Sequence[Dict[str, Any]],
+    key: str = "nombre_completo",
+) -> List[Tuple[float, str, Dict[str, Any]]]:
+    """Búsqueda ad-hoc sobre una lista chica (ej. candidatos en pantalla)."""
+    index = NameIndex([it.get(key) or "" for it in items])
+    return [(score, match_type, items[i]) for score, match_type, i in index.search(query)]
@@ -0,0 +1,118 @@
+# gateway_app/services/pg_listener.py
+"""
+LISTEN/NOTIFY compartido (solo Postgres).
+
+UNA conexión dedicada por proceso (autocommit) escucha todos los canales
+registrados y despacha cada NOTIFY a sus callbacks:
+
+    register_listener("staff_changed", lambda payload: ...)
+
+- Los canales se pueden registrar antes o después de iniciar el thread.
+- Al (re)conectar se llama a cada callback con payload=None: mientras no
+  hubo conexión se pudieron perder notificaciones, así que el consumidor
+  debe resincronizar (invalidar cache, re-escanear, etc.).
+- Reconexión con backoff exponencial (máx. PG_LISTENER_MAX_BACKOFF_SECONDS).
+- Con SQLite o PG_LISTENER_ENABLED=false no corre: los consumidores quedan
+  con su mecanismo de respaldo (TTL, polling).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from gateway_app.services.db import DATABASE_URL, using_pg
+
+logger = logging.getLogger(__name__)
+
+PG_LISTENER_POLL_SECONDS = float(os.getenv("PG_LISTENER_POLL_SECONDS", "5"))
+PG_LISTENER_MAX_BACKOFF_SECONDS = float(os.getenv("PG_LISTENER_MAX_BACKOFF_SECONDS", "60"))
+
+_callbacks: Dict[str, List[Callable[[Optional[str]], None]]] = {}
+_callbacks_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_start_lock = threading.Lock()
+
+_CHANNEL_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def register_listener(channel: str, callback: Callable[[Optional[str]], None]) -> None:
+    """Suscribe callback(payload) al canal NOTIFY `channel`."""
+    if not _CHANNEL_RE.match(channel):
+        raise ValueError(f"Canal NOTIFY inválido: {channel!r}")
+    with _callbacks_lock:
+        _callbacks.setdefault(channel, []).append(callback)
+
+
+def listener_running() -> bool:
+    return _thread is not None and _thread.is_alive()
+
+
+def _dispatch(channel: str, payload: Optional[str]) -> None:
+    with _callbacks_lock:
+        callbacks = list(_callbacks.get(channel, []))
+    for cb in callbacks:
+        try:
+            cb(payload)
+        except Exception:
+            logger.exception(f"PG_LISTENER callback de '{channel}' falló")
+
+
+def _listen_loop() -> None:
+    import psycopg
+
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            conn = psycopg.connect(DATABASE_URL, autocommit=True)
+            listening: set = set()
+            logger.info("PG_LISTENER conectado")
+            backoff = 1.0
+
+            while True:
+                with _callbacks_lock:
+                    nuevos = set(_callbacks) - listening
+                for channel in sorted(nuevos):
+                    conn.execute(f"LISTEN {channel}")
+                    listening.add(channel)
+                    # Recién escuchando: lo anterior se pudo perder → resincronizar
+                    _dispatch(channel, None)
+
+                for notify in conn.notifies(timeout=PG_LISTENER_POLL_SECONDS):
+                    _dispatch(notify.channel, notify.payload)
+
+        except Exception as e:
+            logger.warning(f"⚠️ PG_LISTENER desconectado ({e}); reintento en {backoff:.0f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, PG_LISTENER_MAX_BACKOFF_SECONDS)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def start_pg_listener() -> None:
+    """Inicia el thread que escucha NOTIFY (no-op en SQLite)."""
+    global _thread
+
+    if not using_pg():
+        logger.info("PG_LISTENER not started (SQLite)")
+        return
+
+    enabled = (os.getenv("PG_LISTENER_ENABLED", "true") or "").lower() == "true"
+    if not enabled:
+        logger.info("PG_LISTENER not started (PG_LISTENER_ENABLED=false)")
+        return
+
+    with _start_lock:
+        if listener_running():
+            return
+        _thread = threading.Thread(target=_listen_loop, daemon=True, name="pg_listener")
+        _thread.start()
+    logger.info(f"PG_LISTENER started channels={sorted(_callbacks)}")
@@ -0,0 +1,177 @@
+# gateway_app/services/query_plans.py
+"""
+Chequeo de planes (EXPLAIN) de las consultas calientes de tickets.
+
+Para cada consulta se obtienen dos planes:
+- plan normal: lo que el planner elige hoy (con tablas chicas un Seq Scan es legítimo)
+- plan forzado (enable_seqscan = off): si AÚN hace Seq Scan, no existe un índice
+  que sirva para esa consulta → eso es lo que reportamos como problema.
+
+Se loguea al iniciar (después de migraciones) y se expone en /db-status.
+La SQL se importa de tickets_db.py / workers_db.py / ticket_watch.py
+(constantes *_SQL): se revisa exactamente lo que se ejecuta.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from contextlib import suppress
+from typing import Any, Dict, List
+
+from gateway_app.services.db import db, fetchall, using_pg
+
+logger = logging.getLogger(__name__)
+
+
+def _scope() -> tuple:
+    return (
+        int(os.getenv("ORG_ID_DEFAULT", "0") or 0),
+        int(os.getenv("HOTEL_ID_DEFAULT", "0") or 0),
+    )
+
+
+def hot_queries() -> Dict[str, tuple]:
+    """name → (sql, params), con la MISMA SQL que ejecutan los módulos."""
+    from gateway_app.services import ticket_watch
+    from gateway_app.services.tickets_db import (
+        DUPLICADO_PG_SQL,
+        DUPLICADO_SQLITE_SQL,
+        ESTADOS_PENDIENTES,
+        PAGINA_KEYSET_SQL,
+        PAGINA_TICKETS_SQL,
+        PENDIENTES_SQL,
+        SIGUIENTE_PENDIENTE_SQL,
+        TICKETS_ASIGNADOS_SQL,
+        TICKETS_POR_ESTADO_SQL,
+        _ESTADOS_ABIERTOS,
+    )
+    from gateway_app.services.workers_db import CARGA_WORKERS_SQL
+
+    table = "public.tickets" if using_pg() else "tickets"
+    org_id, hotel_id = _scope()
+    states = ",".join(["?"] * len(ESTADOS_PENDIENTES))
+    abiertos = ", ".join(f"'{e}'" for e in _ESTADOS_ABIERTOS)
+    keyset = PAGINA_KEYSET_SQL.format(created_ph="?::timestamptz" if using_pg() else "?")
+
+    if using_pg():
+        duplicado = (
+            DUPLICADO_PG_SQL.format(estados=abiertos),
+            ["x", org_id, hotel_id, "0", 30, 0.3],
+        )
+        watch_sql = ticket_watch.RECENT_GUEST_TICKETS_PG_SQL
+    else:
+        duplicado = (
+            DUPLICADO_SQLITE_SQL.format(estados=abiertos),
+            [org_id, hotel_id, "0", "-30 minutes"],
+        )
+        watch_sql = ticket_watch.RECENT_GUEST_TICKETS_SQLITE_SQL
+
+    return {
+        "obtener_pendientes": (
+            PENDIENTES_SQL.format(table=table, estados=states),
+            [org_id, hotel_id, *ESTADOS_PENDIENTES],
+        ),
+        "obtener_tickets_por_estado": (
+            TICKETS_POR_ESTADO_SQL.format(table=table),
+            [org_id, hotel_id, "ASIGNADO"],
+        ),
+        "obtener_tickets_asignados_a": (
+            TICKETS_ASIGNADOS_SQL.format(table=table),
+            ["0"],
+        ),
+        "obtener_siguiente_pendiente": (
+            SIGUIENTE_PENDIENTE_SQL.format(table=table, estados=states),
+            [org_id, hotel_id, *ESTADOS_PENDIENTES],
+        ),
+        "obtener_pagina_tickets": (
+            PAGINA_TICKETS_SQL.format(table=table, estados="?", keyset=keyset),
+            [org_id, hotel_id, "ASIGNADO", 0, "2000-01-01", 0, 6],
+        ),
+        "buscar_ticket_duplicado": duplicado,
+        "cargar_carga_workers": (
+            CARGA_WORKERS_SQL.format(table=table),
+            [org_id, hotel_id],
+        ),
+        "ticket_watch": (
+            watch_sql.format(table=table, states=states),
+            [org_id, hotel_id, *ESTADOS_PENDIENTES, 1440],
+        ),
+        "ticket_watch_incremental": (
+            ticket_watch.TICKETS_AFTER_SQL.format(table=table),
+            [0, org_id, hotel_id],
+        ),
+    }
+
+
+def _pg_seq_scans(plan: Any) -> List[str]:
+    """Relaciones con Seq Scan dentro de un plan JSON de Postgres."""
+    found: List[str] = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+        if "Plan" in node:
+            stack.append(node["Plan"])
+        if node.get("Node Type") == "Seq Scan":
+            found.append(node.get("Relation Name") or "?")
+        stack.extend(node.get("Plans", []))
+    return found
+
+
+def _pg_explain(sql: str, params: list, force_index: bool) -> List[str]:
+    conn = db()
+    try:
+        cur = conn.cursor()
+        if force_index:
+            cur.execute("SET LOCAL enable_seqscan = off")
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql.replace("?", "%s"), params)
+        raw = cur.fetchone()[0]
+        cur.close()
+        conn.rollback()
+        plan = json.loads(raw) if isinstance(raw, str) else raw
+        return _pg_seq_scans(plan)
+    finally:
+        with suppress(Exception):
+            conn.close()
+
+
+def _sqlite_explain(sql: str, params: list) -> List[str]:
+    rows = fetchall("EXPLAIN QUERY PLAN " + sql, params)
+    # "SCAN tickets" = full scan; "SEARCH tickets USING INDEX ..." = por índice
+    return [
+        r.get("detail", "") for r in rows
+        if str(r.get("detail", "")).startswith("SCAN ") and "USING" not in str(r.get("detail", ""))
+    ]
+
+
+def check_hot_query_plans() -> List[Dict[str, Any]]:
+    """
+    Returns:
+        [{"query": str, "seq_scan": [..], "sin_indice": bool, "error": str|None}, ...]
+    """
+    report = []
+
+    for name, (sql, params) in hot_queries().items():
+        entry: Dict[str, Any] = {"query": name, "seq_scan": [], "sin_indice": False, "error": None}
+        try:
+            if using_pg():
+                entry["seq_scan"] = _pg_explain(sql, params, force_index=False)
+                entry["sin_indice"] = bool(_pg_explain(sql, params, force_index=True))
+            else:
+                entry["seq_scan"] = _sqlite_explain(sql, params)
+                entry["sin_indice"] = bool(entry["seq_scan"])
+        except Exception as e:
+            entry["error"] = str(e)
+
+        if entry["sin_indice"]:
+            logger.warning(f"⚠️ QUERY_PLANS {name}: Seq Scan sin índice utilizable ({entry['seq_scan']})")
+        elif entry["seq_scan"]:
+            logger.info(f"QUERY_PLANS {name}: Seq Scan elegido por el planner (tabla chica), hay índice")
+        report.append(entry)
+
+    return report
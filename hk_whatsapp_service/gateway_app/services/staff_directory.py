@@ -0,0 +1,243 @@
+# gateway_app/services/staff_directory.py
+"""
+Directorio de workers en memoria (por proceso).
+
+El roster (users ⋈ orgusers) casi no cambia, pero se consultaba varias
+veces por mensaje: obtener_todos_workers en cada listado del supervisor,
+buscar_worker_por_telefono / obtener_area_worker en cada mensaje de HK.
+Ahora se carga una vez por (org_id, hotel_id) y se indexa:
+
+    telefono normalizado → worker
+    nombre               → NameIndex (tokens, trigramas, clave fonética)
+    area                 → [workers]
+
+Frescura:
+- TTL (STAFF_DIRECTORY_TTL_SECONDS, default 300): respaldo si se pierde
+  un NOTIFY o no hay listener (SQLite).
+- NOTIFY 'staff_changed': trigger en public.users / public.orgusers (ver
+  migrations.create_staff_notify_triggers) → invalida en todos los procesos
+  vía pg_listener. Incluye cambios de turno_activo.
+- activar/desactivar turno invalidan también localmente (sin esperar el NOTIFY).
+
+Carga de trabajo (tickets abiertos por worker y estado):
+- UNA consulta GROUP BY assigned_phone, estado por scope, cacheada aparte
+  del roster con su propio TTL (WORKLOAD_TTL_SECONDS, default 60): cambia
+  mucho más seguido y otros procesos también asignan.
+- TicketStateMachine la ajusta en memoria en cada transición de este
+  proceso (adjust_workload) o la invalida si no sabe el estado anterior.
+- Los workers que entrega el directorio traen `carga` ({estado: n}) y
+  `tickets_asignados` (total), que usa calcular_score_worker.
+
+Última ubicación conocida (proximidad, ver hotel_topology):
+- Se carga junto con la carga de trabajo (mismo TTL e invalidación): la
+  ubicación del ticket EN_CURSO del worker o, si no tiene, la del último
+  que trabajó.
+- TicketStateMachine la actualiza al tomar/pausar/reanudar/terminar
+  (set_location). Los workers traen `ultima_ubicacion` (o None).
+
+La instancia vive en workers_db (dueño del loader y de la normalización
+de nombres/teléfonos). Los workers se entregan como copias: los callers
+pueden mutarlos sin ensuciar el cache.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from gateway_app.services.name_index import NameIndex
+
+logger = logging.getLogger(__name__)
+
+STAFF_DIRECTORY_TTL_SECONDS = float(os.getenv("STAFF_DIRECTORY_TTL_SECONDS", "300"))
+WORKLOAD_TTL_SECONDS = float(os.getenv("WORKLOAD_TTL_SECONDS", "60"))
+STAFF_NOTIFY_CHANNEL = "staff_changed"
+
+
+class _Snapshot:
+    """Roster de un (org_id, hotel_id) con sus índices."""
+
+    def __init__(self, workers: List[Dict[str, Any]], norm_phone):
+        self.loaded_at = time.monotonic()
+        self.workers = workers
+        self.by_phone: Dict[str, Dict[str, Any]] = {}
+        self.by_area: Dict[str, List[Dict[str, Any]]] = {}
+
+        for w in workers:
+            phone = norm_phone(w.get("telefono") or "")
+            if phone:
+                self.by_phone.setdefault(phone, w)
+            self.by_area.setdefault(w.get("area") or "HOUSEKEEPING", []).append(w)
+
+        self.names = NameIndex([w.get("nombre_completo") or "" for w in workers])
+
+
+class StaffDirectory:
+    """Cache de roster por scope con TTL + invalidación (ver docstring del módulo)."""
+
+    def __init__(
+        self,
+        loader: Callable[[int, int], List[Dict[str, Any]]],
+        norm_phone,
+        workload_loader: Optional[Callable[[int, int], Dict[str, Dict[str, int]]]] = None,
+        location_loader: Optional[Callable[[int, int], Dict[str, str]]] = None,
+    ):
+        self._loader = loader
+        self._norm_phone = norm_phone
+        self._snapshots: Dict[Tuple[int, int], _Snapshot] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self._workload_loader = workload_loader
+        self._location_loader = location_loader
+        # scope → (loaded_at, phone → {estado: n}, phone → ubicación)
+        self._workload: Dict[Tuple[int, int], Tuple[float, Dict[str, Dict[str, int]], Dict[str, str]]] = {}
+        self._workload_lock = threading.Lock()
+        self._workload_generation = 0
+
+    def _snapshot(self, org_id: int, hotel_id: int) -> _Snapshot:
+        key = (org_id, hotel_id)
+        snap = self._snapshots.get(key)
+        if snap is not None and time.monotonic() - snap.loaded_at < STAFF_DIRECTORY_TTL_SECONDS:
+            return snap
+
+        with self._lock:
+            snap = self._snapshots.get(key)
+            if snap is not None and time.monotonic() - snap.loaded_at < STAFF_DIRECTORY_TTL_SECONDS:
+                return snap
+
+            generation = self._generation
+            snap = _Snapshot(self._loader(org_id, hotel_id), self._norm_phone)
+            # Si llegó una invalidación durante la carga, no guardar (podría estar vieja)
+            if generation == self._generation:
+                self._snapshots[key] = snap
+            logger.info(f"👥 STAFF_DIRECTORY cargado org={org_id} hotel={hotel_id}: {len(snap.workers)} workers")
+            return snap
+
+    def invalidate(self, reason: str = "") -> None:
+        """Descarta todos los snapshots; el próximo acceso recarga."""
+        self._generation += 1
+        self._snapshots = {}
+        logger.info(f"👥 STAFF_DIRECTORY invalidado ({reason or 'manual'})")
+
+    # ------------------------------------------------------------------
+    # Carga de trabajo
+    # ------------------------------------------------------------------
+
+    def _operational(self, org_id: int, hotel_id: int) -> Tuple[Dict[str, Dict[str, int]], Dict[str, str]]:
+        """(carga, ubicaciones) del scope. Si falla la carga: ({}, {}) sin cachear."""
+        if self._workload_loader is None:
+            return {}, {}
+
+        key = (org_id, hotel_id)
+        cached = self._workload.get(key)
+        if cached is not None and time.monotonic() - cached[0] < WORKLOAD_TTL_SECONDS:
+            return cached[1], cached[2]
+
+        with self._workload_lock:
+            cached = self._workload.get(key)
+            if cached is not None and time.monotonic() - cached[0] < WORKLOAD_TTL_SECONDS:
+                return cached[1], cached[2]
+
+            generation = self._workload_generation
+            try:
+                counts = self._workload_loader(org_id, hotel_id)
+            except Exception as e:
+                logger.warning(f"⚠️ STAFF_DIRECTORY no pudo cargar la carga de trabajo: {e}")
+                return {}, {}
+
+            locations: Dict[str, str] = {}
+            if self._location_loader is not None:
+                try:
+                    locations = self._location_loader(org_id, hotel_id)
+                except Exception as e:
+                    # Sin ubicaciones solo se pierde el bonus de proximidad
+                    logger.warning(f"⚠️ STAFF_DIRECTORY no pudo cargar ubicaciones: {e}")
+
+            if generation == self._workload_generation:
+                self._workload[key] = (time.monotonic(), counts, locations)
+            return counts, locations
+
+    def workload(self, org_id: int, hotel_id: int) -> Dict[str, Dict[str, int]]:
+        """phone → {estado: n} de tickets abiertos."""
+        return self._operational(org_id, hotel_id)[0]
+
+    def adjust_workload(self, org_id: int, hotel_id: int, phone: str, deltas: Dict[str, int]) -> None:
+        """Aplica una transición conocida (ej. {'ASIGNADO': -1, 'EN_CURSO': 1}) al cache."""
+        phone = self._norm_phone(phone)
+        if not phone:
+            return
+        with self._workload_lock:
+            cached = self._workload.get((org_id, hotel_id))
+            if cached is None:
+                return  # se cargará completa en el próximo acceso
+            per_estado = cached[1].setdefault(phone, {})
+            for estado, delta in deltas.items():
+                n = per_estado.get(estado, 0) + delta
+                if n > 0:
+                    per_estado[estado] = n
+                else:
+                    per_estado.pop(estado, None)
+
+    def set_location(self, org_id: int, hotel_id: int, phone: str, ubicacion: str) -> None:
+        """El worker está (o estuvo recién) en `ubicacion`."""
+        phone = self._norm_phone(phone)
+        if not phone or not ubicacion:
+            return
+        with self._workload_lock:
+            cached = self._workload.get((org_id, hotel_id))
+            if cached is not None:
+                cached[2][phone] = ubicacion
+
+    def invalidate_workload(self, reason: str = "") -> None:
+        with self._workload_lock:
+            self._workload_generation += 1
+            self._workload = {}
+        logger.debug(f"STAFF_DIRECTORY carga invalidada ({reason or 'manual'})")
+
+    def _with_load(self, w: Dict[str, Any], ops: Tuple[Dict[str, Dict[str, int]], Dict[str, str]]) -> Dict[str, Any]:
+        load, locations = ops
+        phone = self._norm_phone(w.get("telefono") or "")
+        carga = dict(load.get(phone, {}))
+        return {
+            **w,
+            "carga": carga,
+            "tickets_asignados": sum(carga.values()),
+            "ultima_ubicacion": locations.get(phone),
+        }
+
+    # ------------------------------------------------------------------
+    # Lecturas (siempre copias)
+    # ------------------------------------------------------------------
+
+    def workers(self, org_id: int, hotel_id: int) -> List[Dict[str, Any]]:
+        ops = self._operational(org_id, hotel_id)
+        return [self._with_load(w, ops) for w in self._snapshot(org_id, hotel_id).workers]
+
+    def by_phone(self, phone: str, org_id: int, hotel_id: int) -> Optional[Dict[str, Any]]:
+        w = self._snapshot(org_id, hotel_id).by_phone.get(self._norm_phone(phone))
+        return self._with_load(w, self._operational(org_id, hotel_id)) if w else None
+
+    def by_area(self, area: str, org_id: int, hotel_id: int) -> List[Dict[str, Any]]:
+        ops = self._operational(org_id, hotel_id)
+        return [self._with_load(w, ops) for w in self._snapshot(org_id, hotel_id).by_area.get(area, [])]
+
+    def search_names(self, query: str, org_id: int, hotel_id: int) -> List[Tuple[float, str, Dict[str, Any]]]:
+        """(score, match_type, worker) rankeados (ver name_index)."""
+        snap = self._snapshot(org_id, hotel_id)
+        hits = snap.names.search(query)
+        ops = self._operational(org_id, hotel_id) if hits else ({}, {})
+        return [(score, match_type, self._with_load(snap.workers[i], ops)) for score, match_type, i in hits]
+
+
+def start_staff_directory_listener() -> None:
+    """Invalida el directorio con cada NOTIFY staff_changed (vía pg_listener)."""
+    from gateway_app.services.pg_listener import register_listener
+    from gateway_app.services.workers_db import invalidar_directorio_workers
+
+    register_listener(
+        STAFF_NOTIFY_CHANNEL,
+        lambda payload: invalidar_directorio_workers(f"NOTIFY {payload or 'resync'}"),
+    )
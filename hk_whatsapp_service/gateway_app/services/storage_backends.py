@@ -0,0 +1,593 @@
+# gateway_app/services/storage_backends.py
+"""
+Backends de almacenamiento de medios.
+
+Interfaz común (StorageBackend):
+    put / put_stream / get / stream / signed_url / public_url / delete / exists
+
+Implementaciones:
+- SupabaseStorage: Supabase Storage por HTTP (upload simple + TUS resumible)
+- LocalStorage:    filesystem local (desarrollo, load tests y benchmarks offline)
+- S3Storage:       cualquier S3-compatible (AWS, R2, MinIO...) vía boto3 (opcional)
+
+Selección por env MEDIA_STORAGE_BACKEND = supabase | local | s3.
+Si no se define: supabase, que exige SUPABASE_URL/SUPABASE_SERVICE_KEY.
+Sin configuración válida get_storage_backend() lanza StorageError: el media
+queda sin storage_url y los envíos usan el media_id de WhatsApp.
+
+local es solo opt-in (MEDIA_STORAGE_BACKEND=local) y exige
+MEDIA_PUBLIC_BASE_URL http(s) que sirva MEDIA_LOCAL_DIR: storage_url se
+manda a WhatsApp como link, y una URL file:// no la puede descargar nadie.
+"""
+from __future__ import annotations
+
+import base64
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, Iterator, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BUCKET = "ticket-media"
+
+# Abre la fuente a subir desde un offset (para reanudar) → iterador de bytes
+SourceOpener = Callable[[int], Iterable[bytes]]
+# Persiste (o limpia con None) el token de una subida resumible en curso
+ResumeCallback = Callable[[Optional[str]], None]
+
+
+class StorageError(Exception):
+    """Error de un backend de almacenamiento."""
+
+
+def is_http_url(url: Optional[str]) -> bool:
+    """¿URL que un tercero (WhatsApp) puede descargar?"""
+    return bool(url) and url.lower().startswith(("http://", "https://"))
+
+
+class StorageBackend(ABC):
+    """Interfaz de almacenamiento. `path` es relativo al bucket (p.ej. media/abc.jpg)."""
+
+    name = "base"
+
+    @abstractmethod
+    def put(self, path: str, data: bytes, content_type: str) -> str:
+        """Guarda (upsert) y retorna la URL pública."""
+
+    def put_stream(
+        self,
+        path: str,
+        open_source: SourceOpener,
+        content_type: str,
+        length: int,
+        resume_token: Optional[str] = None,
+        on_resume_token: Optional[ResumeCallback] = None,
+        max_resumes: int = 3
+    ) -> str:
+        """
+        Sube en streaming con memoria acotada. Si el backend soporta reanudar,
+        `resume_token` retoma una subida previa y `open_source(offset)` se vuelve
+        a abrir desde el último byte confirmado.
+
+        Implementación por defecto: junta los bytes y usa put() (sin reanudación).
+        """
+        data = b"".join(open_source(0))
+        return self.put(path, data, content_type)
+
+    def get(self, path: str) -> bytes:
+        return b"".join(self.stream(path))
+
+    @abstractmethod
+    def stream(self, path: str, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        ...
+
+    @abstractmethod
+    def signed_url(self, path: str, expires_in: int = 3600) -> str:
+        ...
+
+    @abstractmethod
+    def public_url(self, path: str) -> str:
+        ...
+
+    def path_from_url(self, url: str) -> Optional[str]:
+        """Inverso de public_url: path dentro del bucket, o None si la URL no es de este backend."""
+        prefix = self.public_url("")
+        if url and prefix and url.startswith(prefix):
+            return url[len(prefix):]
+        return None
+
+    @abstractmethod
+    def delete(self, path: str) -> None:
+        ...
+
+    @abstractmethod
+    def exists(self, path: str) -> bool:
+        ...
+
+
+# ============================================================
+# SUPABASE
+# ============================================================
+
+class SupabaseStorage(StorageBackend):
+    """Supabase Storage (REST + TUS resumible)."""
+
+    name = "supabase"
+    TUS_CHUNK_SIZE = 6 * 1024 * 1024  # Supabase exige chunks de 6MB (salvo el último)
+
+    def __init__(self, url: str, key: str, bucket: str = STORAGE_BUCKET):
+        self.url = url.rstrip("/")
+        self.key = key
+        self.bucket = bucket
+
+    def _auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.key}"}
+
+    def public_url(self, path: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{path}"
+
+    def put(self, path: str, data: bytes, content_type: str) -> str:
+        resp = requests.post(
+            f"{self.url}/storage/v1/object/{self.bucket}/{path}",
+            headers={**self._auth(), "Content-Type": content_type, "x-upsert": "true"},
+            data=data,
+            timeout=60,
+        )
+        if resp.status_code not in (200, 201):
+            raise StorageError(f"Error subiendo: {resp.status_code} - {resp.text}")
+        return self.public_url(path)
+
+    # --- TUS ---
+
+    def _tus_metadata(self, **values: str) -> str:
+        return ",".join(
+            f"{k} {base64.b64encode(v.encode('utf-8')).decode('ascii')}"
+            for k, v in values.items()
+        )
+
+    def _tus_create(self, path: str, content_type: str, length: int) -> str:
+        resp = requests.post(
+            f"{self.url}/storage/v1/upload/resumable",
+            headers={
+                **self._auth(),
+                "Tus-Resumable": "1.0.0",
+                "Upload-Length": str(length),
+                "Upload-Metadata": self._tus_metadata(
+                    bucketName=self.bucket,
+                    objectName=path,
+                    contentType=content_type,
+                    cacheControl="3600",
+                ),
+                "x-upsert": "true",
+            },
+            timeout=30,
+        )
+        if resp.status_code not in (200, 201) or not resp.headers.get("Location"):
+            raise StorageError(f"Error creando upload TUS: {resp.status_code} - {resp.text}")
+
+        location = resp.headers["Location"]
+        if location.startswith("/"):
+            location = f"{self.url}{location}"
+        return location
+
+    def _tus_offset(self, upload_url: str) -> Optional[int]:
+        """Offset confirmado por el servidor, o None si la subida ya no existe."""
+        resp = requests.head(upload_url, headers={**self._auth(), "Tus-Resumable": "1.0.0"}, timeout=15)
+        if resp.status_code in (404, 410):
+            return None
+        if resp.status_code not in (200, 204):
+            raise StorageError(f"Error consultando upload TUS: {resp.status_code}")
+        return int(resp.headers.get("Upload-Offset") or 0)
+
+    def _tus_patch(self, upload_url: str, offset: int, chunk: bytes) -> int:
+        resp = requests.patch(
+            upload_url,
+            headers={
+                **self._auth(),
+                "Tus-Resumable": "1.0.0",
+                "Upload-Offset": str(offset),
+                "Content-Type": "application/offset+octet-stream",
+            },
+            data=chunk,
+            timeout=(10, 120),
+        )
+        if resp.status_code not in (200, 204):
+            raise StorageError(f"Error subiendo chunk en offset {offset}: {resp.status_code}")
+        return int(resp.headers.get("Upload-Offset") or offset + len(chunk))
+
+    def put_stream(
+        self,
+        path: str,
+        open_source: SourceOpener,
+        content_type: str,
+        length: int,
+        resume_token: Optional[str] = None,
+        on_resume_token: Optional[ResumeCallback] = None,
+        max_resumes: int = 3
+    ) -> str:
+        upload_url = resume_token
+        last_error = None
+
+        for attempt in range(max_resumes + 1):
+            try:
+                offset = 0
+                if upload_url:
+                    offset = self._tus_offset(upload_url)
+                    if offset is None:
+                        upload_url = None
+                        offset = 0
+
+                if not upload_url:
+                    upload_url = self._tus_create(path, content_type, length)
+                    if on_resume_token:
+                        on_resume_token(upload_url)
+
+                if offset < length:
+                    logger.info(f"📤 Streaming a Supabase: {path} ({length/1024/1024:.1f}MB) desde offset {offset}")
+                    buffer = bytearray()
+                    for piece in open_source(offset):
+                        buffer.extend(piece)
+                        while len(buffer) >= self.TUS_CHUNK_SIZE:
+                            offset = self._tus_patch(upload_url, offset, bytes(buffer[:self.TUS_CHUNK_SIZE]))
+                            del buffer[:self.TUS_CHUNK_SIZE]
+                    if buffer:
+                        offset = self._tus_patch(upload_url, offset, bytes(buffer))
+
+                if offset < length:
+                    raise StorageError(f"Subida incompleta ({offset}/{length} bytes)")
+
+                if on_resume_token:
+                    on_resume_token(None)
+                return self.public_url(path)
+
+            except Exception as e:
+                last_error = e
+                logger.warning(f"⚠️ Streaming interrumpido (intento {attempt + 1}): {e}")
+                if attempt < max_resumes:
+                    time.sleep(min(2 ** attempt, 10))
+
+        raise StorageError(f"Streaming falló: {last_error}")
+
+    def stream(self, path: str, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        resp = requests.get(
+            f"{self.url}/storage/v1/object/{self.bucket}/{path}",
+            headers=self._auth(), stream=True, timeout=(10, 60),
+        )
+        if resp.status_code != 200:
+            resp.close()
+            raise StorageError(f"Error descargando {path}: {resp.status_code}")
+        try:
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                yield chunk
+        finally:
+            resp.close()
+
+    def signed_url(self, path: str, expires_in: int = 3600) -> str:
+        resp = requests.post(
+            f"{self.url}/storage/v1/object/sign/{self.bucket}/{path}",
+            headers=self._auth(), json={"expiresIn": int(expires_in)}, timeout=15,
+        )
+        if resp.status_code != 200:
+            raise StorageError(f"Error firmando URL: {resp.status_code}")
+        signed = resp.json().get("signedURL") or resp.json().get("signedUrl") or ""
+        return f"{self.url}/storage/v1{signed}" if signed.startswith("/") else signed
+
+    def delete(self, path: str) -> None:
+        resp = requests.delete(
+            f"{self.url}/storage/v1/object/{self.bucket}",
+            headers=self._auth(), json={"prefixes": [path]}, timeout=15,
+        )
+        if resp.status_code not in (200, 204):
+            raise StorageError(f"Error eliminando {path}: {resp.status_code}")
+
+    def exists(self, path: str) -> bool:
+        resp = requests.head(f"{self.url}/storage/v1/object/{self.bucket}/{path}", headers=self._auth(), timeout=15)
+        return resp.status_code == 200
+
+
+# ============================================================
+# FILESYSTEM LOCAL
+# ============================================================
+
+class LocalStorage(StorageBackend):
+    """
+    Filesystem local. Las subidas en streaming se escriben en {path}.part
+    (el tamaño del .part es el offset para reanudar) y se renombran al terminar.
+
+    Sin base_url las URLs son file:// (solo scripts offline vía
+    set_storage_backend); _build_backend exige un base_url http(s).
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.base_url = (base_url or "").rstrip("/")
+
+    def _full(self, path: str) -> str:
+        full = os.path.abspath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            raise StorageError(f"Path fuera del storage: {path}")
+        return full
+
+    def public_url(self, path: str) -> str:
+        if self.base_url:
+            return f"{self.base_url}/{path}"
+        return f"file://{self.root}/{path}"
+
+    def put(self, path: str, data: bytes, content_type: str) -> str:
+        full = self._full(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = f"{full}.tmp{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, full)
+        return self.public_url(path)
+
+    def put_stream(
+        self,
+        path: str,
+        open_source: SourceOpener,
+        content_type: str,
+        length: int,
+        resume_token: Optional[str] = None,
+        on_resume_token: Optional[ResumeCallback] = None,
+        max_resumes: int = 3
+    ) -> str:
+        full = self._full(path)
+        part = f"{full}.part"
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        last_error = None
+
+        for attempt in range(max_resumes + 1):
+            try:
+                offset = os.path.getsize(part) if os.path.exists(part) else 0
+                if on_resume_token and offset == 0:
+                    on_resume_token(part)
+                with open(part, "ab") as f:
+                    for piece in open_source(offset):
+                        f.write(piece)
+                if length and os.path.getsize(part) < length:
+                    raise StorageError(f"Subida incompleta ({os.path.getsize(part)}/{length} bytes)")
+                os.replace(part, full)
+                if on_resume_token:
+                    on_resume_token(None)
+                return self.public_url(path)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"⚠️ Streaming local interrumpido (intento {attempt + 1}): {e}")
+
+        raise StorageError(f"Streaming falló: {last_error}")
+
+    def stream(self, path: str, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        try:
+            with open(self._full(path), "rb") as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        except FileNotFoundError:
+            raise StorageError(f"No existe: {path}")
+
+    def signed_url(self, path: str, expires_in: int = 3600) -> str:
+        # Sin control de acceso local: la URL pública sirve como "firmada"
+        return self.public_url(path)
+
+    def delete(self, path: str) -> None:
+        try:
+            os.remove(self._full(path))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(self._full(path))
+
+
+# ============================================================
+# S3-COMPATIBLE
+# ============================================================
+
+class S3Storage(StorageBackend):
+    """
+    S3-compatible vía boto3 (opcional). put_stream usa multipart upload;
+    el token de reanudación es el UploadId y el offset se reconstruye con list_parts.
+    """
+
+    name = "s3"
+    PART_SIZE = 8 * 1024 * 1024  # S3 exige partes >= 5MB (salvo la última)
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        public_base_url: Optional[str] = None
+    ):
+        import boto3  # opcional: solo si MEDIA_STORAGE_BACKEND=s3
+
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+        if public_base_url:
+            self.base_url = public_base_url.rstrip("/")
+        elif endpoint_url:
+            self.base_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.base_url = f"https://{bucket}.s3.amazonaws.com"
+
+    def public_url(self, path: str) -> str:
+        return f"{self.base_url}/{path}"
+
+    def put(self, path: str, data: bytes, content_type: str) -> str:
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=path, Body=data, ContentType=content_type)
+        except Exception as e:
+            raise StorageError(f"Error subiendo a S3: {e}")
+        return self.public_url(path)
+
+    def _uploaded_parts(self, upload_id: str, path: str) -> Optional[list]:
+        try:
+            resp = self.client.list_parts(Bucket=self.bucket, Key=path, UploadId=upload_id)
+        except Exception:
+            return None
+        return [{"PartNumber": p["PartNumber"], "ETag": p["ETag"], "Size": p["Size"]} for p in resp.get("Parts", [])]
+
+    def put_stream(
+        self,
+        path: str,
+        open_source: SourceOpener,
+        content_type: str,
+        length: int,
+        resume_token: Optional[str] = None,
+        on_resume_token: Optional[ResumeCallback] = None,
+        max_resumes: int = 3
+    ) -> str:
+        upload_id = resume_token
+        last_error = None
+
+        for attempt in range(max_resumes + 1):
+            try:
+                parts = self._uploaded_parts(upload_id, path) if upload_id else None
+                if parts is None:
+                    upload_id = self.client.create_multipart_upload(
+                        Bucket=self.bucket, Key=path, ContentType=content_type
+                    )["UploadId"]
+                    parts = []
+                    if on_resume_token:
+                        on_resume_token(upload_id)
+
+                offset = sum(p["Size"] for p in parts)
+                part_number = len(parts) + 1
+                buffer = bytearray()
+
+                def _flush(chunk: bytes) -> None:
+                    nonlocal part_number
+                    etag = self.client.upload_part(
+                        Bucket=self.bucket, Key=path, UploadId=upload_id,
+                        PartNumber=part_number, Body=chunk,
+                    )["ETag"]
+                    parts.append({"PartNumber": part_number, "ETag": etag, "Size": len(chunk)})
+                    part_number += 1
+
+                if offset < length:
+                    for piece in open_source(offset):
+                        buffer.extend(piece)
+                        while len(buffer) >= self.PART_SIZE:
+                            _flush(bytes(buffer[:self.PART_SIZE]))
+                            del buffer[:self.PART_SIZE]
+                    if buffer:
+                        _flush(bytes(buffer))
+
+                self.client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=path, UploadId=upload_id,
+                    MultipartUpload={"Parts": [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in parts]},
+                )
+                if on_resume_token:
+                    on_resume_token(None)
+                return self.public_url(path)
+
+            except Exception as e:
+                last_error = e
+                logger.warning(f"⚠️ Streaming S3 interrumpido (intento {attempt + 1}): {e}")
+                if attempt < max_resumes:
+                    time.sleep(min(2 ** attempt, 10))
+
+        raise StorageError(f"Streaming falló: {last_error}")
+
+    def stream(self, path: str, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=path)["Body"]
+        except Exception as e:
+            raise StorageError(f"Error descargando {path}: {e}")
+        try:
+            for chunk in body.iter_chunks(chunk_size=chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    def signed_url(self, path: str, expires_in: int = 3600) -> str:
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": path}, ExpiresIn=int(expires_in)
+        )
+
+    def delete(self, path: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=path)
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=path)
+            return True
+        except Exception:
+            return False
+
+
+# ============================================================
+# SELECCIÓN
+# ============================================================
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def _build_backend() -> StorageBackend:
+    supabase_url = os.getenv("SUPABASE_URL", "")
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY", "")
+
+    kind = (os.getenv("MEDIA_STORAGE_BACKEND", "") or "").strip().lower() or "supabase"
+
+    if kind == "supabase":
+        if not supabase_url or not supabase_key:
+            raise StorageError(
+                "Storage supabase sin SUPABASE_URL/SUPABASE_SERVICE_KEY "
+                "(storage local solo con MEDIA_STORAGE_BACKEND=local + MEDIA_PUBLIC_BASE_URL)"
+            )
+        return SupabaseStorage(supabase_url, supabase_key)
+
+    if kind == "s3":
+        bucket = os.getenv("S3_BUCKET", "")
+        if not bucket:
+            raise StorageError("MEDIA_STORAGE_BACKEND=s3 sin S3_BUCKET")
+        try:
+            return S3Storage(
+                bucket,
+                endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+                region=os.getenv("S3_REGION"),
+                public_base_url=os.getenv("S3_PUBLIC_BASE_URL"),
+            )
+        except ImportError:
+            raise StorageError("MEDIA_STORAGE_BACKEND=s3 requiere boto3 instalado")
+
+    if kind == "local":
+        base_url = os.getenv("MEDIA_PUBLIC_BASE_URL", "")
+        if not is_http_url(base_url):
+            raise StorageError("MEDIA_STORAGE_BACKEND=local requiere MEDIA_PUBLIC_BASE_URL http(s)")
+        return LocalStorage(os.getenv("MEDIA_LOCAL_DIR", "./media_storage"), base_url=base_url)
+
+    raise StorageError(f"MEDIA_STORAGE_BACKEND desconocido: {kind}")
+
+
+def get_storage_backend() -> StorageBackend:
+    """Backend configurado (singleton por proceso)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                try:
+                    _backend = _build_backend()
+                except StorageError as e:
+                    logger.error(f"❌ Storage backend no configurado: {e}")
+                    raise
+                logger.info(f"🗄️ Storage backend: {_backend.name}")
+    return _backend
+
+
+def set_storage_backend(backend: Optional[StorageBackend]) -> None:
+    """Reemplaza el backend (scripts de benchmark / load test). None = volver a leer env."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,228 @@
+# gateway_app/services/ticket_events.py
+"""
+Log append-only de eventos de tickets (ticket_events).
+
+Cada transición de TicketStateMachine (y la creación del ticket) registra
+un evento (ticket_id, type, actor, payload, ts). Sirve para reconstruir
+quién hizo qué y cuándo, sin raspar logs.
+
+Escritura en lotes:
+- record_event() solo agrega el evento a un buffer en memoria (no toca la BD)
+  → el hot path de las transiciones no se alarga.
+- Un thread escritor vacía el buffer cada TICKET_EVENTS_FLUSH_SECONDS o al
+  juntar TICKET_EVENTS_BATCH_SIZE eventos, con UN INSERT multi-fila.
+- ts se toma al registrar (no al escribir), así el orden del timeline es
+  el real aunque el flush llegue después.
+- Si el escritor no está corriendo (TICKET_EVENTS_ENABLED=false o antes de
+  iniciar), record_event escribe directo.
+- Si el INSERT falla (BD caída, timeout) el lote vuelve al buffer y se
+  reintenta con backoff exponencial (hasta TICKET_EVENTS_MAX_BACKOFF_SECONDS).
+  El buffer se acota a TICKET_EVENTS_MAX_PENDING eventos: pasado eso se
+  descartan los del lote fallido (con log de error).
+
+Durabilidad: el buffer vive en memoria. Al apagar limpio (atexit) se hace
+un último flush, pero un kill duro (SIGKILL, OOM, timeout de gunicorn que
+mata al worker) pierde lo que no se escribió todavía: como máximo
+~TICKET_EVENTS_FLUSH_SECONDS de eventos, o todo lo acumulado mientras la
+BD no respondía. El estado del ticket no se pierde (lo escribe la
+transición misma); solo esas entradas del timeline.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from gateway_app.services.db import execute, fetchall, using_pg
+
+logger = logging.getLogger(__name__)
+
+TICKET_EVENTS_BATCH_SIZE = int(os.getenv("TICKET_EVENTS_BATCH_SIZE", "100"))
+TICKET_EVENTS_FLUSH_SECONDS = float(os.getenv("TICKET_EVENTS_FLUSH_SECONDS", "2"))
+TICKET_EVENTS_MAX_BACKOFF_SECONDS = float(os.getenv("TICKET_EVENTS_MAX_BACKOFF_SECONDS", "60"))
+TICKET_EVENTS_MAX_PENDING = int(os.getenv("TICKET_EVENTS_MAX_PENDING", "50000"))
+
+# Items: (ticket_id, type, actor, payload_json, ts)
+_buffer: "queue.Queue[Tuple[int, str, Optional[str], Optional[str], datetime]]" = queue.Queue()
+_writer: Optional[threading.Thread] = None
+_start_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wake = threading.Event()
+_failures = 0  # flushes fallidos consecutivos
+_retry_at = 0.0  # monotonic: antes de esto no se reintenta (backoff)
+
+
+def _table() -> str:
+    return "public.ticket_events" if using_pg() else "ticket_events"
+
+
+def record_event(
+    ticket_id: int,
+    event_type: str,
+    actor: Optional[str] = None,
+    payload: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Registra un evento de ticket (no bloquea: se escribe en el próximo flush).
+    Nunca lanza excepción: un evento perdido no debe romper una transición.
+    """
+    try:
+        item = (
+            int(ticket_id),
+            event_type,
+            actor,
+            json.dumps(payload, default=str, ensure_ascii=False) if payload else None,
+            datetime.now(timezone.utc),
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ TICKET_EVENTS evento inválido ({event_type} #{ticket_id}): {e}")
+        return
+
+    _buffer.put(item)
+
+    if _writer is None or not _writer.is_alive():
+        flush_events()
+    elif _buffer.qsize() >= TICKET_EVENTS_BATCH_SIZE:
+        _wake.set()
+
+
+def flush_events(force: bool = False) -> int:
+    """
+    Escribe en un solo INSERT todo lo que haya en el buffer (hasta BATCH_SIZE
+    por statement). Retorna la cantidad de eventos escritos.
+
+    Si un INSERT falla, el lote vuelve al buffer y no se reintenta hasta que
+    pase el backoff (salvo force=True, p. ej. al apagar).
+    """
+    global _failures, _retry_at
+    written = 0
+
+    with _flush_lock:
+        if not force and time.monotonic() < _retry_at:
+            return written
+
+        while True:
+            batch: List[Tuple] = []
+            while len(batch) < TICKET_EVENTS_BATCH_SIZE:
+                try:
+                    batch.append(_buffer.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not batch:
+                return written
+
+            try:
+                _insert_batch(batch)
+                written += len(batch)
+                _failures, _retry_at = 0, 0.0
+            except Exception as e:
+                _failures += 1
+                delay = min(
+                    TICKET_EVENTS_FLUSH_SECONDS * 2 ** (_failures - 1),
+                    TICKET_EVENTS_MAX_BACKOFF_SECONDS,
+                )
+                _retry_at = time.monotonic() + delay
+                _requeue(batch)
+                logger.warning(
+                    f"⚠️ TICKET_EVENTS error escribiendo {len(batch)} evento(s), "
+                    f"reintento en {delay:.0f}s (fallo #{_failures}): {e}"
+                )
+                return written
+
+
+def _requeue(batch: List[Tuple]) -> None:
+    """Devuelve un lote fallido al buffer (el orden lo da ts, no la cola)."""
+    dropped = 0
+    for item in batch:
+        if _buffer.qsize() >= TICKET_EVENTS_MAX_PENDING:
+            dropped += 1
+            continue
+        _buffer.put(item)
+    if dropped:
+        logger.error(
+            f"❌ TICKET_EVENTS buffer lleno ({TICKET_EVENTS_MAX_PENDING}): "
+            f"se descartan {dropped} evento(s)"
+        )
+
+
+def _insert_batch(batch: List[Tuple]) -> None:
+    payload_ph = "CAST(? AS JSONB)" if using_pg() else "?"
+    row_ph = f"(?, ?, ?, {payload_ph}, ?)"
+
+    sql = f"""
+        INSERT INTO {_table()} (ticket_id, type, actor, payload, ts)
+        VALUES {", ".join([row_ph] * len(batch))}
+    """
+
+    params: List[Any] = []
+    for ticket_id, event_type, actor, payload, ts in batch:
+        # SQLite: mismo formato que CURRENT_TIMESTAMP para que ordene/compare bien
+        params.extend([
+            ticket_id, event_type, actor, payload,
+            ts if using_pg() else ts.strftime("%Y-%m-%d %H:%M:%S"),
+        ])
+
+    execute(sql, params, commit=True)
+
+
+def obtener_eventos_ticket(ticket_id: int, limit: int = 200) -> List[Dict[str, Any]]:
+    """Timeline de un ticket en orden cronológico (idx_ticket_events_ticket_ts)."""
+    flush_events()
+
+    try:
+        return fetchall(
+            f"""
+            SELECT id, ticket_id, type, actor, payload, ts
+            FROM {_table()}
+            WHERE ticket_id = ?
+            ORDER BY ts ASC, id ASC
+            LIMIT ?
+            """,
+            [ticket_id, limit],
+        ) or []
+    except Exception as e:
+        logger.exception(f"❌ Error obteniendo eventos de ticket #{ticket_id}: {e}")
+        return []
+
+
+def _writer_loop() -> None:
+    logger.info(
+        f"TICKET_EVENTS writer started batch={TICKET_EVENTS_BATCH_SIZE} "
+        f"flush={TICKET_EVENTS_FLUSH_SECONDS}s"
+    )
+
+    while True:
+        try:
+            # Flush por intervalo, o antes si record_event avisa que hay un lote completo
+            _wake.wait(TICKET_EVENTS_FLUSH_SECONDS)
+            _wake.clear()
+            flush_events()
+        except Exception:
+            logger.exception("TICKET_EVENTS writer loop crashed; continuing")
+
+
+def start_ticket_events_writer() -> None:
+    """Inicia el thread que escribe ticket_events en lotes."""
+    global _writer
+
+    enabled = (os.getenv("TICKET_EVENTS_ENABLED", "true") or "").lower() == "true"
+    if not enabled:
+        logger.info("TICKET_EVENTS writer not started (TICKET_EVENTS_ENABLED=false), writing inline")
+        return
+
+    with _start_lock:
+        if _writer is not None and _writer.is_alive():
+            return
+        _writer = threading.Thread(target=_writer_loop, daemon=True, name="ticket_events")
+        _writer.start()
+
+    # Al apagar limpio: escribir lo que quede en el buffer, aunque esté en
+    # backoff (un kill duro no pasa por acá, ver docstring del módulo)
+    atexit.register(flush_events, force=True)
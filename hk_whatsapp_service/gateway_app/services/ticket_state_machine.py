@@ -0,0 +1,449 @@
+# gateway_app/services/ticket_state_machine.py
+"""
+Máquina de estados de tickets: cada transición es UN solo UPDATE con guarda.
+
+    UPDATE tickets SET estado = ..., <timestamps>
+    WHERE id = ? AND estado IN (...) [AND assigned_phone = ?] AND deleted_at IS NULL
+    RETURNING *
+
+- Si la guarda no se cumple (otro worker lo tomó, ya estaba pausado, no es
+  tuyo...) el UPDATE no toca filas y la transición retorna None. No hay
+  ventana entre "leer estado" y "escribir estado" → no se pierden carreras.
+- Timestamps (started_at, accepted_at, paused_at, finished_at, assigned_at) y
+  total_paused_seconds se calculan en SQL, con el reloj de la BD.
+- La fila retornada ya trae el ticket actualizado: el caller no necesita
+  volver a leerlo.
+- Cada transición exitosa registra un evento en ticket_events (en lote,
+  fuera del hot path).
+- Y ajusta la carga de trabajo cacheada del worker (staff_directory): con
+  delta exacto si el estado anterior es conocido (assign, take, pause,
+  resume, finish del worker); si no (reassign, finish del supervisor), la
+  invalida y se recalcula con una consulta en el próximo scoring.
+
+Transiciones:
+    assign    PENDIENTE*                  → ASIGNADO
+    reassign  ASIGNADO/EN_CURSO/PAUSADO   → ASIGNADO (otro worker)
+    take      ASIGNADO                    → EN_CURSO
+    pause     EN_CURSO                    → PAUSADO
+    resume    PAUSADO                     → EN_CURSO
+    finish    EN_CURSO (worker) / abiertos (supervisor) → RESUELTO
+
+En lote (supervisor): assign_many, finish_many y reassign_all aplican la
+misma transición a un conjunto de tickets con UN solo UPDATE
+(WHERE id = ANY(?) ... RETURNING *). Los tickets que no cumplen la guarda
+simplemente no vuelven en el resultado.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from gateway_app.services.db import execute, fetchall, fetchone, using_pg
+from gateway_app.services.ticket_events import record_event
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATES = ("PENDIENTE", "PENDIENTE_APROBACION", "PENDIENTE_APROBACIÓN")
+ACTIVE_STATES = ("ASIGNADO", "EN_CURSO", "PAUSADO")
+OPEN_STATES = PENDING_STATES + ACTIVE_STATES
+
+
+def _paused_elapsed_sql() -> str:
+    """Segundos desde paused_at hasta ahora (0 si no hay paused_at)."""
+    if using_pg():
+        return "COALESCE(EXTRACT(EPOCH FROM (NOW() - paused_at))::INTEGER, 0)"
+    return "COALESCE(CAST((julianday('now') - julianday(paused_at)) * 86400 AS INTEGER), 0)"
+
+
+def _assign_set_sql() -> str:
+    """SET de assign/reassign: worker nuevo; si estaba pausado, acumula la pausa."""
+    return f"""estado = 'ASIGNADO',
+               assigned_phone = ?,
+               assigned_name = ?,
+               huesped_whatsapp = ?,
+               assigned_at = CURRENT_TIMESTAMP,
+               total_paused_seconds = COALESCE(total_paused_seconds, 0)
+                   + CASE WHEN estado = 'PAUSADO' THEN {_paused_elapsed_sql()} ELSE 0 END,
+               paused_at = NULL"""
+
+
+def _finish_set_sql() -> str:
+    """SET de finish: cierra y, si estaba pausado, acumula la pausa."""
+    return f"""estado = 'RESUELTO',
+               finished_at = CURRENT_TIMESTAMP,
+               total_paused_seconds = COALESCE(total_paused_seconds, 0)
+                   + CASE WHEN estado = 'PAUSADO' THEN {_paused_elapsed_sql()} ELSE 0 END,
+               paused_at = NULL"""
+
+
+# Estados en los que el worker está (o estuvo recién) en la ubicación del ticket
+_LOCATION_STATES = ("EN_CURSO", "PAUSADO", "RESUELTO")
+
+
+def _update_workload(tickets: List[Dict[str, Any]], deltas: Optional[Dict[str, int]]) -> None:
+    """
+    Refleja la transición en la carga cacheada de los workers y en su
+    última ubicación conocida (nunca lanza).
+    """
+    try:
+        from gateway_app.services import workers_db
+
+        if deltas is None:
+            workers_db.invalidar_carga_workers("transición sin estado previo conocido")
+            return
+        for t in tickets:
+            if not t.get("assigned_phone") or t.get("org_id") is None or t.get("hotel_id") is None:
+                continue
+            workers_db.ajustar_carga_worker(t["org_id"], t["hotel_id"], t["assigned_phone"], deltas)
+            if t.get("estado") in _LOCATION_STATES and t.get("ubicacion"):
+                workers_db.registrar_ubicacion_worker(
+                    t["org_id"], t["hotel_id"], t["assigned_phone"], str(t["ubicacion"])
+                )
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo actualizar la carga de trabajo: {e}")
+
+
+class TicketStateMachine:
+    """Transiciones atómicas de public.tickets (ver docstring del módulo)."""
+
+    def _table(self) -> str:
+        return "public.tickets" if using_pg() else "tickets"
+
+    def _transition(
+        self,
+        ticket_id: int,
+        set_sql: str,
+        set_params: List[Any],
+        from_states: Sequence[str],
+        worker_phone: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Ejecuta el UPDATE con guarda y retorna la fila actualizada (o None).
+        """
+        table = self._table()
+        placeholders = ",".join(["?"] * len(from_states))
+
+        sql = f"""
+            UPDATE {table}
+            SET {set_sql}
+            WHERE id = ?
+              AND estado IN ({placeholders})
+              AND deleted_at IS NULL
+        """
+        params = list(set_params) + [ticket_id] + list(from_states)
+
+        if worker_phone is not None:
+            sql += " AND assigned_phone = ?"
+            params.append(worker_phone)
+
+        if using_pg():
+            return fetchone(sql + " RETURNING *", params)
+
+        # SQLite: sin RETURNING → rowcount dice si la guarda se cumplió
+        if not execute(sql, params, commit=True):
+            return None
+        return fetchone(f"SELECT * FROM {table} WHERE id = ?", [ticket_id])
+
+    def _transition_many(
+        self,
+        where_sql: str,
+        where_params: List[Any],
+        set_sql: str,
+        set_params: List[Any],
+        from_states: Sequence[str],
+    ) -> List[Dict[str, Any]]:
+        """
+        Igual que _transition pero para un conjunto de tickets (where_sql):
+        retorna solo las filas que cumplieron la guarda.
+        """
+        table = self._table()
+        placeholders = ",".join(["?"] * len(from_states))
+        guard = f"""{where_sql}
+              AND estado IN ({placeholders})
+              AND deleted_at IS NULL"""
+        guard_params = list(where_params) + list(from_states)
+
+        if using_pg():
+            return fetchall(
+                f"UPDATE {table} SET {set_sql} WHERE {guard} RETURNING *",
+                list(set_params) + guard_params,
+            ) or []
+
+        # SQLite (dev): sin RETURNING → fijar los ids que cumplen la guarda,
+        # actualizar solo esos y releerlos
+        ids = [r["id"] for r in fetchall(f"SELECT id FROM {table} WHERE {guard}", guard_params)]
+        if not ids:
+            return []
+        ids_ph = ",".join(["?"] * len(ids))
+        execute(
+            f"UPDATE {table} SET {set_sql} WHERE {guard} AND id IN ({ids_ph})",
+            list(set_params) + guard_params + ids,
+            commit=True,
+        )
+        return fetchall(f"SELECT * FROM {table} WHERE id IN ({ids_ph}) ORDER BY id", ids) or []
+
+    def _ids_sql(self, ticket_ids: Sequence[int]) -> tuple:
+        """WHERE de un conjunto de ids: = ANY(?) en Postgres, IN (...) en SQLite."""
+        ids = [int(i) for i in ticket_ids]
+        if using_pg():
+            return "id = ANY(?)", [ids]
+        return f"id IN ({','.join(['?'] * len(ids))})", ids
+
+    def _run_many(
+        self,
+        name: str,
+        *args,
+        actor: Optional[str] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        workload: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        try:
+            tickets = self._transition_many(*args)
+        except Exception as e:
+            logger.exception(f"❌ Error en transición {name} en lote: {e}")
+            return []
+
+        logger.info(f"✅ {name} en lote: {len(tickets)} ticket(s) {[t.get('id') for t in tickets]}")
+        if tickets:
+            _update_workload(tickets, workload)
+        for ticket in tickets:
+            record_event(
+                ticket["id"],
+                name,
+                actor,
+                {
+                    "estado": ticket.get("estado"),
+                    "assigned_phone": ticket.get("assigned_phone"),
+                    "total_paused_seconds": ticket.get("total_paused_seconds"),
+                    "bulk": True,
+                    **(payload or {}),
+                },
+            )
+        return tickets
+
+    def _run(
+        self,
+        name: str,
+        ticket_id: int,
+        *args,
+        actor: Optional[str] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        workload: Optional[Dict[str, int]] = None,
+        **kwargs,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        workload: delta de carga del worker asignado si la transición es
+        exacta ({estado: ±1}); None → invalidar la carga cacheada.
+        """
+        try:
+            ticket = self._transition(ticket_id, *args, **kwargs)
+        except Exception as e:
+            logger.exception(f"❌ Error en transición {name} del ticket #{ticket_id}: {e}")
+            return None
+
+        if ticket:
+            logger.info(f"✅ Ticket #{ticket_id}: {name} → {ticket.get('estado')}")
+            _update_workload([ticket], workload)
+            record_event(
+                ticket_id,
+                name,
+                actor if actor is not None else kwargs.get("worker_phone"),
+                {
+                    "estado": ticket.get("estado"),
+                    "assigned_phone": ticket.get("assigned_phone"),
+                    "total_paused_seconds": ticket.get("total_paused_seconds"),
+                    **(payload or {}),
+                },
+            )
+        else:
+            logger.info(f"⚠️ Ticket #{ticket_id}: {name} rechazado (estado/asignación no coincide)")
+        return ticket
+
+    # ------------------------------------------------------------------
+    # Supervisor
+    # ------------------------------------------------------------------
+
+    def assign(
+        self,
+        ticket_id: int,
+        worker_phone: str,
+        worker_name: str,
+        *,
+        from_states: Sequence[str] = PENDING_STATES,
+        actor: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        PENDIENTE → ASIGNADO. Guarda assigned_phone/assigned_name y (por
+        compatibilidad) "phone|nombre" en huesped_whatsapp.
+        actor: quien asigna (supervisor), para ticket_events.
+        """
+        return self._run(
+            "assign",
+            ticket_id,
+            _assign_set_sql(),
+            [worker_phone, worker_name, f"{worker_phone}|{worker_name}"],
+            from_states,
+            actor=actor,
+            payload={"assigned_name": worker_name},
+            workload={"ASIGNADO": 1} if tuple(from_states) == PENDING_STATES else None,
+        )
+
+    def reassign(
+        self,
+        ticket_id: int,
+        worker_phone: str,
+        worker_name: str,
+        *,
+        from_phone: Optional[str] = None,
+        actor: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        ASIGNADO/EN_CURSO/PAUSADO → ASIGNADO a otro worker.
+        Con from_phone, solo si sigue asignado a ese worker. Si estaba
+        pausado, el tiempo de pausa se acumula antes de limpiar paused_at.
+        """
+        return self._run(
+            "reassign",
+            ticket_id,
+            _assign_set_sql(),
+            [worker_phone, worker_name, f"{worker_phone}|{worker_name}"],
+            ACTIVE_STATES,
+            worker_phone=from_phone,
+            actor=actor,
+            payload={"assigned_name": worker_name, "from_phone": from_phone},
+        )
+
+    def assign_many(
+        self,
+        ticket_ids: Sequence[int],
+        worker_phone: str,
+        worker_name: str,
+        *,
+        actor: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """PENDIENTE → ASIGNADO para varios tickets (los ya asignados no se tocan)."""
+        if not ticket_ids:
+            return []
+        where_sql, where_params = self._ids_sql(ticket_ids)
+        return self._run_many(
+            "assign",
+            where_sql,
+            where_params,
+            _assign_set_sql(),
+            [worker_phone, worker_name, f"{worker_phone}|{worker_name}"],
+            PENDING_STATES,
+            actor=actor,
+            payload={"assigned_name": worker_name},
+            workload={"ASIGNADO": 1},
+        )
+
+    def reassign_all(
+        self,
+        from_phone: str,
+        worker_phone: str,
+        worker_name: str,
+        *,
+        actor: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Todos los tickets activos de from_phone → ASIGNADO a otro worker."""
+        return self._run_many(
+            "reassign",
+            "assigned_phone = ?",
+            [from_phone],
+            _assign_set_sql(),
+            [worker_phone, worker_name, f"{worker_phone}|{worker_name}"],
+            ACTIVE_STATES,
+            actor=actor,
+            payload={"assigned_name": worker_name, "from_phone": from_phone},
+        )
+
+    def finish_many(
+        self,
+        ticket_ids: Sequence[int],
+        *,
+        actor: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """→ RESUELTO para varios tickets abiertos (uso del supervisor)."""
+        if not ticket_ids:
+            return []
+        where_sql, where_params = self._ids_sql(ticket_ids)
+        return self._run_many(
+            "finish",
+            where_sql,
+            where_params,
+            _finish_set_sql(),
+            [],
+            OPEN_STATES,
+            actor=actor,
+        )
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def take(self, ticket_id: int, worker_phone: str) -> Optional[Dict[str, Any]]:
+        """ASIGNADO → EN_CURSO (solo el worker asignado)."""
+        return self._run(
+            "take",
+            ticket_id,
+            """estado = 'EN_CURSO',
+               started_at = CURRENT_TIMESTAMP,
+               accepted_at = CURRENT_TIMESTAMP""",
+            [],
+            ("ASIGNADO",),
+            worker_phone=worker_phone,
+            workload={"ASIGNADO": -1, "EN_CURSO": 1},
+        )
+
+    def pause(self, ticket_id: int, worker_phone: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """EN_CURSO → PAUSADO, marca paused_at."""
+        return self._run(
+            "pause",
+            ticket_id,
+            "estado = 'PAUSADO', paused_at = CURRENT_TIMESTAMP",
+            [],
+            ("EN_CURSO",),
+            worker_phone=worker_phone,
+            workload={"EN_CURSO": -1, "PAUSADO": 1},
+        )
+
+    def resume(self, ticket_id: int, worker_phone: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """PAUSADO → EN_CURSO, acumula la pausa en total_paused_seconds."""
+        return self._run(
+            "resume",
+            ticket_id,
+            f"""estado = 'EN_CURSO',
+               total_paused_seconds = COALESCE(total_paused_seconds, 0) + {_paused_elapsed_sql()},
+               paused_at = NULL""",
+            [],
+            ("PAUSADO",),
+            worker_phone=worker_phone,
+            workload={"PAUSADO": -1, "EN_CURSO": 1},
+        )
+
+    def finish(
+        self,
+        ticket_id: int,
+        worker_phone: Optional[str] = None,
+        *,
+        actor: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        → RESUELTO con finished_at.
+        Worker (worker_phone): solo desde EN_CURSO y si es suyo.
+        Supervisor (sin worker_phone): desde cualquier estado abierto.
+        """
+        from_states = ("EN_CURSO",) if worker_phone is not None else OPEN_STATES
+        return self._run(
+            "finish",
+            ticket_id,
+            _finish_set_sql(),
+            [],
+            from_states,
+            worker_phone=worker_phone,
+            actor=actor,
+            workload={"EN_CURSO": -1} if worker_phone is not None else None,
+        )
+
+
+ticket_state_machine = TicketStateMachine()
@@ -1,4 +1,37 @@
 # gateway_app/services/ticket_watch.py
+"""
+Notifica a los supervisores los tickets nuevos de huéspedes.
+
+Postgres: trigger en public.tickets → pg_notify('guest_ticket', id) (ver
+migrations.create_guest_ticket_notify_trigger). El thread duerme hasta que
+pg_listener le pasa ids y solo lee esos tickets: el aviso llega en
+milisegundos y sin tráfico a la BD mientras no pasa nada.
+
+High-watermark (tabla ticket_watch_state, por org_id + hotel_id): último id
+de ticket ya revisado. El poll incremental lee id > last_id - OVERLAP (rango
+sobre la PK, sin importar cuántos tickets tenga el hotel) y avanza la marca.
+
+En Postgres los ids se asignan al INSERT pero se ven al COMMIT: una
+transacción lenta puede confirmar el id 100 después de que el poll ya vio
+el 101 y movió la marca. Por eso cada poll relee los últimos
+TICKET_WATCH_OVERLAP_IDS (default 50) ids detrás de la marca; los ya
+avisados no se repiten (filtro assignment_notif_sent + claim atómico).
+
+El poll corre:
+- con LISTEN: al (re)conectar y cada TICKET_WATCH_SWEEP_SECONDS (default
+  300), por si se perdió algún NOTIFY;
+- sin listener (SQLite, PG_LISTENER_ENABLED=false): en cada ciclo, cada
+  TICKET_WATCH_POLL_SECONDS; sin novedades el intervalo se duplica hasta
+  TICKET_WATCH_MAX_IDLE_SECONDS (default 60) y vuelve al mínimo apenas
+  aparece un ticket.
+
+El barrido por ventana (TICKET_WATCH_LOOKBACK_MINUTES) queda solo para el
+arranque y la vuelta al horario laboral: cubre pendientes anteriores a la
+marca.
+
+_diagnostic_sample corre como mucho una vez cada
+TICKET_WATCH_DIAG_INTERVAL_SECONDS (default 900).
+"""
 from __future__ import annotations
 
 import logging
@@ -15,6 +48,20 @@ from gateway_app.core.utils.location_format import formatear_ubicacion_para_mens
 
 logger = logging.getLogger(__name__)
 
+TICKET_WATCH_MAX_IDLE_SECONDS = float(os.getenv("TICKET_WATCH_MAX_IDLE_SECONDS", "60"))
+TICKET_WATCH_DIAG_INTERVAL_SECONDS = float(os.getenv("TICKET_WATCH_DIAG_INTERVAL_SECONDS", "900"))
+
+# Filas por poll incremental; si vuelve llena se sigue leyendo sin esperar
+_INCREMENTAL_BATCH = 200
+
+# Ids detrás de la marca que se releen en cada poll (commits fuera de orden).
+# Menor que el lote, si no un lote lleno de solapamiento no avanzaría nunca.
+TICKET_WATCH_OVERLAP_IDS = min(
+    int(os.getenv("TICKET_WATCH_OVERLAP_IDS", "50")), _INCREMENTAL_BATCH // 2
+)
+
+_last_diag = 0.0
+
 
 def _normalize_phone(phone: str) -> str:
     return re.sub(r"\D", "", (phone or "").strip())
@@ -28,7 +75,7 @@ def _get_supervisor_phones() -> List[str]:
 
 def _priority_emoji(prioridad: Optional[str]) -> str:
     p = (prioridad or "").upper().strip()
-    return {"ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}.get(p, "🟡")
+    return {"URGENTE": "🚨", "ALTA": "🔴", "MEDIA": "🟡", "BAJA": "🟢"}.get(p, "🟡")
 
 
 def _db_hint() -> str:
@@ -52,6 +99,87 @@ def _tickets_table() -> str:
     return "public.tickets" if using_pg() else "tickets"
 
 
+GUEST_TICKET_CHANNEL = "guest_ticket"
+
+_GUEST_TICKET_COLUMNS = """
+    id,
+    org_id,
+    hotel_id,
+    area,
+    prioridad,
+    estado,
+    detalle,
+    canal_origen,
+    ubicacion,
+    huesped_id,
+    huesped_whatsapp,
+    created_at,
+    assignment_notif_sent
+"""
+
+_PENDING_STATES = ("PENDIENTE", "PENDIENTE_APROBACION", "PENDIENTE_APROBACIÓN")
+
+# query_plans.hot_queries hace EXPLAIN de estas mismas constantes.
+# {table} = public.tickets | tickets; {states} = placeholders de _PENDING_STATES.
+RECENT_GUEST_TICKETS_PG_SQL = f"""
+    SELECT {_GUEST_TICKET_COLUMNS}
+    FROM {{table}}
+    WHERE org_id = ?
+      AND hotel_id = ?
+      AND canal_origen = 'huesped_whatsapp'
+      AND estado IN ({{states}})
+      AND (assignment_notif_sent IS NULL OR assignment_notif_sent = false)
+      AND created_at >= NOW() - (INTERVAL '1 minute' * ?)
+    ORDER BY created_at ASC
+    LIMIT 100
+"""
+
+RECENT_GUEST_TICKETS_SQLITE_SQL = f"""
+    SELECT {_GUEST_TICKET_COLUMNS}
+    FROM {{table}}
+    WHERE org_id = ?
+      AND hotel_id = ?
+      AND canal_origen = 'huesped_whatsapp'
+      AND estado IN ({{states}})
+      AND (assignment_notif_sent IS NULL OR assignment_notif_sent = 0)
+      AND datetime(created_at) >= datetime('now', '-' || ? || ' minutes')
+    ORDER BY datetime(created_at) ASC
+    LIMIT 100
+"""
+
+TICKETS_AFTER_SQL = f"""
+    SELECT {_GUEST_TICKET_COLUMNS}
+    FROM {{table}}
+    WHERE id > ?
+      AND org_id = ?
+      AND hotel_id = ?
+    ORDER BY id ASC
+    LIMIT {_INCREMENTAL_BATCH}
+"""
+
+
+def _fetch_guest_tickets_by_ids(org_id: int, hotel_id: int, ids: List[int]) -> List[Dict[str, Any]]:
+    """Los tickets avisados por NOTIFY que siguen pendientes de notificar (mismos filtros que el barrido)."""
+    if not ids:
+        return []
+    table = _tickets_table()
+    notif_false = "false" if using_pg() else "0"
+    id_ph = ",".join(["?"] * len(ids))
+    in_states = ",".join(["?"] * len(_PENDING_STATES))
+    sql = f"""
+    SELECT {_GUEST_TICKET_COLUMNS}
+    FROM {table}
+    WHERE id IN ({id_ph})
+      AND org_id = ?
+      AND hotel_id = ?
+      AND canal_origen = 'huesped_whatsapp'
+      AND estado IN ({in_states})
+      AND (assignment_notif_sent IS NULL OR assignment_notif_sent = {notif_false})
+    ORDER BY id ASC
+    """
+    return fetchall(sql, [*ids, org_id, hotel_id, *_PENDING_STATES]) or []
+
+
 def _fetch_recent_guest_tickets(org_id: int, hotel_id: int, lookback_minutes: int) -> List[Dict[str, Any]]:
     """
     Fetch tickets created by guest bot that still need supervisor notification.
@@ -61,74 +189,101 @@ def _fetch_recent_guest_tickets(org_id: int, hotel_id: int, lookback_minutes: in
         huesped_id, huesped_whatsapp, created_at, assignment_notif_sent
     """
     table = _tickets_table()
+    in_states = ",".join(["?"] * len(_PENDING_STATES))
+
+    # Postgres: interval math segura, NOW() - (INTERVAL '1 minute' * ?)
+    sql = RECENT_GUEST_TICKETS_PG_SQL if using_pg() else RECENT_GUEST_TICKETS_SQLITE_SQL
+    params = [org_id, hotel_id, *_PENDING_STATES, int(lookback_minutes)]
+    return fetchall(sql.format(table=table, states=in_states), params) or []
+
+
+def _is_pending_guest(t: Dict[str, Any]) -> bool:
+    """Mismos filtros que las consultas de arriba, aplicados en memoria."""
+    return (
+        t.get("canal_origen") == "huesped_whatsapp"
+        and t.get("estado") in _PENDING_STATES
+        and not t.get("assignment_notif_sent")
+    )
+
+
+def _fetch_tickets_after(org_id: int, hotel_id: int, after_id: int) -> List[Dict[str, Any]]:
+    """
+    Tickets del scope con id > after_id (todos los canales, para poder
+    avanzar la marca aunque no sean de huésped), en orden de id.
+    """
+    sql = TICKETS_AFTER_SQL.format(table=_tickets_table())
+    return fetchall(sql, [int(after_id), org_id, hotel_id]) or []
+
 
-    pending_states = ("PENDIENTE", "PENDIENTE_APROBACION", "PENDIENTE_APROBACIÓN")
-    in_states = ",".join(["?"] * len(pending_states))
+def _watch_state_table() -> str:
+    return "public.ticket_watch_state" if using_pg() else "ticket_watch_state"
+
+
+def _load_watermark(org_id: int, hotel_id: int) -> int:
+    """
+    Último id revisado del scope. Sin fila (primer arranque) se parte del
+    MAX(id) actual: lo anterior lo cubre el barrido inicial por ventana.
+    """
+    try:
+        row = fetchone(
+            f"SELECT last_id FROM {_watch_state_table()} WHERE org_id = ? AND hotel_id = ?",
+            [org_id, hotel_id],
+        )
+        if row and row.get("last_id") is not None:
+            return int(row["last_id"])
+    except Exception as e:
+        logger.warning("TICKET_WATCH no se pudo leer ticket_watch_state (marca en memoria): %s", e)
 
+    row = fetchone(
+        f"SELECT MAX(id) AS max_id FROM {_tickets_table()} WHERE org_id = ? AND hotel_id = ?",
+        [org_id, hotel_id],
+    )
+    last_id = int((row or {}).get("max_id") or 0)
+    _save_watermark(org_id, hotel_id, last_id, None)
+    return last_id
+
+
+def _save_watermark(org_id: int, hotel_id: int, last_id: int, last_created_at: Any) -> None:
+    """Upsert de la marca; nunca retrocede (otro proceso pudo avanzarla)."""
+    table = _watch_state_table()
     if using_pg():
-        # Safer interval math: NOW() - (INTERVAL '1 minute' * ?)
         sql = f"""
-        SELECT
-            id,
-            org_id,
-            hotel_id,
-            area,
-            prioridad,
-            estado,
-            detalle,
-            canal_origen,
-            ubicacion,
-            huesped_id,
-            huesped_whatsapp,
-            created_at,
-            assignment_notif_sent
-        FROM {table}
-        WHERE org_id = ?
-          AND hotel_id = ?
-          AND canal_origen = 'huesped_whatsapp'
-          AND estado IN ({in_states})
-          AND (assignment_notif_sent IS NULL OR assignment_notif_sent = false)
-          AND created_at >= NOW() - (INTERVAL '1 minute' * ?)
-        ORDER BY created_at ASC
-        LIMIT 100
+        INSERT INTO {table} (org_id, hotel_id, last_id, last_created_at, updated_at)
+        VALUES (?, ?, ?, ?, NOW())
+        ON CONFLICT (org_id, hotel_id) DO UPDATE SET
+            last_id = GREATEST({table}.last_id, EXCLUDED.last_id),
+            last_created_at = COALESCE(EXCLUDED.last_created_at, {table}.last_created_at),
+            updated_at = NOW()
         """
-        params = [org_id, hotel_id, *pending_states, int(lookback_minutes)]
-        return fetchall(sql, params) or []
-
-    # SQLite fallback
-    sql = f"""
-    SELECT
-        id,
-        org_id,
-        hotel_id,
-        area,
-        prioridad,
-        estado,
-        detalle,
-        canal_origen,
-        ubicacion,
-        huesped_id,
-        huesped_whatsapp,
-        created_at,
-        assignment_notif_sent
-    FROM {table}
-    WHERE org_id = ?
-      AND hotel_id = ?
-      AND canal_origen = 'huesped_whatsapp'
-      AND estado IN ({in_states})
-      AND (assignment_notif_sent IS NULL OR assignment_notif_sent = 0)
-      AND datetime(created_at) >= datetime('now', '-' || ? || ' minutes')
-    ORDER BY datetime(created_at) ASC
-    LIMIT 100
-    """
-    params = [org_id, hotel_id, *pending_states, int(lookback_minutes)]
-    return fetchall(sql, params) or []
+    else:
+        sql = f"""
+        INSERT INTO {table} (org_id, hotel_id, last_id, last_created_at, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (org_id, hotel_id) DO UPDATE SET
+            last_id = MAX(last_id, excluded.last_id),
+            last_created_at = COALESCE(excluded.last_created_at, last_created_at),
+            updated_at = CURRENT_TIMESTAMP
+        """
+        if last_created_at is not None:
+            last_created_at = str(last_created_at)
+    try:
+        execute(sql, [org_id, hotel_id, int(last_id), last_created_at], commit=True)
+    except Exception as e:
+        # La marca sigue en memoria; al reiniciar se re-lee algo de más (el claim deduplica)
+        logger.warning("TICKET_WATCH no se pudo guardar la marca last_id=%s: %s", last_id, e)
 
 
 def _diagnostic_sample(org_id: int, hotel_id: int) -> None:
     """
     When fetched=0, log last few tickets so we know what filter mismatched.
+    Como mucho una vez cada TICKET_WATCH_DIAG_INTERVAL_SECONDS.
     """
+    global _last_diag
+    now = time.monotonic()
+    if _last_diag and now - _last_diag < TICKET_WATCH_DIAG_INTERVAL_SECONDS:
+        return
+    _last_diag = now
+
     try:
         table = _tickets_table()
         sql = f"""
@@ -208,101 +363,227 @@ def _build_supervisor_message(ticket: Dict[str, Any]) -> str:
     )
 
 
-def _watch_loop(org_id: int, hotel_id: int, poll_seconds: int, lookback_minutes: int) -> None:
+def _notify_supervisors(t: Dict[str, Any], supervisors: List[str]) -> bool:
+    """False solo si hay que reintentarlo (SQLite sin ningún envío exitoso)."""
+    tid = t.get("id")
+    if tid is None:
+        return True
+    try:
+        tid_int = int(tid)
+    except Exception:
+        return True
+
+    # EXACTLY ONCE claim
+    if using_pg():
+        claimed = _claim_ticket_atomic_pg(tid_int)
+        if not claimed:
+            return True  # already claimed by another instance
+    # SQLite: we mark after send (single-process typical)
+
+    msg = _build_supervisor_message(t)
+
+    # ✅ Logging mejorado: Indicar que se notifica EN horario
+    logger.info(f"✅ TICKET_WATCH: Notificando ticket #{tid_int} (EN horario laboral)")
+
+    any_sent = False
+    for sup in supervisors:
+        try:
+            send_whatsapp_text(to=sup, body=msg)
+            any_sent = True
+        except Exception as e:
+            logger.warning("TICKET_WATCH send failed ticket_id=%s to=%s err=%s", tid_int, sup, e)
+
+    if using_pg():
+        # Postgres: already marked true in the atomic claim.
+        if any_sent:
+            logger.info("TICKET_WATCH notified ticket_id=%s supervisors=%s", tid_int, supervisors)
+        else:
+            # If all sends failed, we currently *keep it claimed* to prevent infinite retries.
+            # If you prefer retries, we can revert flag on failure.
+            logger.warning("TICKET_WATCH all sends failed ticket_id=%s (claimed=true)", tid_int)
+    else:
+        if any_sent:
+            try:
+                _mark_ticket_notified_sqlite(tid_int)
+                logger.info("TICKET_WATCH notified ticket_id=%s supervisors=%s", tid_int, supervisors)
+            except Exception:
+                logger.exception("TICKET_WATCH failed to mark notified ticket_id=%s", tid_int)
+        else:
+            logger.warning("TICKET_WATCH no sends succeeded ticket_id=%s (will retry)", tid_int)
+            return False
+    return True
+
+
+class _Wakeups:
+    """Ids recibidos por NOTIFY + pedido de resync, compartidos con el callback de pg_listener."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._ids: set = set()
+        self._resync = True  # el primer ciclo siempre hace el poll incremental
+
+    def on_notify(self, payload: Optional[str]) -> None:
+        with self._lock:
+            if payload is None:
+                self._resync = True  # (re)conexión del LISTEN: se pudo perder algo
+            else:
+                try:
+                    self._ids.add(int(payload))
+                except ValueError:
+                    self._resync = True
+        self._event.set()
+
+    def poke(self) -> None:
+        """Siguiente ciclo sin esperar (quedan filas por leer)."""
+        with self._lock:
+            self._resync = True
+        self._event.set()
+
+    def wait(self, timeout: float) -> None:
+        self._event.wait(timeout)
+        self._event.clear()
+
+    def take(self) -> tuple:
+        """(ids pendientes, ¿resync?) y los resetea."""
+        with self._lock:
+            ids, resync = sorted(self._ids), self._resync
+            self._ids, self._resync = set(), False
+        return ids, resync
+
+
+def _watch_loop(
+    org_id: int,
+    hotel_id: int,
+    poll_seconds: int,
+    lookback_minutes: int,
+    sweep_seconds: int,
+    wakeups: _Wakeups,
+) -> None:
     """
     Loop de vigilancia de tickets de huéspedes.
     ✅ MODIFICADO: Solo notifica a supervisores en horario laboral (7:30 AM - 11:30 PM)
     """
     from gateway_app.core.utils.horario import esta_en_horario_laboral
+    from gateway_app.services.leader_election import is_leader
+    from gateway_app.services.pg_listener import listener_running
     
     supervisors = _get_supervisor_phones()
     logger.info(
-        "TICKET_WATCH started db=%s org_id=%s hotel_id=%s poll=%ss lookback=%smin supervisors=%s",
-        _db_hint(), org_id, hotel_id, poll_seconds, lookback_minutes, supervisors
+        "TICKET_WATCH started db=%s org_id=%s hotel_id=%s poll=%ss max_idle=%ss sweep=%ss lookback=%smin supervisors=%s",
+        _db_hint(), org_id, hotel_id, poll_seconds, TICKET_WATCH_MAX_IDLE_SECONDS,
+        sweep_seconds, lookback_minutes, supervisors
     )
 
     if not supervisors:
         logger.warning("TICKET_WATCH disabled: SUPERVISOR_PHONES empty")
         return
 
+    min_wait = max(2, int(poll_seconds))
+    idle_wait = float(min_wait)
+    watermark: Optional[int] = None  # se carga en el primer ciclo
+    lookback_pending = True
+    last_poll = 0.0
     while True:
+        # Con LISTEN activo se despierta por NOTIFY; el timeout es solo el poll de respaldo
+        listening = listener_running()
+        if listening:
+            timeout = max(min_wait, sweep_seconds - (time.monotonic() - last_poll))
+        else:
+            timeout = idle_wait
+        wakeups.wait(timeout)
+
         try:
             # ====================================================================
             # ✅ NUEVO: CHECK DE HORARIO AL INICIO DEL LOOP
             # ====================================================================
-            en_horario = esta_en_horario_laboral()
-            
-            if not en_horario:
-                # 🌙 FUERA DE HORARIO: No procesar ni notificar
+            if not esta_en_horario_laboral():
+                # 🌙 FUERA DE HORARIO: No procesar ni notificar; al volver, revisar lo acumulado
                 logger.debug("🌙 TICKET_WATCH: Fuera de horario laboral - no se procesan notificaciones")
-                time.sleep(max(2, int(poll_seconds)))
-                continue  # ← Saltar esta iteración
+                wakeups.take()
+                lookback_pending = True
+                last_poll = 0.0
+                continue
             # ====================================================================
-            
-            tickets = _fetch_recent_guest_tickets(org_id, hotel_id, lookback_minutes)
-            logger.info("TICKET_WATCH fetched=%s", len(tickets))
-
-            if not tickets:
-                # Only occasionally log diagnostics to avoid log spam
-                _diagnostic_sample(org_id, hotel_id)
-
-            for t in tickets:
-                tid = t.get("id")
-                if tid is None:
-                    continue
-                try:
-                    tid_int = int(tid)
-                except Exception:
-                    continue
-
-                # EXACTLY ONCE claim
-                if using_pg():
-                    claimed = _claim_ticket_atomic_pg(tid_int)
-                    if not claimed:
-                        continue  # already claimed by another instance
-                # SQLite: we mark after send (single-process typical)
-
-                msg = _build_supervisor_message(t)
-
-                # ✅ Logging mejorado: Indicar que se notifica EN horario
-                logger.info(f"✅ TICKET_WATCH: Notificando ticket #{tid_int} (EN horario laboral)")
-                
-                any_sent = False
-                for sup in supervisors:
-                    try:
-                        send_whatsapp_text(to=sup, body=msg)
-                        any_sent = True
-                    except Exception as e:
-                        logger.warning("TICKET_WATCH send failed ticket_id=%s to=%s err=%s", tid_int, sup, e)
-
-                if using_pg():
-                    # Postgres: already marked true in the atomic claim.
-                    if any_sent:
-                        logger.info("TICKET_WATCH notified ticket_id=%s supervisors=%s", tid_int, supervisors)
-                    else:
-                        # If all sends failed, we currently *keep it claimed* to prevent infinite retries.
-                        # If you prefer retries, we can revert flag on failure.
-                        logger.warning("TICKET_WATCH all sends failed ticket_id=%s (claimed=true)", tid_int)
-                else:
-                    if any_sent:
-                        try:
-                            _mark_ticket_notified_sqlite(tid_int)
-                            logger.info("TICKET_WATCH notified ticket_id=%s supervisors=%s", tid_int, supervisors)
-                        except Exception:
-                            logger.exception("TICKET_WATCH failed to mark notified ticket_id=%s", tid_int)
-                    else:
-                        logger.warning("TICKET_WATCH no sends succeeded ticket_id=%s (will retry)", tid_int)
+
+            if not is_leader():
+                # Otro proceso es el líder (ver leader_election); al volver a serlo, revisar todo
+                wakeups.take()
+                lookback_pending = True
+                last_poll = 0.0
+                continue
+
+            ids, resync = wakeups.take()
+            if watermark is None:
+                watermark = _load_watermark(org_id, hotel_id)
+                logger.info("TICKET_WATCH watermark last_id=%s", watermark)
+
+            found: Dict[int, Dict[str, Any]] = {}
+
+            if lookback_pending:
+                for t in _fetch_recent_guest_tickets(org_id, hotel_id, lookback_minutes):
+                    found[int(t["id"])] = t
+                lookback_pending = False
+                logger.info("TICKET_WATCH sweep fetched=%s", len(found))
+
+            if ids:
+                notified = _fetch_guest_tickets_by_ids(org_id, hotel_id, ids)
+                for t in notified:
+                    found[int(t["id"])] = t
+                logger.info("TICKET_WATCH notify ids=%s fetched=%s", ids, len(notified))
+
+            rows: List[Dict[str, Any]] = []
+            polled = not listening or resync or time.monotonic() - last_poll >= sweep_seconds
+            if polled:
+                after_id = max(0, watermark - TICKET_WATCH_OVERLAP_IDS)
+                rows = _fetch_tickets_after(org_id, hotel_id, after_id)
+                last_poll = time.monotonic()
+                for t in rows:
+                    if _is_pending_guest(t):
+                        found[int(t["id"])] = t
+                logger.debug("TICKET_WATCH poll after_id=%s rows=%s", after_id, len(rows))
+
+            retry_from: Optional[int] = None
+            for tid in sorted(found):
+                if not _notify_supervisors(found[tid], supervisors) and tid > watermark:
+                    retry_from = tid if retry_from is None else min(retry_from, tid)
+
+            # Solo las filas pasada la marca cuentan como novedad (el resto es el solapamiento)
+            new_rows = [t for t in rows if int(t["id"]) > watermark]
+            if new_rows:
+                new_mark = int(rows[-1]["id"])
+                last_created_at = rows[-1].get("created_at")
+                if retry_from is not None:
+                    # No pasar de un ticket que hay que reintentar (SQLite)
+                    new_mark, last_created_at = retry_from - 1, None
+                if new_mark > watermark:
+                    watermark = new_mark
+                    _save_watermark(org_id, hotel_id, watermark, last_created_at)
+                if len(rows) >= _INCREMENTAL_BATCH and retry_from is None:
+                    wakeups.poke()
+
+            # Backoff exponencial sin actividad; cualquier novedad vuelve al mínimo
+            if found or ids or new_rows:
+                idle_wait = float(min_wait)
+            else:
+                idle_wait = min(idle_wait * 2, max(float(min_wait), TICKET_WATCH_MAX_IDLE_SECONDS))
+                if polled:
+                    _diagnostic_sample(org_id, hotel_id)
 
         except Exception:
             logger.exception("TICKET_WATCH loop error")
-
-        time.sleep(max(2, int(poll_seconds)))
+            last_poll = 0.0
 
 
 def start_ticket_watch() -> None:
     """
     Start background watcher thread.
 
+    Wakeups:
+      - Postgres: NOTIFY guest_ticket vía pg_listener + poll incremental de respaldo
+      - SQLite / sin listener: poll incremental cada TICKET_WATCH_POLL_SECONDS
+        (con backoff hasta TICKET_WATCH_MAX_IDLE_SECONDS)
+
     Dedupe:
       - Postgres: atomic UPDATE ... RETURNING claim using tickets.assignment_notif_sent
       - SQLite: marks after send
@@ -316,10 +597,16 @@ def start_ticket_watch() -> None:
     hotel_id = int(os.getenv("HOTEL_ID_DEFAULT", "6"))
     poll_seconds = int(os.getenv("TICKET_WATCH_POLL_SECONDS", "5"))
     lookback_minutes = int(os.getenv("TICKET_WATCH_LOOKBACK_MINUTES", "1440"))
+    sweep_seconds = int(os.getenv("TICKET_WATCH_SWEEP_SECONDS", "300"))
+
+    from gateway_app.services.pg_listener import register_listener
+
+    wakeups = _Wakeups()
+    register_listener(GUEST_TICKET_CHANNEL, wakeups.on_notify)
 
     th = threading.Thread(
         target=_watch_loop,
-        args=(org_id, hotel_id, poll_seconds, lookback_minutes),
+        args=(org_id, hotel_id, poll_seconds, lookback_minutes, sweep_seconds, wakeups),
         daemon=True,
         name="ticket_watch",
     )
@@ -7,16 +7,21 @@ Alineado al schema REAL de public.tickets:
 
 Convención actual del proyecto:
 - Al crear: huesped_whatsapp = teléfono del supervisor (creado_por)
-- Al asignar: huesped_whatsapp = "{worker_phone}|{worker_name}" (para que HK filtre por phone)
+- Al asignar: assigned_phone / assigned_name (columnas indexadas, usadas en las consultas)
+  + huesped_whatsapp = "{worker_phone}|{worker_name}" (compatibilidad)
 """
 
 import os
 
 import logging
-from typing import Dict, Any, List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 
 from gateway_app.services.db import fetchone, fetchall, execute, using_pg
+from gateway_app.services.ticket_events import record_event
 import re
+import unicodedata
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +42,104 @@ def _default_scope() -> tuple[int, int]:
     return org_id, hotel_id
 
 
+# ============================================================
+# SQL de las consultas calientes
+# ============================================================
+# query_plans.hot_queries hace EXPLAIN de estas mismas constantes.
+# {table} = public.tickets | tickets; {estados} = placeholders del IN.
+
+ESTADOS_PENDIENTES = ("PENDIENTE", "PENDIENTE_APROBACION", "PENDIENTE_APROBACIÓN")
+
+TICKETS_ASIGNADOS_SQL = """
+    SELECT *
+    FROM {table}
+    WHERE assigned_phone = ?
+      AND estado IN ('ASIGNADO', 'EN_CURSO', 'PAUSADO')
+      AND deleted_at IS NULL
+    ORDER BY priority_rank, created_at ASC
+"""
+
+TICKETS_POR_ESTADO_SQL = """
+    SELECT *
+    FROM {table}
+    WHERE org_id = ?
+      AND hotel_id = ?
+      AND estado = ?
+      AND deleted_at IS NULL
+    ORDER BY created_at DESC
+"""
+
+# {keyset}: "" en la primera página, si no la condición sobre el cursor (ver PAGINA_KEYSET_SQL)
+PAGINA_TICKETS_SQL = """
+    SELECT *
+    FROM {table}
+    WHERE org_id = ?
+      AND hotel_id = ?
+      AND estado IN ({estados})
+      AND deleted_at IS NULL
+      {keyset}
+    ORDER BY priority_rank, created_at, id
+    LIMIT ?
+"""
+
+PAGINA_KEYSET_SQL = "AND (priority_rank, created_at, id) > (?, {created_ph}, ?)"
+
+PENDIENTES_SQL = """
+    SELECT *
+    FROM {table}
+    WHERE org_id = ?
+      AND hotel_id = ?
+      AND estado IN ({estados})
+      AND deleted_at IS NULL
+    ORDER BY created_at DESC
+"""
+
+SIGUIENTE_PENDIENTE_SQL = """
+    SELECT *
+    FROM {table}
+    WHERE org_id = ?
+      AND hotel_id = ?
+      AND estado IN ({estados})
+      AND deleted_at IS NULL
+    ORDER BY priority_rank, created_at ASC
+    LIMIT 1
+"""
+
+# Duplicados: {estados} van como literales (ver buscar_ticket_duplicado)
+DUPLICADO_PG_SQL = """
+    SELECT t.*, s.similitud
+    FROM public.tickets t,
+         LATERAL (
+             SELECT similarity(
+                 public.f_unaccent(lower(coalesce(t.detalle, ''))),
+                 public.f_unaccent(lower(?))
+             ) AS similitud
+         ) s
+    WHERE t.org_id = ?
+      AND t.hotel_id = ?
+      AND t.ubicacion = ?
+      AND t.estado IN ({estados})
+      AND t.deleted_at IS NULL
+      AND t.created_at >= NOW() - make_interval(mins => ?)
+      AND s.similitud >= ?
+    ORDER BY s.similitud DESC, t.created_at DESC
+    LIMIT 1
+"""
+
+DUPLICADO_SQLITE_SQL = """
+    SELECT *
+    FROM tickets
+    WHERE org_id = ?
+      AND hotel_id = ?
+      AND ubicacion = ?
+      AND estado IN ({estados})
+      AND deleted_at IS NULL
+      AND created_at >= datetime('now', ?)
+    ORDER BY created_at DESC
+    LIMIT 20
+"""
+
+
 def crear_ticket(
     habitacion: str,
     detalle: str,
@@ -124,6 +227,8 @@ def crear_ticket(
                 routing_version,
             ],
         )
+        if ticket:
+            record_event(ticket["id"], "create", creado_por, {"estado": estado, "prioridad": prioridad, "area": area})
         return ticket
 
     # SQLite fallback (dev local)
@@ -159,59 +264,40 @@ def crear_ticket(
         creado_por,
         routing_source, routing_reason, routing_confidence, routing_version,
     ])
-    return fetchone(f"SELECT * FROM {table} ORDER BY id DESC LIMIT 1")
+    ticket = fetchone(f"SELECT * FROM {table} ORDER BY id DESC LIMIT 1")
+    if ticket:
+        record_event(ticket["id"], "create", creado_por, {"estado": estado, "prioridad": prioridad, "area": area})
+    return ticket
 
 
 def asignar_ticket(ticket_id: int, asignado_a_phone: str, asignado_a_nombre: str) -> bool:
     """
-    Asigna ticket: estado=ASIGNADO y guarda "phone|nombre" en huesped_whatsapp.
-    """
-    table = "public.tickets" if using_pg() else "tickets"
+    Asigna ticket: estado=ASIGNADO, guarda assigned_phone/assigned_name
+    y (por compatibilidad) "phone|nombre" en huesped_whatsapp.
 
-    sql = f"""
-        UPDATE {table}
-        SET estado = 'ASIGNADO',
-            huesped_whatsapp = ?,
-            assigned_at = NOW()
-        WHERE id = ?
+    Acepta cualquier estado abierto (asignar o reasignar sin guarda de worker).
+    Para transiciones estrictas usar TicketStateMachine.assign / reassign.
     """
-    phone_with_name = f"{asignado_a_phone}|{asignado_a_nombre}"
+    from gateway_app.services.ticket_state_machine import ticket_state_machine, OPEN_STATES
 
-    try:
-        execute(sql, [phone_with_name, ticket_id], commit=True)
-        return True
-    except Exception as e:
-        logger.exception("Error asignando ticket: %s", e)
-        return False
+    ticket = ticket_state_machine.assign(
+        ticket_id, asignado_a_phone, asignado_a_nombre, from_states=OPEN_STATES
+    )
+    return ticket is not None
 
 def _norm_phone(phone: str) -> str:
     return re.sub(r"\D+", "", phone or "")
 
 def obtener_tickets_asignados_a(phone: str) -> List[Dict[str, Any]]:
     """
-    Retorna tickets asignados al worker.
-    Busca en huesped_whatsapp (formato: "phone|nombre" cuando está asignado).
+    Retorna tickets asignados al worker, por prioridad (priority_rank) y antigüedad.
+    Usa assigned_phone (índice idx_tickets_assigned_rank).
     """
     table = "public.tickets" if using_pg() else "tickets"
-
-    sql = f"""
-    SELECT *
-    FROM {table}
-    WHERE huesped_whatsapp LIKE ?
-      AND estado IN ('ASIGNADO', 'EN_CURSO', 'PAUSADO')
-      AND deleted_at IS NULL
-    ORDER BY 
-        CASE prioridad
-            WHEN 'ALTA' THEN 1
-            WHEN 'MEDIA' THEN 2
-            WHEN 'BAJA' THEN 3
-            ELSE 4
-        END,
-        created_at ASC
-    """
+    sql = TICKETS_ASIGNADOS_SQL.format(table=table)
 
     try:
-        tickets = fetchall(sql, [f"{phone}|%"])
+        tickets = fetchall(sql, [phone])
         logger.info(f"📋 Encontrados {len(tickets)} tickets para {phone}")
         return tickets
     except Exception as e:
@@ -242,16 +328,8 @@ def obtener_tickets_asignados_y_en_curso(
                 t.prioridad,
                 t.estado,
                 t.huesped_whatsapp,
-                CASE 
-                    WHEN POSITION('|' IN COALESCE(t.huesped_whatsapp, '')) > 0 
-                    THEN SPLIT_PART(t.huesped_whatsapp, '|', 2)
-                    ELSE NULL
-                END as worker_name,
-                CASE 
-                    WHEN POSITION('|' IN COALESCE(t.huesped_whatsapp, '')) > 0 
-                    THEN SPLIT_PART(t.huesped_whatsapp, '|', 1)
-                    ELSE t.huesped_whatsapp
-                END as worker_phone,
+                t.assigned_name as worker_name,
+                COALESCE(t.assigned_phone, t.huesped_whatsapp) as worker_phone,
                 t.created_at,
                 t.assigned_at
             FROM public.tickets t
@@ -259,14 +337,7 @@ def obtener_tickets_asignados_y_en_curso(
               AND t.hotel_id = ?
               AND t.estado IN ('ASIGNADO', 'EN_CURSO')
               AND t.deleted_at IS NULL
-            ORDER BY 
-                CASE t.prioridad
-                    WHEN 'ALTA' THEN 1
-                    WHEN 'MEDIA' THEN 2
-                    WHEN 'BAJA' THEN 3
-                    ELSE 4
-                END,
-                t.created_at ASC
+            ORDER BY t.priority_rank, t.created_at ASC
             """,
             [org_id, hotel_id],
         )
@@ -302,22 +373,328 @@ def obtener_tickets_por_estado(
 
     try:
         return fetchall(
+            TICKETS_POR_ESTADO_SQL.format(table=table),
+            [org_id, hotel_id, estado],
+        ) or []
+    except Exception as e:
+        logger.exception("Error obteniendo tickets por estado: %s", e)
+        return []
+
+
+def obtener_pagina_tickets(
+    estados: Sequence[str],
+    *,
+    despues_de: Optional[Sequence[Any]] = None,
+    limite: int = 5,
+    org_id: Optional[int] = None,
+    hotel_id: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[List[Any]]]:
+    """
+    Una página de tickets ordenada por (priority_rank, created_at, id), con
+    paginación keyset: la página siguiente arranca en
+    WHERE (priority_rank, created_at, id) > cursor, sin OFFSET.
+    Solo viajan `limite` filas (+1 para saber si hay más).
+
+    Args:
+        estados: estados a listar
+        despues_de: cursor [priority_rank, created_at, id] de la página anterior
+
+    Returns:
+        (tickets, cursor_siguiente) — cursor_siguiente es None en la última página
+    """
+    table = "public.tickets" if using_pg() else "tickets"
+
+    if org_id is None or hotel_id is None:
+        d_org, d_hotel = _default_scope()
+        org_id = d_org if org_id is None else org_id
+        hotel_id = d_hotel if hotel_id is None else hotel_id
+
+    placeholders = ",".join(["?"] * len(estados))
+    params: List[Any] = [org_id, hotel_id, *estados]
+
+    keyset = ""
+    if despues_de:
+        keyset = PAGINA_KEYSET_SQL.format(created_ph="?::timestamptz" if using_pg() else "?")
+        params.extend(despues_de)
+
+    params.append(limite + 1)
+
+    try:
+        rows = fetchall(
+            PAGINA_TICKETS_SQL.format(table=table, estados=placeholders, keyset=keyset),
+            params,
+        ) or []
+    except Exception as e:
+        logger.exception("Error obteniendo página de tickets: %s", e)
+        return [], None
+
+    if len(rows) <= limite:
+        return rows, None
+
+    rows = rows[:limite]
+    ultimo = rows[-1]
+    cursor = [ultimo.get("priority_rank"), str(ultimo.get("created_at")), ultimo.get("id")]
+    return rows, cursor
+
+
+def contar_tickets_por_estados(
+    estados: Sequence[str],
+    *,
+    org_id: Optional[int] = None,
+    hotel_id: Optional[int] = None,
+) -> Dict[str, int]:
+    """Totales por estado (para el encabezado de un listado paginado)."""
+    table = "public.tickets" if using_pg() else "tickets"
+
+    if org_id is None or hotel_id is None:
+        d_org, d_hotel = _default_scope()
+        org_id = d_org if org_id is None else org_id
+        hotel_id = d_hotel if hotel_id is None else hotel_id
+
+    placeholders = ",".join(["?"] * len(estados))
+
+    try:
+        rows = fetchall(
             f"""
-            SELECT *
+            SELECT estado, COUNT(*) AS total
             FROM {table}
             WHERE org_id = ?
               AND hotel_id = ?
-              AND estado = ?
+              AND estado IN ({placeholders})
+              AND deleted_at IS NULL
+            GROUP BY estado
+            """,
+            [org_id, hotel_id, *estados],
+        ) or []
+        return {r["estado"]: int(r["total"]) for r in rows}
+    except Exception as e:
+        logger.exception("Error contando tickets por estado: %s", e)
+        return {}
+
+
+_STOPWORDS_BUSQUEDA = {
+    "el", "la", "los", "las", "un", "una", "de", "del", "al", "a", "en", "con",
+    "por", "para", "que", "y", "o", "se", "lo", "su", "hay", "tarea", "ticket",
+}
+
+
+def _palabras_busqueda(query: str) -> List[str]:
+    """Palabras (alfanuméricas) de una búsqueda libre, sin stopwords ni otra sintaxis."""
+    palabras = re.findall(r"\w+", (query or "").lower())
+    return [p for p in palabras if p not in _STOPWORDS_BUSQUEDA][:12]
+
+
+def buscar_tickets(
+    query: str,
+    limit: int = 10,
+    *,
+    org_id: Optional[int] = None,
+    hotel_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Búsqueda por texto libre sobre detalle + ubicacion ("ducha que gotea piso 4").
+
+    Postgres: full-text (config spanish, sin acentos) sobre search_tsv, con
+    las palabras en OR y ordenado por ts_rank; más matches difusos por
+    trigramas (typos, palabras parciales). Ver migrations.ensure_ticket_search.
+    SQLite: FTS5 (bm25), o LIKE si FTS5 no está disponible.
+
+    Returns:
+        Tickets (no eliminados) más relevantes primero
+    """
+    palabras = _palabras_busqueda(query)
+    if not palabras:
+        return []
+
+    if org_id is None or hotel_id is None:
+        d_org, d_hotel = _default_scope()
+        org_id = d_org if org_id is None else org_id
+        hotel_id = d_hotel if hotel_id is None else hotel_id
+
+    texto = " ".join(palabras)
+
+    if using_pg():
+        search_text = "public.f_unaccent(lower(coalesce(detalle, '') || ' ' || coalesce(ubicacion, '')))"
+        # OJO: "%%" es el operador de similitud de pg_trgm ("%" escapado para psycopg)
+        sql = f"""
+            SELECT t.*,
+                   ts_rank(t.search_tsv, q.tsq) AS search_rank,
+                   similarity({search_text}, q.txt) AS search_sim
+            FROM public.tickets t,
+                 LATERAL (
+                     SELECT to_tsquery('spanish'::regconfig, public.f_unaccent(?)) AS tsq,
+                            public.f_unaccent(?) AS txt
+                 ) q
+            WHERE t.org_id = ?
+              AND t.hotel_id = ?
+              AND t.deleted_at IS NULL
+              AND (t.search_tsv @@ q.tsq OR {search_text} %% q.txt)
+            ORDER BY search_rank DESC, search_sim DESC, t.created_at DESC
+            LIMIT ?
+        """
+        params = [" | ".join(palabras), texto, org_id, hotel_id, limit]
+        try:
+            return fetchall(sql, params) or []
+        except Exception as e:
+            logger.exception("Error buscando tickets: %s", e)
+            return []
+
+    # SQLite: FTS5 (prefijos en OR, orden bm25)
+    match = " OR ".join(f'"{p}"*' for p in palabras)
+    try:
+        return fetchall(
+            """
+            SELECT t.*
+            FROM tickets_fts f
+            JOIN tickets t ON t.id = f.rowid
+            WHERE tickets_fts MATCH ?
+              AND t.org_id = ?
+              AND t.hotel_id = ?
+              AND t.deleted_at IS NULL
+            ORDER BY bm25(tickets_fts), t.created_at DESC
+            LIMIT ?
+            """,
+            [match, org_id, hotel_id, limit],
+        ) or []
+    except Exception as e:
+        logger.warning(f"⚠️ FTS5 no disponible, buscando con LIKE: {e}")
+
+    condiciones = " OR ".join(["(detalle LIKE ? OR ubicacion LIKE ?)"] * len(palabras))
+    like_params: List[Any] = []
+    for p in palabras:
+        like_params.extend([f"%{p}%", f"%{p}%"])
+
+    try:
+        return fetchall(
+            f"""
+            SELECT *
+            FROM tickets
+            WHERE org_id = ?
+              AND hotel_id = ?
               AND deleted_at IS NULL
+              AND ({condiciones})
             ORDER BY created_at DESC
+            LIMIT ?
             """,
-            [org_id, hotel_id, estado],
+            [org_id, hotel_id, *like_params, limit],
         ) or []
     except Exception as e:
-        logger.exception("Error obteniendo tickets por estado: %s", e)
+        logger.exception("Error buscando tickets: %s", e)
         return []
 
 
+DUPLICADO_VENTANA_MINUTOS = int(os.getenv("DUPLICADO_VENTANA_MINUTOS", "30"))
+# 0.3 = umbral por defecto de pg_trgm; un falso positivo solo cuesta un "no"
+DUPLICADO_UMBRAL = float(os.getenv("DUPLICADO_UMBRAL", "0.3"))
+
+_ESTADOS_ABIERTOS = (
+    "PENDIENTE", "PENDIENTE_APROBACION", "PENDIENTE_APROBACIÓN",
+    "ASIGNADO", "EN_CURSO", "PAUSADO",
+)
+
+
+def _trigramas(texto: str) -> set:
+    """Trigramas estilo pg_trgm: minúsculas, sin acentos, cada palabra con padding '  x '."""
+    texto = unicodedata.normalize("NFKD", (texto or "").lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    trigramas = set()
+    for palabra in re.findall(r"[^\W_]+", texto):
+        p = f"  {palabra} "
+        trigramas.update(p[i:i + 3] for i in range(len(p) - 2))
+    return trigramas
+
+
+def similitud_texto(a: str, b: str) -> float:
+    """Similitud por trigramas (misma fórmula que similarity() de pg_trgm)."""
+    ta, tb = _trigramas(a), _trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def buscar_ticket_duplicado(
+    ubicacion: str,
+    detalle: str,
+    *,
+    ventana_minutos: Optional[int] = None,
+    umbral: Optional[float] = None,
+    org_id: Optional[int] = None,
+    hotel_id: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Busca un ticket abierto que probablemente sea el mismo reporte: misma
+    ubicación, creado hace menos de `ventana_minutos` y con detalle similar
+    (trigramas) sobre `umbral`. Se llama ANTES de crear_ticket.
+
+    Los candidatos salen de idx_tickets_dup_check (org_id, hotel_id,
+    ubicacion, created_at) parcial sobre estados abiertos → son pocas filas;
+    la similitud solo se calcula sobre ellas (Postgres: similarity() de
+    pg_trgm; SQLite: similitud_texto en Python).
+
+    Returns:
+        El ticket más similar (con "similitud") o None
+    """
+    ubicacion = str(ubicacion or "").strip()
+    if not ubicacion or not (detalle or "").strip():
+        return None
+
+    ventana_minutos = DUPLICADO_VENTANA_MINUTOS if ventana_minutos is None else ventana_minutos
+    umbral = DUPLICADO_UMBRAL if umbral is None else umbral
+
+    if org_id is None or hotel_id is None:
+        d_org, d_hotel = _default_scope()
+        org_id = d_org if org_id is None else org_id
+        hotel_id = d_hotel if hotel_id is None else hotel_id
+
+    # Estados como literales (no "?"): así el planner puede probar que la
+    # consulta cae dentro del índice parcial
+    estados_sql = ", ".join(f"'{e}'" for e in _ESTADOS_ABIERTOS)
+
+    if using_pg():
+        try:
+            return fetchone(
+                DUPLICADO_PG_SQL.format(estados=estados_sql),
+                [detalle, org_id, hotel_id, ubicacion, int(ventana_minutos), umbral],
+            )
+        except Exception as e:
+            logger.exception("Error buscando ticket duplicado: %s", e)
+            return None
+
+    try:
+        candidatos = fetchall(
+            DUPLICADO_SQLITE_SQL.format(estados=estados_sql),
+            [org_id, hotel_id, ubicacion, f"-{int(ventana_minutos)} minutes"],
+        ) or []
+    except Exception as e:
+        logger.exception("Error buscando ticket duplicado: %s", e)
+        return None
+
+    mejor = None
+    for t in candidatos:
+        sim = similitud_texto(t.get("detalle") or "", detalle)
+        if sim >= umbral and (mejor is None or sim > mejor["similitud"]):
+            mejor = {**t, "similitud": sim}
+    return mejor
+
+
+def registrar_reporte_duplicado(
+    ticket_id: int,
+    reportado_por: str,
+    detalle: Optional[str] = None,
+    media_id: Optional[str] = None,
+) -> None:
+    """
+    Un reporte que resultó ser el mismo que `ticket_id` (ver
+    buscar_ticket_duplicado): en vez de otro ticket, queda en el timeline.
+    """
+    record_event(
+        ticket_id,
+        "duplicate_report",
+        reportado_por,
+        {"detalle": detalle, "media_id": media_id},
+    )
+
+
 def obtener_ticket_por_id(ticket_id: int) -> Optional[Dict[str, Any]]:
     table = "public.tickets" if using_pg() else "tickets"
     try:
@@ -326,13 +703,30 @@ def obtener_ticket_por_id(ticket_id: int) -> Optional[Dict[str, Any]]:
         logger.exception("Error obteniendo ticket por id: %s", e)
         return None
 
-def actualizar_estado_ticket(ticket_id: int, nuevo_estado: str) -> bool:
+def _invalidar_carga_workers(motivo: str) -> None:
+    """Updates de estado fuera de TicketStateMachine: la carga cacheada ya no sirve."""
+    try:
+        from gateway_app.services.workers_db import invalidar_carga_workers
+        invalidar_carga_workers(motivo)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo invalidar la carga de trabajo: {e}")
+
+
+def actualizar_estado_ticket(
+    ticket_id: int,
+    nuevo_estado: str,
+    *,
+    actor: Optional[str] = None,
+) -> bool:
     """
-    Actualiza el estado de un ticket.
+    Actualiza el estado de un ticket (sin guarda: para transiciones con
+    guarda usar TicketStateMachine). Registra un evento "set_state" en
+    ticket_events para que el cambio aparezca en el timeline.
     
     Args:
         ticket_id: ID del ticket
         nuevo_estado: Nuevo estado (ASIGNADO, EN_CURSO, PAUSADO, RESUELTO)
+        actor: quien hizo el cambio (para ticket_events)
     
     Returns:
         True si se actualizó correctamente
@@ -346,8 +740,11 @@ def actualizar_estado_ticket(ticket_id: int, nuevo_estado: str) -> bool:
     """
     
     try:
-        execute(sql, [nuevo_estado, ticket_id], commit=True)
+        updated = execute(sql, [nuevo_estado, ticket_id], commit=True)
         logger.info(f"✅ Ticket #{ticket_id} actualizado a {nuevo_estado}")
+        _invalidar_carga_workers(f"ticket #{ticket_id} → {nuevo_estado}")
+        if updated:
+            record_event(ticket_id, "set_state", actor, {"estado": nuevo_estado})
         return True
     except Exception as e:
         logger.exception(f"❌ Error actualizando estado de ticket: {e}")
@@ -398,41 +795,110 @@ def actualizar_area_ticket(ticket_id: int, nueva_area: str) -> bool:
 
 def completar_ticket(ticket_id: int) -> bool:
     """
-    Marca un ticket como RESUELTO y registra finished_at.
+    Marca un ticket como RESUELTO y registra finished_at (desde cualquier
+    estado abierto, sin guarda de worker: uso del supervisor).
     Usar siempre en lugar de actualizar_estado_ticket cuando el estado
-    final es RESUELTO o RESUELTO.
+    final es RESUELTO.
     """
-    from datetime import datetime, timezone
-    table = "public.tickets" if using_pg() else "tickets"
-    now = datetime.now(timezone.utc)
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
 
-    sql = f"""
-        UPDATE {table}
-        SET estado = 'RESUELTO',
-            finished_at = ?
-        WHERE id = ?
+    return ticket_state_machine.finish(ticket_id) is not None
+
+
+def asignar_tickets(
+    ticket_ids: Sequence[int],
+    asignado_a_phone: str,
+    asignado_a_nombre: str,
+    *,
+    actor: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Asigna varios tickets pendientes a un worker en un solo UPDATE
+    (WHERE id = ANY(?) ... RETURNING *).
+
+    Returns:
+        Tickets efectivamente asignados (los que no estaban pendientes quedan fuera)
+    """
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
+
+    return ticket_state_machine.assign_many(
+        ticket_ids, asignado_a_phone, asignado_a_nombre, actor=actor
+    )
+
+
+def completar_tickets(ticket_ids: Sequence[int], *, actor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Marca varios tickets abiertos como RESUELTO en un solo UPDATE.
+
+    Returns:
+        Tickets efectivamente cerrados
+    """
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
+
+    return ticket_state_machine.finish_many(ticket_ids, actor=actor)
+
+
+def reasignar_tickets_de_worker(
+    phone_origen: str,
+    asignado_a_phone: str,
+    asignado_a_nombre: str,
+    *,
+    actor: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Pasa TODOS los tickets activos (ASIGNADO/EN_CURSO/PAUSADO) de un worker
+    a otro en un solo UPDATE.
+
+    Returns:
+        Tickets reasignados
+    """
+    from gateway_app.services.ticket_state_machine import ticket_state_machine
+
+    return ticket_state_machine.reassign_all(
+        phone_origen, asignado_a_phone, asignado_a_nombre, actor=actor
+    )
+
+
+def contar_tickets_en_curso(phone: str) -> int:
+    """
+    Cantidad de tickets EN_CURSO del worker (index-only sobre
+    idx_tickets_assigned_phone_estado).
     """
+    table = "public.tickets" if using_pg() else "tickets"
+
     try:
-        execute(sql, [now, ticket_id], commit=True)
-        logger.info(f"✅ Ticket #{ticket_id} completado | finished_at={now.isoformat()}")
-        return True
+        result = fetchone(
+            f"""
+            SELECT COUNT(*) AS total
+            FROM {table}
+            WHERE assigned_phone = ?
+              AND estado = 'EN_CURSO'
+              AND deleted_at IS NULL
+            """,
+            [phone],
+        )
+        return int(result["total"]) if result else 0
     except Exception as e:
-        logger.exception(f"❌ Error completando ticket #{ticket_id}: {e}")
-        return False
+        logger.exception("Error contando tickets en curso: %s", e)
+        return 0
 
 # ============================================================
 # COMPAT / ALIASES para orchestrator_hk_multiticket.py
 # (evita ImportError cuando el HK intenta "tomar")
 # ============================================================
 
-def actualizar_ticket_estado(ticket_id: int, nuevo_estado: str) -> bool:
+def actualizar_ticket_estado(
+    ticket_id: int,
+    nuevo_estado: str,
+    *,
+    actor: Optional[str] = None,
+) -> bool:
     """
     Alias compatible con el orquestador HK.
     Debe actualizar el estado del ticket (ej: ASIGNADO -> EN_CURSO).
+    Pasa por actualizar_estado_ticket → también queda en ticket_events.
     """
-    # Si ya tienes una función equivalente, úsala aquí:
-    # Ejemplos típicos: actualizar_estado_ticket, set_ticket_estado, cambiar_estado_ticket
-    return actualizar_estado_ticket(ticket_id, nuevo_estado)
+    return actualizar_estado_ticket(ticket_id, nuevo_estado, actor=actor)
 
 def obtener_pendientes(
     *,
@@ -444,26 +910,79 @@ def obtener_pendientes(
     if org_id is None or hotel_id is None:
         org_id, hotel_id = _default_scope()
 
-    estados = ("PENDIENTE", "PENDIENTE_APROBACION", "PENDIENTE_APROBACIÓN")
-    placeholders = ",".join(["?"] * len(estados))
+    placeholders = ",".join(["?"] * len(ESTADOS_PENDIENTES))
 
     return fetchall(
-        f"""
-        SELECT *
-        FROM {table}
-        WHERE org_id = ?
-          AND hotel_id = ?
-          AND estado IN ({placeholders})
-          AND deleted_at IS NULL
-        ORDER BY created_at DESC
-        """,
-        [org_id, hotel_id, *estados],
+        PENDIENTES_SQL.format(table=table, estados=placeholders),
+        [org_id, hotel_id, *ESTADOS_PENDIENTES],
     ) or []
 
+def obtener_pendientes_priorizados(
+    limite: int,
+    *,
+    org_id: Optional[int] = None,
+    hotel_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Los `limite` pendientes más prioritarios (mismo orden e índice que
+    obtener_siguiente_pendiente). Entrada de la asignación automática.
+    """
+    table = "public.tickets" if using_pg() else "tickets"
+
+    if org_id is None or hotel_id is None:
+        org_id, hotel_id = _default_scope()
+
+    estados = ("PENDIENTE", "PENDIENTE_APROBACION", "PENDIENTE_APROBACIÓN")
+    placeholders = ",".join(["?"] * len(estados))
+
+    try:
+        return fetchall(
+            f"""
+            SELECT *
+            FROM {table}
+            WHERE org_id = ?
+              AND hotel_id = ?
+              AND estado IN ({placeholders})
+              AND deleted_at IS NULL
+            ORDER BY priority_rank, created_at ASC
+            LIMIT ?
+            """,
+            [org_id, hotel_id, *estados, int(limite)],
+        ) or []
+    except Exception as e:
+        logger.exception("Error obteniendo pendientes priorizados: %s", e)
+        return []
+
+
+def obtener_siguiente_pendiente(
+    *,
+    org_id: Optional[int] = None,
+    hotel_id: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    El pendiente más prioritario (URGENTE > ALTA > MEDIA > BAJA) y, a igual
+    prioridad, el más antiguo. Range scan sobre idx_tickets_pendientes_rank.
+    """
+    table = "public.tickets" if using_pg() else "tickets"
+
+    if org_id is None or hotel_id is None:
+        org_id, hotel_id = _default_scope()
+
+    placeholders = ",".join(["?"] * len(ESTADOS_PENDIENTES))
+
+    try:
+        return fetchone(
+            SIGUIENTE_PENDIENTE_SQL.format(table=table, estados=placeholders),
+            [org_id, hotel_id, *ESTADOS_PENDIENTES],
+        )
+    except Exception as e:
+        logger.exception("Error obteniendo siguiente pendiente: %s", e)
+        return None
+
 def tomar_ticket_asignado(ticket_id: int, worker_phone: str) -> bool:
     """
     ✅ FIX C1: Marca un ticket como EN_CURSO SOLO si está asignado a ese worker.
-    Valida pertenencia via huesped_whatsapp (formato "phone|nombre").
+    Valida pertenencia via assigned_phone.
     
     Nota: Actualmente no se usa (el orquestador HK usa actualizar_ticket_estado),
     pero queda disponible si se necesita validación estricta de pertenencia.
@@ -477,7 +996,7 @@ def tomar_ticket_asignado(ticket_id: int, worker_phone: str) -> bool:
     # Verificar que el ticket pertenece al worker y está en estado válido
     ticket = fetchone(
         f"""
-        SELECT id, huesped_whatsapp, estado
+        SELECT id, assigned_phone, huesped_whatsapp, estado
         FROM {table}
         WHERE id = ?
           AND estado IN ('ASIGNADO', 'PENDIENTE')
@@ -489,9 +1008,9 @@ def tomar_ticket_asignado(ticket_id: int, worker_phone: str) -> bool:
         logger.warning(f"⚠️ tomar_ticket_asignado: ticket #{ticket_id} no encontrado o estado inválido")
         return False
 
-    # Validar que huesped_whatsapp empieza con el teléfono del worker
+    # Validar que el ticket está asignado al teléfono del worker
     hw = ticket.get("huesped_whatsapp") or ""
-    hw_phone = hw.split("|")[0] if "|" in hw else hw
+    hw_phone = ticket.get("assigned_phone") or (hw.split("|")[0] if "|" in hw else hw)
     hw_phone_norm = _norm_phone(hw_phone)
 
     if hw_phone_norm != p:
@@ -503,7 +1022,7 @@ def tomar_ticket_asignado(ticket_id: int, worker_phone: str) -> bool:
 
     # Actualizar estado
     try:
-        execute(
+        updated = execute(
             f"""
             UPDATE {table}
             SET estado = 'EN_CURSO',
@@ -514,6 +1033,14 @@ def tomar_ticket_asignado(ticket_id: int, worker_phone: str) -> bool:
             commit=True,
         )
         logger.info(f"✅ tomar_ticket_asignado: ticket #{ticket_id} tomado por {p}")
+        _invalidar_carga_workers(f"ticket #{ticket_id} tomado")
+        if updated:
+            record_event(
+                ticket_id,
+                "take",
+                p,
+                {"estado": "EN_CURSO", "assigned_phone": ticket.get("assigned_phone"), "from": ticket.get("estado")},
+            )
         return True
     except Exception as e:
         logger.exception(f"❌ Error tomando ticket {ticket_id} para {p}: {e}")
@@ -526,7 +1053,9 @@ def agregar_media_a_ticket(
     whatsapp_media_id: str,
     mime_type: str,
     file_size_bytes: int,
-    uploaded_by: str
+    uploaded_by: str,
+    original_hash: Optional[str] = None,
+    content_hash: Optional[str] = None
 ) -> Optional[int]:
     """
     Agrega un registro de media a un ticket.
@@ -539,6 +1068,8 @@ def agregar_media_a_ticket(
         mime_type: Tipo MIME (image/jpeg, video/mp4, etc.)
         file_size_bytes: Tamaño en bytes
         uploaded_by: Teléfono del usuario que subió el media
+        original_hash: SHA-256 del archivo recibido de WhatsApp
+        content_hash: SHA-256 del archivo almacenado (optimizado)
     
     Returns:
         ID del registro creado o None si falló
@@ -549,23 +1080,26 @@ def agregar_media_a_ticket(
     
     sql = f"""
         INSERT INTO {table} 
-        (ticket_id, media_type, storage_url, whatsapp_media_id, mime_type, file_size_bytes, uploaded_by)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        (ticket_id, media_type, storage_url, whatsapp_media_id, mime_type, file_size_bytes, uploaded_by,
+         original_hash, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         RETURNING id
     """
     
+    invalidar_memo_media(ticket_id)
+
     try:
         if using_pg():
             result = fetchone(sql, [
                 ticket_id, media_type, storage_url, whatsapp_media_id,
-                mime_type, file_size_bytes, uploaded_by
+                mime_type, file_size_bytes, uploaded_by, original_hash, content_hash
             ])
             return result["id"] if result else None
         else:
             # SQLite no soporta RETURNING
             execute(sql.replace("RETURNING id", ""), [
                 ticket_id, media_type, storage_url, whatsapp_media_id,
-                mime_type, file_size_bytes, uploaded_by
+                mime_type, file_size_bytes, uploaded_by, original_hash, content_hash
             ], commit=True)
             result = fetchone("SELECT last_insert_rowid() as id")
             return result["id"] if result else None
@@ -578,6 +1112,7 @@ def agregar_media_a_ticket(
 def obtener_media_de_ticket(ticket_id: int) -> List[Dict[str, Any]]:
     """
     Obtiene todos los medios asociados a un ticket.
+    Para varios tickets usar media_for (una sola query para todos).
     
     Args:
         ticket_id: ID del ticket
@@ -585,28 +1120,13 @@ def obtener_media_de_ticket(ticket_id: int) -> List[Dict[str, Any]]:
     Returns:
         Lista de registros de media
     """
-    from gateway_app.services.db import fetchall, using_pg
-    
-    table = "public.ticket_media" if using_pg() else "ticket_media"
-    
-    sql = f"""
-        SELECT id, ticket_id, media_type, storage_url, whatsapp_media_id,
-               mime_type, file_size_bytes, uploaded_by, created_at
-        FROM {table}
-        WHERE ticket_id = ?
-        ORDER BY created_at ASC
-    """
-    
-    try:
-        return fetchall(sql, [ticket_id]) or []
-    except Exception as e:
-        logger.exception(f"❌ Error obteniendo media de ticket #{ticket_id}: {e}")
-        return []
+    return media_for([ticket_id]).get(ticket_id, [])
 
 
 def contar_media_de_ticket(ticket_id: int) -> int:
     """
     Cuenta cuántos medios tiene un ticket.
+    Para listas usar media_counts_for (una sola query para todos).
     
     Args:
         ticket_id: ID del ticket
@@ -614,23 +1134,14 @@ def contar_media_de_ticket(ticket_id: int) -> int:
     Returns:
         Cantidad de medios
     """
-    from gateway_app.services.db import fetchone, using_pg
-    
-    table = "public.ticket_media" if using_pg() else "ticket_media"
-    
-    sql = f"SELECT COUNT(*) as count FROM {table} WHERE ticket_id = ?"
-    
-    try:
-        result = fetchone(sql, [ticket_id])
-        return result["count"] if result else 0
-    except Exception as e:
-        logger.exception(f"❌ Error contando media de ticket #{ticket_id}: {e}")
-        return 0
+    return media_counts_for([ticket_id]).get(ticket_id, 0)
 
 
 def obtener_primer_media_de_ticket(ticket_id: int) -> Optional[Dict[str, Any]]:
     """
     Obtiene el primer media de un ticket (útil para previews).
+    Incluye thumb_url/preview_url si las renditions ya existen.
+    Para listas usar first_media_for (una sola query para todos).
     
     Args:
         ticket_id: ID del ticket
@@ -638,24 +1149,195 @@ def obtener_primer_media_de_ticket(ticket_id: int) -> Optional[Dict[str, Any]]:
     Returns:
         Registro de media o None
     """
-    from gateway_app.services.db import fetchone, using_pg
-    
+    return first_media_for([ticket_id]).get(ticket_id)
+
+
+# ============================================================
+# CARGA DE MEDIA EN LOTE (evita N+1 al renderizar listas)
+# ============================================================
+
+# Memo por request: {("count"|"first"|"all", ticket_id): valor}.
+# Solo activo dentro de media_request_scope() (el webhook abre uno por request);
+# fuera de un scope cada llamada consulta la BD.
+_media_memo: ContextVar[Optional[Dict[Tuple[str, int], Any]]] = ContextVar("_media_memo", default=None)
+
+
+@contextmanager
+def media_request_scope():
+    """Activa el memo de media para el request en curso."""
+    token = _media_memo.set({})
+    try:
+        yield
+    finally:
+        _media_memo.reset(token)
+
+
+def invalidar_memo_media(ticket_id: int) -> None:
+    """Olvida lo memorizado de un ticket (p.ej. tras registrar un media nuevo)."""
+    memo = _media_memo.get()
+    if memo is not None:
+        for kind in ("count", "first", "all"):
+            memo.pop((kind, int(ticket_id)), None)
+
+
+def _ticket_ids_sql(ticket_ids: List[int]) -> Tuple[str, List[Any]]:
+    """Filtro "ticket_id en la lista": = ANY(?) en Postgres, IN (...) en SQLite."""
+    if using_pg():
+        return "= ANY(?)", [list(ticket_ids)]
+    return f"IN ({','.join(['?'] * len(ticket_ids))})", list(ticket_ids)
+
+
+def _memo_batch(kind: str, ticket_ids, loader, default):
+    """
+    Resuelve ticket_ids desde el memo y carga SOLO los faltantes con loader(ids) → dict.
+    """
+    ids = []
+    for tid in ticket_ids or []:
+        try:
+            tid = int(tid)
+        except (TypeError, ValueError):
+            continue
+        if tid not in ids:
+            ids.append(tid)
+
+    memo = _media_memo.get()
+    result: Dict[int, Any] = {}
+    faltantes = []
+    for tid in ids:
+        if memo is not None and (kind, tid) in memo:
+            result[tid] = memo[(kind, tid)]
+        else:
+            faltantes.append(tid)
+
+    if faltantes:
+        try:
+            cargados = loader(faltantes)
+        except Exception as e:
+            logger.exception(f"❌ Error cargando media ({kind}) de {len(faltantes)} ticket(s): {e}")
+            cargados = {}
+        for tid in faltantes:
+            value = cargados.get(tid, default() if callable(default) else default)
+            result[tid] = value
+            if memo is not None:
+                memo[(kind, tid)] = value
+
+    return result
+
+
+def media_counts_for(ticket_ids: List[int]) -> Dict[int, int]:
+    """
+    Cantidad de medios por ticket, para muchos tickets en UNA query.
+
+    Returns:
+        {ticket_id: cantidad} (0 para tickets sin media)
+    """
     table = "public.ticket_media" if using_pg() else "ticket_media"
-    
-    sql = f"""
-        SELECT id, ticket_id, media_type, storage_url, whatsapp_media_id,
-               mime_type, file_size_bytes, uploaded_by, created_at
-        FROM {table}
-        WHERE ticket_id = ?
-        ORDER BY created_at ASC
-        LIMIT 1
+
+    def _load(ids: List[int]) -> Dict[int, int]:
+        filtro, params = _ticket_ids_sql(ids)
+        rows = fetchall(
+            f"""
+            SELECT ticket_id, COUNT(*) AS count
+            FROM {table}
+            WHERE ticket_id {filtro}
+            GROUP BY ticket_id
+            """,
+            params,
+        ) or []
+        return {int(r["ticket_id"]): int(r["count"]) for r in rows}
+
+    return _memo_batch("count", ticket_ids, _load, 0)
+
+
+def first_media_for(ticket_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
     """
-    
-    try:
-        return fetchone(sql, [ticket_id])
-    except Exception as e:
-        logger.exception(f"❌ Error obteniendo primer media de ticket #{ticket_id}: {e}")
-        return None
+    Primer media (con thumb_url/preview_url) de cada ticket, en UNA query.
+
+    Returns:
+        {ticket_id: media | None}
+    """
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+    renditions = "public.ticket_media_renditions" if using_pg() else "ticket_media_renditions"
+
+    columnas = """m.id, m.ticket_id, m.media_type, m.storage_url, m.whatsapp_media_id,
+               m.mime_type, m.file_size_bytes, m.uploaded_by, m.created_at,
+               rt.storage_url AS thumb_url,
+               rp.storage_url AS preview_url"""
+    joins = f"""LEFT JOIN {renditions} rt ON rt.media_id = m.id AND rt.kind = 'thumb'
+            LEFT JOIN {renditions} rp ON rp.media_id = m.id AND rp.kind = 'preview'"""
+
+    def _load(ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        filtro, params = _ticket_ids_sql(ids)
+        if using_pg():
+            sql = f"""
+                SELECT DISTINCT ON (m.ticket_id) {columnas}
+                FROM {table} m
+                {joins}
+                WHERE m.ticket_id {filtro}
+                ORDER BY m.ticket_id, m.created_at ASC, m.id ASC
+            """
+        else:
+            sql = f"""
+                SELECT * FROM (
+                    SELECT {columnas},
+                           ROW_NUMBER() OVER (PARTITION BY m.ticket_id ORDER BY m.created_at ASC, m.id ASC) AS rn
+                    FROM {table} m
+                    {joins}
+                    WHERE m.ticket_id {filtro}
+                )
+                WHERE rn = 1
+            """
+        rows = fetchall(sql, params) or []
+        result = {}
+        for r in rows:
+            r.pop("rn", None)
+            result[int(r["ticket_id"])] = r
+        return result
+
+    return _memo_batch("first", ticket_ids, _load, None)
+
+
+def media_for(ticket_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Todos los medios de cada ticket, en UNA query.
+
+    Returns:
+        {ticket_id: [media, ...]} en orden de creación
+    """
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+
+    def _load(ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        filtro, params = _ticket_ids_sql(ids)
+        rows = fetchall(
+            f"""
+            SELECT id, ticket_id, media_type, storage_url, whatsapp_media_id,
+                   mime_type, file_size_bytes, uploaded_by, created_at
+            FROM {table}
+            WHERE ticket_id {filtro}
+            ORDER BY ticket_id, created_at ASC
+            """,
+            params,
+        ) or []
+        result: Dict[int, List[Dict[str, Any]]] = {}
+        for r in rows:
+            result.setdefault(int(r["ticket_id"]), []).append(r)
+        return result
+
+    return _memo_batch("all", ticket_ids, _load, list)
+
+
+def adjuntar_conteo_media(tickets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Agrega t["media_count"] a cada ticket de la lista con una sola query
+    (los que ya lo traen no se vuelven a consultar). Para "📎 N" en listados.
+    """
+    sin_conteo = [t.get("id") for t in tickets or [] if "media_count" not in t and t.get("id") is not None]
+    if sin_conteo:
+        counts = media_counts_for(sin_conteo)
+        for t in tickets:
+            if "media_count" not in t and t.get("id") is not None:
+                t["media_count"] = counts.get(int(t["id"]), 0)
+    return tickets
 
 
 def eliminar_media(media_id: int) -> bool:
@@ -709,4 +1391,318 @@ def mover_media_a_ticket(whatsapp_media_id: str, ticket_id: int) -> bool:
         return True
     except Exception as e:
         logger.exception(f"❌ Error moviendo media a ticket #{ticket_id}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+# ============================================================
+# MEDIA ASÍNCRONO (ver services/media_jobs.py)
+# ============================================================
+
+def registrar_media_pendiente(
+    ticket_id: int,
+    media_type: str,
+    whatsapp_media_id: str,
+    uploaded_by: str
+) -> Optional[int]:
+    """
+    Registra un media en estado PENDIENTE (sin storage_url todavía).
+    Idempotente por (ticket_id, whatsapp_media_id): si ya existe, retorna su id.
+
+    Returns:
+        ID del registro o None si falló
+    """
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+
+    select_sql = f"""
+        SELECT id FROM {table}
+        WHERE ticket_id = ? AND whatsapp_media_id = ?
+        ORDER BY id ASC
+        LIMIT 1
+    """
+
+    try:
+        existente = fetchone(select_sql, [ticket_id, whatsapp_media_id])
+        if existente:
+            return existente["id"]
+
+        insert_sql = f"""
+            INSERT INTO {table}
+            (ticket_id, media_type, storage_url, whatsapp_media_id, uploaded_by, estado)
+            VALUES (?, ?, NULL, ?, ?, 'PENDIENTE')
+        """
+        if using_pg():
+            result = fetchone(insert_sql + " RETURNING id", [
+                ticket_id, media_type, whatsapp_media_id, uploaded_by
+            ])
+        else:
+            execute(insert_sql, [ticket_id, media_type, whatsapp_media_id, uploaded_by], commit=True)
+            result = fetchone(select_sql, [ticket_id, whatsapp_media_id])
+        invalidar_memo_media(ticket_id)
+        return result["id"] if result else None
+
+    except Exception as e:
+        # Carrera con otro worker (índice único): el registro ya existe
+        existente = fetchone(select_sql, [ticket_id, whatsapp_media_id])
+        if existente:
+            return existente["id"]
+        logger.exception(f"❌ Error registrando media pendiente en ticket #{ticket_id}: {e}")
+        return None
+
+
+def reclamar_media_pendiente(media_db_id: int, stale_minutes: int = 10) -> Optional[Dict[str, Any]]:
+    """
+    Marca un media como PROCESANDO solo si está PENDIENTE/ERROR, o si quedó
+    PROCESANDO hace más de `stale_minutes` (worker caído).
+    Garantiza que un solo worker procese cada media.
+
+    Returns:
+        La fila reclamada o None si otro worker ya la tiene / ya está LISTO
+    """
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+
+    if using_pg():
+        sql = f"""
+            UPDATE {table}
+            SET estado = 'PROCESANDO',
+                procesando_desde = NOW()
+            WHERE id = ?
+              AND (
+                estado IN ('PENDIENTE', 'ERROR')
+                OR (estado = 'PROCESANDO' AND procesando_desde < NOW() - (INTERVAL '1 minute' * ?))
+              )
+            RETURNING *
+        """
+    else:
+        sql = f"""
+            UPDATE {table}
+            SET estado = 'PROCESANDO',
+                procesando_desde = CURRENT_TIMESTAMP
+            WHERE id = ?
+              AND (
+                estado IN ('PENDIENTE', 'ERROR')
+                OR (estado = 'PROCESANDO' AND datetime(procesando_desde) < datetime('now', '-' || ? || ' minutes'))
+              )
+        """
+
+    try:
+        if using_pg():
+            return fetchone(sql, [media_db_id, int(stale_minutes)])
+
+        # SQLite: fetchone no hace commit → UPDATE + SELECT (fallback de desarrollo, un solo proceso)
+        execute(sql, [media_db_id, int(stale_minutes)], commit=True)
+        return fetchone(f"SELECT * FROM {table} WHERE id = ? AND estado = 'PROCESANDO'", [media_db_id])
+    except Exception as e:
+        logger.exception(f"❌ Error reclamando media #{media_db_id}: {e}")
+        return None
+
+
+def completar_media_pendiente(
+    media_db_id: int,
+    storage_url: str,
+    mime_type: str,
+    file_size_bytes: int,
+    original_hash: Optional[str] = None,
+    content_hash: Optional[str] = None
+) -> bool:
+    """Completa un media procesado: guarda storage_url (+ hashes) y lo deja en LISTO."""
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+    now_sql = "NOW()" if using_pg() else "CURRENT_TIMESTAMP"
+
+    sql = f"""
+        UPDATE {table}
+        SET storage_url = ?,
+            mime_type = ?,
+            file_size_bytes = ?,
+            original_hash = COALESCE(?, original_hash),
+            content_hash = COALESCE(?, content_hash),
+            estado = 'LISTO',
+            ultimo_error = NULL,
+            procesando_desde = NULL,
+            procesado_at = {now_sql}
+        WHERE id = ?
+    """
+
+    try:
+        execute(sql, [
+            storage_url, mime_type, file_size_bytes, original_hash, content_hash, media_db_id
+        ], commit=True)
+        return True
+    except Exception as e:
+        logger.exception(f"❌ Error completando media #{media_db_id}: {e}")
+        return False
+
+
+def guardar_upload_url_media(media_db_id: int, upload_url: Optional[str]) -> None:
+    """
+    Persiste (o limpia con None) la URL de la subida resumible en curso,
+    para que un reintento continúe desde el último chunk confirmado.
+    """
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+
+    try:
+        execute(f"UPDATE {table} SET upload_url = ? WHERE id = ?", [upload_url, media_db_id], commit=True)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo guardar upload_url de media #{media_db_id}: {e}")
+
+
+def marcar_media_error(media_db_id: int, error: str) -> int:
+    """
+    Registra un intento fallido.
+
+    Returns:
+        Cantidad de intentos acumulados (0 si no se pudo registrar)
+    """
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+
+    sql = f"""
+        UPDATE {table}
+        SET estado = 'ERROR',
+            intentos = intentos + 1,
+            ultimo_error = ?,
+            procesando_desde = NULL
+        WHERE id = ?
+    """
+
+    try:
+        params = [(error or "")[:500], media_db_id]
+        if using_pg():
+            result = fetchone(sql + " RETURNING intentos", params)
+        else:
+            execute(sql, params, commit=True)
+            result = fetchone(f"SELECT intentos FROM {table} WHERE id = ?", [media_db_id])
+        return result["intentos"] if result else 0
+    except Exception as e:
+        logger.exception(f"❌ Error marcando media #{media_db_id} con error: {e}")
+        return 0
+
+
+def obtener_media_listo_por_whatsapp_id(whatsapp_media_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Busca un media ya subido (LISTO con storage_url) para el mismo whatsapp_media_id.
+    Permite que un reintento (o el mismo media en otro ticket) no vuelva a subir el archivo.
+    """
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+
+    sql = f"""
+        SELECT id, storage_url, mime_type, file_size_bytes, original_hash, content_hash
+        FROM {table}
+        WHERE whatsapp_media_id = ?
+          AND estado = 'LISTO'
+          AND storage_url IS NOT NULL
+          AND storage_url <> ''
+        ORDER BY id ASC
+        LIMIT 1
+    """
+
+    try:
+        return fetchone(sql, [whatsapp_media_id])
+    except Exception as e:
+        logger.exception(f"❌ Error buscando media listo {whatsapp_media_id}: {e}")
+        return None
+
+
+def obtener_media_por_hash(sha256: str) -> Optional[Dict[str, Any]]:
+    """
+    Busca un media ya almacenado con el mismo contenido (hash del original o del optimizado).
+    Convierte un upload duplicado en un simple lookup.
+    """
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+
+    sql = f"""
+        SELECT id, storage_url, mime_type, file_size_bytes, original_hash, content_hash
+        FROM {table}
+        WHERE (content_hash = ? OR original_hash = ?)
+          AND storage_url IS NOT NULL
+          AND storage_url <> ''
+        ORDER BY id ASC
+        LIMIT 1
+    """
+
+    try:
+        return fetchone(sql, [sha256, sha256])
+    except Exception as e:
+        logger.exception(f"❌ Error buscando media por hash: {e}")
+        return None
+
+
+def obtener_media_pendientes(max_intentos: int, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Medios que aún no tienen storage_url y no agotaron sus reintentos.
+    Usado por el barrido de recuperación al iniciar la app.
+    """
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+
+    sql = f"""
+        SELECT id, ticket_id, media_type, whatsapp_media_id, uploaded_by, estado, intentos
+        FROM {table}
+        WHERE estado IN ('PENDIENTE', 'PROCESANDO', 'ERROR')
+          AND intentos < ?
+        ORDER BY created_at ASC
+        LIMIT ?
+    """
+
+    try:
+        return fetchall(sql, [int(max_intentos), int(limit)]) or []
+    except Exception as e:
+        logger.exception(f"❌ Error obteniendo medios pendientes: {e}")
+        return []
+
+
+# ============================================================
+# RENDITIONS (ver services/media_renditions.py)
+# ============================================================
+
+def obtener_media_por_id(media_db_id: int) -> Optional[Dict[str, Any]]:
+    """Obtiene un registro de ticket_media por su ID."""
+    table = "public.ticket_media" if using_pg() else "ticket_media"
+
+    try:
+        return fetchone(f"SELECT * FROM {table} WHERE id = ?", [media_db_id])
+    except Exception as e:
+        logger.exception(f"❌ Error obteniendo media #{media_db_id}: {e}")
+        return None
+
+
+def obtener_rendition(media_db_id: int, kind: str) -> Optional[Dict[str, Any]]:
+    """Obtiene una rendition (thumb/preview/full) de un media, o None si no existe."""
+    table = "public.ticket_media_renditions" if using_pg() else "ticket_media_renditions"
+
+    sql = f"""
+        SELECT media_id, kind, storage_url, width, height, file_size_bytes
+        FROM {table}
+        WHERE media_id = ? AND kind = ?
+    """
+
+    try:
+        return fetchone(sql, [media_db_id, kind])
+    except Exception as e:
+        logger.exception(f"❌ Error obteniendo rendition {kind} de media #{media_db_id}: {e}")
+        return None
+
+
+def guardar_rendition(
+    media_db_id: int,
+    kind: str,
+    storage_url: str,
+    width: Optional[int],
+    height: Optional[int],
+    file_size_bytes: Optional[int]
+) -> bool:
+    """Registra (o actualiza) una rendition generada."""
+    table = "public.ticket_media_renditions" if using_pg() else "ticket_media_renditions"
+
+    sql = f"""
+        INSERT INTO {table} (media_id, kind, storage_url, width, height, file_size_bytes)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (media_id, kind) DO UPDATE
+        SET storage_url = excluded.storage_url,
+            width = excluded.width,
+            height = excluded.height,
+            file_size_bytes = excluded.file_size_bytes
+    """
+
+    try:
+        execute(sql, [media_db_id, kind, storage_url, width, height, file_size_bytes], commit=True)
+        return True
+    except Exception as e:
+        logger.exception(f"❌ Error guardando rendition {kind} de media #{media_db_id}: {e}")
+        return False
@@ -1,5 +1,6 @@
 import requests
 from gateway_app.config import Config
+from gateway_app.services.storage_backends import is_http_url
 
 GRAPH_BASE = "https://graph.facebook.com/v20.0"
 
@@ -56,6 +57,11 @@ def send_whatsapp_image(
     import requests
     from gateway_app.config import Config
     
+    # WhatsApp descarga el link: file://, rutas locales, etc. no sirven
+    if image_url and not is_http_url(image_url):
+        logger.warning(f"⚠️ image_url no es http(s), se descarta: {image_url[:80]}")
+        image_url = None
+
     if not media_id and not image_url:
         return {"success": False, "error": "Se requiere media_id o image_url"}
     
@@ -122,6 +128,11 @@ def send_whatsapp_video(
     import requests
     from gateway_app.config import Config
     
+    # WhatsApp descarga el link: file://, rutas locales, etc. no sirven
+    if video_url and not is_http_url(video_url):
+        logger.warning(f"⚠️ video_url no es http(s), se descarta: {video_url[:80]}")
+        video_url = None
+
     if not media_id and not video_url:
         return {"success": False, "error": "Se requiere media_id o video_url"}
     
@@ -6,14 +6,17 @@ Consultas de workers desde Supabase.
    - public.users no tiene org_id/hotel_id
    - public.orgusers SÍ tiene org_id y default_hotel_id
    - JOIN: users.id = orgusers.user_id → filtra por organización y hotel
+
+Las lecturas de roster pasan por un directorio en memoria (staff_directory):
+se consulta la BD una vez por TTL / invalidación, no en cada mensaje.
 """
 import os
 import logging
-import re
-import unicodedata
 from typing import List, Dict, Any, Optional
 
 from gateway_app.services.db import fetchall, fetchone, execute, using_pg
+from gateway_app.services.name_index import normalize_name
+from gateway_app.services.staff_directory import StaffDirectory
 
 logger = logging.getLogger(__name__)
 
@@ -54,35 +57,32 @@ def _normalize_phone(phone: str) -> str:
     return "".join(ch for ch in (phone or "").strip() if ch.isdigit())
 
 
-def _norm(s: str) -> str:
-    if not s:
-        return ""
-    s = s.strip().lower()
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-
 # ============================================================
-# SQL base: SELECT de workers filtrado por org/hotel via orgusers
+# SQL base: roster filtrado por org/hotel via orgusers
 # ============================================================
 
-_WORKERS_BASE_SQL = """
+# Roster + flags efímeros (pausada/ocupada) de runtime_sessions en UNA consulta.
+# Los flags se comparan como texto: un valor raro en el JSONB da false, no error.
+_ROSTER_SQL = """
     SELECT 
         u.id,
         u.username AS nombre_completo,
         u.telefono,
         u.area,
         u.activo,
-        u.turno_activo
+        u.turno_activo,
+        COALESCE(lower(rs.data->>'pausada') IN ('true', 't', '1'), false) AS pausada,
+        COALESCE(lower(rs.data->>'ocupada') IN ('true', 't', '1'), false) AS ocupada,
+        NULLIF(UPPER(rs.data->>'area'), '') AS runtime_area
     FROM public.users u
     JOIN public.orgusers ou ON ou.user_id = u.id
+    LEFT JOIN public.runtime_sessions rs ON rs.phone = u.telefono
     WHERE u.activo = true
       AND ou.org_id = ?
       AND ou.default_hotel_id = ?
       AND u.area IN ('HOUSEKEEPING', 'MANTENCION', 'MANTENIMIENTO', 
                       'AREAS_COMUNES', 'ROOMSERVICE')
+    ORDER BY u.username
 """
 
 
@@ -112,6 +112,7 @@ def activar_turno_por_telefono(phone: str) -> bool:
 
     if row:
         logger.info("✅ Turno activado: telefono=%s user_id=%s", phone_n, row["id"])
+        invalidar_directorio_workers("turno activado")
         return True
 
     logger.warning("⚠️ No se activó turno: no existe user con telefono=%s", phone_n)
@@ -127,71 +128,142 @@ def desactivar_turno_por_telefono(phone: str) -> bool:
         "UPDATE public.users SET turno_activo = ?, turno_updated_at = now() WHERE telefono = ?",
         (False, phone_n),
     )
+    invalidar_directorio_workers("turno desactivado")
     return True
 
 
 # ============================================================
-# RUNTIME SESSIONS (no depende de org/hotel)
+# ROSTER + DIRECTORIO EN MEMORIA
 # ============================================================
 
-def _get_pg_conn():
-    dsn = os.getenv("DATABASE_URL")
-    if not dsn:
-        raise RuntimeError("DATABASE_URL no está configurada")
+def cargar_roster_workers(org_id: int, hotel_id: int) -> List[Dict[str, Any]]:
+    """
+    Consulta el roster de workers activos de (org_id, hotel_id) con sus
+    flags normalizados. Es el loader del directorio: si falla, lanza (así
+    no se cachea un roster vacío).
+    """
+    workers = fetchall(_ROSTER_SQL, [org_id, hotel_id])
 
-    try:
-        import psycopg2  # type: ignore
-        return psycopg2.connect(dsn, sslmode="require")
-    except Exception:
-        try:
-            import psycopg  # type: ignore
-            return psycopg.connect(dsn, sslmode="require")
-        except Exception as e:
-            raise RuntimeError("No hay driver Postgres (psycopg2/psycopg)") from e
+    for w in workers:
+        runtime_area = w.pop("runtime_area", None)
+
+        # Turno desde BD (fuente de verdad); pausada/ocupada desde runtime_sessions
+        w["turno_activo"] = bool(w.get("turno_activo", False))
+        w["pausada"] = bool(w.get("pausada", False))
+        w["ocupada"] = bool(w.get("ocupada", False))
 
+        # Área normalizada
+        w["area"] = normalizar_area(w.get("area") or runtime_area or "HOUSEKEEPING")
 
-def obtener_runtime_sessions_por_telefonos(phones: list[str]) -> dict[str, dict]:
+    logger.info(
+        f"👥 {len(workers)} workers (org={org_id}, hotel={hotel_id}); "
+        f"turno_activo={sum(1 for w in workers if w.get('turno_activo'))}; "
+        f"areas_sample={[w.get('area') for w in workers[:5]]}"
+    )
+    return workers
+
+
+# query_plans.hot_queries hace EXPLAIN de esta misma constante
+CARGA_WORKERS_SQL = """
+    SELECT assigned_phone, estado, COUNT(*) AS n
+    FROM {table}
+    WHERE org_id = ? AND hotel_id = ?
+      AND estado IN ('ASIGNADO', 'EN_CURSO', 'PAUSADO')
+      AND deleted_at IS NULL
+      AND assigned_phone IS NOT NULL
+    GROUP BY assigned_phone, estado
+"""
+
+
+def cargar_carga_workers(org_id: int, hotel_id: int) -> Dict[str, Dict[str, int]]:
     """
-    Devuelve phone -> {turno_activo, ocupada, pausada, area} desde runtime_sessions.
-    Nunca debe botar la app: si falla, devuelve {}.
+    Tickets abiertos por worker y estado en UNA consulta:
+        {telefono_normalizado: {"ASIGNADO": n, "EN_CURSO": n, "PAUSADO": n}}
+    Es el loader de carga del directorio: si falla, lanza.
+    """
+    table = "public.tickets" if using_pg() else "tickets"
+    rows = fetchall(CARGA_WORKERS_SQL.format(table=table), [org_id, hotel_id])
+
+    carga: Dict[str, Dict[str, int]] = {}
+    for r in rows:
+        phone = _normalize_phone(r.get("assigned_phone") or "")
+        if phone:
+            por_estado = carga.setdefault(phone, {})
+            por_estado[r["estado"]] = por_estado.get(r["estado"], 0) + int(r["n"])
+    return carga
+
+
+# Ventana para "último ticket trabajado": más atrás ya no dice dónde está el worker
+ULTIMA_UBICACION_HORAS = int(os.getenv("ULTIMA_UBICACION_HORAS", "12"))
+
+
+def cargar_ubicaciones_workers(org_id: int, hotel_id: int) -> Dict[str, str]:
     """
-    phones = [str(p).strip() for p in (phones or []) if p]
-    if not phones:
-        return {}
-
-    sql = """
-      SELECT
-        phone,
-        COALESCE((data->>'turno_activo')::boolean, NULL) AS turno_activo,
-        COALESCE((data->>'ocupada')::boolean, NULL)      AS ocupada,
-        COALESCE((data->>'pausada')::boolean, NULL)      AS pausada,
-        NULLIF(UPPER(data->>'area'), '')                 AS area
-      FROM runtime_sessions
-      WHERE phone = ANY(%s)
+    Última ubicación conocida por worker en UNA consulta:
+        {telefono_normalizado: ubicacion}
+    Ticket EN_CURSO si tiene; si no, el último PAUSADO/RESUELTO reciente.
     """
+    table = "public.tickets" if using_pg() else "tickets"
+    desde = (
+        f"NOW() - INTERVAL '{ULTIMA_UBICACION_HORAS} hours'"
+        if using_pg()
+        else f"datetime('now', '-{ULTIMA_UBICACION_HORAS} hours')"
+    )
+    rows = fetchall(
+        f"""
+        SELECT assigned_phone, ubicacion
+        FROM (
+            SELECT assigned_phone, ubicacion,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY assigned_phone
+                       ORDER BY (estado = 'EN_CURSO') DESC, updated_at DESC
+                   ) AS rn
+            FROM {table}
+            WHERE org_id = ? AND hotel_id = ?
+              AND estado IN ('EN_CURSO', 'PAUSADO', 'RESUELTO')
+              AND deleted_at IS NULL
+              AND assigned_phone IS NOT NULL
+              AND updated_at >= {desde}
+        ) ult
+        WHERE rn = 1
+        """,
+        [org_id, hotel_id],
+    )
 
-    try:
-        conn = _get_pg_conn()
-        try:
-            cur = conn.cursor()
-            cur.execute(sql, (phones,))
-            rows = cur.fetchall()
-            cur.close()
-        finally:
-            conn.close()
-
-        out: dict[str, dict] = {}
-        for phone, turno_activo, ocupada, pausada, area in rows:
-            out[str(phone)] = {
-                "turno_activo": turno_activo,
-                "ocupada": ocupada,
-                "pausada": pausada,
-                "area": area,
-            }
-        return out
-    except Exception:
-        logger.exception("Error leyendo runtime_sessions; devolviendo {}")
-        return {}
+    ubicaciones: Dict[str, str] = {}
+    for r in rows:
+        phone = _normalize_phone(r.get("assigned_phone") or "")
+        if phone and r.get("ubicacion"):
+            ubicaciones.setdefault(phone, str(r["ubicacion"]))
+    return ubicaciones
+
+
+_directorio = StaffDirectory(
+    cargar_roster_workers,
+    _normalize_phone,
+    cargar_carga_workers,
+    cargar_ubicaciones_workers,
+)
+
+
+def invalidar_directorio_workers(motivo: str = "") -> None:
+    """Fuerza recargar el roster en el próximo acceso (turno, NOTIFY staff_changed)."""
+    _directorio.invalidate(motivo)
+
+
+def ajustar_carga_worker(org_id: int, hotel_id: int, phone: str, deltas: Dict[str, int]) -> None:
+    """Ajusta la carga cacheada tras una transición (ver TicketStateMachine)."""
+    _directorio.adjust_workload(org_id, hotel_id, phone, deltas)
+
+
+def registrar_ubicacion_worker(org_id: int, hotel_id: int, phone: str, ubicacion: str) -> None:
+    """Actualiza la última ubicación cacheada del worker (ver TicketStateMachine)."""
+    _directorio.set_location(org_id, hotel_id, phone, ubicacion)
+
+
+def invalidar_carga_workers(motivo: str = "") -> None:
+    """La próxima lectura de carga vuelve a consultar la BD."""
+    _directorio.invalidate_workload(motivo)
 
 
 # ============================================================
@@ -204,46 +276,37 @@ def obtener_todos_workers(
     hotel_id: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
     """
-    Obtiene trabajadores activos FILTRADOS por org_id y hotel_id.
-    Usa JOIN con orgusers (que tiene org_id y default_hotel_id).
+    Obtiene trabajadores activos FILTRADOS por org_id y hotel_id
+    (desde el directorio en memoria).
     """
     if org_id is None or hotel_id is None:
         d_org, d_hotel = _default_scope()
         org_id = d_org if org_id is None else org_id
         hotel_id = d_hotel if hotel_id is None else hotel_id
 
-    sql = _WORKERS_BASE_SQL + "\n    ORDER BY u.username"
-
     try:
-        workers = fetchall(sql, [org_id, hotel_id])
-
-        # Enriquecer con runtime_sessions SOLO para flags efímeros (no turno)
-        phones = [w.get("telefono") for w in workers if w.get("telefono")]
-        sessions = obtener_runtime_sessions_por_telefonos(phones) or {}
-
-        for w in workers:
-            phone = w.get("telefono")
-            data = (sessions.get(phone, {}) or {})
-
-            # Turno desde BD (fuente de verdad)
-            w["turno_activo"] = bool(w.get("turno_activo", False))
-
-            # Estado efímero desde runtime
-            w["pausada"] = bool(data.get("pausada", False))
-            w["ocupada"] = bool(data.get("ocupada", False))
+        return _directorio.workers(org_id, hotel_id)
+    except Exception as e:
+        logger.exception(f"❌ Error obteniendo workers: {e}")
+        return []
 
-            # Área normalizada
-            w["area"] = normalizar_area(w.get("area") or data.get("area") or "HOUSEKEEPING")
 
-        logger.info(
-            f"👥 {len(workers)} workers (org={org_id}, hotel={hotel_id}); "
-            f"turno_activo={sum(1 for w in workers if w.get('turno_activo'))}; "
-            f"areas_sample={[w.get('area') for w in workers[:5]]}"
-        )
-        return workers
+def obtener_workers_por_area(
+    area: str,
+    *,
+    org_id: Optional[int] = None,
+    hotel_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Workers activos de un área (normalizada: MANTENCION → MANTENIMIENTO, etc.)."""
+    if org_id is None or hotel_id is None:
+        d_org, d_hotel = _default_scope()
+        org_id = d_org if org_id is None else org_id
+        hotel_id = d_hotel if hotel_id is None else hotel_id
 
+    try:
+        return _directorio.by_area(normalizar_area(area), org_id, hotel_id)
     except Exception as e:
-        logger.exception(f"❌ Error obteniendo workers: {e}")
+        logger.exception(f"❌ Error obteniendo workers por área: {e}")
         return []
 
 
@@ -254,53 +317,30 @@ def buscar_worker_por_nombre(
     hotel_id: Optional[int] = None,
 ) -> Optional[Dict[str, Any]]:
     """
-    Busca un worker por nombre (case-insensitive + sin tildes).
-    Retorna el mejor match. Filtrado por org/hotel via orgusers.
+    Busca un worker por nombre (sin tildes, tolerante a errores de
+    transcripción; ver name_index). Retorna el mejor match.
+    Filtrado por org/hotel via orgusers.
     """
     if org_id is None or hotel_id is None:
         d_org, d_hotel = _default_scope()
         org_id = d_org if org_id is None else org_id
         hotel_id = d_hotel if hotel_id is None else hotel_id
 
-    nombre_norm = _norm(nombre)
-    if not nombre_norm:
+    if not normalize_name(nombre):
         return None
 
-    sql = _WORKERS_BASE_SQL
-
     try:
-        workers = fetchall(sql, [org_id, hotel_id]) or []
-
-        logger.info(f"🔍 Buscando '{nombre}' entre {len(workers)} workers activos (org={org_id}, hotel={hotel_id})")
-
-        # Filtrar candidatos por nombre normalizado
-        candidatos: List[Dict[str, Any]] = []
-        for w in workers:
-            w_norm = _norm(w.get("nombre_completo") or "")
-            if nombre_norm in w_norm:
-                candidatos.append(w)
-                logger.debug(f"   ✓ Match: '{w.get('nombre_completo')}' contiene '{nombre}'")
+        candidatos = _directorio.search_names(nombre, org_id, hotel_id)
 
         if not candidatos:
-            logger.info(f"👥 0 workers encontrados con '{nombre}'")
-            logger.info(f"📋 Workers disponibles:")
-            for w in workers[:5]:
-                logger.info(f"   - {w.get('nombre_completo')}")
+            logger.info(f"👥 0 workers encontrados con '{nombre}' (org={org_id}, hotel={hotel_id})")
             return None
 
-        # Ranking: exact match > startswith > contains
-        def score(w: Dict[str, Any]) -> int:
-            w_norm = _norm(w.get("nombre_completo") or "")
-            if w_norm == nombre_norm:
-                return 3
-            if w_norm.startswith(nombre_norm):
-                return 2
-            return 1
-
-        candidatos.sort(key=lambda w: (score(w), (w.get("nombre_completo") or "").lower()), reverse=True)
-        elegido = candidatos[0]
-
-        logger.info(f"✅ Worker encontrado: {elegido.get('nombre_completo')} (área: {elegido.get('area')})")
+        score, match_type, elegido = candidatos[0]
+        logger.info(
+            f"✅ Worker encontrado: {elegido.get('nombre_completo')} (área: {elegido.get('area')}) "
+            f"[{match_type} {score:.2f}]"
+        )
         return elegido
 
     except Exception as e:
@@ -315,7 +355,10 @@ def buscar_workers_por_nombre(
     hotel_id: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
     """
-    Busca múltiples workers que coincidan con el nombre (match sin tildes).
+    Busca múltiples workers que coincidan con el nombre, ordenados por
+    relevancia. Si hay coincidencias directas (exacto/prefijo/substring) solo
+    devuelve esas; si no, las aproximadas (fonética/trigramas).
+    Cada worker trae match_score / match_type (ver name_index).
     Filtrado por org/hotel via orgusers.
     """
     if org_id is None or hotel_id is None:
@@ -323,23 +366,14 @@ def buscar_workers_por_nombre(
         org_id = d_org if org_id is None else org_id
         hotel_id = d_hotel if hotel_id is None else hotel_id
 
-    nombre_norm = _norm(nombre)
-    if not nombre_norm:
+    if not normalize_name(nombre):
         return []
 
-    sql = _WORKERS_BASE_SQL + "\n    ORDER BY u.username"
-
     try:
-        workers = fetchall(sql, [org_id, hotel_id])
-
-        matches = []
-        for w in (workers or []):
-            nombre_worker = _norm(w.get("nombre_completo") or "")
-            if nombre_norm in nombre_worker:
-                w["turno_activo"] = bool(w.get("turno_activo", False))
-                w["area"] = normalizar_area(w.get("area") or "HOUSEKEEPING")
-                matches.append(w)
-
+        matches = [
+            {**w, "match_score": score, "match_type": match_type}
+            for score, match_type, w in _directorio.search_names(nombre, org_id, hotel_id)
+        ]
         logger.info(f"👥 {len(matches)} workers encontrados con '{nombre}' (org={org_id}, hotel={hotel_id})")
         return matches
 
@@ -363,17 +397,10 @@ def buscar_worker_por_telefono(
         org_id = d_org if org_id is None else org_id
         hotel_id = d_hotel if hotel_id is None else hotel_id
 
-    sql = _WORKERS_BASE_SQL + """
-        AND u.telefono = ?
-        LIMIT 1
-    """
-
     try:
-        worker = fetchone(sql, [org_id, hotel_id, telefono])
+        worker = _directorio.by_phone(telefono, org_id, hotel_id)
 
         if worker:
-            worker["turno_activo"] = bool(worker.get("turno_activo", False))
-            worker["area"] = normalizar_area(worker.get("area") or "HOUSEKEEPING")
             logger.info(f"✅ Worker encontrado por teléfono: {worker['nombre_completo']} (org={org_id}, hotel={hotel_id})")
         else:
             logger.info(f"⚠️ No se encontró worker con teléfono: {telefono} (org={org_id}, hotel={hotel_id})")
@@ -382,4 +409,4 @@ def buscar_worker_por_telefono(
 
     except Exception as e:
         logger.exception(f"❌ Error buscando worker por teléfono: {e}")
-        return None
\ No newline at end of file
+        return None